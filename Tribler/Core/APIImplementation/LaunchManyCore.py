@@ -8,13 +8,14 @@ import logging
 import os
 import sys
 import time as timemod
+from ConfigParser import Error as ConfigParserError
 from glob import iglob
 from threading import Event, enumerate as enumerate_threads
 from traceback import print_exc
 
 from twisted.internet import reactor
-from twisted.internet.defer import Deferred, inlineCallbacks, DeferredList
-from twisted.internet.task import LoopingCall
+from twisted.internet.defer import CancelledError, Deferred, inlineCallbacks, DeferredList, succeed
+from twisted.internet.task import LoopingCall, deferLater
 from twisted.internet.threads import deferToThread
 from twisted.python.threadable import isInIOThread
 
@@ -41,6 +42,33 @@ from Tribler.community.tunnel.tunnel_community import TunnelSettings
 from Tribler.dispersy.taskmanager import TaskManager
 from Tribler.dispersy.util import blockingCallFromThread, blocking_call_on_reactor_thread
 
+RESUME_BATCH_SIZE = 500  # The number of download checkpoints that is parsed at once while resuming
+RESUME_QUEUE_SIZE = 100  # The maximum number of resumed downloads waiting to be added by libtorrent
+RESUME_PACING_INTERVAL = 0.05  # The time between two checks of the libtorrent queue while resuming
+
+
+def parse_checkpoint(filename):
+    """
+    Parses a download checkpoint, usually in a thread. The literal values in the checkpoint, such as the
+    metainfo and the resume data, are evaluated here as well. Strings are left as they are, since reading an option
+    evaluates it again.
+    :return: A tuple of the filename and a dictionary with the options of every section, or None as options if the
+             checkpoint cannot be read
+    """
+    pstate = CallbackConfigParser()
+    try:
+        pstate.read_file(filename)
+    except (IOError, UnicodeDecodeError, ConfigParserError):
+        return filename, None
+
+    sections = {}
+    for section in pstate.sections():
+        options = sections[section] = {}
+        for option, value in pstate.items(section):
+            literal_value = CallbackConfigParser.get_literal_value(value)
+            options[option] = value if isinstance(literal_value, basestring) else literal_value
+    return filename, sections
+
 
 class TriblerLaunchMany(TaskManager):
 
@@ -84,6 +112,7 @@ class TriblerLaunchMany(TaskManager):
         self.channelcast_db = None
 
         self.search_manager = None
+        self.search_cache = None
         self.channel_manager = None
 
         self.video_server = None
@@ -154,6 +183,10 @@ class TriblerLaunchMany(TaskManager):
                 self.tracker_manager = TrackerManager(self.session)
                 self.tracker_manager.initialize()
 
+                from Tribler.Core.Modules.search_cache import SearchResultCache
+                self.search_cache = SearchResultCache(self.session)
+                self.search_cache.initialize()
+
             if self.session.config.get_video_server_enabled():
                 self.video_server = VideoServer(self.session.config.get_video_server_port(), self.session)
                 self.video_server.start()
@@ -172,7 +205,8 @@ class TriblerLaunchMany(TaskManager):
 
                 # register TFTP service
                 from Tribler.Core.TFTP.handler import TftpHandler
-                self.tftp_handler = TftpHandler(self.session, endpoint, "fffffffd".decode('hex'), block_size=1024)
+                self.tftp_handler = TftpHandler(self.session, endpoint, "fffffffd".decode('hex'), block_size=1024,
+                                                window_size=16)
                 self.tftp_handler.initialize()
 
             if self.session.config.get_torrent_search_enabled() or self.session.config.get_channel_search_enabled():
@@ -367,7 +401,7 @@ class TriblerLaunchMany(TaskManager):
         self.initComplete = True
 
     def add(self, tdef, dscfg, pstate=None, setupDelay=0, hidden=False,
-            share_mode=False, checkpoint_disabled=False):
+            share_mode=False, checkpoint_disabled=False, async_add=False):
         """ Called by any thread """
         d = None
         with self.session_lock:
@@ -401,9 +435,10 @@ class TriblerLaunchMany(TaskManager):
 
             # Store in list of Downloads, always.
             self.downloads[infohash] = d
-            setup_deferred = d.setup(dscfg, pstate, wrapperDelay=setupDelay,
-                                     share_mode=share_mode, checkpoint_disabled=checkpoint_disabled)
-            setup_deferred.addCallback(self.on_download_handle_created)
+            setup_deferred = d.setup(dscfg, pstate, wrapperDelay=setupDelay, share_mode=share_mode,
+                                     checkpoint_disabled=checkpoint_disabled, async_add=async_add)
+            # A download that is removed before libtorrent has added its torrent is not checkpointed
+            setup_deferred.addCallbacks(self.on_download_handle_created, lambda failure: failure.trap(CancelledError))
 
         if d and not hidden and self.session.config.get_megacache_enabled():
             @forceDBThread
@@ -626,16 +661,80 @@ class TriblerLaunchMany(TaskManager):
     #
     def load_checkpoint(self):
         """ Called by any thread """
-
-        def do_load_checkpoint():
-            with self.session_lock:
-                for i, filename in enumerate(iglob(os.path.join(self.session.get_downloads_pstate_dir(), '*.state'))):
-                    self.resume_download(filename, setupDelay=i * 0.1)
-
         if self.initComplete:
-            do_load_checkpoint()
+            return self.resume_downloads()
         else:
-            self.register_task("load_checkpoint", reactor.callLater(1, do_load_checkpoint))
+            self.register_task("load_checkpoint", reactor.callLater(1, self.resume_downloads))
+
+    @inlineCallbacks
+    def resume_downloads(self):
+        """
+        Resumes the downloads of all checkpoints. The checkpoints are parsed in a thread, while the downloads of the
+        previous batch are added to libtorrent. Instead of delaying every download, the downloads are added
+        asynchronously as fast as libtorrent works through its queue.
+        """
+        start_time = timemod.time()
+        filenames = list(iglob(os.path.join(self.session.get_downloads_pstate_dir(), '*.state')))
+        batches = [filenames[offset:offset + RESUME_BATCH_SIZE]
+                   for offset in xrange(0, len(filenames), RESUME_BATCH_SIZE)]
+        self._logger.info("tlm: resuming %d downloads", len(filenames))
+
+        # A single batch is parsed right away, so a few downloads are resumed synchronously
+        in_thread = len(batches) > 1
+        handle_deferreds = []
+        next_checkpoints = self._parse_checkpoints(batches[0], in_thread) if batches else None
+        for index in xrange(len(batches)):
+            checkpoints = yield next_checkpoints
+            if index + 1 < len(batches):
+                next_checkpoints = self._parse_checkpoints(batches[index + 1], in_thread)
+
+            while checkpoints:
+                num_pending = self.ltmgr.get_num_pending_adds() if self.ltmgr else 0
+                room = max(RESUME_QUEUE_SIZE - num_pending, 0)
+                submit, checkpoints = checkpoints[:room], checkpoints[room:]
+                with self.session_lock:
+                    for filename, sections in submit:
+                        download = self.resume_download(filename, pstate=self._create_pstate(filename, sections),
+                                                        async_add=True)
+                        if download:
+                            handle_deferreds.append(download.get_handle())
+                if checkpoints:
+                    # Give libtorrent the time to work through the downloads that were just added
+                    yield deferLater(reactor, RESUME_PACING_INTERVAL, lambda: None)
+
+        self._logger.info("tlm: submitted %d downloads in %.2f seconds", len(handle_deferreds),
+                          timemod.time() - start_time)
+
+        def on_downloads_resumed(_):
+            self._logger.info("tlm: all %d downloads resumed in %.2f seconds", len(handle_deferreds),
+                              timemod.time() - start_time)
+        DeferredList(handle_deferreds).addCallback(on_downloads_resumed)
+
+    @staticmethod
+    def _parse_checkpoints(filenames, in_thread):
+        """
+        Parses the checkpoints with the given filenames, in a thread if in_thread is set.
+        :return: A Deferred that fires with the results of parse_checkpoint.
+        """
+        if not in_thread:
+            return succeed(map(parse_checkpoint, filenames))
+        return deferToThread(map, parse_checkpoint, filenames)
+
+    @staticmethod
+    def _create_pstate(filename, sections):
+        """
+        Returns the pstate of a checkpoint parsed by parse_checkpoint, or None if it could not be parsed.
+        """
+        if sections is None:
+            return None
+
+        pstate = CallbackConfigParser()
+        pstate.filename = filename
+        for section, options in sections.iteritems():
+            pstate.add_section(section)
+            for option, value in options.iteritems():
+                pstate.set(section, option, value)
+        return pstate
 
     def load_download_pstate_noexc(self, infohash):
         """ Called by any thread, assume session_lock already held """
@@ -650,11 +749,16 @@ class TriblerLaunchMany(TaskManager):
         except Exception:
             self._logger.exception("Exception while loading pstate: %s", infohash)
 
-    def resume_download(self, filename, setupDelay=0):
-        tdef = dscfg = pstate = None
+    def resume_download(self, filename, setupDelay=0, pstate=None, async_add=False):
+        """
+        Resumes the download of a checkpoint. The pstate is loaded from the checkpoint unless it is given.
+        :return: The resumed download, or None if it could not be resumed
+        """
+        tdef = dscfg = None
 
         try:
-            pstate = self.load_download_pstate(filename)
+            if pstate is None:
+                pstate = self.load_download_pstate(filename)
 
             # SWIFTPROC
             metainfo = pstate.get('state', 'metainfo')
@@ -698,7 +802,7 @@ class TriblerLaunchMany(TaskManager):
             if dscfg.get_dest_dir() != '':  # removed torrent ignoring
                 try:
                     if not self.download_exists(tdef.get_infohash()):
-                        self.add(tdef, dscfg, pstate, setupDelay=setupDelay)
+                        return self.add(tdef, dscfg, pstate, setupDelay=setupDelay, async_add=async_add)
                     else:
                         self._logger.info("tlm: not resuming checkpoint because download has already been added")
 
@@ -782,6 +886,10 @@ class TriblerLaunchMany(TaskManager):
             yield self.search_manager.shutdown()
         self.search_manager = None
 
+        if self.search_cache:
+            self.search_cache.shutdown()
+        self.search_cache = None
+
         if self.rtorrent_handler:
             yield self.rtorrent_handler.shutdown()
         self.rtorrent_handler = None
@@ -5,6 +5,11 @@ Author(s): Jelle Roozenburg
 """
 import logging
 import threading
+import time
+from collections import OrderedDict
+
+from twisted.internet import reactor
+from twisted.python.threadable import isInIOThread
 
 from Tribler.Core.simpledefs import (NTFY_TORRENTS, NTFY_PLAYLISTS, NTFY_COMMENTS,
                                      NTFY_MODIFICATIONS, NTFY_MODERATIONS, NTFY_MARKINGS, NTFY_MYPREFERENCES,
@@ -40,7 +45,15 @@ class Notifier(object):
         self.observertimers = {}
         self.observerLock = threading.Lock()
 
-    def add_observer(self, func, subject, changeTypes=[NTFY_UPDATE, NTFY_INSERT, NTFY_DELETE], id=None, cache=0):
+        # The observers indexed by (subject, changeType). The lists in this dictionary are never modified in place,
+        # but replaced when an observer is added or removed, so notify can iterate them without holding the lock.
+        self._observers_by_event = {}
+
+        self._start_time = time.time()
+        self._subject_statistics = {}
+
+    def add_observer(self, func, subject, changeTypes=[NTFY_UPDATE, NTFY_INSERT, NTFY_DELETE], id=None, cache=0,
+                     coalesce=False):
         """
         Add observer function which will be called upon certain event
         Example:
@@ -49,79 +62,135 @@ class Notifier(object):
         addObserver(NTFY_TORRENTS, [NTFY_SEARCH_RESULT], 'a_search_id') -> get
                     callbacks when peer-searchresults of of search
                     with id=='a_search_id' come in
+
+        If cache is set, the events are batched for that amount of seconds and func is called on the reactor thread
+        with the list of events. If coalesce is set as well, only the last event of each obj_id is kept in a batch.
         """
         assert isinstance(changeTypes, list)
         assert subject in self.SUBJECTS, 'Subject %s not in SUBJECTS' % subject
 
-        obs = (func, subject, changeTypes, id, cache)
-        self.observerLock.acquire()
-        self.observers.append(obs)
-        self.observerLock.release()
+        obs = (func, subject, changeTypes, id, cache, coalesce)
+        with self.observerLock:
+            self.observers.append(obs)
+            self._update_index()
 
     def remove_observer(self, func):
         """ Remove all observers with function func
         """
         with self.observerLock:
-            i = 0
-            while i < len(self.observers):
-                ofunc = self.observers[i][0]
-                if ofunc == func:
-                    del self.observers[i]
-                else:
-                    i += 1
+            self.observers = [obs for obs in self.observers if obs[0] != func]
+            self._update_index()
 
     def remove_observers(self):
         with self.observerLock:
             for timer in self.observertimers.values():
-                timer.cancel()
+                if timer and timer.active():
+                    timer.cancel()
             self.observerscache = {}
             self.observertimers = {}
             self.observers = []
+            self._update_index()
+
+    def _update_index(self):
+        """
+        Rebuilds the dispatch index of the observers. Should be called while holding the observer lock.
+        """
+        observers_by_event = {}
+        for obs in self.observers:
+            for change_type in obs[2]:
+                observers_by_event.setdefault((obs[1], change_type), []).append(obs)
+        self._observers_by_event = observers_by_event
 
     def notify(self, subject, changeType, obj_id, *args):
         """
-        Notify all interested observers about an event with threads from the pool
+        Notify all interested observers about an event. Observers without a cache are called in this thread,
+        the events of observers with a cache are queued and delivered in a batch on the reactor thread.
         """
-        tasks = []
         assert subject in self.SUBJECTS, 'Subject %s not in SUBJECTS' % subject
 
+        statistics = self._get_subject_statistics(subject)
+        statistics['events'] += 1
+
+        observers = self._observers_by_event.get((subject, changeType))
+        if not observers:
+            return
+
         args = [subject, changeType, obj_id] + list(args)
 
-        self.observerLock.acquire()
-        for ofunc, osubject, ochangeTypes, oid, cache in self.observers:
-            try:
-                if (subject == osubject and
-                    changeType in ochangeTypes and
-                        (oid is None or oid == obj_id)):
-
-                    if not cache:
-                        tasks.append(ofunc)
-                    else:
-                        if ofunc not in self.observerscache:
-                            def doQueue(ofunc):
-                                self.observerLock.acquire()
-                                if ofunc in self.observerscache:
-                                    events = self.observerscache[ofunc]
-                                    del self.observerscache[ofunc]
-                                    del self.observertimers[ofunc]
-                                else:
-                                    events = []
-                                self.observerLock.release()
-
-                                if events:
-                                    ofunc(events)
-
-                            t = threading.Timer(cache, doQueue, (ofunc,))
-                            t.setName("Notifier-timer-%s" % subject)
-                            t.start()
-
-                            self.observerscache[ofunc] = []
-                            self.observertimers[ofunc] = t
-
-                        self.observerscache[ofunc].append(args)
-            except:
-                self._logger.exception("OIDs were %s %s", repr(oid), repr(obj_id))
-
-        self.observerLock.release()
+        tasks = []
+        for ofunc, _, _, oid, cache, coalesce in observers:
+            if oid is not None and oid != obj_id:
+                continue
+
+            if not cache:
+                tasks.append(ofunc)
+                continue
+
+            with self.observerLock:
+                if ofunc not in self.observerscache:
+                    self.observerscache[ofunc] = OrderedDict() if coalesce else []
+                    self.observertimers[ofunc] = None
+                    self._schedule_flush(ofunc, cache, subject)
+
+                if coalesce:
+                    # Only keep the latest event of each object, at the position of its latest occurrence
+                    self.observerscache[ofunc].pop(obj_id, None)
+                    self.observerscache[ofunc][obj_id] = args
+                else:
+                    self.observerscache[ofunc].append(args)
+
         for task in tasks:
-            task(*args)  # call observer function in this thread
+            self._call_observer(subject, task, *args)  # call observer function in this thread
+
+    def _schedule_flush(self, ofunc, cache, subject):
+        def schedule():
+            with self.observerLock:
+                if ofunc in self.observertimers:
+                    self.observertimers[ofunc] = reactor.callLater(cache, self._flush, ofunc, subject)
+
+        if isInIOThread():
+            schedule()
+        else:
+            reactor.callFromThread(schedule)
+
+    def _flush(self, ofunc, subject):
+        with self.observerLock:
+            events = self.observerscache.pop(ofunc, None)
+            self.observertimers.pop(ofunc, None)
+
+        if events:
+            self._call_observer(subject, ofunc, events.values() if isinstance(events, OrderedDict) else events)
+
+    def _call_observer(self, subject, ofunc, *args):
+        start_time = time.time()
+        try:
+            ofunc(*args)
+        finally:
+            callback_time = time.time() - start_time
+            statistics = self._get_subject_statistics(subject)
+            statistics['callbacks'] += 1
+            statistics['callback_time'] += callback_time
+            statistics['max_callback_time'] = max(statistics['max_callback_time'], callback_time)
+
+    def _get_subject_statistics(self, subject):
+        statistics = self._subject_statistics.get(subject)
+        if statistics is None:
+            statistics = self._subject_statistics.setdefault(subject, {'events': 0, 'callbacks': 0,
+                                                                       'callback_time': 0.0,
+                                                                       'max_callback_time': 0.0})
+        return statistics
+
+    def get_statistics(self):
+        """
+        Returns the number of events per second and the latency of the observer callbacks for each subject.
+        """
+        uptime = max(time.time() - self._start_time, 1e-6)
+        result = {}
+        for subject, statistics in self._subject_statistics.items():
+            callbacks = statistics['callbacks']
+            result[subject] = {'events': statistics['events'],
+                               'events_per_second': statistics['events'] / uptime,
+                               'callbacks': callbacks,
+                               'avg_callback_time': statistics['callback_time'] / callbacks if callbacks else 0.0,
+                               'max_callback_time': statistics['max_callback_time']}
+        return result
@@ -5,7 +5,6 @@ Author(s): Jie Yang
 """
 import json
 import logging
-import math
 import os
 import threading
 from collections import OrderedDict, defaultdict
@@ -16,11 +15,13 @@ from pprint import pformat
 from struct import unpack_from
 from time import time
 from traceback import print_exc
+from twisted.internet import reactor
 from twisted.internet.task import LoopingCall
+from twisted.internet.threads import deferToThread
 
-from Tribler.Core.CacheDB.sqlitecachedb import bin2str, str2bin
 from Tribler.Core.TorrentDef import TorrentDef
 from Tribler.Core.Utilities.search_utils import split_into_keywords, filter_keywords
+from Tribler.Core.Utilities.term_index import TermIndex, levenshtein
 from Tribler.Core.Utilities.tracker_utils import get_uniformed_tracker_url
 from Tribler.Core.Utilities.unicode import dunno2unicode
 from Tribler.Core.simpledefs import (INFOHASH_LENGTH, NTFY_UPDATE, NTFY_INSERT, NTFY_DELETE, NTFY_CREATE,
@@ -32,7 +33,13 @@ from Tribler.dispersy.taskmanager import TaskManager
 
 VOTECAST_FLUSH_DB_INTERVAL = 15
 
+TERM_INDEX_BUILD_DELAY = 5
+SEARCH_SUGGESTION_MAX_DISTANCE = 2
+SEARCH_SUGGESTION_CANDIDATES = 100
+
 DEFAULT_ID_CACHE_SIZE = 1024 * 5
+# The maximum number of host parameters SQLite accepts in a single statement by default
+MAX_SQL_VARIABLES = 999
 
 
 class LimitedOrderedDict(OrderedDict):
@@ -94,14 +101,14 @@ class PeerDBHandler(BasicDBHandler):
             assert isinstance(permid, str), permid
 
             if permid not in self.permid_id:
-                to_select.append(bin2str(permid))
+                to_select.append(buffer(permid))
 
         if len(to_select) > 0:
             parameters = u", ".join(u'?' * len(to_select))
             sql_get_peer_ids = u"SELECT peer_id, permid FROM Peer WHERE permid IN (%s)" % parameters
             peerids = self._db.fetchall(sql_get_peer_ids, to_select)
             for peer_id, permid in peerids:
-                self.permid_id[str2bin(permid)] = peer_id
+                self.permid_id[str(permid)] = peer_id
 
         to_return = []
         for permid in permids:
@@ -121,18 +128,18 @@ class PeerDBHandler(BasicDBHandler):
 
     def getPeer(self, permid, keys=None):
         if keys is not None:
-            res = self.getOne(keys, permid=bin2str(permid))
+            res = self.getOne(keys, permid=buffer(permid))
             return res
         else:
             # return a dictionary
             # make it compatible for calls to old bsddb interface
             value_name = (u'peer_id', u'permid', u'name')
 
-            item = self.getOne(value_name, permid=bin2str(permid))
+            item = self.getOne(value_name, permid=buffer(permid))
             if not item:
                 return None
             peer = dict(zip(value_name, item))
-            peer['permid'] = str2bin(peer['permid'])
+            peer['permid'] = str(peer['permid'])
             return peer
 
     def getPeerById(self, peer_id, keys=None):
@@ -148,7 +155,7 @@ class PeerDBHandler(BasicDBHandler):
             if not item:
                 return None
             peer = dict(zip(value_name, item))
-            peer['permid'] = str2bin(peer['permid'])
+            peer['permid'] = str(peer['permid'])
             return peer
 
     def addPeer(self, permid, value):
@@ -167,7 +174,7 @@ class PeerDBHandler(BasicDBHandler):
             where = u'peer_id == %d' % peer_id
             self._db.update('Peer', where, **value)
         else:
-            self._db.insert_or_ignore('Peer', permid=bin2str(permid), **value)
+            self._db.insert_or_ignore('Peer', permid=buffer(permid), **value)
 
         if _permid is not None:
             value['permid'] = permid
@@ -176,9 +183,8 @@ class PeerDBHandler(BasicDBHandler):
         if not check_db:
             return bool(self.getPeerID(permid))
         else:
-            permid_str = bin2str(permid)
             sql_get_peer_id = u"SELECT peer_id FROM Peer WHERE permid == ?"
-            peer_id = self._db.fetchone(sql_get_peer_id, (permid_str,))
+            peer_id = self._db.fetchone(sql_get_peer_id, (buffer(permid),))
             if peer_id is None:
                 return False
             else:
@@ -227,6 +233,12 @@ class TorrentDBHandler(BasicDBHandler):
         # to incoming remote torrents without doing a full text search.
         self.latest_matchinfo_torrent = None
 
+        # The index of the terms in the torrent names, used for autocompletion and search suggestions. It is None
+        # until it has been built, during the build the names that are indexed or removed are kept in a list of
+        # (name, added) tuples.
+        self.term_index = None
+        self._term_index_pending_changes = None
+
     def initialize(self, *args, **kwargs):
         super(TorrentDBHandler, self).initialize(*args, **kwargs)
         self.category = self.session.lm.category
@@ -235,6 +247,38 @@ class TorrentDBHandler(BasicDBHandler):
         self.channelcast_db = self.session.open_dbhandler(NTFY_CHANNELCAST)
         self._rtorrent_handler = self.session.lm.rtorrent_handler
 
+        self.register_task(u"build_term_index", reactor.callLater(TERM_INDEX_BUILD_DELAY, self.build_term_index))
+
+    def build_term_index(self):
+        """
+        Builds the term index from the swarm names in the FullTextIndex. The names are read on the read pool of the
+        database and the index is built in a thread, so the reactor is not blocked.
+        :return: A Deferred that fires when the index is ready.
+        """
+        def build_index(names):
+            term_index = TermIndex()
+            term_index.add_names(name for name, in names)
+            return term_index
+
+        def on_index_built(term_index):
+            for name, added in self._term_index_pending_changes:
+                if added:
+                    term_index.add_name(name)
+                else:
+                    term_index.remove_name(name)
+            self._term_index_pending_changes = None
+            self.term_index = term_index
+            self._logger.info("Built the term index with %d terms", len(term_index))
+
+        def on_build_failed(failure):
+            self._term_index_pending_changes = None
+            self._logger.error("Failed to build the term index: %s", failure.getErrorMessage())
+
+        self._term_index_pending_changes = []
+        return self._db.fetchall_async(u"SELECT swarmname FROM FullTextIndex WHERE swarmname IS NOT NULL")\
+            .addCallback(lambda names: deferToThread(build_index, names))\
+            .addCallbacks(on_index_built, on_build_failed)
+
     def close(self):
         super(TorrentDBHandler, self).close()
         self.category = None
@@ -259,14 +303,13 @@ class TorrentDBHandler(BasicDBHandler):
             if infohash in self.infohash_id:
                 to_return[infohash] = self.infohash_id[infohash]
             else:
-                to_select.append(bin2str(infohash))
+                to_select.append(buffer(infohash))
 
-        parameters = '?,' * len(to_select)
-        parameters = parameters[:-1]
-        sql_stmt = u"SELECT torrent_id, infohash FROM Torrent WHERE infohash IN (%s)" % parameters
-        torrents = self._db.fetchall(sql_stmt, to_select)
-        for torrent_id, infohash in torrents:
-            self.infohash_id[str2bin(infohash)] = torrent_id
+        for offset in xrange(0, len(to_select), MAX_SQL_VARIABLES):
+            chunk = to_select[offset:offset + MAX_SQL_VARIABLES]
+            sql_stmt = u"SELECT torrent_id, infohash FROM Torrent WHERE infohash IN (%s)" % ','.join('?' * len(chunk))
+            for torrent_id, infohash in self._db.fetchall(sql_stmt, chunk):
+                self.infohash_id[str(infohash)] = torrent_id
 
         for infohash in unique_infohashes:
             if infohash not in to_return:
@@ -277,7 +320,7 @@ class TorrentDBHandler(BasicDBHandler):
             self._logger.error("to_return:")
             self._logger.error(pformat(to_return))
             self._logger.error("infohashes:")
-            self._logger.error(pformat([bin2str(infohash) for infohash in unique_infohashes]))
+            self._logger.error(pformat([infohash.encode('hex') for infohash in unique_infohashes]))
             assert len(to_return) == len(unique_infohashes), (len(to_return), len(unique_infohashes))
 
         return to_return
@@ -286,7 +329,7 @@ class TorrentDBHandler(BasicDBHandler):
         sql_get_infohash = "SELECT infohash FROM Torrent WHERE torrent_id==?"
         ret = self._db.fetchone(sql_get_infohash, (torrent_id,))
         if ret:
-            ret = str2bin(ret)
+            ret = str(ret)
         return ret
 
     def hasTorrent(self, infohash):
@@ -294,8 +337,7 @@ class TorrentDBHandler(BasicDBHandler):
         assert len(infohash) == INFOHASH_LENGTH, "INFOHASH has invalid length: %d" % len(infohash)
         if infohash in self.existed_torrents:  # to do: not thread safe
             return True
-        infohash_str = bin2str(infohash)
-        existed = self._db.getOne('CollectedTorrent', 'torrent_id', infohash=infohash_str)
+        existed = self._db.getOne('CollectedTorrent', 'torrent_id', infohash=buffer(infohash))
         if existed is None:
             return False
         else:
@@ -312,31 +354,10 @@ class TorrentDBHandler(BasicDBHandler):
 
     def addExternalTorrentNoDef(self, infohash, name, files, trackers, timestamp, extra_info={}):
         if not self.hasTorrent(infohash):
-            metainfo = {'info': {}, 'encoding': 'utf_8'}
-            metainfo['info']['name'] = name.encode('utf_8')
-            metainfo['info']['piece length'] = -1
-            metainfo['info']['pieces'] = ''
-
-            if len(files) > 1:
-                files_as_dict = []
-                for filename, file_length in files:
-                    filename = filename.encode('utf_8')
-                    files_as_dict.append({'path': [filename], 'length': file_length})
-                metainfo['info']['files'] = files_as_dict
-
-            elif len(files) == 1:
-                metainfo['info']['length'] = files[0][1]
-            else:
+            metainfo = self._get_metainfo_no_def(name, files, trackers, timestamp)
+            if metainfo is None:
                 return
 
-            if len(trackers) > 0:
-                metainfo['announce'] = trackers[0]
-                metainfo['announce-list'] = [list(trackers)]
-            else:
-                metainfo['nodes'] = []
-
-            metainfo['creation date'] = timestamp
-
             try:
                 torrentdef = TorrentDef.load_from_dict(metainfo)
                 torrentdef.infohash = infohash
@@ -352,13 +373,118 @@ class TorrentDBHandler(BasicDBHandler):
                 self._logger.error("Could not create a TorrentDef instance %r %r %r %r %r %r", infohash, timestamp, name, files, trackers, extra_info)
                 print_exc()
 
+    def addExternalTorrentsNoDef(self, torrents):
+        """
+        Adds many torrents of which only the name, files and trackers are known at once, for instance when a channel
+        is synchronized. The Torrent, FullTextIndex, TorrentFiles and TorrentTrackerMapping rows of all new torrents
+        are written with a handful of batched statements in the current transaction, instead of a few statements per
+        torrent. Torrents that were already in the database are left untouched.
+        :param torrents: A list of (infohash, name, files, trackers, timestamp) tuples.
+        :return: A tuple of the torrent ids, in the order of torrents, and the set of infohashes that were inserted.
+        """
+        torrent_ids, inserted = self.addOrGetTorrentIDSReturn([torrent[0] for torrent in torrents])
+
+        insert_time = long(time())
+        update_torrents = []
+        index_values = []
+        insert_files = []
+        insert_mappings = []
+        tracker_urls_cache = {}
+        to_add = set(inserted)
+        for torrent_id, (infohash, name, files, trackers, timestamp) in zip(torrent_ids, torrents):
+            if infohash not in to_add:
+                continue
+            to_add.discard(infohash)
+
+            metainfo = self._get_metainfo_no_def(name, files, trackers, timestamp)
+            if metainfo is None:
+                continue
+
+            try:
+                name = metainfo['info']['name'].decode('utf_8')
+                category = self.category.calculateCategory(metainfo, name)
+                update_torrents.append((name, sum(length for _, length in files), timestamp, len(files), insert_time,
+                                        category, torrent_id))
+            except:
+                self._logger.error("Could not add torrent %r %r %r %r %r", infohash, timestamp, name, files, trackers)
+                print_exc()
+                continue
+
+            if len(files) > 1:
+                index_values.append(self._get_index_values(torrent_id, name, [unicode(path) for path, _ in files]))
+            else:
+                index_values.append(self._get_index_values(torrent_id, os.path.splitext(name)[0], [name]))
+            insert_files.extend((torrent_id, unicode(path), length) for path, length in files)
+
+            # Most torrents of a channel share their trackers, so every tracker URL is only sanitized once
+            for tracker in trackers:
+                if tracker not in tracker_urls_cache:
+                    tracker_urls_cache[tracker] = get_uniformed_tracker_url(tracker)
+            tracker_urls = set([tracker_urls_cache[tracker] for tracker in trackers if tracker_urls_cache[tracker]])
+            tracker_urls.add(u'DHT')
+            insert_mappings.extend((torrent_id, tracker_url) for tracker_url in tracker_urls)
+
+            if self._rtorrent_handler:
+                self._rtorrent_handler.notify_possible_torrent_infohash(infohash)
+
+        if not update_torrents:
+            return torrent_ids, inserted
+
+        self._db.executemany(u"UPDATE Torrent SET name = ?, length = ?, creation_date = ?, num_files = ?, "
+                             u"insert_time = ?, secret = 0, relevance = 0.0, category = ?, status = 'unknown', "
+                             u"comment = NULL, is_collected = 0 WHERE torrent_id = ?", update_torrents)
+        self._insert_index_values(index_values)
+        self._db.executemany(u"INSERT OR IGNORE INTO TorrentFiles (torrent_id, path, length) VALUES (?,?,?)",
+                             insert_files)
+
+        if self.session.lm.tracker_manager is not None:
+            for tracker_url in set(tracker_urls_cache.itervalues()):
+                if tracker_url:
+                    self.session.lm.tracker_manager.add_tracker(tracker_url)
+        self._db.executemany(u"INSERT OR IGNORE INTO TorrentTrackerMapping(torrent_id, tracker_id) "
+                             u"VALUES(?, (SELECT tracker_id FROM TrackerInfo WHERE tracker = ?))", insert_mappings)
+
+        return torrent_ids, inserted
+
+    @staticmethod
+    def _get_metainfo_no_def(name, files, trackers, timestamp):
+        """
+        Returns the metainfo dictionary of a torrent of which only the name, files, trackers and creation date are
+        known, or None if the torrent has no files.
+        """
+        metainfo = {'info': {}, 'encoding': 'utf_8'}
+        metainfo['info']['name'] = name.encode('utf_8')
+        metainfo['info']['piece length'] = -1
+        metainfo['info']['pieces'] = ''
+
+        if len(files) > 1:
+            files_as_dict = []
+            for filename, file_length in files:
+                filename = filename.encode('utf_8')
+                files_as_dict.append({'path': [filename], 'length': file_length})
+            metainfo['info']['files'] = files_as_dict
+
+        elif len(files) == 1:
+            metainfo['info']['length'] = files[0][1]
+        else:
+            return None
+
+        if len(trackers) > 0:
+            metainfo['announce'] = trackers[0]
+            metainfo['announce-list'] = [list(trackers)]
+        else:
+            metainfo['nodes'] = []
+
+        metainfo['creation date'] = timestamp
+        return metainfo
+
     def addOrGetTorrentID(self, infohash):
         assert isinstance(infohash, str), "INFOHASH has invalid type: %s" % type(infohash)
         assert len(infohash) == INFOHASH_LENGTH, "INFOHASH has invalid length: %d" % len(infohash)
 
         torrent_id = self.getTorrentID(infohash)
         if torrent_id is None:
-            self._db.insert('Torrent', infohash=bin2str(infohash), status=u'unknown')
+            self._db.insert('Torrent', infohash=buffer(infohash), status=u'unknown')
             torrent_id = self.getTorrentID(infohash)
         return torrent_id
 
@@ -370,7 +496,7 @@ class TorrentDBHandler(BasicDBHandler):
                 to_be_inserted.add(infohash)
 
         sql = "INSERT INTO Torrent (infohash, status) VALUES (?, ?)"
-        self._db.executemany(sql, [(bin2str(infohash), u'unknown') for infohash in to_be_inserted])
+        self._db.executemany(sql, [(buffer(infohash), u'unknown') for infohash in to_be_inserted])
 
         torrent_id_results = self.getTorrentIDS(infohashes)
         torrent_ids = []
@@ -383,7 +509,7 @@ class TorrentDBHandler(BasicDBHandler):
         assert isinstance(torrentdef, TorrentDef), "TORRENTDEF has invalid type: %s" % type(torrentdef)
         assert torrentdef.is_finalized(), "TORRENTDEF is not finalized"
 
-        dict = {"infohash": bin2str(torrentdef.get_infohash()),
+        dict = {"infohash": buffer(torrentdef.get_infohash()),
                 "name": torrentdef.get_name_as_unicode(),
                 "length": torrentdef.get_length(),
                 "creation_date": torrentdef.get_creation_date(),
@@ -431,6 +557,20 @@ class TorrentDBHandler(BasicDBHandler):
         return torrent_id
 
     def _indexTorrent(self, torrent_id, swarmname, files):
+        self._insert_index_values([self._get_index_values(torrent_id, swarmname, files)])
+
+    def _get_index_values(self, torrent_id, swarmname, files):
+        """
+        Returns the FullTextIndex row of a torrent.
+        """
+        swarm_keywords, filenames, fileextensions = self._get_index_terms(swarmname, files)
+        return torrent_id, swarm_keywords, filenames, fileextensions
+
+    @staticmethod
+    def _get_index_terms(swarmname, files):
+        """
+        Returns the swarmname, filenames and fileextensions columns of the FullTextIndex row of a torrent.
+        """
         # Niels: new method for indexing, replaces invertedindex
         # Making sure that swarmname does not include extension for single file torrents
         swarm_keywords = " ".join(split_into_keywords(swarmname))
@@ -451,16 +591,56 @@ class TorrentDBHandler(BasicDBHandler):
             filenames.sort(cmp=popSort, reverse=True)
             filenames = filenames[:1000]
 
-        values = (torrent_id, swarm_keywords, " ".join(filenames), " ".join(fileextensions))
+        return swarm_keywords, " ".join(filenames), " ".join(fileextensions)
+
+    def _insert_index_values(self, index_values):
+        self._update_term_index([values[0] for values in index_values], [values[1] for values in index_values])
         try:
             # INSERT OR REPLACE not working for fts3 table
-            self._db.execute_write(u"DELETE FROM FullTextIndex WHERE rowid = ?", (torrent_id,))
-            self._db.execute_write(
-                u"INSERT INTO FullTextIndex (rowid, swarmname, filenames, fileextensions) VALUES(?,?,?,?)", values)
+            self._db.executemany(u"DELETE FROM FullTextIndex WHERE rowid = ?",
+                                 [(values[0],) for values in index_values])
+            self._db.executemany(
+                u"INSERT INTO FullTextIndex (rowid, swarmname, filenames, fileextensions) VALUES(?,?,?,?)",
+                index_values)
         except:
             # this will fail if the fts3 module cannot be found
             print_exc()
 
+    def _remove_index_values(self, torrent_ids):
+        self._update_term_index(torrent_ids, [])
+        try:
+            self._db.executemany(u"DELETE FROM FullTextIndex WHERE rowid = ?", [(rowid,) for rowid in torrent_ids])
+        except:
+            # this will fail if the fts3 module cannot be found
+            print_exc()
+
+    def _update_term_index(self, rowids, names):
+        """
+        Removes the names that are currently indexed for the given FullTextIndex rows from the term index and adds
+        the new names. While the term index is being built, the changes are kept until it is ready.
+        :param rowids: The rowids of the FullTextIndex rows that are replaced or deleted.
+        :param names: The swarm names that are indexed.
+        """
+        if self.term_index is None and self._term_index_pending_changes is None:
+            return
+
+        changes = []
+        for offset in xrange(0, len(rowids), MAX_SQL_VARIABLES):
+            chunk = rowids[offset:offset + MAX_SQL_VARIABLES]
+            sql = u"SELECT swarmname FROM FullTextIndex WHERE rowid IN (%s) AND swarmname IS NOT NULL" \
+                  % u",".join(u"?" * len(chunk))
+            changes.extend((name, False) for name, in self._db.fetchall(sql, chunk))
+        changes.extend((name, True) for name in names)
+
+        if self.term_index is None:
+            self._term_index_pending_changes.extend(changes)
+            return
+        for name, added in changes:
+            if added:
+                self.term_index.add_name(name)
+            else:
+                self.term_index.remove_name(name)
+
     # ------------------------------------------------------------
     # Adds the trackers of a given torrent into the database.
     # ------------------------------------------------------------
@@ -505,15 +685,15 @@ class TorrentDBHandler(BasicDBHandler):
                 kw.pop(key)
 
         if len(kw) > 0:
-            infohash_str = bin2str(infohash)
-            where = "infohash='%s'" % infohash_str
-            self._db.update(self.table_name, where, **kw)
+            torrent_id = self.getTorrentID(infohash)
+            if torrent_id is not None:
+                self._db.update(self.table_name, u"torrent_id = %d" % torrent_id, **kw)
 
         if notify:
             self.notifier.notify(NTFY_TORRENTS, NTFY_UPDATE, infohash)
 
     def on_torrent_collect_response(self, infohashes):
-        infohash_list = [(bin2str(infohash)) for infohash in infohashes]
+        infohash_list = [buffer(infohash) for infohash in infohashes]
 
         i_parameters = u"?," * len(infohash_list)
         i_parameters = i_parameters[:-1]
@@ -524,13 +704,13 @@ class TorrentDBHandler(BasicDBHandler):
         info_dict = {}
         for torrent_id, infohash in results:
             if infohash:
-                info_dict[infohash] = torrent_id
+                info_dict[str(infohash)] = torrent_id
 
         to_be_inserted = []
-        for infohash in infohash_list:
+        for infohash in infohashes:
             if infohash in info_dict:
                 continue
-            to_be_inserted.append((infohash,))
+            to_be_inserted.append((buffer(infohash),))
 
         if len(to_be_inserted) > 0:
             sql = u"INSERT OR IGNORE INTO Torrent (infohash) VALUES (?)"
@@ -539,9 +719,9 @@ class TorrentDBHandler(BasicDBHandler):
     def on_search_response(self, torrents):
         status = u'unknown'
 
-        torrents = [(bin2str(torrent[0]), torrent[1], torrent[2], torrent[3], torrent[4][0],
+        torrents = [(torrent[0], torrent[1], torrent[2], torrent[3], torrent[4][0],
                      torrent[5]) for torrent in torrents]
-        infohash = [(torrent[0],) for torrent in torrents]
+        infohash = [(buffer(torrent[0]),) for torrent in torrents]
 
         sql = u"SELECT torrent_id, infohash, is_collected, name FROM Torrent WHERE infohash == ?"
         results = self._db.executemany(sql, infohash) or []
@@ -568,13 +748,14 @@ class TorrentDBHandler(BasicDBHandler):
 
             if tid:  # we know this torrent
                 if tid not in tid_collected and swarmname != tid_name.get(tid, ''):  # if not collected and name not equal then do fullupdate
-                    update.append((swarmname, length, nrfiles, category, creation_date, infohash, status, tid))
+                    update.append((swarmname, length, nrfiles, category, creation_date, buffer(infohash), status,
+                                   tid))
                     to_be_indexed.append((tid, swarmname))
 
                 elif infohash and infohash not in infohash_tid:
-                    update_infohash.append((infohash, tid))
+                    update_infohash.append((buffer(infohash), tid))
             else:
-                insert.append((swarmname, length, nrfiles, category, creation_date, infohash, status))
+                insert.append((swarmname, length, nrfiles, category, creation_date, buffer(infohash), status))
 
         if len(update) > 0:
             sql = u"UPDATE Torrent SET name = ?, length = ?, num_files = ?, category = ?, creation_date = ?," \
@@ -596,7 +777,7 @@ class TorrentDBHandler(BasicDBHandler):
                 to_be_indexed = to_be_indexed + list(self._db.executemany(sql, were_inserted))
             except:
                 print_exc()
-                self._logger.error(u"infohashes: %s", insert)
+                self._logger.error(u"infohashes: %s", [str(inserted[5]).encode('hex') for inserted in insert])
 
         for torrent_id, swarmname in to_be_indexed:
             self._indexTorrent(torrent_id, swarmname, [])
@@ -613,11 +794,66 @@ class TorrentDBHandler(BasicDBHandler):
 
         self._db.execute_write(sql, (seeders, leechers, last_check, next_check, status, retries, torrent_id))
 
-        self._logger.debug(u"update result %d/%d for %s/%d", seeders, leechers, bin2str(infohash), torrent_id)
+        self._logger.debug(u"update result %d/%d for %s/%d", seeders, leechers, infohash.encode('hex'), torrent_id)
 
         # notify
         self.notifier.notify(NTFY_TORRENTS, NTFY_UPDATE, infohash)
 
+    def updateTorrentCheckResults(self, check_results):
+        """
+        Stores the results of many torrent checks in one go. The observers are notified once about all of them, with
+        None as infohash and the list of updated infohashes as argument.
+        :param check_results: A list of (torrent_id, infohash, seeders, leechers, last_check, next_check, status,
+                              retries) tuples.
+        """
+        if not check_results:
+            return
+
+        sql = u"UPDATE Torrent SET num_seeders = ?, num_leechers = ?, last_tracker_check = ?, next_tracker_check = ?," \
+              u" status = ?, tracker_check_retries = ? WHERE torrent_id = ?"
+        self._db.executemany(sql, [(seeders, leechers, last_check, next_check, status, retries, torrent_id)
+                                   for torrent_id, _, seeders, leechers, last_check, next_check, status, retries
+                                   in check_results])
+
+        self._logger.debug(u"update results of %d torrents", len(check_results))
+
+        # notify
+        self.notifier.notify(NTFY_TORRENTS, NTFY_UPDATE, None, [check_result[1] for check_result in check_results])
+
+    def getTorrentCheckRetriesByInfohash(self, infohashes):
+        """
+        Returns a dictionary that maps each of the given infohashes that is in the database to a tuple of its
+        torrent_id and the number of failed checks in a row.
+        """
+        if not infohashes:
+            return {}
+
+        parameters = u"?," * len(infohashes)
+        sql = u"SELECT infohash, torrent_id, tracker_check_retries FROM Torrent WHERE infohash IN (%s)" \
+              % parameters[:-1]
+        results = self._db.fetchall(sql, [buffer(infohash) for infohash in infohashes])
+        return dict((str(infohash), (torrent_id, retries or 0)) for infohash, torrent_id, retries in results)
+
+    def getTorrentCheckStatistics(self, current_time, max_age):
+        """
+        Returns statistics about the freshness of the health (seeders/leechers) information of the torrents.
+        :param current_time: The current time.
+        :param max_age: The maximum age (in seconds) of a check to be considered fresh.
+        :return: A dictionary with the number of torrents, the number of torrents that have been checked, were checked
+                 less than max_age seconds ago and should be checked again, the fraction of fresh torrents and the
+                 average age of the last check of the checked torrents.
+        """
+        sql = u"""
+            SELECT COUNT(*), SUM(last_tracker_check > 0), SUM(last_tracker_check >= ?), SUM(next_tracker_check < ?),
+                   AVG(CASE WHEN last_tracker_check > 0 THEN ? - last_tracker_check END)
+              FROM Torrent
+            """
+        num_torrents, num_checked, num_fresh, num_due, avg_age = \
+            self._db.fetchone(sql, (current_time - max_age, current_time, current_time))
+        return {"torrents": num_torrents, "checked": num_checked or 0, "fresh": num_fresh or 0, "due": num_due or 0,
+                "fresh_fraction": float(num_fresh or 0) / num_torrents if num_torrents else 0.0,
+                "avg_check_age": avg_age or 0.0}
+
     def addTorrentTrackerMapping(self, torrent_id, tracker):
         self.addTorrentTrackerMappingInBatch(torrent_id, [tracker, ])
 
@@ -688,7 +924,7 @@ class TorrentDBHandler(BasicDBHandler):
               ORDER BY next_tracker_check DESC
               LIMIT ?
             """
-        return [str2bin(tinfo[0]) for tinfo in self._db.fetchall(sql, (tracker, current_time, limit))]
+        return [str(tinfo[0]) for tinfo in self._db.fetchall(sql, (tracker, current_time, limit))]
 
     def getTrackerListByTorrentID(self, torrent_id):
         sql = 'SELECT TR.tracker FROM TrackerInfo TR, TorrentTrackerMapping MP'\
@@ -741,7 +977,7 @@ class TorrentDBHandler(BasicDBHandler):
         else:
             keys = list(keys)
 
-        res = self._db.getOne('Torrent C', keys, infohash=bin2str(infohash))
+        res = self._db.getOne('Torrent C', keys, infohash=buffer(infohash))
 
         if not res:
             return None
@@ -777,14 +1013,14 @@ class TorrentDBHandler(BasicDBHandler):
                 for i in range(len(results)):
                     result = list(results[i])
                     if result[key_index]:
-                        result[key_index] = str2bin(result[key_index])
+                        result[key_index] = str(result[key_index])
                         results[i] = result
         fix_value('infohash')
         return results
 
     def getNumberCollectedTorrents(self):
-        # return self._db.size('CollectedTorrent')
-        return self._db.getOne('CollectedTorrent', 'count(torrent_id)')
+        # The number of collected torrents is maintained by triggers on the Torrent table
+        return int(self._db.fetchone(u"SELECT value FROM MyInfo WHERE entry == 'collected_torrents'"))
 
     def getRecentlyCollectedTorrents(self, limit):
         sql = u"""
@@ -794,7 +1030,7 @@ class TorrentDBHandler(BasicDBHandler):
              AND T.secret is not 1 ORDER BY CT.insert_time DESC LIMIT ?
              """
         results = self._db.fetchall(sql, (limit,))
-        return [[str2bin(result[0]), result[1], result[2], result[3] or 0, result[4]] for result in results]
+        return [[str(result[0]), result[1], result[2], result[3] or 0, result[4]] for result in results]
 
     def getRandomlyCollectedTorrents(self, insert_time, limit):
         sql = u"""
@@ -805,7 +1041,7 @@ class TorrentDBHandler(BasicDBHandler):
              AND T.secret is not 1 ORDER BY RANDOM() DESC LIMIT ?
             """
         results = self._db.fetchall(sql, (insert_time, limit))
-        return [[str2bin(result[0]), result[1], result[2], result[3] or 0] for result in results]
+        return [[str(result[0]), result[1], result[2], result[3] or 0] for result in results]
 
     def select_torrents_to_collect(self, hashes):
         parameters = '?,' * len(hashes)
@@ -814,113 +1050,100 @@ class TorrentDBHandler(BasicDBHandler):
         # TODO: bias according to votecast, popular first
 
         sql = u"SELECT infohash FROM Torrent WHERE is_collected == 0 AND infohash IN (%s)" % parameters
-        results = self._db.fetchall(sql, map(bin2str, hashes))
-        return [str2bin(infohash) for infohash, in results]
+        results = self._db.fetchall(sql, map(buffer, hashes))
+        return [str(infohash) for infohash, in results]
 
     def getTorrentsStats(self):
         return self._db.getOne('CollectedTorrent', ['count(torrent_id)', 'sum(length)', 'sum(num_files)'])
 
     def freeSpace(self, torrents2del):
+        """
+        Removes the collected torrents with the lowest eviction score, except for the torrents in the library and in
+        our own channel. The candidates are read in order from the eviction index, so only the removed torrents are
+        visited instead of all collected torrents.
+        :param torrents2del: The number of torrents to remove.
+        :return: The number of removed torrents.
+        """
+        sql = u"""
+            SELECT torrent_id, infohash FROM Torrent
+            WHERE is_collected == 1
+            AND torrent_id NOT IN (SELECT torrent_id FROM MyPreference)
+            """
+        args = []
         if self.channelcast_db and self.channelcast_db._channel_id:
-            sql = U"""
-                SELECT name, torrent_id, infohash, relevance,
-                MIN(relevance, 2500) + MIN(500, num_leechers) + 4*MIN(500, num_seeders) - (MAX(0, MIN(500, (%d - creation_date)/86400)) ) AS weight
-                FROM CollectedTorrent
-                WHERE torrent_id NOT IN (SELECT torrent_id FROM MyPreference)
-                AND torrent_id NOT IN (SELECT torrent_id FROM ChannelTorrents WHERE channel_id == %d)
-                ORDER BY weight
-                LIMIT %d
-            """ % (int(time()), self.channelcast_db._channel_id, torrents2del)
-        else:
-            sql = u"""
-                SELECT name, torrent_id, infohash, relevance,
-                    min(relevance,2500) +  min(500,num_leechers) + 4*min(500,num_seeders) - (max(0,min(500,(%d-creation_date)/86400)) ) AS weight
-                FROM CollectedTorrent
-                WHERE torrent_id NOT IN (SELECT torrent_id FROM MyPreference)
-                ORDER BY weight
-                LIMIT %d
-            """ % (int(time()), torrents2del)
-
-        res_list = self._db.fetchall(sql)
+            sql += u"AND torrent_id NOT IN (SELECT torrent_id FROM ChannelTorrents WHERE channel_id == ?)"
+            args.append(self.channelcast_db._channel_id)
+        sql += u" ORDER BY eviction_score LIMIT ?"
+        args.append(torrents2del)
+
+        res_list = self._db.fetchall(sql, args)
         if len(res_list) == 0:
             return 0
 
-        # delete torrents from db
+        # delete torrents from db, but keep the infohash in db to maintain consistence with preference db
         sql_del_torrent = u"UPDATE Torrent SET name = NULL, is_collected = 0 WHERE torrent_id = ?"
-        # sql_del_pref = "delete from Preference where torrent_id=?"
-
-        tids = []
-        for _name, torrent_id, infohash, _relevance, _weight in res_list:
-            tids.append((torrent_id,))
-            self.session.delete_collected_torrent(infohash)
-
-        self._db.executemany(sql_del_torrent, tids)
-        # self._db.executemany(sql_del_tracker, tids)
-        deleted = self._db.connection.changes()
-        # self._db.executemany(sql_del_pref, tids)
+        self._db.executemany(sql_del_torrent, [(torrent_id,) for torrent_id, _ in res_list])
+        self._remove_index_values([torrent_id for torrent_id, _ in res_list])
+        self.session.delete_collected_torrents([str(infohash) for _, infohash in res_list])
 
-        # but keep the infohash in db to maintain consistence with preference db
-        # torrent_id_infohashes = [(torrent_id,infohash_str,relevance) for torrent_file_name, torrent_id, infohash_str, relevance, weight in res_list]
-        # sql_insert =  "insert into Torrent (torrent_id, infohash, relevance) values (?,?,?)"
-        # self._db.executemany(sql_insert, torrent_id_infohashes)
+        self._logger.info("Erased %d torrents", len(res_list))
+        return len(res_list)
 
-        self._logger.info("Erased %d torrents", deleted)
-        return deleted
-
-    def search_in_local_torrents_db(self, query, keys=None):
+    def search_in_local_torrents_db(self, query, keys=None, limit=None, offset=None):
         """
         Search in the local database for torrents matching a specific query. This method also assigns a relevance
-        score to each torrent, based on the name, files and file extensions.
-        The algorithm is based on BM25. The document length factor is regarded since our "documents" are very small
-        (often a few keywords).
-        See https://en.wikipedia.org/wiki/Okapi_BM25 for more information about BM25.
+        score to each torrent, based on the name, files and file extensions (see bm25_rank in search_utils.py).
+        Scoring, ordering and limiting the results is done inside SQLite, so only the requested page of results,
+        ordered by descending relevance, is returned.
         """
-        search_results = []
+        sql, args, keywords = self._get_local_torrents_search_query(query, keys, limit, offset)
+        return self._process_local_torrents_search_results(self._db.fetchall(sql, args), keys, keywords)
+
+    def search_in_local_torrents_db_async(self, query, keys=None, limit=None, offset=None):
+        """
+        Asynchronous version of search_in_local_torrents_db. The full text query is executed on the read pool of the
+        database so the reactor thread is not blocked while SQLite is searching.
+        :return: A Deferred that fires with the ranked search results.
+        """
+        sql, args, keywords = self._get_local_torrents_search_query(query, keys, limit, offset)
+        return self._db.fetchall_async(sql, args)\
+            .addCallback(self._process_local_torrents_search_results, keys, keywords)
+
+    def _get_local_torrents_search_query(self, query, keys, limit, offset):
         keys_str = ", ".join(keys)
         keywords = split_into_keywords(query, to_filter_stopwords=True)
-        infohash_index = keys.index('infohash')
 
         # This query gets torrents matching speciifc keywords. The matchinfo object is also returned. For more
         # information about the returned matchinfo parameters, see https://www.sqlite.org/fts3.html#matchinfo.
-        results = self._db.fetchall("SELECT DISTINCT %s, Matchinfo(FullTextIndex, 'pcnalx') "
-                                    "FROM Torrent T, FullTextIndex "
-                                    "LEFT OUTER JOIN _ChannelTorrents C ON T.torrent_id = C.torrent_id "
-                                    "WHERE t.name IS NOT NULL AND t.torrent_id = FullTextIndex.rowid "
-                                    "AND C.deleted_at IS NULL AND FullTextIndex MATCH ?"
-                                    % keys_str, (" OR ".join(keywords),))
+        # The matchinfo is computed in a DISTINCT subquery, which SQLite does not flatten, so it is only computed
+        # once per row and reused by the ranking function.
+        sql = "SELECT *, bm25_rank(matchinfo) AS relevance_score FROM (" \
+              "SELECT DISTINCT %s, Matchinfo(FullTextIndex, 'pcnalx') AS matchinfo " \
+              "FROM Torrent T, FullTextIndex " \
+              "LEFT OUTER JOIN _ChannelTorrents C ON T.torrent_id = C.torrent_id " \
+              "WHERE t.name IS NOT NULL AND t.torrent_id = FullTextIndex.rowid " \
+              "AND C.deleted_at IS NULL AND FullTextIndex MATCH ?) " \
+              "ORDER BY relevance_score DESC" % keys_str
+        args = [" OR ".join(keywords)]
+
+        if limit is not None or offset is not None:
+            sql += " LIMIT ? OFFSET ?"
+            args += [limit if limit is not None else -1, offset or 0]
+
+        return sql, args, keywords
+
+    def _process_local_torrents_search_results(self, results, keys, keywords):
+        search_results = []
+        infohash_index = keys.index('infohash')
 
         for result in results:
             result = list(result)  # We convert the result to a mutable list since we have to decode the infohash
-            result[infohash_index] = str2bin(result[infohash_index])
-            matchinfo = result[len(keys)]  # The matchinfo is the last element in the results tuple
-            self.latest_matchinfo_torrent = matchinfo, keywords
-            num_phrases, num_cols, num_rows = unpack_from('III', matchinfo)
-
-            unpack_str = 'I' * (3 * num_cols * num_phrases)
-            matchinfo = unpack_from('I' * 9 + unpack_str, matchinfo)[9:]
-
-            scores = []
-
-            for col_ind in xrange(num_cols):
-                score = 0
-                for phrase_ind in xrange(num_phrases):
-                    # Fetch info about the current matching term. This number is fetched from the matchinfo object.
-                    # See https://www.sqlite.org/fts3.html#matchinfo for info about the offset calculation.
-                    base_term_offset = 3 * (col_ind + phrase_ind * num_cols)
-                    rows_with_term = matchinfo[base_term_offset + 2]
-                    term_freq = matchinfo[base_term_offset]
+            result[infohash_index] = str(result[infohash_index])
+            search_results.append(result)
 
-                    inv_doc_freq = math.log((num_rows - rows_with_term + 0.5) / (rows_with_term + 0.5), 2)
-                    right_side = ((term_freq * (1.2 + 1)) / (term_freq + 1.2))
-
-                    score += inv_doc_freq * right_side
-
-                scores.append(score)
-
-            # Our score is 80% dependent on matching in the name of the torrent, 10% on the names of the files in the
-            # torrent and 10% on the extensions of files in the torrent.
-            extended_result = result + [0.8 * scores[0] + 0.1 * scores[1] + 0.1 * scores[2]]
-            search_results.append(extended_result)
+        if search_results:
+            # The matchinfo is the element after the keys in the results tuple
+            self.latest_matchinfo_torrent = search_results[-1][len(keys)], keywords
 
         return search_results
 
@@ -928,12 +1151,23 @@ class TorrentDBHandler(BasicDBHandler):
         assert 'infohash' in keys
         assert not doSort or ('num_seeders' in keys or 'T.num_seeders' in keys)
 
-        infohash_index = keys.index('infohash')
-        num_seeders_index = keys.index('num_seeders') if 'num_seeders' in keys else -1
+        sql, args = self._get_search_names_query(kws, local, keys)
+        return self._process_search_names_results(self._db.fetchall(sql, args), kws, local, keys, doSort)
 
-        if num_seeders_index == -1:
-            doSort = False
+    def searchNames_async(self, kws, local=True, keys=None, doSort=True):
+        """
+        Asynchronous version of searchNames. The full text query is executed on the read pool of the database, the
+        results are merged with their channels on the reactor thread.
+        :return: A Deferred that fires with the search results.
+        """
+        assert 'infohash' in keys
+        assert not doSort or ('num_seeders' in keys or 'T.num_seeders' in keys)
 
+        sql, args = self._get_search_names_query(kws, local, keys)
+        return self._db.fetchall_async(sql, args)\
+            .addCallback(self._process_search_names_results, kws, local, keys, doSort)
+
+    def _get_search_names_query(self, kws, local, keys):
         values = ", ".join(keys)
         mainsql = "SELECT " + values + ", C.channel_id, Matchinfo(FullTextIndex) FROM"
         if local:
@@ -949,10 +1183,16 @@ class TorrentDBHandler(BasicDBHandler):
         if not local:
             mainsql += "AND T.secret is not 1 LIMIT 250"
 
-        query = " ".join(filter_keywords(kws))
-        not_negated = [kw for kw in filter_keywords(kws) if kw[0] != '-']
+        return mainsql, (" ".join(filter_keywords(kws)),)
+
+    def _process_search_names_results(self, results, kws, local, keys, doSort):
+        infohash_index = keys.index('infohash')
+        num_seeders_index = keys.index('num_seeders') if 'num_seeders' in keys else -1
+
+        if num_seeders_index == -1:
+            doSort = False
 
-        results = self._db.fetchall(mainsql, (query,))
+        not_negated = [kw for kw in filter_keywords(kws) if kw[0] != '-']
 
         channels = set()
         channel_dict = {}
@@ -977,7 +1217,7 @@ class TorrentDBHandler(BasicDBHandler):
             channel_id = result[-2]
             channel = channel_dict.get(channel_id, None)
 
-            infohash = result[infohash_index]
+            infohash = str(result[infohash_index])
             if channel:
                 # ignoring spam channels
                 if channel[7] < 0:
@@ -1013,7 +1253,7 @@ class TorrentDBHandler(BasicDBHandler):
         for index in xrange(len(results) - 1, -1, -1):
             result = results[index]
 
-            result[infohash_index] = str2bin(result[infohash_index])
+            result[infohash_index] = str(result[infohash_index])
 
             matches = {'swarmname': set(), 'filenames': set(), 'fileextensions': set()}
 
@@ -1062,6 +1302,12 @@ class TorrentDBHandler(BasicDBHandler):
         return results
 
     def getAutoCompleteTerms(self, keyword, max_terms, limit=100):
+        # Single terms are completed with the most popular terms in the term index, once it is available
+        if self.term_index is not None and len(keyword.split()) == 1:
+            keyword = keyword.strip()
+            terms = self.term_index.get_terms_with_prefix(keyword, max_terms + 1)
+            return [term for term in terms if term != keyword][:max_terms]
+
         sql = "SELECT swarmname FROM FullTextIndex WHERE swarmname MATCH ? LIMIT ?"
         result = self._db.fetchall(sql, ('"%s*"' % keyword, limit))
 
@@ -1083,29 +1329,9 @@ class TorrentDBHandler(BasicDBHandler):
     def getSearchSuggestion(self, keywords, limit=1):
         match = [keyword.lower() for keyword in keywords if len(keyword) > 3]
 
-        def lev(a, b):
-            "Calculates the Levenshtein distance between a and b."
-            n, m = len(a), len(b)
-            if n > m:
-                # Make sure n <= m, to use O(min(n,m)) space
-                a, b = b, a
-                n, m = m, n
-
-            current = range(n + 1)
-            for i in range(1, m + 1):
-                previous, current = current, [i] + [0] * n
-                for j in range(1, n + 1):
-                    add, delete = previous[j] + 1, current[j - 1] + 1
-                    change = previous[j - 1]
-                    if a[j - 1] != b[i - 1]:
-                        change = change + 1
-                    current[j] = min(add, delete, change)
-
-            return current[n]
-
         def levcollate(s1, s2):
-            l1 = sum(sorted([lev(a, b) for a in s1.split() for b in match])[:len(match)])
-            l2 = sum(sorted([lev(a, b) for a in s2.split() for b in match])[:len(match)])
+            l1 = sum(sorted([levenshtein(a, b) for a in s1.split() for b in match])[:len(match)])
+            l2 = sum(sorted([levenshtein(a, b) for a in s2.split() for b in match])[:len(match)])
 
             # return -1 if s1<s2, +1 if s1>s2 else 0
             if l1 < l2:
@@ -1114,6 +1340,24 @@ class TorrentDBHandler(BasicDBHandler):
                 return 1
             return 0
 
+        if self.term_index is not None:
+            # Only the names containing a term close to one of the keywords are candidates. These terms are found
+            # with a bounded edit distance walk over the term index, instead of comparing all names in SQLite.
+            close_terms = {}
+            for keyword in match:
+                for term, distance in self.term_index.get_close_terms(keyword, SEARCH_SUGGESTION_MAX_DISTANCE):
+                    close_terms[term] = min(distance, close_terms.get(term, distance))
+            if not close_terms:
+                return []
+
+            # Prefer the closest and then the most popular terms
+            close_terms = sorted(close_terms, key=lambda term: (close_terms[term], -self.term_index.get_count(term)))
+            close_terms = close_terms[:SEARCH_SUGGESTION_CANDIDATES]
+
+            sql = "SELECT swarmname FROM FullTextIndex WHERE swarmname MATCH ? LIMIT ?"
+            results = self._db.fetchall(sql, (' OR '.join(close_terms), SEARCH_SUGGESTION_CANDIDATES))
+            return sorted([result[0] for result in results], cmp=levcollate)[:limit]
+
         cursor = self._db.get_cursor()
         connection = cursor.getconnection()
         connection.createcollation("leven", levcollate)
@@ -1153,7 +1397,7 @@ class MyPreferenceDBHandler(BasicDBHandler):
 
         res = self._db.fetchall(sql)
         res = [item for sublist in res for item in sublist]
-        return [str2bin(p) if p else '' for p in res]
+        return [str(p) if p else '' for p in res]
 
     def getMyPrefStats(self, torrent_id=None):
         value_name = ('torrent_id', 'destination_path',)
@@ -1387,7 +1631,7 @@ ORDER BY CMD.time_stamp DESC LIMIT ?;
         torrent_list = []
         for torrent_id, info_hash, name, length, category, status, num_seeders, num_leechers, metadata_json in result_list:
             torrent_dict = {'id': torrent_id,
-                            'info_hash': str2bin(info_hash),
+                            'info_hash': str(info_hash),
                             'name': name,
                             'length': length,
                             'category': category,
@@ -1476,33 +1720,31 @@ ORDER BY CMD.time_stamp DESC LIMIT ?;
             self.notifier.notify(NTFY_CHANNELCAST, NTFY_MODIFIED, channel_id)
 
     def on_torrents_from_dispersy(self, torrentlist):
-        infohashes = [torrent[3] for torrent in torrentlist]
-        torrent_ids, inserted = self.torrent_db.addOrGetTorrentIDSReturn(infohashes)
+        torrent_ids, _ = self.torrent_db.addExternalTorrentsNoDef(
+            [(infohash, name, files, trackers, timestamp)
+             for _, _, _, infohash, timestamp, name, files, trackers in torrentlist])
 
         insert_data = []
         updated_channels = {}
 
         for i, torrent in enumerate(torrentlist):
             channel_id, dispersy_id, peer_id, infohash, timestamp, name, files, trackers = torrent
-            torrent_id = torrent_ids[i]
-
-            # if new or not yet collected
-            if infohash in inserted:
-                self.torrent_db.addExternalTorrentNoDef(
-                    infohash, name, files, trackers, timestamp, {'dispersy_id': dispersy_id})
-
-            insert_data.append((dispersy_id, torrent_id, channel_id, peer_id, name, timestamp))
+            insert_data.append((dispersy_id, torrent_ids[i], channel_id, peer_id, name, timestamp))
             updated_channels[channel_id] = updated_channels.get(channel_id, 0) + 1
 
+        # The ids of the new rows are larger than the largest id before the insert, so the channel torrent ids of the
+        # whole list are fetched with a single query instead of one query per torrent
+        last_channel_torrent_id = self._db.fetchone(u"SELECT MAX(id) FROM _ChannelTorrents") or 0
+
         if len(insert_data) > 0:
             sql_insert_torrent = "INSERT INTO _ChannelTorrents (dispersy_id, torrent_id, channel_id, peer_id, name, time_stamp) VALUES (?,?,?,?,?,?)"
             self._db.executemany(sql_insert_torrent, insert_data)
 
         updated_channel_torrent_dict = defaultdict(list)
-        for torrent in torrentlist:
-            channel_id, dispersy_id, peer_id, infohash, timestamp, name, files, trackers = torrent
-            channel_torrent_id = self.get_channel_torrent_id(channel_id, infohash)
-            updated_channel_torrent_dict[channel_id].append({u'info_hash': infohash,
+        sql = u"""SELECT CT.id, CT.channel_id, T.infohash FROM _ChannelTorrents CT, Torrent T
+                  WHERE CT.id > ? AND T.torrent_id = CT.torrent_id ORDER BY CT.id"""
+        for channel_torrent_id, channel_id, infohash in self._db.fetchall(sql, (last_channel_torrent_id,)):
+            updated_channel_torrent_dict[channel_id].append({u'info_hash': str(infohash),
                                                              u'channel_torrent_id': channel_torrent_id})
 
         sql_update_channel = "UPDATE _Channels SET modified = strftime('%s','now'), nr_torrents = nr_torrents+? WHERE id = ?"
@@ -1535,7 +1777,7 @@ ORDER BY CMD.time_stamp DESC LIMIT ?;
 
         if infohash:
             self.notifier.notify(NTFY_TORRENTS, NTFY_DELETE, None,
-                                 {"infohash": str2bin(infohash).encode('hex'),
+                                 {"infohash": str(infohash).encode('hex'),
                                   "dispersy_cid": str(dispersy_cid).encode('hex')})
 
     def on_torrent_modification_from_dispersy(self, channeltorrent_id, modification_type, modification_value):
@@ -1547,7 +1789,7 @@ ORDER BY CMD.time_stamp DESC LIMIT ?;
             infohash = self._db.fetchone(sql, (channeltorrent_id,))
 
             if infohash:
-                infohash = str2bin(infohash)
+                infohash = str(infohash)
                 self.notifier.notify(NTFY_TORRENTS, NTFY_UPDATE, infohash)
 
     def addOrGetChannelTorrentID(self, channel_id, infohash):
@@ -1700,7 +1942,7 @@ ORDER BY CMD.time_stamp DESC LIMIT ?;
             get_channeltorent_id = """SELECT _ChannelTorrents.id FROM _ChannelTorrents, Torrent, _PlaylistTorrents
             WHERE _ChannelTorrents.torrent_id = Torrent.torrent_id AND _ChannelTorrents.id =
             _PlaylistTorrents.channeltorrent_id AND playlist_id = ? AND Torrent.infohash = ?"""
-            channeltorrent_id = self._db.fetchone(get_channeltorent_id, (playlist_id, bin2str(infohash)))
+            channeltorrent_id = self._db.fetchone(get_channeltorent_id, (playlist_id, buffer(infohash)))
 
             if channeltorrent_id:
                 sql = "UPDATE _PlaylistTorrents SET deleted_at = ? WHERE playlist_id = ? AND channeltorrent_id = ?"
@@ -1854,7 +2096,7 @@ ORDER BY CMD.time_stamp DESC LIMIT ?;
         AND ChannelTorrents.channel_id==? and ChannelTorrents.dispersy_id <> -1 order by time_stamp desc limit ?"""
         myrecenttorrents = self._db.fetchall(sql, (self._channel_id, NUM_OWN_RECENT_TORRENTS))
         for cid, infohash, timestamp in myrecenttorrents:
-            torrent_dict.setdefault(str(cid), set()).add(str2bin(infohash))
+            torrent_dict.setdefault(str(cid), set()).add(str(infohash))
             least_recent = timestamp
 
         if len(myrecenttorrents) == NUM_OWN_RECENT_TORRENTS and least_recent != -1:
@@ -1864,10 +2106,10 @@ ORDER BY CMD.time_stamp DESC LIMIT ?;
             AND ChannelTorrents.dispersy_id <> -1 order by random() limit ?"""
             myrandomtorrents = self._db.fetchall(sql, (self._channel_id, least_recent, NUM_OWN_RANDOM_TORRENTS))
             for cid, infohash, _ in myrecenttorrents:
-                torrent_dict.setdefault(str(cid), set()).add(str2bin(infohash))
+                torrent_dict.setdefault(str(cid), set()).add(str(infohash))
 
             for cid, infohash in myrandomtorrents:
-                torrent_dict.setdefault(str(cid), set()).add(str2bin(infohash))
+                torrent_dict.setdefault(str(cid), set()).add(str(infohash))
 
         nr_records = sum(len(torrents) for torrents in torrent_dict.values())
         additionalSpace = (NUM_OWN_RECENT_TORRENTS + NUM_OWN_RANDOM_TORRENTS) - nr_records
@@ -1888,7 +2130,7 @@ ORDER BY CMD.time_stamp DESC LIMIT ?;
         WHERE voter_id ISNULL AND vote=2) and ChannelTorrents.dispersy_id <> -1 ORDER BY time_stamp desc limit ?"""
         othersrecenttorrents = self._db.fetchall(sql, (NUM_OTHERS_RECENT_TORRENTS,))
         for cid, infohash, timestamp in othersrecenttorrents:
-            torrent_dict.setdefault(str(cid), set()).add(str2bin(infohash))
+            torrent_dict.setdefault(str(cid), set()).add(str(infohash))
             least_recent = timestamp
 
         if othersrecenttorrents and len(othersrecenttorrents) == NUM_OTHERS_RECENT_TORRENTS and least_recent != -1:
@@ -1899,7 +2141,7 @@ ORDER BY CMD.time_stamp DESC LIMIT ?;
             AND ChannelTorrents.dispersy_id <> -1 order by random() limit ?"""
             othersrandomtorrents = self._db.fetchall(sql, (least_recent, NUM_OTHERS_RANDOM_TORRENTS))
             for cid, infohash in othersrandomtorrents:
-                torrent_dict.setdefault(str(cid), set()).add(str2bin(infohash))
+                torrent_dict.setdefault(str(cid), set()).add(str(infohash))
 
         twomonthsago = long(time() - 5259487)
         nr_records = sum(len(torrents) for torrents in torrent_dict.values())
@@ -1914,7 +2156,7 @@ ORDER BY CMD.time_stamp DESC LIMIT ?;
         AND ChannelTorrents.dispersy_id <> -1 and Channels.modified > ? order by time_stamp desc limit ?"""
         interesting_records = self._db.fetchall(sql, (twomonthsago, NUM_OTHERS_DOWNLOADED))
         for cid, infohash in interesting_records:
-            torrent_dict.setdefault(str(cid), set()).add(str2bin(infohash))
+            torrent_dict.setdefault(str(cid), set()).add(str(infohash))
 
         return torrent_dict
 
@@ -1924,20 +2166,20 @@ ORDER BY CMD.time_stamp DESC LIMIT ?;
 
         returnar = []
         for infohash, in self._db.fetchall(sql, (channel_id, limit)):
-            returnar.append(str2bin(infohash))
+            returnar.append(str(infohash))
         return returnar
 
     def getTorrentFromChannelId(self, channel_id, infohash, keys):
         sql = "SELECT " + ", ".join(keys) + """ FROM Torrent, ChannelTorrents
               WHERE Torrent.torrent_id = ChannelTorrents.torrent_id AND channel_id = ? AND infohash = ?"""
-        result = self._db.fetchone(sql, (channel_id, bin2str(infohash)))
+        result = self._db.fetchone(sql, (channel_id, buffer(infohash)))
 
         return self.__fixTorrent(keys, result)
 
     def getChannelTorrents(self, infohash, keys):
         sql = "SELECT " ", ".join(keys) + """ FROM Torrent, ChannelTorrents
               WHERE Torrent.torrent_id = ChannelTorrents.torrent_id AND infohash = ?"""
-        results = self._db.fetchall(sql, (bin2str(infohash),))
+        results = self._db.fetchall(sql, (buffer(infohash),))
 
         return self.__fixTorrents(keys, results)
 
@@ -1961,6 +2203,26 @@ ORDER BY CMD.time_stamp DESC LIMIT ?;
             return self.__fixTorrent(keys, result)
 
     def getTorrentsFromChannelId(self, channel_id, isDispersy, keys, limit=None):
+        sql = self._get_torrents_from_channel_id_query(channel_id, isDispersy, keys, limit)
+
+        if channel_id:
+            results = self._db.fetchall(sql, (channel_id,))
+        else:
+            results = self._db.fetchall(sql)
+
+        return self._on_torrents_from_channel_id(results, channel_id, keys, limit)
+
+    def getTorrentsFromChannelIdAsync(self, channel_id, isDispersy, keys, limit=None):
+        """
+        Asynchronous version of getTorrentsFromChannelId. The torrents are read on the read pool of the database,
+        the bookkeeping of the channel is done on the reactor thread afterwards.
+        :return: A Deferred that fires with the torrents in the channel.
+        """
+        sql = self._get_torrents_from_channel_id_query(channel_id, isDispersy, keys, limit)
+        return self._db.fetchall_async(sql, (channel_id,) if channel_id else None)\
+            .addCallback(self._on_torrents_from_channel_id, channel_id, keys, limit)
+
+    def _get_torrents_from_channel_id_query(self, channel_id, isDispersy, keys, limit):
         if isDispersy:
             sql = "SELECT " + ", ".join(keys) + """ FROM Torrent, ChannelTorrents
                   WHERE Torrent.torrent_id = ChannelTorrents.torrent_id"""
@@ -1974,12 +2236,9 @@ ORDER BY CMD.time_stamp DESC LIMIT ?;
 
         if limit:
             sql += " LIMIT %d" % limit
+        return sql
 
-        if channel_id:
-            results = self._db.fetchall(sql, (channel_id,))
-        else:
-            results = self._db.fetchall(sql)
-
+    def _on_torrents_from_channel_id(self, results, channel_id, keys, limit):
         if limit is None and channel_id:
             # use this possibility to update nrtorrent in channel
 
@@ -2045,7 +2304,7 @@ ORDER BY CMD.time_stamp DESC LIMIT ?;
               WHERE Torrent.torrent_id = ChannelTorrents.torrent_id
               AND ChannelTorrents.id = PlaylistTorrents.channeltorrent_id
               AND playlist_id = ? AND infohash = ?"""
-        result = self._db.fetchone(sql, (playlist_id, bin2str(infohash)))
+        result = self._db.fetchone(sql, (playlist_id, buffer(infohash)))
 
         return self.__fixTorrent(keys, result)
 
@@ -2141,15 +2400,15 @@ ORDER BY CMD.time_stamp DESC LIMIT ?;
 
     def __fixTorrent(self, keys, torrent):
         if len(keys) == 1:
-            if keys[0] == 'infohash':
-                return str2bin(torrent)
+            if keys[0] == 'infohash' and torrent:
+                return str(torrent)
             return torrent
 
         def fix_value(key, torrent):
             if key in keys:
                 key_index = keys.index(key)
                 if torrent[key_index]:
-                    torrent[key_index] = str2bin(torrent[key_index])
+                    torrent[key_index] = str(torrent[key_index])
         if torrent:
             torrent = list(torrent)
             fix_value('infohash', torrent)
@@ -2162,7 +2421,7 @@ ORDER BY CMD.time_stamp DESC LIMIT ?;
                 for i in range(len(results)):
                     result = list(results[i])
                     if result[key_index]:
-                        result[key_index] = str2bin(result[key_index])
+                        result[key_index] = str(result[key_index])
                         results[i] = result
         fix_value('infohash')
         return results
@@ -2266,7 +2525,7 @@ ORDER BY CMD.time_stamp DESC LIMIT ?;
                 dispersy_cid = str(dispersy_cid)
                 torrents = self._db.fetchall(select_torrents, (channel_id, limitTorrents))
                 for infohash, ChTname, CoTname, time_stamp in torrents:
-                    infohash = str2bin(infohash)
+                    infohash = str(infohash)
                     results.append((channel_id, dispersy_cid, name, infohash, ChTname or CoTname, time_stamp))
             return results
         return []
@@ -2478,7 +2737,7 @@ ORDER BY CMD.time_stamp DESC LIMIT ?;
               FROM Channels, ChannelTorrents, Torrent
               WHERE Channels.id = ChannelTorrents.channel_id
               AND ChannelTorrents.torrent_id = Torrent.torrent_id AND infohash = ?"""
-        channels = self._db.fetchall(sql, (bin2str(infohash),))
+        channels = self._db.fetchall(sql, (buffer(infohash),))
 
         if len(channels) > 0:
             channel_ids = set()
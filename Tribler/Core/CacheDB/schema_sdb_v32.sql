@@ -19,7 +19,7 @@ CREATE TABLE MyPreference (
 
 CREATE TABLE Peer (
   peer_id    integer PRIMARY KEY AUTOINCREMENT NOT NULL,
-  permid     text NOT NULL,
+  permid     blob NOT NULL,
   name       text,
   thumbnail  text
 );
@@ -32,7 +32,7 @@ CREATE UNIQUE INDEX permid_idx
 
 CREATE TABLE Torrent (
   torrent_id       integer PRIMARY KEY AUTOINCREMENT NOT NULL,
-  infohash		   text NOT NULL,
+  infohash		   blob NOT NULL,
   name             text,
   length           integer,
   creation_date    integer,
@@ -49,13 +49,55 @@ CREATE TABLE Torrent (
   is_collected     integer DEFAULT 0,
   last_tracker_check    integer DEFAULT 0,
   tracker_check_retries integer DEFAULT 0,
-  next_tracker_check    integer DEFAULT 0
+  next_tracker_check    integer DEFAULT 0,
+  eviction_score        numeric
 );
 
 CREATE UNIQUE INDEX infohash_idx
   ON Torrent
   (infohash);
 
+CREATE INDEX IF NOT EXISTS TorNextCheckIndex ON Torrent(next_tracker_check);
+
+-- The collected torrents with the lowest eviction score are removed first when the collected torrent limit is reached.
+-- The score is kept up to date by triggers, so the candidates can be read in order from TorEvictionIndex. The age
+-- penalty is the age of a torrent when it was inserted, capped at 500 days. Torrents without a creation date or with
+-- one in the future are treated as new.
+CREATE INDEX IF NOT EXISTS TorEvictionIndex ON Torrent(is_collected, eviction_score, infohash);
+
+CREATE TRIGGER IF NOT EXISTS TorEvictionScoreInsert AFTER INSERT ON Torrent
+BEGIN
+  UPDATE Torrent SET eviction_score = MIN(relevance, 2500) + MIN(500, num_leechers) + 4 * MIN(500, num_seeders)
+    - CASE WHEN creation_date > 0 AND insert_time > 0 THEN MIN(500, MAX(0, (insert_time - creation_date) / 86400))
+      ELSE 0 END WHERE torrent_id = NEW.torrent_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS TorEvictionScoreUpdate
+AFTER UPDATE OF relevance, num_seeders, num_leechers, creation_date, insert_time ON Torrent
+BEGIN
+  UPDATE Torrent SET eviction_score = MIN(relevance, 2500) + MIN(500, num_leechers) + 4 * MIN(500, num_seeders)
+    - CASE WHEN creation_date > 0 AND insert_time > 0 THEN MIN(500, MAX(0, (insert_time - creation_date) / 86400))
+      ELSE 0 END WHERE torrent_id = NEW.torrent_id;
+END;
+
+-- The number of collected torrents is kept in MyInfo, so it does not have to be counted.
+CREATE TRIGGER IF NOT EXISTS TorCollectedInsert AFTER INSERT ON Torrent WHEN NEW.is_collected IS 1
+BEGIN
+  UPDATE MyInfo SET value = value + 1 WHERE entry == 'collected_torrents';
+END;
+
+CREATE TRIGGER IF NOT EXISTS TorCollectedUpdate AFTER UPDATE OF is_collected ON Torrent
+WHEN NEW.is_collected IS NOT OLD.is_collected
+BEGIN
+  UPDATE MyInfo SET value = value + (NEW.is_collected IS 1) - (OLD.is_collected IS 1)
+    WHERE entry == 'collected_torrents';
+END;
+
+CREATE TRIGGER IF NOT EXISTS TorCollectedDelete AFTER DELETE ON Torrent WHEN OLD.is_collected IS 1
+BEGIN
+  UPDATE MyInfo SET value = value - 1 WHERE entry == 'collected_torrents';
+END;
+
 ----------------------------------------
 
 CREATE TABLE TrackerInfo (
@@ -278,6 +320,7 @@ COMMIT TRANSACTION create_table;
 BEGIN TRANSACTION init_values;
 
 INSERT INTO MyInfo VALUES ('version', 28);
+INSERT INTO MyInfo VALUES ('collected_torrents', 0);
 
 INSERT INTO TrackerInfo (tracker) VALUES ('no-DHT');
 INSERT INTO TrackerInfo (tracker) VALUES ('DHT');
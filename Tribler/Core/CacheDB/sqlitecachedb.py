@@ -10,7 +10,11 @@ from Tribler.Core.Utilities.install_dir import get_lib_path
 from apsw import CantOpenError, SQLError
 from base64 import encodestring, decodestring
 from threading import currentThread, RLock
+from twisted.internet import reactor
+from twisted.internet.defer import succeed
+from twisted.internet.threads import deferToThreadPool
 from twisted.python.threadable import isInIOThread
+from twisted.python.threadpool import ThreadPool
 
 import apsw
 
@@ -18,6 +22,7 @@ from Tribler.dispersy.taskmanager import TaskManager
 from Tribler.dispersy.util import blocking_call_on_reactor_thread, call_on_reactor_thread
 
 from Tribler.Core.CacheDB.db_versions import LATEST_DB_VERSION
+from Tribler.Core.Utilities.search_utils import bm25_rank
 
 
 DB_SCRIPT_NAME = "schema_sdb_v%s.sql" % str(LATEST_DB_VERSION)
@@ -28,6 +33,7 @@ DB_FILE_RELATIVE_PATH = os.path.join(DB_DIR_NAME, DB_FILE_NAME)
 DB_SCRIPT_ABSOLUTE_PATH = os.path.join(get_lib_path(), 'Core', 'CacheDB', DB_SCRIPT_NAME)
 
 DEFAULT_BUSY_TIMEOUT = 10000
+DEFAULT_READ_POOL_SIZE = 4
 
 forceDBThread = call_on_reactor_thread
 forceAndReturnDBThread = blocking_call_on_reactor_thread
@@ -47,7 +53,8 @@ def str2bin(str_data):
 
 class SQLiteCacheDB(TaskManager):
 
-    def __init__(self, db_path, db_script_path=DB_SCRIPT_ABSOLUTE_PATH, busytimeout=DEFAULT_BUSY_TIMEOUT):
+    def __init__(self, db_path, db_script_path=DB_SCRIPT_ABSOLUTE_PATH, busytimeout=DEFAULT_BUSY_TIMEOUT,
+                 read_pool_size=DEFAULT_READ_POOL_SIZE):
         super(SQLiteCacheDB, self).__init__()
 
         self._logger = logging.getLogger(self.__class__.__name__)
@@ -60,6 +67,13 @@ class SQLiteCacheDB(TaskManager):
         self.db_script_path = db_script_path
         self._busytimeout = busytimeout  # busytimeout is in milliseconds
 
+        # Read-only connections used by the *_async read methods, one per thread of the read pool
+        self._read_pool_size = read_pool_size
+        self._read_pool = None
+        self._read_pool_shutdown_trigger = None
+        self._read_connection_lock = RLock()
+        self._read_connection_table = {}
+
         self._version = None
 
         self._should_commit = False
@@ -90,9 +104,10 @@ class SQLiteCacheDB(TaskManager):
     @blocking_call_on_reactor_thread
     def close(self):
         """
-        Cancels all pending tasks and closes all cursors. Then, it closes the connection.
+        Cancels all pending tasks and closes all cursors. Then, it stops the read pool and closes the connection.
         """
         self.cancel_all_pending_tasks()
+        self._stop_read_pool()
         with self._cursor_lock:
             for cursor in self._cursor_table.itervalues():
                 cursor.close()
@@ -122,6 +137,7 @@ class SQLiteCacheDB(TaskManager):
         try:
             self._connection = apsw.Connection(self.sqlite_db_path)
             self._connection.setbusytimeout(self._busytimeout)
+            self._register_functions(self._connection)
         except CantOpenError as e:
             msg = u"Failed to open connection to %s: %s" % (self.sqlite_db_path, e)
             raise CantOpenError(msg)
@@ -189,6 +205,72 @@ class SQLiteCacheDB(TaskManager):
         else:
             self._version = 1
 
+    @staticmethod
+    def _register_functions(connection):
+        """
+        Registers the functions that are available in our SQL queries, next to the built-in SQLite functions.
+        """
+        connection.createscalarfunction(u"bm25_rank", bm25_rank, 1)
+
+    def _get_read_pool(self):
+        """
+        Returns the thread pool that serves the *_async read methods, starting it on first use. Since the database
+        runs in WAL mode, readers on their own connections do not block the writer connection (and vice versa).
+        An in-memory database cannot be shared between connections, so in that case None is returned and all reads
+        stay on the writer connection.
+        """
+        if self._read_pool is None and self._connection is not None \
+                and self.sqlite_db_path != u":memory:" and self._read_pool_size > 0:
+            self._read_pool = ThreadPool(minthreads=1, maxthreads=self._read_pool_size, name="SQLiteCacheDB-read")
+            self._read_pool.start()
+            self._read_pool_shutdown_trigger = reactor.addSystemEventTrigger('during', 'shutdown',
+                                                                             self._on_reactor_shutdown)
+        return self._read_pool
+
+    def _on_reactor_shutdown(self):
+        self._read_pool_shutdown_trigger = None
+        self._stop_read_pool()
+
+    def _stop_read_pool(self):
+        if self._read_pool is None:
+            return
+
+        if self._read_pool_shutdown_trigger is not None:
+            reactor.removeSystemEventTrigger(self._read_pool_shutdown_trigger)
+            self._read_pool_shutdown_trigger = None
+        self._read_pool.stop()
+        self._read_pool = None
+
+        with self._read_connection_lock:
+            for connection in self._read_connection_table.itervalues():
+                connection.close()
+            self._read_connection_table = {}
+
+    def _get_read_cursor(self):
+        """
+        Returns a cursor of the read-only connection that belongs to the calling thread of the read pool.
+        """
+        thread_name = currentThread().getName()
+
+        with self._read_connection_lock:
+            if thread_name not in self._read_connection_table:
+                connection = apsw.Connection(self.sqlite_db_path, flags=apsw.SQLITE_OPEN_READONLY)
+                connection.setbusytimeout(self._busytimeout)
+                self._register_functions(connection)
+                self._read_connection_table[thread_name] = connection
+            return self._read_connection_table[thread_name].cursor()
+
+    def _fetchall_on_read_connection(self, sql, args):
+        cursor = self._get_read_cursor()
+        try:
+            return list(cursor.execute(sql, args) if args is not None else cursor.execute(sql))
+        except Exception:
+            self._logger.exception(u"cachedb: ===%s===\nSQL Type: %s\n-----\n%s\n-----\n%s\n======\n",
+                                   currentThread().getName(), type(sql), sql, args)
+            raise
+        finally:
+            cursor.close()
+
     def get_cursor(self):
         thread_name = currentThread().getName()
 
@@ -383,15 +465,16 @@ class SQLiteCacheDB(TaskManager):
         find = self.execute_read(sql, args)
         if not find:
             return
+        return self._get_one_from_rows(sql, list(find))
+
+    def _get_one_from_rows(self, sql, rows):
+        if len(rows) > 0:
+            if len(rows) > 1:
+                self._logger.debug(
+                    u"FetchONE resulted in many more rows than one, consider putting a LIMIT 1 in the sql statement %s, %s", sql, len(rows))
+            find = rows[0]
         else:
-            find = list(find)
-            if len(find) > 0:
-                if len(find) > 1:
-                    self._logger.debug(
-                        u"FetchONE resulted in many more rows than one, consider putting a LIMIT 1 in the sql statement %s, %s", sql, len(find))
-                find = find[0]
-            else:
-                return
+            return
         if len(find) > 1:
             return find
         else:
@@ -406,6 +489,27 @@ class SQLiteCacheDB(TaskManager):
         else:
             return []  # should it return None?
 
+    def fetchall_async(self, sql, args=None):
+        """
+        Executes a read query on one of the read-only connections of the read pool, off the reactor thread.
+        Pending writes are committed first so the query observes them.
+        :return: A Deferred that fires with a list of the resulting rows.
+        """
+        read_pool = self._get_read_pool()
+        if read_pool is None:
+            return succeed(self.fetchall(sql, args))
+
+        if self._should_commit:
+            self.commit_now()
+        return deferToThreadPool(reactor, read_pool, self._fetchall_on_read_connection, sql, args)
+
+    def fetchone_async(self, sql, args=None):
+        """
+        Asynchronous counterpart of fetchone, see fetchall_async.
+        :return: A Deferred that fires with the same value fetchone would return.
+        """
+        return self.fetchall_async(sql, args).addCallback(lambda rows: self._get_one_from_rows(sql, rows))
+
     def getOne(self, table_name, value_name, where=None, conj=u"AND", **kw):
         """ value_name could be a string, a tuple of strings, or '*'
         """
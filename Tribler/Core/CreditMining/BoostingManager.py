@@ -230,10 +230,16 @@ class BoostingManager(TaskManager):
 
         self.torrents[infohash] = torrent
 
-    def on_torrent_notify(self, subject, change_type, infohash):
+    def on_torrent_notify(self, subject, change_type, infohash, infohashes=None):
         """
         Notify us when we have new seeder/leecher value in torrent from tracker
         """
+        if infohash is None and infohashes:
+            # The results of many torrent checks are notified at once
+            for updated_infohash in infohashes:
+                self.on_torrent_notify(subject, change_type, updated_infohash)
+            return
+
         if infohash not in self.torrents:
             return
 
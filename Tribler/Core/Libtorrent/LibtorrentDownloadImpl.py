@@ -5,11 +5,13 @@ Author(s): Arno Bakker, Egbert Bouman
 """
 import base64
 import logging
+import mmap
 import os
 import random
 import sys
 import time
 from binascii import hexlify
+from threading import Condition
 from traceback import print_exc
 from twisted.internet import defer, reactor
 from twisted.internet.defer import Deferred, CancelledError, succeed
@@ -39,6 +41,22 @@ if sys.platform == "win32":
         pass
 
 
+VOD_READAHEAD_SIZE = 8 * 1024 * 1024  # The number of bytes ahead of the playback cursor that get piece deadlines
+VOD_DEADLINE_INTERVAL = 250  # The time (in ms) between the deadlines of consecutive pieces ahead of the cursor
+VOD_PIECE_WAIT_TIMEOUT = 1  # The maximum time a stream waits for a piece before checking its state again
+
+# The alerts a download handles with its on_<alert type> methods
+ALERT_HANDLER_TYPES = frozenset(['tracker_reply_alert', 'tracker_error_alert', 'tracker_warning_alert',
+                                 'metadata_received_alert', 'file_renamed_alert', 'performance_alert',
+                                 'torrent_checked_alert', 'torrent_finished_alert', 'save_resume_data_alert',
+                                 'save_resume_data_failed_alert', 'piece_finished_alert'])
+# The alerts after which a download refreshes its statistics right away, instead of with the next state update
+STATE_ALERT_TYPES = frozenset(['state_changed_alert', 'torrent_paused_alert', 'torrent_resumed_alert',
+                               'torrent_error_alert'])
+# All alerts the LibtorrentMgr passes on to the downloads, other alerts are dropped
+DOWNLOAD_ALERT_TYPES = ALERT_HANDLER_TYPES | STATE_ALERT_TYPES
+
+
 class VODFile(object):
 
     def __init__(self, f, d):
@@ -56,28 +74,69 @@ class VODFile(object):
         self.endpiece = get_info_from_handle(self._download.handle).map_file(
             self._download.get_vod_fileindex(), self._download.get_vod_filesize(), 0)
 
+        self._readahead_piece = None
+
+    def wait_for_bytes(self, position, size):
+        """
+        Blocks until the given byte range of the file has been downloaded, waking up whenever libtorrent finishes
+        a piece. Returns False if the file got closed in the meantime.
+        """
+        while not self._file.closed and self._download.vod_seekpos is not None and \
+                self._download.get_byte_progress([(self._download.get_vod_fileindex(), position,
+                                                   position + size)]) < 1:
+            self._download.wait_for_piece(VOD_PIECE_WAIT_TIMEOUT)
+        return not self._file.closed
+
     def read(self, *args):
         oldpos = self._file.tell()
 
         self._logger.debug('VODFile: get bytes %s - %s', oldpos, oldpos + args[0])
 
-        while not self._file.closed and self._download.get_byte_progress([(self._download.get_vod_fileindex(), oldpos, oldpos + args[0])]) < 1 and self._download.vod_seekpos is not None:
-            time.sleep(1)
-
-        if self._file.closed:
+        if not self.wait_for_bytes(oldpos, args[0]):
             self._logger.debug('VODFile: got no bytes, file is closed')
             return ''
 
         result = self._file.read(*args)
 
         newpos = self._file.tell()
-        if self._download.vod_seekpos == oldpos:
-            self._download.vod_seekpos = newpos
+        self._on_bytes_read(oldpos, newpos)
 
         self._logger.debug('VODFile: got bytes %s - %s', oldpos, newpos)
 
         return result
 
+    def read_buffer(self, position, size):
+        """
+        Returns a read-only buffer with (at most) size bytes of the file, starting at position. Ranges that are on
+        disk are mapped into memory instead of being copied into a string, so they can be written to a socket
+        directly. The caller should wait for the range to be downloaded first, see wait_for_bytes.
+        """
+        fileno = self._file.fileno()
+        if size > 0 and os.fstat(fileno).st_size >= position + size:
+            offset = position - position % mmap.ALLOCATIONGRANULARITY
+            mapping = mmap.mmap(fileno, position + size - offset, access=mmap.ACCESS_READ, offset=offset)
+            # The buffer keeps a reference to the mapping, which is unmapped as soon as the buffer is released
+            result = buffer(mapping, position - offset, size)
+        else:
+            # The file is not (fully) allocated yet, read the range instead
+            data = bytearray(size)
+            self._file.seek(position)
+            result = buffer(data, 0, self._file.readinto(data))
+
+        self._file.seek(position + len(result))
+        self._on_bytes_read(position, position + len(result))
+        return result
+
+    def _on_bytes_read(self, oldpos, newpos):
+        if self._download.vod_seekpos == oldpos:
+            self._download.vod_seekpos = newpos
+
+        # Set deadlines on the pieces ahead of the cursor whenever it enters a new piece
+        piece = (self.startpiece.piece * self.piecesize + self.startpiece.start + newpos) // self.piecesize
+        if piece != self._readahead_piece:
+            self._readahead_piece = piece
+            self._download.set_vod_readahead(newpos)
+
     def seek(self, *args):
         self._file.seek(*args)
         newpos = self._file.tell()
@@ -88,6 +147,8 @@ class VODFile(object):
             self._download.vod_seekpos = newpos
         self._download.set_byte_priority([(self._download.get_vod_fileindex(), 0, newpos)], 0)
         self._download.set_byte_priority([(self._download.get_vod_fileindex(), newpos, -1)], 1)
+        self._readahead_piece = None
+        self._download.set_vod_readahead(newpos)
 
         self._logger.debug('VODFile: seek, get pieces %s', self._download.handle.piece_priorities())
         self._logger.debug('VODFile: seek, got pieces %s', [
@@ -128,6 +189,7 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
         self.ltmgr = None
 
         # Libtorrent status
+        self.lt_status = None  # The last torrent_status of the handle, updated by the batched state updates
         self.dlstates = [DLSTATUS_WAITING4HASHCHECK, DLSTATUS_HASHCHECKING, DLSTATUS_METADATA, DLSTATUS_DOWNLOADING,
                          DLSTATUS_SEEDING, DLSTATUS_SEEDING, DLSTATUS_ALLOCATING_DISKSPACE, DLSTATUS_HASHCHECKING]
         self.dlstate = DLSTATUS_WAITING4HASHCHECK
@@ -149,6 +211,9 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
 
         self.max_prebuffsize = 5 * 1024 * 1024
 
+        # Notified whenever a piece finishes, so VOD streams don't have to poll for data
+        self.piece_condition = Condition()
+
         self.pstate_for_restart = None
 
         self.cew_scheduled = False
@@ -199,12 +264,15 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
         self.deferreds_handle.append(deferred)
         return deferred
 
-    def setup(self, dcfg=None, pstate=None, wrapperDelay=0, share_mode=False, checkpoint_disabled=False):
+    def setup(self, dcfg=None, pstate=None, wrapperDelay=0, share_mode=False, checkpoint_disabled=False,
+              async_add=False):
         """
         Create a Download object. Used internally by Session.
         @param dcfg DownloadStartupConfig or None (in which case
         a new DownloadConfig() is created and the result
         becomes the runtime config of this Download.
+        @param async_add Whether to add the torrent to libtorrent without waiting for it, see
+        LibtorrentMgr.async_add_torrent.
         :returns a Deferred to which a callback can be added which returns the result of
         network_create_engine_wrapper.
         """
@@ -236,7 +304,7 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
                 def schedule_create_engine():
                     self.cew_scheduled = True
                     create_engine_wrapper_deferred = self.network_create_engine_wrapper(
-                        self.pstate_for_restart, share_mode=share_mode)
+                        self.pstate_for_restart, share_mode=share_mode, async_add=async_add)
                     create_engine_wrapper_deferred.chainDeferred(deferred)
 
                 def schedule_create_engine_call(_):
@@ -290,7 +358,7 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
         do_check()
         return can_create_deferred
 
-    def network_create_engine_wrapper(self, pstate, checkpoint_disabled=False, share_mode=False):
+    def network_create_engine_wrapper(self, pstate, checkpoint_disabled=False, share_mode=False, async_add=False):
         with self.dllock:
             self._logger.debug("LibtorrentDownloadImpl: network_create_engine_wrapper()")
 
@@ -336,12 +404,24 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
                 atp["url"] = self.tdef.get_url() or "magnet:?xt=urn:btih:" + hexlify(self.tdef.get_infohash())
                 atp["name"] = self.tdef.get_name_as_unicode()
 
-            self.handle = self.ltmgr.add_torrent(self, atp)
+            if async_add:
+                return self.ltmgr.async_add_torrent(self, atp).addCallback(self.on_torrent_added, pstate)
+            return self.on_torrent_added(self.ltmgr.add_torrent(self, atp), pstate)
+
+    def on_torrent_added(self, handle, pstate):
+        """
+        Starts the download once its torrent has been added to libtorrent.
+        :return: A Deferred that fires with this download, or fails if the torrent could not be added.
+        """
+        with self.dllock:
+            self.handle = handle
+            self.lt_status = None
             # assert self.handle.status().share_mode == share_mode
             if self.handle.is_valid():
 
                 self.set_selected_files()
 
+                resume_data = pstate.get('state', 'engineresumedata') if pstate else None
                 user_stopped = pstate.get('download_defaults', 'user_stopped') if pstate else False
 
                 # If we lost resume_data always resume download in order to force checking
@@ -396,13 +476,49 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
             self.set_byte_priority([(self.get_vod_fileindex(), -self.endbuffsize, -1)], 1)
 
             self.progress = self.get_byte_progress([(self.get_vod_fileindex(), 0, -1)])
+            if self.ltmgr:
+                self.ltmgr.set_piece_alerts(self.get_hops(), self.tdef.get_infohash(), True)
             self._logger.debug("LibtorrentDownloadImpl: going into VOD mode %s", filename)
         else:
             self.handle.set_sequential_download(False)
             self.handle.set_priority(0)
+            if self.ltmgr:
+                self.ltmgr.set_piece_alerts(self.get_hops(), self.tdef.get_infohash(), False)
             if self.get_vod_fileindex() >= 0:
                 self.set_byte_priority([(self.get_vod_fileindex(), 0, -1)], 1)
 
+        with self.piece_condition:
+            self.piece_condition.notify_all()
+
+    @checkHandleAndSynchronize()
+    def set_vod_readahead(self, position):
+        """
+        Sets deadlines on the missing pieces in the VOD_READAHEAD_SIZE bytes after position in the VOD file, so
+        libtorrent requests them in playback order. The piece at position gets the earliest deadline.
+        """
+        fileindex = self.get_vod_fileindex()
+        if fileindex < 0:
+            return
+
+        torrent_info = get_info_from_handle(self.handle)
+        file_size = torrent_info.file_at(fileindex).size
+        if position >= file_size:
+            return
+
+        startpiece = torrent_info.map_file(fileindex, position, 0).piece
+        endpiece = torrent_info.map_file(fileindex, min(position + VOD_READAHEAD_SIZE, file_size - 1), 0).piece
+        for index, piece in enumerate(xrange(startpiece, endpiece + 1)):
+            if not self.handle.have_piece(piece):
+                self.handle.set_piece_deadline(piece, (index + 1) * VOD_DEADLINE_INTERVAL)
+
+    def wait_for_piece(self, timeout):
+        """
+        Blocks until libtorrent finishes a piece of this download, the VOD mode changes or the timeout expires.
+        Should not be called while holding the download lock, since the piece alerts are processed with that lock.
+        """
+        with self.piece_condition:
+            self.piece_condition.wait(timeout)
+
     def get_vod_fileindex(self):
         if self.vod_index is not None:
             return self.vod_index
@@ -528,15 +644,15 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
         if alert.category() in [lt.alert.category_t.error_notification, lt.alert.category_t.performance_warning]:
             self._logger.debug("LibtorrentDownloadImpl: alert %s with message %s", alert_type, alert)
 
-        alert_types = ('tracker_reply_alert', 'tracker_error_alert', 'tracker_warning_alert', 'metadata_received_alert',
-                       'file_renamed_alert', 'performance_alert', 'torrent_checked_alert', 'torrent_finished_alert',
-                       'save_resume_data_alert', 'save_resume_data_failed_alert')
-
-        if alert_type in alert_types:
+        if alert_type in ALERT_HANDLER_TYPES:
             getattr(self, 'on_' + alert_type)(alert)
         else:
             self.update_lt_stats()
 
+    def on_piece_finished_alert(self, alert):
+        with self.piece_condition:
+            self.piece_condition.notify_all()
+
     def on_save_resume_data_alert(self, alert):
         """
         Callback for the alert that contains the resume data of a specific download.
@@ -680,9 +796,18 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
                 self.set_byte_priority([(self.get_vod_fileindex(), 0, -1)], 1)
                 self.endbuffsize = 0
 
-    def update_lt_stats(self):
+    def on_state_update(self, status):
+        """
+        Called by the LibtorrentMgr with the status of this download, when libtorrent reports it has changed.
+        """
+        with self.dllock:
+            if self.handle is not None:
+                self.update_lt_stats(status)
+
+    def update_lt_stats(self, status=None):
         """ Update libtorrent stats and check if the download should be stopped."""
-        status = self.handle.status()
+        status = status or self.handle.status()
+        self.lt_status = status
         self.dlstate = self.dlstates[status.state] if not status.paused else DLSTATUS_STOPPED
         self.dlstate = DLSTATUS_STOPPED_ON_ERROR if self.dlstate == DLSTATUS_STOPPED and status.error else self.dlstate
         if self.get_mode() == DLMODE_VOD:
@@ -877,8 +1002,13 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
         stats['vod_prebuf_frac'] = self.network_calc_prebuf_frac()
         stats['vod_prebuf_frac_consec'] = self.network_calc_prebuf_frac(consecutive=True)
         stats['vod'] = self.get_mode()
-        stats['spew'] = self.network_create_spew_from_peerlist() if getpeerlist or self.askmoreinfo else None
-        stats['tracker_status'] = self.network_tracker_status() if getpeerlist or self.askmoreinfo else None
+        if getpeerlist or self.askmoreinfo:
+            # Both the peer list and the tracker status need the peers, only ask libtorrent for them once
+            peer_infos = self.handle.get_peer_info()
+            stats['spew'] = self.network_create_spew_from_peerlist(peer_infos)
+            stats['tracker_status'] = self.network_tracker_status(peer_infos)
+        else:
+            stats['spew'] = stats['tracker_status'] = None
 
         seeding_stats = {}
         seeding_stats['total_up'] = self.all_time_upload
@@ -895,7 +1025,7 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
 
     @checkHandleAndSynchronize()
     def network_create_statistics_reponse(self):
-        status = self.handle.status()
+        status = self.lt_status or self.handle.status()
         numTotSeeds = status.num_complete if status.num_complete >= 0 else status.list_seeds
         numTotPeers = status.num_incomplete if status.num_incomplete >= 0 else status.list_peers
         numleech = max(status.num_peers - status.num_seeds, 0)  # When anon downloading, this might become negative
@@ -960,10 +1090,11 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
 
         return peer_dict
 
-    def network_create_spew_from_peerlist(self):
+    def network_create_spew_from_peerlist(self, peer_infos=None):
         plist = []
-        with self.dllock:
-            peer_infos = self.handle.get_peer_info()
+        if peer_infos is None:
+            with self.dllock:
+                peer_infos = self.handle.get_peer_info()
         for peer_info in peer_infos:
             # Only consider fully connected peers.
             # Disabling for now, to avoid presenting the user with conflicting information
@@ -977,7 +1108,7 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
         return plist
 
     @checkHandleAndSynchronize(default={})
-    def network_tracker_status(self):
+    def network_tracker_status(self, peer_infos=None):
         # Make sure all trackers are in the tracker_status dict
         for announce_entry in self.handle.trackers():
             if announce_entry['url'] not in self.tracker_status:
@@ -989,7 +1120,7 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
 
         # Count DHT and PeX peers
         dht_peers = pex_peers = 0
-        for peer_info in self.handle.get_peer_info():
+        for peer_info in (self.handle.get_peer_info() if peer_infos is None else peer_infos):
             if peer_info.source & peer_info.dht:
                 dht_peers += 1
             if peer_info.source & peer_info.pex:
@@ -1069,6 +1200,7 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
                 if removestate:
                     self.ltmgr.remove_torrent(self, removecontent)
                     self.handle = None
+                    self.lt_status = None
                 else:
                     self.set_vod_mode(False)
                     self.handle.pause()
@@ -17,10 +17,11 @@ from urllib import url2pathname
 
 import libtorrent as lt
 from twisted.internet import reactor, threads
-from twisted.internet.defer import succeed, fail
+from twisted.internet.defer import Deferred, succeed, fail
 from twisted.python.failure import Failure
 
 from Tribler.Core.DownloadConfig import DefaultDownloadStartupConfig
+from Tribler.Core.Libtorrent.LibtorrentDownloadImpl import DOWNLOAD_ALERT_TYPES
 from Tribler.Core.TorrentDef import TorrentDef, TorrentDefNoMetainfo
 from Tribler.Core.Utilities.torrent_utils import get_info_from_handle
 from Tribler.Core.Utilities.utilities import parse_magnetlink, fix_torrent
@@ -34,6 +35,17 @@ from Tribler.dispersy.util import blocking_call_on_reactor_thread, call_on_react
 LTSTATE_FILENAME = "lt.state"
 METAINFO_CACHE_PERIOD = 5 * 60
 DHT_CHECK_RETRIES = 1
+ALERT_INTERVAL = 1
+VOD_ALERT_INTERVAL = 0.2  # Alerts are processed more often while streaming, so streams wake up soon after a piece
+ADD_ALERT_INTERVAL = 0.1  # Alerts are processed more often while torrents are being added asynchronously
+
+# Libtorrent filters alerts by category only, so this mask contains the categories of the alerts that are handled.
+# The statistics of the downloads are fetched in batches with post_torrent_updates, so no stats_notification.
+DEFAULT_ALERT_MASK = (lt.alert.category_t.error_notification |
+                      lt.alert.category_t.status_notification |
+                      lt.alert.category_t.storage_notification |
+                      lt.alert.category_t.performance_warning |
+                      lt.alert.category_t.tracker_notification)
 
 
 class LibtorrentMgr(TaskManager):
@@ -60,6 +72,13 @@ class LibtorrentMgr(TaskManager):
         self.metainfo_requests = {}
         self.metainfo_lock = threading.RLock()
         self.metainfo_cache = {}
+        self.pending_adds = {}  # Maps the infohash of a torrent being added asynchronously to its download and session
+        self.cancelled_adds = {}  # Maps the infohash of a torrent removed while being added to its session and options
+        self.piece_alert_downloads = {}  # Maps the hops of a session to the infohashes of its downloads in VOD mode
+
+        self.alert_handlers = {}  # Maps an alert class to an (alert type, handler) tuple, handler is None if ignored
+        self.alert_statistics = {}  # Maps an alert type to the number of these alerts and the time spent on them
+        self.alert_statistics_start_time = time.time()
 
         self.process_alerts_lc = self.register_task("process_alerts", LoopingCall(self._task_process_alerts))
         self.check_reachability_lc = self.register_task("check_reachability", LoopingCall(self._check_reachability))
@@ -73,7 +92,7 @@ class LibtorrentMgr(TaskManager):
         self.metadata_tmpdir = tempfile.mkdtemp(suffix=u'tribler_metainfo_tmpdir')
 
         # register tasks
-        self.process_alerts_lc.start(1, now=False)
+        self.process_alerts_lc.start(ALERT_INTERVAL, now=False)
         self.check_reachability_lc.start(5, now=True)
         self._schedule_next_check(5, DHT_CHECK_RETRIES)
 
@@ -83,6 +102,8 @@ class LibtorrentMgr(TaskManager):
     @blocking_call_on_reactor_thread
     def shutdown(self):
         self.cancel_all_pending_tasks()
+        self.pending_adds = {}
+        self.cancelled_adds = {}
 
         # remove all upnp mapping
         for upnp_handle in self.upnp_mapping_dict.itervalues():
@@ -140,12 +161,7 @@ class LibtorrentMgr(TaskManager):
             ltsession.add_extension(lt.create_smart_ban_plugin)
 
         ltsession.set_settings(settings)
-        ltsession.set_alert_mask(lt.alert.category_t.stats_notification |
-                                 lt.alert.category_t.error_notification |
-                                 lt.alert.category_t.status_notification |
-                                 lt.alert.category_t.storage_notification |
-                                 lt.alert.category_t.performance_warning |
-                                 lt.alert.category_t.tracker_notification)
+        ltsession.set_alert_mask(DEFAULT_ALERT_MASK)
 
         # Load proxy settings
         if hops == 0:
@@ -190,6 +206,42 @@ class LibtorrentMgr(TaskManager):
 
         return ltsession
 
+    def set_piece_alerts(self, hops, infohash, enable):
+        """
+        Enables or disables the alerts for finished pieces for a download in the session with the given number of
+        hops. These alerts wake up the VOD streams waiting for data. Since they are posted for every piece of every
+        download, they are only enabled while at least one download in that session is in VOD mode.
+        """
+        changed_hops = set([hops])
+        if enable:
+            self.piece_alert_downloads.setdefault(hops, set()).add(infohash)
+        else:
+            # The hops of the download may have changed since it went into VOD mode
+            for session_hops, infohashes in self.piece_alert_downloads.items():
+                if infohash in infohashes:
+                    changed_hops.add(session_hops)
+                    infohashes.discard(infohash)
+                    if not infohashes:
+                        del self.piece_alert_downloads[session_hops]
+
+        for session_hops in changed_hops:
+            alert_mask = DEFAULT_ALERT_MASK
+            if session_hops in self.piece_alert_downloads:
+                alert_mask |= lt.alert.category_t.progress_notification
+            self.get_session(session_hops).set_alert_mask(alert_mask)
+        self._update_alert_interval()
+
+    def _update_alert_interval(self):
+        """
+        Sets the interval at which alerts are processed, which is shorter while streaming or adding torrents.
+        """
+        if self.pending_adds:
+            self.process_alerts_lc.interval = ADD_ALERT_INTERVAL
+        elif self.piece_alert_downloads:
+            self.process_alerts_lc.interval = VOD_ALERT_INTERVAL
+        else:
+            self.process_alerts_lc.interval = ALERT_INTERVAL
+
     def get_session(self, hops=0):
         if hops not in self.ltsessions:
             self.ltsessions[hops] = self.create_session(hops)
@@ -259,23 +311,36 @@ class LibtorrentMgr(TaskManager):
     def is_dht_ready(self):
         return self.dht_ready
 
-    def add_torrent(self, torrentdl, atp):
-        # If we are collecting the torrent for this infohash, abort this first.
-        with self.metainfo_lock:
-            ltsession = self.get_session(atp.pop('hops', 0))
+    def _prepare_add_torrent(self, atp):
+        """
+        Returns the session and the infohash of a torrent that is about to be added. If we are collecting the torrent
+        for this infohash, this is aborted first. Called with the metainfo lock held.
+        """
+        ltsession = self.get_session(atp.pop('hops', 0))
 
-            if 'ti' in atp:
-                infohash = str(atp['ti'].info_hash())
-            elif 'url' in atp:
-                infohash = binascii.hexlify(parse_magnetlink(atp['url'])[1])
-            else:
-                raise ValueError('No ti or url key in add_torrent_params')
+        if 'ti' in atp:
+            infohash = str(atp['ti'].info_hash())
+        elif 'url' in atp:
+            infohash = binascii.hexlify(parse_magnetlink(atp['url'])[1])
+        else:
+            raise ValueError('No ti or url key in add_torrent_params')
 
-            if infohash in self.metainfo_requests:
-                self._logger.info("killing get_metainfo request for %s", infohash)
-                request_handle = self.metainfo_requests.pop(infohash)['handle']
-                if request_handle:
-                    ltsession.remove_torrent(request_handle, 0)
+        if infohash in self.pending_adds:
+            raise DuplicateDownloadException("This download is already being added.")
+        if infohash in self.cancelled_adds:
+            raise DuplicateDownloadException("This download is still being removed.")
+
+        if infohash in self.metainfo_requests:
+            self._logger.info("killing get_metainfo request for %s", infohash)
+            request_handle = self.metainfo_requests.pop(infohash)['handle']
+            if request_handle:
+                ltsession.remove_torrent(request_handle, 0)
+
+        return ltsession, infohash
+
+    def add_torrent(self, torrentdl, atp):
+        with self.metainfo_lock:
+            ltsession, _ = self._prepare_add_torrent(atp)
 
             torrent_handle = ltsession.add_torrent(encode_atp(atp))
             infohash = str(torrent_handle.info_hash())
@@ -287,6 +352,29 @@ class LibtorrentMgr(TaskManager):
 
             return torrent_handle
 
+    def async_add_torrent(self, torrentdl, atp):
+        """
+        Adds a torrent without waiting for libtorrent to add it. Libtorrent queues the torrent and posts an
+        add_torrent_alert once it has been added, so many torrents can be added at once.
+        :return: A Deferred that fires with the handle of the torrent, which is invalid if it could not be added.
+        """
+        with self.metainfo_lock:
+            ltsession, infohash = self._prepare_add_torrent(atp)
+            if infohash in self.torrents:
+                raise DuplicateDownloadException("This download already exists.")
+
+            deferred = Deferred()
+            self.pending_adds[infohash] = (torrentdl, ltsession, deferred)
+            ltsession.async_add_torrent(encode_atp(atp))
+            self._update_alert_interval()
+            return deferred
+
+    def get_num_pending_adds(self):
+        """
+        Returns the number of torrents that were added asynchronously and are still queued in libtorrent.
+        """
+        return len(self.pending_adds)
+
     def remove_torrent(self, torrentdl, removecontent=False):
         handle = torrentdl.handle
         if handle and handle.is_valid():
@@ -297,9 +385,27 @@ class LibtorrentMgr(TaskManager):
                 self._logger.debug("remove torrent %s", infohash)
             else:
                 self._logger.debug("cannot remove torrent %s because it does not exists", infohash)
-        else:
+        elif not self._cancel_add_torrent(torrentdl, removecontent):
             self._logger.debug("cannot remove invalid torrent")
 
+    def _cancel_add_torrent(self, torrentdl, removecontent):
+        """
+        Cancels the asynchronous addition of the torrent of a download. The torrent is removed from libtorrent as soon
+        as its add_torrent_alert arrives.
+        :return: True if the torrent was being added, else False.
+        """
+        infohash = hexlify(torrentdl.get_def().get_infohash())
+        with self.metainfo_lock:
+            if infohash not in self.pending_adds or self.pending_adds[infohash][0] is not torrentdl:
+                return False
+            _, ltsession, deferred = self.pending_adds.pop(infohash)
+            self.cancelled_adds[infohash] = (ltsession, removecontent)
+            self._update_alert_interval()
+
+        self._logger.debug("cancelled adding torrent %s", infohash)
+        deferred.cancel()
+        return True
+
     def add_upnp_mapping(self, port, protocol='TCP'):
         # TODO martijn: this check should be removed once we do not support libtorrent versions that do not have the
         # add_port_mapping method exposed in the Python bindings
@@ -316,8 +422,44 @@ class LibtorrentMgr(TaskManager):
         else:
             self._logger.warning("port mapping method not exposed in libtorrent")
 
+    def get_alert_handler(self, alert_class):
+        """
+        Returns the (alert type, handler) tuple for a class of alerts. The handler is None for alerts that nobody
+        handles, so these are dropped without looking up their torrent.
+        """
+        if alert_class not in self.alert_handlers:
+            alert_type = alert_class.__name__
+            if alert_type == 'state_update_alert':
+                handler = self.process_state_update_alert
+            elif alert_type == 'add_torrent_alert':
+                handler = self.process_add_torrent_alert
+            elif alert_type in DOWNLOAD_ALERT_TYPES:
+                handler = self.process_torrent_alert
+            else:
+                handler = None
+            self.alert_handlers[alert_class] = (alert_type, handler)
+        return self.alert_handlers[alert_class]
+
     def process_alert(self, alert):
-        alert_type = str(type(alert)).split("'")[1].split(".")[-1]
+        alert_type, handler = self.get_alert_handler(type(alert))
+
+        start_time = time.time()
+        if handler:
+            handler(alert, alert_type)
+        handling_time = time.time() - start_time
+
+        statistics = self.alert_statistics.get(alert_type)
+        if statistics is None:
+            statistics = self.alert_statistics[alert_type] = {'alerts': 0, 'handling_time': 0.0,
+                                                              'max_handling_time': 0.0, 'handled': bool(handler)}
+        statistics['alerts'] += 1
+        statistics['handling_time'] += handling_time
+        statistics['max_handling_time'] = max(statistics['max_handling_time'], handling_time)
+
+    def process_torrent_alert(self, alert, alert_type):
+        """
+        Passes an alert about a torrent to its download, or to the metainfo request of the torrent.
+        """
         handle = getattr(alert, 'handle', None)
         if handle:
             if handle.is_valid():
@@ -325,13 +467,61 @@ class LibtorrentMgr(TaskManager):
                 if infohash in self.torrents:
                     self.torrents[infohash][0].process_alert(alert, alert_type)
                 elif infohash in self.metainfo_requests:
-                    if isinstance(alert, lt.metadata_received_alert):
+                    if alert_type == 'metadata_received_alert':
                         self.got_metainfo(infohash)
                 else:
                     self._logger.debug("LibtorrentMgr: could not find torrent %s", infohash)
             else:
                 self._logger.debug("Alert for invalid torrent")
 
+    def process_add_torrent_alert(self, alert, alert_type=None):
+        """
+        Completes the asynchronous addition of a torrent. Libtorrent posts this alert for every torrent that is added,
+        the alerts of torrents that were not added with async_add_torrent are ignored.
+        """
+        if alert.handle.is_valid():
+            infohash = str(alert.handle.info_hash())
+        else:
+            params = alert.params
+            if params.get('ti'):
+                infohash = str(params['ti'].info_hash())
+            elif params.get('url'):
+                infohash = binascii.hexlify(parse_magnetlink(params['url'])[1])
+            else:
+                infohash = str(params.get('info_hash'))
+
+        with self.metainfo_lock:
+            if infohash in self.cancelled_adds:
+                # The download was removed while its torrent was being added
+                ltsession, removecontent = self.cancelled_adds.pop(infohash)
+                if not alert.error.value() and alert.handle.is_valid():
+                    ltsession.remove_torrent(alert.handle, int(removecontent))
+                return
+            if infohash not in self.pending_adds:
+                return
+            torrentdl, ltsession, deferred = self.pending_adds.pop(infohash)
+            self._update_alert_interval()
+
+            if alert.error.value():
+                self._logger.error("could not add torrent %s: %s", infohash, alert.error.message())
+                handle = lt.torrent_handle()
+            else:
+                handle = alert.handle
+                self.torrents[infohash] = (torrentdl, ltsession)
+                self._logger.debug("added torrent %s", infohash)
+
+        deferred.callback(handle)
+
+    def process_state_update_alert(self, alert, alert_type=None):
+        """
+        Passes the statuses in a state_update_alert to their downloads. The alert only contains the statuses of the
+        torrents that changed since the previous post_torrent_updates call.
+        """
+        for status in alert.status:
+            infohash = str(status.handle.info_hash())
+            if infohash in self.torrents:
+                self.torrents[infohash][0].on_state_update(status)
+
     def get_metainfo(self, infohash_or_magnet, callback, timeout=30, timeout_callback=None, notify=True):
         if not self.is_dht_ready() and timeout > 5:
             self._logger.info("DHT not ready, rescheduling get_metainfo")
@@ -475,11 +665,28 @@ class LibtorrentMgr(TaskManager):
             if last_time < oldest_time:
                 del self.metainfo_cache[info_hash]
 
+    def get_alert_statistics(self):
+        """
+        Returns the number of alerts per second and the time spent handling them (in seconds) for each alert type.
+        """
+        uptime = max(time.time() - self.alert_statistics_start_time, 1e-6)
+        result = {}
+        for alert_type, statistics in self.alert_statistics.items():
+            alerts = statistics['alerts']
+            result[alert_type] = {'alerts': alerts,
+                                  'alerts_per_second': alerts / uptime,
+                                  'handled': statistics['handled'],
+                                  'avg_handling_time': statistics['handling_time'] / alerts,
+                                  'max_handling_time': statistics['max_handling_time']}
+        return result
+
     def _task_process_alerts(self):
         for ltsession in self.ltsessions.itervalues():
             if ltsession:
                 for alert in ltsession.pop_alerts():
                     self.process_alert(alert)
+                # The statuses of all changed torrents arrive in a single state_update_alert on the next call
+                ltsession.post_torrent_updates()
 
     def _check_reachability(self):
         if self.get_session() and self.get_session().status().has_incoming_connections:
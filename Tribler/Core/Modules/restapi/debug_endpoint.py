@@ -1,6 +1,7 @@
 import json
 from twisted.web import http, resource
 
+from Tribler.community.search.community import SearchCommunity
 from Tribler.community.tunnel.tunnel_community import TunnelCommunity
 
 
@@ -12,7 +13,9 @@ class DebugEndpoint(resource.Resource):
     def __init__(self, session):
         resource.Resource.__init__(self)
 
-        child_handler_dict = {"circuits": DebugCircuitsEndpoint}
+        child_handler_dict = {"circuits": DebugCircuitsEndpoint, "search": DebugSearchEndpoint,
+                              "notifier": DebugNotifierEndpoint, "alerts": DebugAlertsEndpoint,
+                              "torrentchecker": DebugTorrentCheckerEndpoint}
 
         for path, child_cls in child_handler_dict.iteritems():
             self.putChild(path, child_cls(session))
@@ -86,3 +89,210 @@ class DebugCircuitsEndpoint(resource.Resource):
             circuits_json.append(item)
 
         return json.dumps({'circuits': circuits_json})
+
+
+class DebugSearchEndpoint(resource.Resource):
+    """
+    This class handles requests regarding debug information about searching.
+    """
+
+    def __init__(self, session):
+        resource.Resource.__init__(self)
+        self.session = session
+
+    def render_GET(self, request):
+        """
+        .. http:get:: /debug/search
+
+        A GET request to this endpoint returns statistics about the cache of local search results and, when the
+        search community is loaded, about the search requests of other peers we served, answered from the cache
+        or dropped.
+
+            **Example request**:
+
+            .. sourcecode:: none
+
+                curl -X GET http://localhost:8085/debug/search
+
+            **Example response**:
+
+            .. sourcecode:: javascript
+
+                {
+                    "search_cache": {
+                        "entries": 12,
+                        "max_entries": 128,
+                        "ttl": 300,
+                        "hits": 43,
+                        "misses": 17,
+                        "invalidations": 5
+                    },
+                    "remote_search": {
+                        "served": 31,
+                        "cached": 12,
+                        "dropped": 3,
+                        "pending": 1,
+                        "cache": {...}
+                    }
+                }
+        """
+        search_cache = self.session.lm.search_cache
+        if not search_cache:
+            request.setResponseCode(http.NOT_FOUND)
+            return json.dumps({"error": "search cache not enabled"})
+
+        statistics = {"search_cache": search_cache.get_statistics()}
+        search_community = self.get_search_community()
+        if search_community:
+            statistics["remote_search"] = search_community.get_search_statistics()
+        return json.dumps(statistics)
+
+    def get_search_community(self):
+        """
+        Search for the search community in the dispersy communities.
+        """
+        if not self.session.config.get_dispersy_enabled():
+            return None
+        for community in self.session.get_dispersy_instance().get_communities():
+            if isinstance(community, SearchCommunity):
+                return community
+        return None
+
+
+class DebugNotifierEndpoint(resource.Resource):
+    """
+    This class handles requests regarding debug information about the notifier.
+    """
+
+    def __init__(self, session):
+        resource.Resource.__init__(self)
+        self.session = session
+
+    def render_GET(self, request):
+        """
+        .. http:get:: /debug/notifier
+
+        A GET request to this endpoint returns, per subject, the number of events per second and the time spent in
+        the observer callbacks (in seconds).
+
+            **Example request**:
+
+            .. sourcecode:: none
+
+                curl -X GET http://localhost:8085/debug/notifier
+
+            **Example response**:
+
+            .. sourcecode:: javascript
+
+                {
+                    "subjects": {
+                        "torrents": {
+                            "events": 4825,
+                            "events_per_second": 12.3,
+                            "callbacks": 4825,
+                            "avg_callback_time": 0.0002,
+                            "max_callback_time": 0.013
+                        }, ...
+                    }
+                }
+        """
+        return json.dumps({"subjects": self.session.notifier.get_statistics()})
+
+
+class DebugAlertsEndpoint(resource.Resource):
+    """
+    This class handles requests regarding debug information about the libtorrent alerts.
+    """
+
+    def __init__(self, session):
+        resource.Resource.__init__(self)
+        self.session = session
+
+    def render_GET(self, request):
+        """
+        .. http:get:: /debug/alerts
+
+        A GET request to this endpoint returns, per alert type, the number of libtorrent alerts per second and the
+        time spent handling them (in seconds). Alerts that are not handled by Tribler are dropped right away.
+
+            **Example request**:
+
+            .. sourcecode:: none
+
+                curl -X GET http://localhost:8085/debug/alerts
+
+            **Example response**:
+
+            .. sourcecode:: javascript
+
+                {
+                    "alerts": {
+                        "state_update_alert": {
+                            "alerts": 3600,
+                            "alerts_per_second": 1.0,
+                            "handled": true,
+                            "avg_handling_time": 0.004,
+                            "max_handling_time": 0.08
+                        }, ...
+                    }
+                }
+        """
+        ltmgr = self.session.lm.ltmgr
+        if not ltmgr:
+            request.setResponseCode(http.NOT_FOUND)
+            return json.dumps({"error": "libtorrent not enabled"})
+
+        return json.dumps({"alerts": ltmgr.get_alert_statistics()})
+
+
+class DebugTorrentCheckerEndpoint(resource.Resource):
+    """
+    This class handles requests regarding debug information about the torrent checker.
+    """
+
+    def __init__(self, session):
+        resource.Resource.__init__(self)
+        self.session = session
+
+    def render_GET(self, request):
+        """
+        .. http:get:: /debug/torrentchecker
+
+        A GET request to this endpoint returns statistics about the tracker checks and the freshness of the health
+        (seeders/leechers) information of the torrents in the database. Times are in seconds.
+
+            **Example request**:
+
+            .. sourcecode:: none
+
+                curl -X GET http://localhost:8085/debug/torrentchecker
+
+            **Example response**:
+
+            .. sourcecode:: javascript
+
+                {
+                    "torrent_checker": {
+                        "tracker_sessions": 8,
+                        "max_tracker_sessions": 8,
+                        "tracker_checks": 1532,
+                        "failed_tracker_checks": 211,
+                        "checked_torrents": 98412,
+                        "freshness": {
+                            "torrents": 512345,
+                            "checked": 245112,
+                            "fresh": 20411,
+                            "due": 398012,
+                            "fresh_fraction": 0.04,
+                            "avg_check_age": 86012.5
+                        }
+                    }
+                }
+        """
+        torrent_checker = self.session.lm.torrent_checker
+        if not torrent_checker:
+            request.setResponseCode(http.NOT_FOUND)
+            return json.dumps({"error": "torrent checking not enabled"})
+
+        return json.dumps({"torrent_checker": torrent_checker.get_statistics()})
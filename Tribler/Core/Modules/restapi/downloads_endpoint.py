@@ -1,11 +1,16 @@
 import json
 import logging
+import os
 from twisted.web import http, resource
 from twisted.web.server import NOT_DONE_YET
 
 from Tribler.Core.DownloadConfig import DownloadStartupConfig
 from Tribler.Core.Libtorrent.LibtorrentDownloadImpl import LibtorrentStatisticsResponse
-from Tribler.Core.simpledefs import DOWNLOAD, UPLOAD, dlstatus_strings, DLMODE_VOD
+from Tribler.Core.simpledefs import DOWNLOAD, UPLOAD, dlstatus_strings, DLMODE_VOD, DLSTATUS_STOPPED, \
+    DLSTATUS_STOPPED_ON_ERROR
+
+# Deltas are only computed from this many revisions back, older revisions get all downloads and fields again
+MAX_DELTA_REVISIONS = 1000
 
 
 class DownloadBaseEndpoint(resource.Resource):
@@ -72,12 +77,30 @@ class DownloadsEndpoint(DownloadBaseEndpoint):
     starting, pausing and stopping downloads.
     """
 
+    def __init__(self, session):
+        DownloadBaseEndpoint.__init__(self, session)
+
+        # The revision is incremented whenever a field of a download changes, or a download is added or removed. The
+        # revisions handed out are prefixed with a random epoch, so revisions from before a restart are recognised.
+        self.epoch = os.urandom(4).encode('hex')
+        self.revision = 0
+        self.download_fields = {}  # Maps an infohash to a {field: (value, revision in which it last changed)} dict
+        self.removed_downloads = {}  # Maps the infohash of a removed download to the revision it was removed in
+
+        # The JSON of stopped downloads is reused while they do not change
+        self.stopped_downloads_json = {}  # Maps an infohash to a (state key, download JSON) tuple
+        self.compared_downloads_json = {}  # Maps an infohash to the download JSON last compared by update_revision
+
+        # The fields of a download that only change with its torrent definition, computed once per definition
+        self.static_fields = {}  # Maps an infohash to a (torrent definition, static fields) tuple
+        self.files_cache = {}  # Maps an infohash to a ((progress, selected files), files array) tuple
+
     def getChild(self, path, request):
         return DownloadSpecificEndpoint(self.session, path)
 
     def render_GET(self, request):
         """
-        .. http:get:: /downloads?get_peers=(boolean: get_peers)&get_pieces=(boolean: get_pieces)
+        .. http:get:: /downloads?get_peers=(boolean: get_peers)&get_pieces=(boolean: get_pieces)&revision=(str: revision)
 
         A GET request to this endpoint returns all downloads in Tribler, both active and inactive. The progress is a
         number ranging from 0 to 1, indicating the progress of the specific state (downloading, checking etc). The
@@ -88,6 +111,13 @@ class DownloadsEndpoint(DownloadBaseEndpoint):
         Note that setting this flag has a negative impact on performance and should only be used in situations
         where this data is required.
 
+        When a revision is passed, only the downloads and fields that changed after that revision are returned,
+        together with the infohashes of the downloads removed since then and the current revision, to be passed with
+        the next request. When the revision is unknown, for instance because it is from before a restart or too old,
+        or when revision 0 is passed, all downloads and fields are returned and full is true. The client should then
+        replace the downloads it has. The response has an ETag, so unchanged responses can be answered with
+        304 Not Modified.
+
             **Example request**:
 
             .. sourcecode:: none
@@ -148,6 +178,27 @@ class DownloadsEndpoint(DownloadBaseEndpoint):
                         "time_added": 1484819242,
                     }
                 }, ...]
+
+            **Example request**:
+
+            .. sourcecode:: none
+
+                curl -X GET http://localhost:8085/downloads?revision=8c2f1a07-1337
+
+            **Example response**:
+
+            .. sourcecode:: javascript
+
+                {
+                    "revision": "8c2f1a07-1342",
+                    "full": False,
+                    "downloads": [{
+                        "infohash": "4344503b7e797ebf31582327a5baae35b11bda01",
+                        "progress": 0.31459265,
+                        "speed_down": 4938.83
+                    }, ...],
+                    "removed": ["8bb88a02da691636a7ed929b87d467f24700e490"]
+                }
         """
         get_peers = False
         if 'get_peers' in request.args and len(request.args['get_peers']) > 0 \
@@ -159,67 +210,193 @@ class DownloadsEndpoint(DownloadBaseEndpoint):
                 and request.args['get_pieces'][0] == "1":
             get_pieces = True
 
-        downloads_json = []
-        downloads = self.session.get_downloads()
-        for download in downloads:
-            stats = download.network_create_statistics_reponse() or LibtorrentStatisticsResponse(0, 0, 0, 0, 0, 0, 0)
-            state = download.network_get_state(None, get_peers)
-
-            # Create files information of the download
+        downloads_json = [self.get_cached_download_json(download, get_peers, get_pieces)
+                          for download in self.session.get_downloads()]
+        self.update_revision(downloads_json)
+
+        since_revision = None
+        if 'revision' in request.args and len(request.args['revision']) > 0:
+            since_revision = self.parse_revision(request.args['revision'][0])
+
+        etag = '"%s-%d-%d-%d-%s"' % (self.epoch, self.revision, get_peers, get_pieces,
+                                     since_revision if since_revision is not None else "full")
+        if request.setETag(etag) == http.CACHED:
+            return ""
+
+        if since_revision is None:
+            return json.dumps({"downloads": downloads_json})
+
+        changed_downloads_json = []
+        for download_json in downloads_json:
+            fields = self.download_fields[download_json["infohash"]]
+            changed_json = dict((key, value) for key, value in download_json.iteritems()
+                                if fields[key][1] > since_revision)
+            if changed_json:
+                changed_json["infohash"] = download_json["infohash"]
+                changed_downloads_json.append(changed_json)
+
+        removed = [infohash for infohash, revision in self.removed_downloads.iteritems()
+                   if since_revision and revision > since_revision]
+        return json.dumps({"revision": "%s-%d" % (self.epoch, self.revision), "full": not since_revision,
+                           "downloads": changed_downloads_json, "removed": removed})
+
+    def parse_revision(self, revision):
+        """
+        Returns the revision number of a revision handed out by this endpoint, or 0 if changes cannot be computed
+        from it because it is from another epoch, too old or malformed.
+        """
+        epoch, _, revision_number = revision.partition('-')
+        if epoch != self.epoch or not revision_number.isdigit():
+            return 0
+        revision_number = int(revision_number)
+        if revision_number > self.revision or revision_number < self.revision - MAX_DELTA_REVISIONS:
+            return 0
+        return revision_number
+
+    def get_static_fields(self, download):
+        """
+        Returns the fields of a download that only depend on its torrent definition.
+        """
+        tdef = download.get_def()
+        infohash = tdef.get_infohash()
+        cached = self.static_fields.get(infohash)
+        if cached is None or cached[0] is not tdef:
+            static_fields = {"name": tdef.get_name(), "infohash": infohash.encode('hex'), "size": tdef.get_length(),
+                             "files": list(enumerate(tdef.get_files_with_length()))}
+            cached = self.static_fields[infohash] = (tdef, static_fields)
+        return cached[1]
+
+    def get_files_json(self, download, state, static_fields):
+        """
+        Returns the files array of a download. It is only rebuilt when the progress or the file selection changed.
+        """
+        infohash = download.get_def().get_infohash()
+        selected_files = download.get_selected_files()
+        key = (download.get_progress(), tuple(selected_files), len(static_fields["files"]))
+        cached = self.files_cache.get(infohash)
+        if cached is None or cached[0] != key:
             files_completion = dict((name, progress) for name, progress in state.get_files_completion())
-            selected_files = download.get_selected_files()
-            files_array = []
-            file_index = 0
-            for file, size in download.get_def().get_files_with_length():
-                files_array.append({"index": file_index, "name": file, "size": size,
-                                    "included": (file in selected_files or not selected_files),
-                                    "progress": files_completion.get(file, 0.0)})
-                file_index += 1
-
-            # Create tracker information of the download
-            tracker_info = []
-            for url, url_info in download.network_tracker_status().iteritems():
-                tracker_info.append({"url": url, "peers": url_info[0], "status": url_info[1]})
-
-            ratio = 0.0
-            if stats.downTotal > 0:
-                ratio = stats.upTotal / float(stats.downTotal)
-
-            download_json = {"name": download.get_def().get_name(), "progress": download.get_progress(),
-                             "infohash": download.get_def().get_infohash().encode('hex'),
-                             "speed_down": download.get_current_speed(DOWNLOAD),
-                             "speed_up": download.get_current_speed(UPLOAD),
-                             "status": dlstatus_strings[download.get_status()],
-                             "size": download.get_def().get_length(), "eta": download.network_calc_eta(),
-                             "num_peers": stats.numPeers, "num_seeds": stats.numSeeds, "total_up": stats.upTotal,
-                             "total_down": stats.downTotal, "ratio": ratio,
-                             "files": files_array, "trackers": tracker_info, "hops": download.get_hops(),
-                             "anon_download": download.get_anon_mode(), "safe_seeding": download.get_safe_seeding(),
-                             # Maximum upload/download rates are set for entire sessions
-                             "max_upload_speed": self.session.config.get_libtorrent_max_upload_rate(),
-                             "max_download_speed": self.session.config.get_libtorrent_max_download_rate(),
-                             "destination": download.get_dest_dir(), "availability": state.get_availability(),
-                             "total_pieces": download.get_num_pieces(), "vod_mode": download.get_mode() == DLMODE_VOD,
-                             "vod_prebuffering_progress": state.get_vod_prebuffering_progress(),
-                             "vod_prebuffering_progress_consec": state.get_vod_prebuffering_progress_consec(),
-                             "error": repr(state.get_error()) if state.get_error() else "",
-                             "time_added": download.get_time_added()}
-
-            # Add peers information if requested
-            if get_peers:
-                peer_list = state.get_peerlist()
-                for peer_info in peer_list:  # Remove have field since it is very large to transmit.
-                    del peer_info['have']
-                    peer_info['id'] = peer_info['id'].encode('hex')
-
-                download_json["peers"] = peer_list
-
-            # Add piece information if requested
-            if get_pieces:
-                download_json["pieces"] = download.get_pieces_base64()
-
-            downloads_json.append(download_json)
-        return json.dumps({"downloads": downloads_json})
+            files_array = [{"index": file_index, "name": file_name, "size": size,
+                            "included": (file_name in selected_files or not selected_files),
+                            "progress": files_completion.get(file_name, 0.0)}
+                           for file_index, (file_name, size) in static_fields["files"]]
+            cached = self.files_cache[infohash] = (key, files_array)
+        return cached[1]
+
+    def get_cached_download_json(self, download, get_peers, get_pieces):
+        """
+        Returns the JSON dictionary of a download. The JSON of a stopped download is reused while its state and
+        settings do not change, so it is not built again for every request.
+        """
+        status = download.get_status()
+        if status not in (DLSTATUS_STOPPED, DLSTATUS_STOPPED_ON_ERROR):
+            return self.get_download_json(download, get_peers, get_pieces)
+
+        tdef = download.get_def()
+        key = (status, download.get_progress(), tdef, download.get_hops(), download.get_safe_seeding(),
+               download.get_dest_dir(), download.get_mode(), tuple(download.get_selected_files()),
+               download.get_time_added(), self.session.config.get_libtorrent_max_upload_rate(),
+               self.session.config.get_libtorrent_max_download_rate(), get_peers, get_pieces)
+        cached = self.stopped_downloads_json.get(tdef.get_infohash())
+        if cached is None or cached[0] != key:
+            cached = self.stopped_downloads_json[tdef.get_infohash()] = \
+                (key, self.get_download_json(download, get_peers, get_pieces))
+        return cached[1]
+
+    def get_download_json(self, download, get_peers, get_pieces):
+        """
+        Returns the JSON dictionary with all information about a download.
+        """
+        stats = download.network_create_statistics_reponse() or LibtorrentStatisticsResponse(0, 0, 0, 0, 0, 0, 0)
+        state = download.network_get_state(None, get_peers)
+        static_fields = self.get_static_fields(download)
+
+        # Create tracker information of the download
+        tracker_info = []
+        for url, url_info in download.network_tracker_status().iteritems():
+            tracker_info.append({"url": url, "peers": url_info[0], "status": url_info[1]})
+
+        ratio = 0.0
+        if stats.downTotal > 0:
+            ratio = stats.upTotal / float(stats.downTotal)
+
+        download_json = {"name": static_fields["name"], "progress": download.get_progress(),
+                         "infohash": static_fields["infohash"],
+                         "speed_down": download.get_current_speed(DOWNLOAD),
+                         "speed_up": download.get_current_speed(UPLOAD),
+                         "status": dlstatus_strings[download.get_status()],
+                         "size": static_fields["size"], "eta": download.network_calc_eta(),
+                         "num_peers": stats.numPeers, "num_seeds": stats.numSeeds, "total_up": stats.upTotal,
+                         "total_down": stats.downTotal, "ratio": ratio,
+                         "files": self.get_files_json(download, state, static_fields), "trackers": tracker_info,
+                         "hops": download.get_hops(),
+                         "anon_download": download.get_anon_mode(), "safe_seeding": download.get_safe_seeding(),
+                         # Maximum upload/download rates are set for entire sessions
+                         "max_upload_speed": self.session.config.get_libtorrent_max_upload_rate(),
+                         "max_download_speed": self.session.config.get_libtorrent_max_download_rate(),
+                         "destination": download.get_dest_dir(), "availability": state.get_availability(),
+                         "total_pieces": download.get_num_pieces(), "vod_mode": download.get_mode() == DLMODE_VOD,
+                         "vod_prebuffering_progress": state.get_vod_prebuffering_progress(),
+                         "vod_prebuffering_progress_consec": state.get_vod_prebuffering_progress_consec(),
+                         "error": repr(state.get_error()) if state.get_error() else "",
+                         "time_added": download.get_time_added()}
+
+        # Add peers information if requested
+        if get_peers:
+            peer_list = state.get_peerlist()
+            for peer_info in peer_list:  # Remove have field since it is very large to transmit.
+                del peer_info['have']
+                peer_info['id'] = peer_info['id'].encode('hex')
+
+            download_json["peers"] = peer_list
+
+        # Add piece information if requested
+        if get_pieces:
+            download_json["pieces"] = download.get_pieces_base64()
+
+        return download_json
+
+    def update_revision(self, downloads_json):
+        """
+        Compares the fields of the downloads with the previous request and records the revision in which they changed.
+        Removed downloads are forgotten once deltas are no longer computed from the revision they were removed in.
+        """
+        new_revision = self.revision + 1
+        changed = False
+
+        for download_json in downloads_json:
+            # The JSON of a stopped download that is reused has not changed since it was last compared
+            if self.compared_downloads_json.get(download_json["infohash"]) is download_json:
+                continue
+            self.compared_downloads_json[download_json["infohash"]] = download_json
+
+            fields = self.download_fields.get(download_json["infohash"])
+            if fields is None:
+                fields = self.download_fields[download_json["infohash"]] = {}
+                self.removed_downloads.pop(download_json["infohash"], None)
+
+            for key, value in download_json.iteritems():
+                previous = fields.get(key)
+                if previous is None or previous[0] != value:
+                    fields[key] = (value, new_revision)
+                    changed = True
+
+        current_infohashes = set(download_json["infohash"] for download_json in downloads_json)
+        for infohash in set(self.download_fields) - current_infohashes:
+            del self.download_fields[infohash]
+            self.compared_downloads_json.pop(infohash, None)
+            self.static_fields.pop(infohash.decode('hex'), None)
+            self.files_cache.pop(infohash.decode('hex'), None)
+            self.stopped_downloads_json.pop(infohash.decode('hex'), None)
+            self.removed_downloads[infohash] = new_revision
+            changed = True
+
+        if changed:
+            self.revision = new_revision
+
+        for infohash, revision in self.removed_downloads.items():
+            if revision <= self.revision - MAX_DELTA_REVISIONS:
+                del self.removed_downloads[infohash]
 
     def render_PUT(self, request):
         """
@@ -1,12 +1,16 @@
 import json
 import logging
 from twisted.web import http, resource
+from twisted.web.server import NOT_DONE_YET
 
 from Tribler.Core.Utilities.search_utils import split_into_keywords
 from Tribler.Core.exceptions import OperationNotEnabledByConfigurationException
 from Tribler.Core.simpledefs import NTFY_CHANNELCAST, NTFY_TORRENTS, SIGNAL_TORRENT, SIGNAL_ON_SEARCH_RESULTS, \
     SIGNAL_CHANNEL
 
+# The maximum number of local torrent results returned for a single search request
+DEFAULT_SEARCH_LIMIT = 250
+
 
 class SearchEndpoint(resource.Resource):
     """
@@ -26,11 +30,13 @@ class SearchEndpoint(resource.Resource):
 
     def render_GET(self, request):
         """
-        .. http:get:: /search?q=(string:query)
+        .. http:get:: /search?q=(string:query)&limit=(int:max nr of torrents)&offset=(int:nr of torrents to skip)
 
         A GET request to this endpoint will create a search. Results are returned over the events endpoint, one by one.
         First, the results available in the local database will be pushed. After that, incoming Dispersy results are
         pushed. The query to this endpoint is passed using the url, i.e. /search?q=pioneer.
+        You can optionally specify the limit and offset parameters to page through the local torrent results, which
+        are ordered by relevance. By default, the 250 most relevant torrents are returned.
 
             **Example request**:
 
@@ -63,6 +69,21 @@ class SearchEndpoint(resource.Resource):
             request.setResponseCode(http.BAD_REQUEST)
             return json.dumps({"error": "query parameter missing"})
 
+        limit = DEFAULT_SEARCH_LIMIT
+        offset = 0
+        try:
+            if 'limit' in request.args and len(request.args['limit']) > 0:
+                limit = int(request.args['limit'][0])
+            if 'offset' in request.args and len(request.args['offset']) > 0:
+                offset = int(request.args['offset'][0])
+        except ValueError:
+            request.setResponseCode(http.BAD_REQUEST)
+            return json.dumps({"error": "the limit and offset parameters must be numbers"})
+
+        if limit <= 0 or offset < 0:
+            request.setResponseCode(http.BAD_REQUEST)
+            return json.dumps({"error": "the limit must be positive and the offset must not be negative"})
+
         # Notify the events endpoint that we are starting a new search query
         self.events_endpoint.start_new_query()
 
@@ -75,18 +96,52 @@ class SearchEndpoint(resource.Resource):
 
         torrent_db_columns = ['T.torrent_id', 'infohash', 'T.name', 'length', 'category',
                               'num_seeders', 'num_leechers', 'last_tracker_check']
-        results_local_torrents = self.torrent_db_handler.search_in_local_torrents_db(query, keys=torrent_db_columns)
-        results_dict = {"keywords": keywords, "result_list": results_local_torrents}
-        self.session.notifier.notify(SIGNAL_TORRENT, SIGNAL_ON_SEARCH_RESULTS, None, results_dict)
-
-        # Create remote searches
-        try:
-            self.session.search_remote_torrents(keywords)
-            self.session.search_remote_channels(keywords)
-        except OperationNotEnabledByConfigurationException as exc:
-            self._logger.error(exc)
-
-        return json.dumps({"queried": True})
+        search_cache = self.session.lm.search_cache
+
+        def on_local_torrents_searched(results_local_torrents, cache_key, cache_generation):
+            infohash_index = torrent_db_columns.index('infohash')
+            search_cache.put(cache_key, results_local_torrents,
+                             [result[infohash_index] for result in results_local_torrents], cache_generation)
+            return results_local_torrents
+
+        def on_local_torrents(results_local_torrents):
+            results_dict = {"keywords": keywords, "result_list": results_local_torrents}
+            self.session.notifier.notify(SIGNAL_TORRENT, SIGNAL_ON_SEARCH_RESULTS, None, results_dict)
+
+            # Create remote searches
+            try:
+                self.session.search_remote_torrents(keywords)
+                self.session.search_remote_channels(keywords)
+            except OperationNotEnabledByConfigurationException as exc:
+                self._logger.error(exc)
+
+            request.write(json.dumps({"queried": True}))
+            request.finish()
+
+        def on_search_error(failure):
+            self._logger.error("Error when searching the local database: %s", failure.getErrorMessage())
+            request.setResponseCode(http.INTERNAL_SERVER_ERROR)
+            request.write(json.dumps({"error": failure.getErrorMessage()}))
+            request.finish()
+
+        # The local torrent search runs on the read pool of the database, off the reactor thread. Repeated queries
+        # (i.e. when retyping or paging) are served from the search cache.
+        if search_cache:
+            cache_key = (search_cache.get_query_key(query), limit, offset)
+            cached_results = search_cache.get(cache_key)
+            if cached_results is not None:
+                on_local_torrents(cached_results)
+                return NOT_DONE_YET
+
+            search_deferred = self.torrent_db_handler.search_in_local_torrents_db_async(
+                query, keys=torrent_db_columns, limit=limit, offset=offset)
+            search_deferred.addCallback(on_local_torrents_searched, cache_key, search_cache.generation)
+        else:
+            search_deferred = self.torrent_db_handler.search_in_local_torrents_db_async(
+                query, keys=torrent_db_columns, limit=limit, offset=offset)
+        search_deferred.addCallbacks(on_local_torrents, on_search_error)
+
+        return NOT_DONE_YET
 
 
 class SearchCompletionsEndpoint(resource.Resource):
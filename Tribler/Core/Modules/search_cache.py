@@ -0,0 +1,114 @@
+import logging
+import time
+from collections import OrderedDict
+from threading import RLock
+
+from Tribler.Core.Utilities.search_utils import split_into_keywords
+from Tribler.Core.simpledefs import NTFY_TORRENTS, NTFY_INSERT, NTFY_UPDATE
+
+SEARCH_CACHE_MAX_ENTRIES = 128
+SEARCH_CACHE_TTL = 300  # Cached search results are dropped after 5 minutes
+
+
+class SearchResultCache(object):
+    """
+    This class caches the results of local torrent searches, keyed by the normalized keywords of the query.
+    The cache is bounded both in the number of entries (least recently used entries are dropped first) and in time.
+    Entries are invalidated when torrents are inserted or updated in the database, so new results still show up.
+    """
+
+    def __init__(self, session, max_entries=SEARCH_CACHE_MAX_ENTRIES, ttl=SEARCH_CACHE_TTL):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.session = session
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        # Maps a query key to a tuple of (insertion time, results, infohashes in the results)
+        self._entries = OrderedDict()
+        self._lock = RLock()
+
+        # Incremented on every invalidation, so results of searches that raced with a change are not cached
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def initialize(self):
+        self.session.add_observer(self.on_torrents_changed, NTFY_TORRENTS, [NTFY_INSERT, NTFY_UPDATE])
+
+    def shutdown(self):
+        self.session.remove_observer(self.on_torrents_changed)
+        self.clear()
+
+    @staticmethod
+    def get_query_key(query):
+        """
+        Returns the key under which the results of a query are cached. Queries that only differ in case, word order,
+        stopwords or punctuation share the same key.
+        """
+        return frozenset(split_into_keywords(query, to_filter_stopwords=True))
+
+    def get(self, key):
+        """
+        Returns the cached results for a key, or None if there are no (valid) results cached.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                self.misses += 1
+                return None
+
+            # Move the entry to the end, so it is the most recently used one
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, results, infohashes, generation=None):
+        """
+        Caches the results of a query.
+        :param key: The key of the query, see get_query_key.
+        :param results: The results to cache.
+        :param infohashes: The (binary) infohashes of the torrents in the results.
+        :param generation: The generation of the cache when the query was started. If the cache has been invalidated
+                           since, the results might be outdated and are not cached.
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time(), results, frozenset(infohashes))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def on_torrents_changed(self, subject, change_type, infohash, *args):
+        """
+        Invalidates cached results when the torrents in the database change. An inserted torrent might match any
+        query, so all entries are dropped. An updated torrent only affects the entries that contain it. Updates of
+        many torrents at once are notified with None as infohash and the list of infohashes as argument.
+        """
+        with self._lock:
+            if change_type == NTFY_INSERT or (infohash is None and not args):
+                invalid_keys = self._entries.keys()
+            else:
+                infohashes = args[0] if infohash is None else (infohash,)
+                invalid_keys = [key for key, entry in self._entries.iteritems() if not entry[2].isdisjoint(infohashes)]
+
+            for key in invalid_keys:
+                del self._entries[key]
+            self.invalidations += len(invalid_keys)
+            self.generation += 1
+
+    def get_statistics(self):
+        """
+        Returns a dictionary with the statistics of this cache.
+        """
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "ttl": self.ttl,
+                    "hits": self.hits, "misses": self.misses, "invalidations": self.invalidations}
@@ -152,3 +152,22 @@ class TrackerManager(object):
         if next_tracker_url is None:
             return
         return next_tracker_url, next_tracker_info
+
+    @call_on_reactor_thread
+    def get_next_trackers_for_auto_check(self, max_trackers, exclude=()):
+        """
+        Gets the next trackers for automatic tracker-checking, the trackers that have been checked longest ago first.
+        Trackers that failed recently are skipped, see should_check_tracker. The DHT cannot be scraped, so it is
+        never returned.
+        :param max_trackers: The maximum number of trackers to return.
+        :param exclude: The URLs of trackers that should not be returned, for instance because they are being checked.
+        :return: A list with the URLs of the next trackers for automatic tracker-checking.
+        """
+        tracker_urls = []
+        for tracker_url, _ in sorted(self._tracker_dict.iteritems(), key=lambda d: d[1][u'last_check']):
+            if len(tracker_urls) >= max_trackers:
+                break
+            if tracker_url not in (u'DHT', u'no-DHT') and tracker_url not in exclude \
+                    and self.should_check_tracker(tracker_url):
+                tracker_urls.append(tracker_url)
+        return tracker_urls
@@ -10,7 +10,7 @@ import sys
 import time
 from binascii import hexlify
 from twisted.internet import threads
-from twisted.internet.defer import inlineCallbacks, fail
+from twisted.internet.defer import inlineCallbacks, fail, succeed
 from twisted.python.failure import Failure
 from twisted.python.log import addObserver
 from twisted.python.threadable import isInIOThread
@@ -369,7 +369,7 @@ class Session(object):
     #
     # Notification of events in the Session
     #
-    def add_observer(self, observer_function, subject, change_types=None, object_id=None, cache=0):
+    def add_observer(self, observer_function, subject, change_types=None, object_id=None, cache=0, coalesce=False):
         """
         Add an observer function function to the Session. The observer
         function will be called when one of the specified events (changeTypes)
@@ -387,9 +387,11 @@ class Session(object):
         :param object_id: The specific object in the subject to monitor (e.g. a
         specific primary key in a database to monitor for updates.)
         :param cache: the time to bundle/cache events matching this function
+        :param coalesce: whether only the last event of each object_id should be kept when bundling events
         """
         change_types = change_types or [NTFY_UPDATE, NTFY_INSERT, NTFY_DELETE]
-        self.notifier.add_observer(observer_function, subject, change_types, object_id, cache=cache)
+        self.notifier.add_observer(observer_function, subject, change_types, object_id, cache=cache,
+                                   coalesce=coalesce)
 
     def remove_observer(self, function):
         """
@@ -488,9 +490,12 @@ class Session(object):
 
         if self.config.get_upgrader_enabled():
             self.upgrader = TriblerUpgrader(self, self.sqlite_db)
-            self.upgrader.run()
+            upgrade_deferred = self.upgrader.run()
+        else:
+            upgrade_deferred = succeed(None)
 
-        startup_deferred = self.lm.register(self, self.session_lock)
+        # The database may only be used once the upgrade, which can take a while, is done
+        startup_deferred = upgrade_deferred.addCallback(lambda _: self.lm.register(self, self.session_lock))
 
         def load_checkpoint(_):
             if self.config.get_libtorrent_enabled():
@@ -670,6 +675,17 @@ class Session(object):
 
         del self.lm.torrent_store[hexlify(infohash)]
 
+    def delete_collected_torrents(self, infohashes):
+        """
+        Deletes the given torrents from the torrent_store database at once.
+
+        :param infohashes: a list of infohash binaries
+        """
+        if not self.config.get_torrent_store_enabled():
+            raise OperationNotEnabledByConfigurationException("torrent_store is not enabled")
+
+        self.lm.torrent_store.delete_many([hexlify(infohash) for infohash in infohashes])
+
     def search_remote_torrents(self, keywords):
         """
         Searches for remote torrents through SearchCommunity with the given keywords.
@@ -1,5 +1,6 @@
 import logging
 from base64 import b64encode
+from collections import OrderedDict
 from binascii import hexlify
 from hashlib import sha1
 from random import randint
@@ -14,7 +15,7 @@ from Tribler.dispersy.util import call_on_reactor_thread, blocking_call_on_react
 from .exception import InvalidPacketException, FileNotFound
 from .packet import (encode_packet, decode_packet, OPCODE_RRQ, OPCODE_WRQ, OPCODE_ACK, OPCODE_DATA, OPCODE_OACK,
                      OPCODE_ERROR, ERROR_DICT)
-from .session import Session, DEFAULT_BLOCK_SIZE, DEFAULT_TIMEOUT
+from .session import Session, DEFAULT_BLOCK_SIZE, DEFAULT_TIMEOUT, DEFAULT_WINDOW_SIZE
 
 MAX_INT16 = 2 ** 16 - 1
 
@@ -23,6 +24,8 @@ METADATA_PREFIX = "metadata" + SEPARATOR
 
 DEFAULT_RETIES = 5
 
+MAX_LOCKSTEP_ADDRESSES = 1024  # the number of peers without window support that are remembered
+
 
 class TftpHandler(TaskManager):
 
@@ -31,7 +34,7 @@ class TftpHandler(TaskManager):
     """
 
     def __init__(self, session, endpoint, prefix, block_size=DEFAULT_BLOCK_SIZE, timeout=DEFAULT_TIMEOUT,
-                 max_retries=DEFAULT_RETIES):
+                 max_retries=DEFAULT_RETIES, window_size=DEFAULT_WINDOW_SIZE):
         """ The constructor.
         :param session:     The tribler session.
         :param endpoint:    The endpoint to use.
@@ -39,6 +42,7 @@ class TftpHandler(TaskManager):
         :param block_size:  Transmission block size.
         :param timeout:     Transmission timeout.
         :param max_retries: Transmission maximum retries.
+        :param window_size: Maximum number of DATA packets in flight before an ACK is needed.
         """
         super(TftpHandler, self).__init__()
         self._logger = logging.getLogger(self.__class__.__name__)
@@ -51,12 +55,17 @@ class TftpHandler(TaskManager):
         self._block_size = block_size
         self._timeout = timeout
         self._max_retries = max_retries
+        self._window_size = window_size
 
         self._timeout_check_interval = 0.5
 
         self._session_id_dict = {}
         self._session_dict = {}
 
+        # Peers that did not answer a request with a windowsize option, we fall back to lock-step transfers for them.
+        # The least recently used peers are forgotten first.
+        self._lockstep_addresses = OrderedDict()
+
         self._callback_scheduled = False
         self._callbacks = []
 
@@ -123,9 +132,14 @@ class TftpHandler(TaskManager):
         # create session
         assert session_id is not None, u"session_id = %s" % session_id
         self._logger.debug(u"start downloading %s from %s:%s, sid = %s", file_name, ip, port, session_id)
+        window_size = self._window_size
+        if self._lockstep_addresses.pop((ip, port), None):
+            self._lockstep_addresses[(ip, port)] = True
+            window_size = 1
         session = Session(True, session_id, (ip, port), OPCODE_RRQ, file_name, '', None, None,
                           extra_info=extra_info, block_size=self._block_size, timeout=self._timeout,
-                          success_callback=success_callback, failure_callback=failure_callback)
+                          window_size=window_size, success_callback=success_callback,
+                          failure_callback=failure_callback)
 
         self._add_new_session(session)
         self._send_request_packet(session)
@@ -169,10 +183,29 @@ class TftpHandler(TaskManager):
             if session.retries < self._max_retries and session.last_sent_packet['opcode'] in (OPCODE_ACK, OPCODE_DATA):
                 self._send_packet(session, session.last_sent_packet)
                 session.retries += 1
+                session.packets_retransmitted += 1
+            elif session.retries < self._max_retries and session.last_sent_packet['opcode'] == OPCODE_RRQ \
+                    and session.window_size > 1 and not session.packets_received:
+                # older peers drop requests with options they do not know, ask again without a window
+                self._logger.info(u"%s got no answer to a windowed request, falling back to lock-step", session)
+                self._add_lockstep_address(session.address)
+                session.window_size = 1
+                self._send_request_packet(session)
+                session.retries += 1
             else:
                 has_failed = True
         return has_failed
 
+    def _add_lockstep_address(self, address):
+        """
+        Remembers that a peer does not support windows, forgetting the least recently used peer if there are too many.
+        :param address: The (IP, port) address tuple of the peer.
+        """
+        self._lockstep_addresses.pop(address, None)
+        self._lockstep_addresses[address] = True
+        if len(self._lockstep_addresses) > MAX_LOCKSTEP_ADDRESSES:
+            self._lockstep_addresses.popitem(last=False)
+
     def _schedule_callback_processing(self):
         """
         Schedules a task to process callbacks.
@@ -253,7 +286,10 @@ class TftpHandler(TaskManager):
                     msg = "download failed", ei = session.extra_info: cb(a, fn, msg, ei)
                 self._callbacks.append(callback)
         elif session.is_done:
-            self._logger.info(u"%s finished", session)
+            statistics = session.get_statistics()
+            self._logger.info(u"%s finished, %s bytes in %.2f seconds (%.1f KB/s), %s packets retransmitted",
+                              session, statistics["bytes"], statistics["duration"], statistics["throughput"] / 1024,
+                              statistics["packets_retransmitted"])
             if session.success_callback:
                 callback = lambda cb = session.success_callback, a = session.address, fn = session.file_name,\
                     fd = session.file_data, ei = session.extra_info: cb(a, fn, fd, ei)
@@ -283,6 +319,7 @@ class TftpHandler(TaskManager):
         file_name = packet['file_name'].decode('utf8')
         block_size = packet['options']['blksize']
         timeout = packet['options']['timeout']
+        window_size = max(1, min(packet['options'].get('windowsize', 1), self._window_size))
 
         # check session_id
         if (ip, port, packet['session_id']) in self._session_dict:
@@ -318,7 +355,8 @@ class TftpHandler(TaskManager):
 
         # create a session object
         session = Session(False, packet['session_id'], (ip, port), packet['opcode'],
-                          file_name, file_data, file_size, checksum, block_size=block_size, timeout=timeout)
+                          file_name, file_data, file_size, checksum, block_size=block_size, timeout=timeout,
+                          window_size=window_size)
 
         # insert session_id and session
         self._add_new_session(session)
@@ -359,7 +397,7 @@ class TftpHandler(TaskManager):
         """
         start_idx = session.block_number * session.block_size
         end_idx = start_idx + session.block_size
-        data = session.file_data[start_idx:end_idx]
+        data = session.file_view[start_idx:end_idx]
         session.block_number += 1
 
         # check if we are done
@@ -373,6 +411,7 @@ class TftpHandler(TaskManager):
         :param packet: The incoming packet dictionary.
         """
         session.last_contact_time = time()
+        session.packets_received += 1
         # check if it is an ERROR packet
         if packet['opcode'] == OPCODE_ERROR:
             self._logger.warning(u"%s got ERROR message: code = %s, msg = %s",
@@ -408,6 +447,16 @@ class TftpHandler(TaskManager):
                     self._handle_error(session, 0, error_msg=msg)  # Error: timeout mismatch
                     return
 
+                # peers that do not support windows leave out the option, and never send more than we asked for
+                window_size = packet['options'].get('windowsize', 1)
+                if not 1 <= window_size <= session.window_size:
+                    msg = "%s OACK windowsize mismatch: %s > %s (expected)" %\
+                          (session, window_size, session.window_size)
+                    self._logger.error(msg)
+                    self._handle_error(session, 8, error_msg=msg)  # Error: failed to negotiate options
+                    return
+
+                session.window_size = window_size
                 session.file_size = packet['options']['tsize']
                 session.checksum = packet['options']['checksum']
 
@@ -415,7 +464,7 @@ class TftpHandler(TaskManager):
                     # send ACK
                     self._send_ack_packet(session, session.block_number)
                     session.block_number += 1
-                    session.file_data = ""
+                    session.file_blocks = []
 
             else:
                 self._logger.error(u"%s Got OPCODE %s which is not expected", session, packet['opcode'])
@@ -437,21 +486,33 @@ class TftpHandler(TaskManager):
                               session, packet['block_number'], session.block_number)
             return
 
-        if packet['block_number'] != session.block_number:
-            msg = "%s Got ACK with block# %s while expecting %s" %\
-                  (session, packet['block_number'], session.block_number)
-            self._logger.error(msg)
-            self._handle_error(session, 0, error_msg=msg)  # Error: block_number mismatch
+        if packet['block_number'] > session.block_number:
+            # a block of the window got lost, acknowledge the blocks we got so the sender continues from there
+            if not session.is_gap_acked:
+                self._logger.debug(u"%s missed DATA %s, got %s", session, session.block_number, packet['block_number'])
+                self._send_ack_packet(session, session.block_number - 1)
+                session.blocks_since_ack = 0
+                session.is_gap_acked = True
             return
 
         # save data
-        session.file_data += packet['data']
-        self._send_ack_packet(session, session.block_number)
+        session.file_blocks.append(packet['data'])
+        session.bytes_transferred += len(packet['data'])
         session.block_number += 1
+        session.blocks_since_ack += 1
+        session.is_gap_acked = False
+
+        # acknowledge every full window and the last block
+        is_last_block = len(packet['data']) < session.block_size
+        if is_last_block or session.blocks_since_ack >= session.window_size:
+            self._send_ack_packet(session, session.block_number - 1)
+            session.blocks_since_ack = 0
 
         # check if it is the end
-        if len(packet['data']) < session.block_size:
+        if is_last_block:
             self._logger.info(u"%s transfer finished. checking data integrity...", session)
+            session.file_data = "".join(session.file_blocks)
+            session.file_blocks = []
             # check file size and checksum
             if session.file_size != len(session.file_data):
                 self._logger.error(u"%s file size %s doesn't match expectation %s",
@@ -481,25 +542,38 @@ class TftpHandler(TaskManager):
 
         # check block number
         # ignore old ones, they may be retransmissions
-        if packet['block_number'] < session.block_number:
+        if packet['block_number'] < session.acked_block_number:
             self._logger.warn(u"%s ignore old block number ACK %s < %s",
-                              session, packet['block_number'], session.block_number)
+                              session, packet['block_number'], session.acked_block_number)
             return
 
-        if packet['block_number'] != session.block_number:
+        if packet['block_number'] > session.block_number:
             msg = "%s got ACK with block# %s while expecting %s" %\
                   (session, packet['block_number'], session.block_number)
             self._logger.error(msg)
             self._handle_error(session, 0, error_msg=msg)  # Error: block_number mismatch
             return
 
-        if session.is_waiting_for_last_ack:
+        session.acked_block_number = packet['block_number']
+        session.bytes_transferred = min(session.acked_block_number * session.block_size, session.file_size)
+
+        if packet['block_number'] < session.block_number:
+            # the receiver missed a block of the window, continue from the first block it did not get
+            self._logger.debug(u"%s resending from DATA %s", session, packet['block_number'] + 1)
+            session.packets_retransmitted += session.block_number - packet['block_number']
+            session.block_number = packet['block_number']
+            session.is_waiting_for_last_ack = False
+
+        elif session.is_waiting_for_last_ack:
             session.is_done = True
             return
 
-        data = self._get_next_data(session)
-        # send DATA
-        self._send_data_packet(session, session.block_number, data)
+        # send a window of DATA
+        for _ in xrange(session.window_size):
+            data = self._get_next_data(session)
+            self._send_data_packet(session, session.block_number, data)
+            if session.is_waiting_for_last_ack:
+                break
 
     def _handle_error(self, session, error_code, error_msg=""):
         """ Handles an error during packet processing.
@@ -521,6 +595,7 @@ class TftpHandler(TaskManager):
         # update information
         session.last_contact_time = time()
         session.last_sent_packet = packet
+        session.packets_sent += 1
 
     def _send_request_packet(self, session):
         assert session.request == OPCODE_RRQ, u"Invalid request_opcode %s" % repr(session.request)
@@ -531,6 +606,9 @@ class TftpHandler(TaskManager):
                   'options': {'blksize': session.block_size,
                               'timeout': session.timeout,
                               }}
+        # only ask for a window if we want one, older peers do not know this option
+        if session.window_size > 1:
+            packet['options']['windowsize'] = session.window_size
         self._send_packet(session, packet)
 
     def _send_data_packet(self, session, block_number, data):
@@ -563,4 +641,6 @@ class TftpHandler(TaskManager):
                               'tsize': session.file_size,
                               'checksum': session.checksum,
                               }}
+        if session.window_size > 1:
+            packet['options']['windowsize'] = session.window_size
         self._send_packet(session, packet)
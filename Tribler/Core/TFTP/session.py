@@ -7,26 +7,37 @@ DEFAULT_BLOCK_SIZE = 512
 # default timeout and maximum retries
 DEFAULT_TIMEOUT = 2
 
+# default number of DATA packets sent before waiting for an ACK (RFC 7440), 1 means lock-step
+DEFAULT_WINDOW_SIZE = 1
+
 
 class Session(object):
 
     def __init__(self, is_client, session_id, address, request, file_name, file_data, file_size, checksum,
                  extra_info=None, block_size=DEFAULT_BLOCK_SIZE, timeout=DEFAULT_TIMEOUT,
-                 success_callback=None, failure_callback=None):
+                 window_size=DEFAULT_WINDOW_SIZE, success_callback=None, failure_callback=None):
         self.is_client = is_client
         self.session_id = session_id
         self.address = address
         self.request = request
         self.file_name = file_name
         self.file_data = file_data
+        # the sender slices blocks out of this view, so they are not copied until they are sent
+        self.file_view = memoryview(file_data) if file_data is not None else None
+        # the receiver collects the blocks here and joins them when the transfer is finished
+        self.file_blocks = []
         self.file_size = file_size
         self.checksum = checksum
 
         self.extra_info = extra_info
 
         self.block_number = 0
+        self.acked_block_number = 0
         self.block_size = block_size
         self.timeout = timeout
+        self.window_size = window_size
+        self.blocks_since_ack = 0
+        self.is_gap_acked = False
         self.success_callback = success_callback
         self.failure_callback = failure_callback
 
@@ -37,11 +48,33 @@ class Session(object):
 
         self.retries = 0
 
+        self.start_time = time()
+        self.bytes_transferred = 0
+        self.packets_sent = 0
+        self.packets_received = 0
+        self.packets_retransmitted = 0
+
         self.is_done = False
         self.is_failed = False
 
         self.next_func = None
 
+    def get_throughput(self):
+        """
+        Returns the average number of file bytes per second transferred in this session so far.
+        """
+        duration = time() - self.start_time
+        return self.bytes_transferred / duration if duration > 0 else 0.0
+
+    def get_statistics(self):
+        """
+        Returns a dictionary with the transfer statistics of this session.
+        """
+        return {"bytes": self.bytes_transferred, "duration": time() - self.start_time,
+                "throughput": self.get_throughput(), "window_size": self.window_size,
+                "packets_sent": self.packets_sent, "packets_received": self.packets_received,
+                "packets_retransmitted": self.packets_retransmitted}
+
     def __str__(self):
         type_str = "C" if self.is_client else "S"
         return "TFTP[%s %s %s:%s][%s]" % (self.session_id, type_str, self.address[0], self.address[1],
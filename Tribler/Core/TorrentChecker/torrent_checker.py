@@ -1,12 +1,12 @@
 import logging
 import time
-from binascii import hexlify
+from binascii import hexlify, unhexlify
 from twisted.internet import reactor
 from twisted.internet.defer import DeferredList, CancelledError, fail, succeed
 from twisted.internet.error import ConnectingCancelledError
 from twisted.python.failure import Failure
 
-from Tribler.Core.TorrentChecker.session import create_tracker_session, FakeDHTSession
+from Tribler.Core.TorrentChecker.session import create_tracker_session, FakeDHTSession, MAX_TRACKER_MULTI_SCRAPE
 from Tribler.Core.Utilities.tracker_utils import MalformedTrackerURLException
 from Tribler.Core.simpledefs import NTFY_TORRENTS
 from Tribler.dispersy.taskmanager import TaskManager
@@ -19,6 +19,9 @@ DEFAULT_TORRENT_CHECK_INTERVAL = 900  # base multiplier for the check delay
 DEFAULT_MAX_TORRENT_CHECK_RETRIES = 8  # max check delay increments when failed.
 DEFAULT_TORRENT_CHECK_RETRY_INTERVAL = 30  # interval when the torrent was successfully checked for the last time
 
+DEFAULT_MAX_TRACKER_SESSIONS = 8  # the number of trackers that are checked at the same time
+DEFAULT_MIN_TRACKER_CHECK_INTERVAL = 300  # the minimum time between two automatic checks of the same tracker
+
 
 class TorrentChecker(TaskManager):
 
@@ -38,6 +41,20 @@ class TorrentChecker(TaskManager):
         self._session_list = {'DHT': []}
         self._last_torrent_selection_time = 0
 
+        # The sessions of the automatic tracker checks in flight, by tracker URL. A tracker is checked by at most one
+        # session at a time, which scrapes as many torrents as the tracker accepts in a single request.
+        self._max_tracker_sessions = DEFAULT_MAX_TRACKER_SESSIONS
+        self._tracker_check_sessions = {}
+
+        # The times at which the automatic checks of trackers finished, by tracker URL. A tracker is not checked again
+        # before the minimum tracker check interval has passed, also when its previous check was successful.
+        self._min_tracker_check_interval = DEFAULT_MIN_TRACKER_CHECK_INTERVAL
+        self._tracker_check_times = {}
+
+        self.num_tracker_checks = 0
+        self.num_failed_tracker_checks = 0
+        self.num_checked_torrents = 0
+
         # Track all session cleanups
         self.session_stop_defer_list = []
 
@@ -89,44 +106,121 @@ class TorrentChecker(TaskManager):
 
     def _task_select_tracker(self):
         """
-        The regularly scheduled task that selects torrents associated with a specific tracker to check.
+        The regularly scheduled task that selects the trackers to check, up to the maximum number of tracker sessions.
         """
 
         # update the torrent selection interval
         self._reschedule_tracker_select()
 
-        # start selecting torrents
-        result = self.tribler_session.lm.tracker_manager.get_next_tracker_for_auto_check()
-        if result is None:
-            self._logger.warn(u"No tracker to select from, skip")
+        return self._start_tracker_checks()
+
+    def _start_tracker_checks(self):
+        """
+        Starts checking trackers until max_tracker_sessions trackers are being checked.
+        :returns A deferred that fires when the started checks have finished.
+        """
+        max_trackers = self._max_tracker_sessions - len(self._tracker_check_sessions)
+        if max_trackers <= 0:
+            return succeed(None)
+
+        # Forget about the trackers that have waited long enough since their last check
+        min_check_time = time.time() - self._min_tracker_check_interval
+        for tracker_url, check_time in self._tracker_check_times.items():
+            if check_time <= min_check_time:
+                del self._tracker_check_times[tracker_url]
+
+        tracker_urls = self.tribler_session.lm.tracker_manager.get_next_trackers_for_auto_check(
+            max_trackers, exclude=set(self._tracker_check_sessions) | set(self._tracker_check_times))
+        if not tracker_urls:
+            self._logger.debug(u"No tracker to select from, skip")
             return succeed(None)
 
-        tracker_url, _ = result
+        return DeferredList([self._check_tracker(tracker_url) for tracker_url in tracker_urls])
+
+    def _check_tracker(self, tracker_url):
+        """
+        Checks the torrents on a tracker that are due for a check, as many as fit in a single scrape.
+        """
         self._logger.debug(u"Start selecting torrents on tracker %s.", tracker_url)
 
+        # etree.org does not accept multiple infohashes in a single scrape
+        max_infohashes = MAX_TRACKER_MULTI_SCRAPE if "etree" not in tracker_url else 1
+
         # get the torrents that should be checked
-        infohashes = self._torrent_db.getTorrentsOnTracker(tracker_url, int(time.time()))
+        infohashes = self._torrent_db.getTorrentsOnTracker(tracker_url, int(time.time()), limit=max_infohashes)
 
         if len(infohashes) == 0:
             # We have not torrent to recheck for this tracker. Still update the last_check for this tracker.
             self._logger.info("No torrent to check for tracker %s", tracker_url)
             self.tribler_session.lm.tracker_manager.update_tracker_info(tracker_url, True)
             return succeed(None)
-        elif tracker_url != u'DHT' and tracker_url != u'no-DHT'\
-                and self.tribler_session.lm.tracker_manager.should_check_tracker(tracker_url):
 
-            try:
-                session = self._create_session_for_request(tracker_url, timeout=30)
-            except MalformedTrackerURLException as e:
-                self._logger.error(e)
-                return succeed(None)
+        try:
+            session = self._create_session_for_request(tracker_url, timeout=30)
+        except MalformedTrackerURLException as e:
+            self._logger.error(e)
+            # Back off, so the tracker does not take a tracker session every time
+            self.tribler_session.lm.tracker_manager.update_tracker_info(tracker_url, False)
+            return succeed(None)
+
+        for infohash in infohashes:
+            session.add_infohash(infohash)
+        self._tracker_check_sessions[tracker_url] = session
+        self.num_tracker_checks += 1
 
-            for infohash in infohashes:
-                session.add_infohash(infohash)
+        self._logger.info(u"Selected %d new torrents to check on tracker: %s", len(infohashes), tracker_url)
+        return session.connect_to_tracker().addCallbacks(*self.get_callbacks_for_session(session))\
+            .addCallback(self._on_tracker_check_result)\
+            .addErrback(self._on_tracker_check_failed)\
+            .addCallback(lambda _: self._on_tracker_check_finished(tracker_url, session))
+
+    def _on_tracker_check_result(self, result):
+        """
+        Stores the seeders and leechers that a tracker reported for the torrents in a session.
+        """
+        if not result:
+            return
+
+        last_check = int(time.time())
+        self._update_torrent_results([{'infohash': unhexlify(response['infohash']), 'seeders': response['seeders'],
+                                       'leechers': response['leechers'], 'last_check': last_check}
+                                      for response_list in result.itervalues() for response in response_list])
 
-            self._logger.info(u"Selected %d new torrents to check on tracker: %s", len(infohashes), tracker_url)
-            return session.connect_to_tracker().addCallbacks(*self.get_callbacks_for_session(session))\
-                .addErrback(lambda _: None)
+    def _on_tracker_check_failed(self, _):
+        self.num_failed_tracker_checks += 1
+
+    def _on_tracker_check_finished(self, tracker_url, session):
+        """
+        Forgets about a finished tracker check and starts checking the next trackers right away, so that the
+        maximum number of trackers is being checked. The tracker itself is not checked again before the minimum
+        tracker check interval has passed.
+        """
+        if self._should_stop:
+            return
+
+        if self._tracker_check_sessions.get(tracker_url) is session:
+            del self._tracker_check_sessions[tracker_url]
+        self._tracker_check_times[tracker_url] = time.time()
+
+        # Failed sessions have not been cleaned up yet
+        if session in self._session_list.get(tracker_url, []):
+            self._session_list[tracker_url].remove(session)
+            self.session_stop_defer_list.append(session.cleanup())
+
+        self._start_tracker_checks()
+
+    def get_statistics(self):
+        """
+        Returns a dictionary with statistics about the tracker checks and the freshness of the health information of
+        the torrents in the database, see TorrentDBHandler.getTorrentCheckStatistics.
+        """
+        return {"tracker_sessions": len(self._tracker_check_sessions),
+                "max_tracker_sessions": self._max_tracker_sessions,
+                "tracker_checks": self.num_tracker_checks,
+                "failed_tracker_checks": self.num_failed_tracker_checks,
+                "checked_torrents": self.num_checked_torrents,
+                "freshness": self._torrent_db.getTorrentCheckStatistics(int(time.time()),
+                                                                         self._torrent_check_interval)}
 
     def get_callbacks_for_session(self, session):
         success_lambda = lambda info_dict: self._on_result_from_session(session, info_dict)
@@ -251,34 +345,47 @@ class TorrentChecker(TaskManager):
         return result_list
 
     def _update_torrent_result(self, response):
-        infohash = response['infohash']
-        seeders = response['seeders']
-        leechers = response['leechers']
-        last_check = response['last_check']
+        self._update_torrent_results([response])
 
-        # the torrent status logic, TODO: do it in other way
-        self._logger.debug(u"Update result %s/%s for %s", seeders, leechers, hexlify(infohash))
+    def _update_torrent_results(self, responses):
+        """
+        Stores the results of torrent checks in the database with a single query.
+        :param responses: A list of dictionaries with the infohash, seeders, leechers and last_check of a torrent.
+        """
+        check_retries = self._torrent_db.getTorrentCheckRetriesByInfohash(
+            [response['infohash'] for response in responses])
 
-        result = self._torrent_db.getTorrent(infohash, (u'torrent_id', u'tracker_check_retries'), include_mypref=False)
-        torrent_id = result[u'torrent_id']
-        retries = result[u'tracker_check_retries']
-
-        # the status logic
-        if seeders > 0:
-            retries = 0
-            status = u'good'
-        else:
-            retries += 1
-            if retries < self._max_torrent_check_retries:
-                status = u'unknown'
+        check_results = []
+        for response in responses:
+            infohash = response['infohash']
+            seeders = response['seeders']
+            leechers = response['leechers']
+            last_check = response['last_check']
+
+            # the torrent status logic, TODO: do it in other way
+            self._logger.debug(u"Update result %s/%s for %s", seeders, leechers, hexlify(infohash))
+
+            if infohash not in check_retries:
+                continue
+            torrent_id, retries = check_retries[infohash]
+
+            # the status logic
+            if seeders > 0:
+                retries = 0
+                status = u'good'
             else:
-                status = u'dead'
-                # prevent retries from exceeding the maximum
-                retries = self._max_torrent_check_retries
+                retries += 1
+                if retries < self._max_torrent_check_retries:
+                    status = u'unknown'
+                else:
+                    status = u'dead'
+                    # prevent retries from exceeding the maximum
+                    retries = self._max_torrent_check_retries
+
+            # calculate next check time: <last-time> + <interval> * (2 ^ <retries>)
+            next_check = last_check + self._torrent_check_retry_interval * (2 ** retries)
 
-        # calculate next check time: <last-time> + <interval> * (2 ^ <retries>)
-        next_check = last_check + self._torrent_check_retry_interval * (2 ** retries)
+            check_results.append((torrent_id, infohash, seeders, leechers, last_check, next_check, status, retries))
 
-        self._torrent_db.updateTorrentCheckResult(torrent_id,
-                                                  infohash, seeders, leechers, last_check, next_check,
-                                                  status, retries)
+        self._torrent_db.updateTorrentCheckResults(check_results)
+        self.num_checked_torrents += len(check_results)
@@ -6,6 +6,7 @@ Author(s): Arno Bakker
 import logging
 import os
 import sys
+from bisect import bisect_right
 from hashlib import sha1
 from types import StringType, ListType, IntType, LongType
 
@@ -21,6 +22,75 @@ from Tribler.Core.simpledefs import INFOHASH_LENGTH
 from Tribler.dispersy.util import blocking_call_on_reactor_thread
 
 
+class TorrentFileTable(object):
+    """
+    The file list of a finalized torrent def, decoded once from its metainfo. The names, lengths, extensions and
+    byte offsets of the files are kept in tuples and the paths of the files are indexed in dictionaries, so that
+    repeated queries for the files of large multi-file torrents do not have to walk and decode the metainfo again.
+    """
+
+    def __init__(self, metainfo, files_with_length):
+        self.metainfo = metainfo
+        self.info = metainfo['info']
+
+        # The (unicode name, length) tuples of the files, as returned by get_files_with_length
+        self.files_with_length = tuple(files_with_length)
+        self.extensions = tuple(os.path.splitext(filename)[1][1:].lower() for filename, _ in self.files_with_length)
+
+        if 'files' in self.info:
+            files = self.info['files']
+            self.lengths = tuple(file_dict['length'] for file_dict in files)
+            # The names used to select files, see maketorrent.get_length_from_metainfo
+            self.selection_names = tuple(maketorrent.pathlist2filename(file_dict['path'])
+                                         if 'path' in file_dict else None for file_dict in files)
+            # Maps the name of a file to its index in the metainfo, the first file wins if names are not unique
+            self.file_indices = {}
+            for index, file_dict in enumerate(files):
+                path = file_dict['path.utf-8'] if 'path.utf-8' in file_dict else file_dict.get('path')
+                if path is not None:
+                    self.file_indices.setdefault(maketorrent.pathlist2filename(path), index)
+        else:
+            self.lengths = (self.info['length'],)
+            self.selection_names = None
+            self.file_indices = None
+
+        offsets = [0]
+        for length in self.lengths:
+            offsets.append(offsets[-1] + length)
+        self.offsets = tuple(offsets)
+        self.total_length = sum(length for length in self.lengths if length > 0)
+
+    def is_valid_for(self, metainfo):
+        return self.metainfo is metainfo and self.info is metainfo['info']
+
+    def get_files_with_length(self, exts=None):
+        if exts is None:
+            return list(self.files_with_length)
+        return [self.files_with_length[index] for index, ext in enumerate(self.extensions) if ext in exts]
+
+    def get_length(self, selectedfiles=None):
+        if not selectedfiles:
+            return self.total_length
+        if self.selection_names is None:
+            return self.info['length']
+
+        selectedfiles = set(selectedfiles)
+        return sum(length for length, name in zip(self.lengths, self.selection_names)
+                   if length > 0 and name in selectedfiles)
+
+    def get_index_of_file(self, name):
+        return self.file_indices.get(name) if self.file_indices is not None else None
+
+    def get_index_of_offset(self, offset):
+        """
+        Returns the index of the file in the metainfo that contains the byte at offset, or None if offset lies outside
+        of the content of the torrent.
+        """
+        if offset < 0 or offset >= self.offsets[-1]:
+            return None
+        return bisect_right(self.offsets, offset) - 1
+
+
 class TorrentDef(object):
 
     """
@@ -42,6 +112,7 @@ class TorrentDef(object):
         assert infohash is None or len(infohash) == INFOHASH_LENGTH, "INFOHASH has invalid length: %d" % len(infohash)
 
         self._logger = logging.getLogger(self.__class__.__name__)
+        self._file_table = None  # built from the metainfo on first use, see _get_file_table
 
         if input is not None:  # copy constructor
             self.input = input
@@ -687,14 +758,7 @@ class TorrentDef(object):
         if not self.metainfo_valid:
             raise NotYetImplementedException()  # must save first
 
-        videofiles = []
-        for filename, length in self._get_all_files_as_unicode_with_length():
-            prefix, ext = os.path.splitext(filename)
-            if ext != "" and ext[0] == ".":
-                ext = ext[1:]
-            if exts is None or ext.lower() in exts:
-                videofiles.append((filename, length))
-        return videofiles
+        return self._get_file_table().get_files_with_length(exts)
 
     def get_files(self, exts=None):
         return [filename for filename, _ in self.get_files_with_length(exts)]
@@ -708,7 +772,7 @@ class TorrentDef(object):
         if not self.metainfo_valid:
             raise NotYetImplementedException()  # must save first
 
-        return maketorrent.get_length_from_metainfo(self.metainfo, selectedfiles)
+        return self._get_file_table().get_length(selectedfiles)
 
     def get_creation_date(self, default=0):
         if not self.metainfo_valid:
@@ -743,22 +807,32 @@ class TorrentDef(object):
         if not self.metainfo_valid:
             raise NotYetImplementedException()  # must save first
 
-        info = self.metainfo['info']
+        if file is None or not self.is_multifile_torrent():
+            raise ValueError("File not found in single-file torrent")
 
-        if file is not None and 'files' in info:
-            for i in range(len(info['files'])):
-                file_dict = info['files'][i]
+        index = self._get_file_table().get_index_of_file(file)
+        if index is None:
+            raise ValueError("File not found in torrent")
+        return index
 
-                if 'path.utf-8' in file_dict:
-                    intorrentpath = maketorrent.pathlist2filename(file_dict['path.utf-8'])
-                else:
-                    intorrentpath = maketorrent.pathlist2filename(file_dict['path'])
+    def get_index_of_file_at_offset(self, offset):
+        """ Returns the index of the file that contains the byte at offset
+        in the content of the torrent, or None if there is no such file.
+        """
+        if not self.metainfo_valid:
+            raise NotYetImplementedException()  # must save first
 
-                if intorrentpath == file:
-                    return i
-            raise ValueError("File not found in torrent")
-        else:
-            raise ValueError("File not found in single-file torrent")
+        return self._get_file_table().get_index_of_offset(offset)
+
+    def _get_file_table(self):
+        """ Returns the file table of the finalized torrent def, which is
+        rebuilt whenever the metainfo has been replaced.
+        """
+        file_table = self._file_table
+        if file_table is None or not file_table.is_valid_for(self.metainfo):
+            file_table = TorrentFileTable(self.metainfo, self._get_all_files_as_unicode_with_length())
+            self._file_table = file_table
+        return file_table
 
 
 class TorrentDefNoMetainfo(object):
@@ -5,9 +5,15 @@ Author(s): Elric Milon
 """
 import logging
 import os
-from binascii import hexlify
+from binascii import hexlify, unhexlify, Error as BinasciiError
+from collections import OrderedDict
+from itertools import chain, groupby, islice
+from operator import itemgetter
 from shutil import rmtree
 from sqlite3 import Connection
+from time import time
+from twisted.internet.defer import inlineCallbacks, succeed
+from twisted.internet.threads import deferToThread
 
 from Tribler.Core.CacheDB.SqliteCacheDBHandler import TorrentDBHandler
 from Tribler.Core.CacheDB.db_versions import LOWEST_SUPPORTED_DB_VERSION, LATEST_DB_VERSION
@@ -15,6 +21,57 @@ from Tribler.Core.CacheDB.sqlitecachedb import str2bin
 from Tribler.Core.Category.Category import Category
 from Tribler.Core.TorrentDef import TorrentDef
 from Tribler.Core.Utilities.search_utils import split_into_keywords
+from Tribler.Core.Utilities.tracker_utils import get_uniformed_tracker_url
+
+REIMPORT_BATCH_SIZE = 500  # The number of torrents that is decoded in a thread and written at once
+REINDEX_BATCH_SIZE = 10000  # The range of torrent ids that is reindexed at once
+
+# The MyInfo entries that hold the progress of an unfinished re-import or reindex
+REIMPORT_CHECKPOINT = u"reimport_torrents_checkpoint"
+REINDEX_CHECKPOINT = u"reindex_torrents_checkpoint"
+
+_category = None
+
+
+def decode_torrent(item):
+    """
+    Decodes a torrent from the torrent store and computes what is stored about it in the database. This is done in the
+    decoding thread of the re-import, so it does not access the database.
+    :param item: A tuple of the key and the data of the torrent in the torrent store.
+    :return: None if the torrent data is invalid, else a tuple of the key, the infohash, the (name, length,
+             creation_date, num_files, secret, category, comment) values of the Torrent row, the (swarmname, filenames,
+             fileextensions) values of the FullTextIndex row and the set of trackers of the torrent.
+    """
+    global _category
+
+    key, torrent_data = item
+    try:
+        torrentdef = TorrentDef.load_from_memory(torrent_data)
+    except Exception:
+        # the torrent store may contain corrupted torrent data
+        return None
+    if not torrentdef.is_finalized():
+        return None
+
+    if _category is None:
+        _category = Category()
+
+    name = torrentdef.get_name_as_unicode()
+    files = torrentdef.get_files()
+    values = (name, torrentdef.get_length(), torrentdef.get_creation_date(), len(files),
+              1 if torrentdef.is_private() else 0, _category.calculateCategory(torrentdef.metainfo, name),
+              torrentdef.get_comment_as_unicode())
+
+    swarmname = name if torrentdef.is_multifile_torrent() else os.path.splitext(name)[0]
+    index_terms = TorrentDBHandler._get_index_terms(swarmname, files)
+
+    trackers = set([u'no-DHT' if torrentdef.is_private() else u'DHT'])
+    for tracker in chain([torrentdef.get_tracker()], *(torrentdef.get_tracker_hierarchy() or [])):
+        tracker_url = get_uniformed_tracker_url(tracker) if tracker else None
+        if tracker_url:
+            trackers.add(tracker_url)
+
+    return key, torrentdef.get_infohash(), values, index_terms, trackers
 
 
 class VersionNoLongerSupportedError(Exception):
@@ -82,6 +139,18 @@ class DBUpgrader(object):
         if self.db.version == 28:
             self._upgrade_28_to_29()
 
+        # version 29 -> 30
+        if self.db.version == 29:
+            self._upgrade_29_to_30()
+
+        # version 30 -> 31
+        if self.db.version == 30:
+            self._upgrade_30_to_31()
+
+        # version 31 -> 32
+        if self.db.version == 31:
+            self._upgrade_31_to_32()
+
         # check if we managed to upgrade to the latest DB version.
         if self.db.version == LATEST_DB_VERSION:
             self.status_update_func(u"Database upgrade finished.")
@@ -521,11 +590,13 @@ DROP TABLE IF EXISTS MetaDataTypes;
     def _upgrade_28_to_29(self):
         self.status_update_func(u"Upgrading FTS engine...")
 
-        self.db.execute(u"""
+        # An interrupted reindex continues in the index it was filling
+        if self._get_checkpoint(REINDEX_CHECKPOINT) is None:
+            self.db.execute(u"""
 DROP TABLE IF EXISTS FullTextIndex;
 CREATE VIRTUAL TABLE FullTextIndex USING fts4(swarmname, filenames, fileextensions);
         """)
-        self.db.commit_now()
+            self.db.commit_now()
 
         self.status_update_func(u"Reindexing torrents...")
         self.reindex_torrents()
@@ -533,51 +604,244 @@ CREATE VIRTUAL TABLE FullTextIndex USING fts4(swarmname, filenames, fileextensio
         # update database version
         self.db.write_version(29)
 
+    def _upgrade_29_to_30(self):
+        self.status_update_func(u"Upgrading database from v%s to v%s..." % (29, 30))
+
+        self.db.execute(u"CREATE INDEX IF NOT EXISTS TorNextCheckIndex ON Torrent(next_tracker_check);")
+
+        # update database version
+        self.db.write_version(30)
+
+    def _upgrade_30_to_31(self):
+        self.status_update_func(u"Upgrading database from v%s to v%s..." % (30, 31))
+
+        # New databases are created with the eviction_score column
+        columns = [column[1] for column in self.db.fetchall(u"PRAGMA table_info(Torrent)")]
+        if u"eviction_score" not in columns:
+            self.db.execute(u"ALTER TABLE Torrent ADD COLUMN eviction_score numeric;")
+
+        self.db.execute(u"""
+UPDATE Torrent SET eviction_score = MIN(relevance, 2500) + MIN(500, num_leechers) + 4 * MIN(500, num_seeders)
+  - CASE WHEN creation_date > 0 AND insert_time > 0 THEN MIN(500, MAX(0, (insert_time - creation_date) / 86400))
+    ELSE 0 END;
+
+CREATE INDEX IF NOT EXISTS TorEvictionIndex ON Torrent(is_collected, eviction_score, infohash);
+
+CREATE TRIGGER IF NOT EXISTS TorEvictionScoreInsert AFTER INSERT ON Torrent
+BEGIN
+  UPDATE Torrent SET eviction_score = MIN(relevance, 2500) + MIN(500, num_leechers) + 4 * MIN(500, num_seeders)
+    - CASE WHEN creation_date > 0 AND insert_time > 0 THEN MIN(500, MAX(0, (insert_time - creation_date) / 86400))
+      ELSE 0 END WHERE torrent_id = NEW.torrent_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS TorEvictionScoreUpdate
+AFTER UPDATE OF relevance, num_seeders, num_leechers, creation_date, insert_time ON Torrent
+BEGIN
+  UPDATE Torrent SET eviction_score = MIN(relevance, 2500) + MIN(500, num_leechers) + 4 * MIN(500, num_seeders)
+    - CASE WHEN creation_date > 0 AND insert_time > 0 THEN MIN(500, MAX(0, (insert_time - creation_date) / 86400))
+      ELSE 0 END WHERE torrent_id = NEW.torrent_id;
+END;
+
+INSERT OR REPLACE INTO MyInfo (entry, value)
+  VALUES ('collected_torrents', (SELECT COUNT(*) FROM Torrent WHERE is_collected == 1));
+
+CREATE TRIGGER IF NOT EXISTS TorCollectedInsert AFTER INSERT ON Torrent WHEN NEW.is_collected IS 1
+BEGIN
+  UPDATE MyInfo SET value = value + 1 WHERE entry == 'collected_torrents';
+END;
+
+CREATE TRIGGER IF NOT EXISTS TorCollectedUpdate AFTER UPDATE OF is_collected ON Torrent
+WHEN NEW.is_collected IS NOT OLD.is_collected
+BEGIN
+  UPDATE MyInfo SET value = value + (NEW.is_collected IS 1) - (OLD.is_collected IS 1)
+    WHERE entry == 'collected_torrents';
+END;
+
+CREATE TRIGGER IF NOT EXISTS TorCollectedDelete AFTER DELETE ON Torrent WHEN OLD.is_collected IS 1
+BEGIN
+  UPDATE MyInfo SET value = value - 1 WHERE entry == 'collected_torrents';
+END;
+""")
+
+        # update database version
+        self.db.write_version(31)
+
+    def _upgrade_31_to_32(self):
+        self.status_update_func(u"Upgrading database from v%s to v%s..." % (31, 32))
+
+        # Infohashes and permids used to be stored base64 encoded, now they are stored as blobs
+        self._decode_base64_column(u"Torrent", u"torrent_id", u"infohash")
+        self._decode_base64_column(u"Peer", u"peer_id", u"permid")
+
+        # update database version
+        self.db.write_version(32)
+
+    def _decode_base64_column(self, table_name, key_name, column_name):
+        """
+        Replaces the base64 encoded text values in a column by the binary data they encode. Values that are blobs
+        already are left alone, so the conversion can safely be done again.
+        """
+        sql = u"SELECT %s, %s FROM %s WHERE typeof(%s) == 'text'" % (key_name, column_name, table_name, column_name)
+        decoded = []
+        for key, value in self.db.fetchall(sql):
+            try:
+                decoded.append((buffer(str2bin(value)), key))
+            except BinasciiError:
+                self._logger.warning(u"Cannot decode %s of %s %d: %r", column_name, table_name, key, value)
+
+        # Should two encodings decode to the same value, the unique index keeps the first one
+        self.db.executemany(u"UPDATE OR IGNORE %s SET %s = ? WHERE %s = ?" % (table_name, column_name, key_name),
+                            decoded)
+
+    def _get_checkpoint(self, name):
+        return self.db.fetchone(u"SELECT value FROM MyInfo WHERE entry == ?", (name,))
+
+    def _set_checkpoint(self, name, value):
+        if value is None:
+            self.db.execute_write(u"DELETE FROM MyInfo WHERE entry == ?", (name,))
+        else:
+            self.db.execute_write(u"INSERT OR REPLACE INTO MyInfo (entry, value) VALUES (?, ?)", (name, value))
+
+    def mark_reimport_pending(self):
+        """
+        Marks the re-import of the torrents as pending until reimport_torrents has finished. The checkpoint of an
+        interrupted re-import is kept, so it continues from there.
+        """
+        if self._get_checkpoint(REIMPORT_CHECKPOINT) is None:
+            self._set_checkpoint(REIMPORT_CHECKPOINT, u"")
+            self.db.commit_now()
+
+    @inlineCallbacks
     def reimport_torrents(self):
-        """Import all torrent files in the collected torrent dir, all the files already in the database will be ignored.
         """
-        self.status_update_func("Opening TorrentDBHandler...")
+        Import all torrent files in the torrent store that are not collected torrents in the database yet.
+        The torrents are decoded in a thread while the previous batch is written to the database.
+        The last written torrent is checkpointed after every batch, so an interrupted import continues from there.
+        :return: A Deferred that fires when all torrents have been imported.
+        """
+        self.status_update_func(u"Opening TorrentDBHandler...")
         # TODO(emilon): That's a freakishly ugly hack.
         torrent_db_handler = TorrentDBHandler(self.session)
-        torrent_db_handler.category = Category()
 
         # TODO(emilon): It would be nice to drop the corrupted torrent data from the store as a bonus.
-        self.status_update_func("Registering recovered torrents...")
+        self.status_update_func(u"Registering recovered torrents...")
+        self.torrent_store.flush()
+        num_torrents = len(self.torrent_store)
+
+        # A store of a single batch is decoded right away, so small imports finish synchronously
+        in_thread = num_torrents > REIMPORT_BATCH_SIZE
         try:
-            for infoshash_str, torrent_data in self.torrent_store.iteritems():
-                self.status_update_func("> %s" % infoshash_str)
-                torrentdef = TorrentDef.load_from_memory(torrent_data)
-                if torrentdef.is_finalized():
-                    infohash = torrentdef.get_infohash()
-                    if not torrent_db_handler.hasTorrent(infohash):
-                        self.status_update_func(u"Registering recovered torrent: %s" % hexlify(infohash))
-                        torrent_db_handler._addTorrentToDB(torrentdef, extra_info={"filename": infoshash_str})
+            checkpoint = self._get_checkpoint(REIMPORT_CHECKPOINT)
+            last_key = unhexlify(checkpoint) if checkpoint else None
+            items = ((key, torrent_data) for key, torrent_data in self.torrent_store.rangescan(start=last_key)
+                     if key != last_key)
+
+            start_time = time()
+            num_done = 0
+            batch = list(islice(items, REIMPORT_BATCH_SIZE))
+            decoding = self._decode_torrents(batch, in_thread)
+            while batch:
+                decoded_torrents = yield decoding
+
+                # The thread decodes the next batch while this one is written
+                next_batch = list(islice(items, REIMPORT_BATCH_SIZE))
+                if next_batch:
+                    decoding = self._decode_torrents(next_batch, in_thread)
+
+                self._add_decoded_torrents(torrent_db_handler, decoded_torrents)
+                self._set_checkpoint(REIMPORT_CHECKPOINT, hexlify(batch[-1][0]))
+                self.db.commit_now()
+
+                num_done += len(batch)
+                self.status_update_func(u"Registering recovered torrents... %d/%d (%d torrents/s)"
+                                        % (num_done, num_torrents, num_done / max(time() - start_time, 0.001)))
+                batch = next_batch
+
+            self._set_checkpoint(REIMPORT_CHECKPOINT, None)
         finally:
             torrent_db_handler.close()
             self.db.commit_now()
-            return self.torrent_store.flush()
 
-    def reindex_torrents(self):
+    @staticmethod
+    def _decode_torrents(batch, in_thread):
+        if not in_thread:
+            return succeed(map(decode_torrent, batch))
+        return deferToThread(map, decode_torrent, batch)
+
+    def _add_decoded_torrents(self, torrent_db_handler, decoded_torrents):
         """
-        Reindex all torrents in the database. Required when upgrading to a newer FTS engine.
+        Writes a batch of torrents that are decoded by decode_torrent to the database, with a few statements for the
+        whole batch. Torrents that are collected torrents in the database already are skipped.
         """
-        results = self.db.fetchall("SELECT torrent_id, name FROM Torrent")
-        for torrent_result in results:
-            if torrent_result[1] is None:
-                continue
+        decoded_torrents = [decoded for decoded in decoded_torrents if decoded]
+        if not decoded_torrents:
+            return
 
-            swarmname = split_into_keywords(torrent_result[1])
-            files_results = self.db.fetchall("SELECT path FROM TorrentFiles WHERE torrent_id = ?", (torrent_result[0],))
-            filenames = ""
-            fileexts = ""
-            for file_result in files_results:
-                filename, ext = os.path.splitext(file_result[0])
-                parts = split_into_keywords(filename)
-                filenames += " ".join(parts) + " "
-                fileexts += ext[1:] + " "
+        sql = u"SELECT infohash FROM CollectedTorrent WHERE infohash IN (%s)" % u",".join(u"?" * len(decoded_torrents))
+        collected = set(str(infohash) for infohash, in
+                        self.db.fetchall(sql, [buffer(decoded[1]) for decoded in decoded_torrents]))
 
-            self.db.execute_write(u"INSERT INTO FullTextIndex (rowid, swarmname, filenames, fileextensions)"
-                                  u" VALUES(?,?,?,?)",
-                                  (torrent_result[0], " ".join(swarmname), filenames[:-1], fileexts[:-1]))
+        # A torrent can be in the store under more than one key
+        torrents = OrderedDict()
+        for decoded in decoded_torrents:
+            if decoded[1] not in collected:
+                torrents[decoded[1]] = decoded
+        if not torrents:
+            return
+
+        torrent_ids, _ = torrent_db_handler.addOrGetTorrentIDSReturn(torrents.keys())
+        insert_time = long(time())
+        self.db.executemany(u"UPDATE Torrent SET name = ?, length = ?, creation_date = ?, num_files = ?, secret = ?, "
+                            u"category = ?, comment = ?, insert_time = ?, relevance = 0.0, status = 'unknown', "
+                            u"is_collected = 0 WHERE torrent_id = ?",
+                            [decoded[2] + (insert_time, torrent_id)
+                             for torrent_id, decoded in zip(torrent_ids, torrents.itervalues())])
+        torrent_db_handler._insert_index_values([(torrent_id,) + decoded[3]
+                                                 for torrent_id, decoded in zip(torrent_ids, torrents.itervalues())])
+
+        # The upgrade runs before the tracker manager is started, so new trackers are added to the database directly
+        mappings = [(torrent_id, tracker) for torrent_id, decoded in zip(torrent_ids, torrents.itervalues())
+                    for tracker in decoded[4]]
+        self.db.executemany(u"INSERT OR IGNORE INTO TrackerInfo (tracker) VALUES (?)",
+                            [(tracker,) for tracker in set(tracker for _, tracker in mappings)])
+        self.db.executemany(u"INSERT OR IGNORE INTO TorrentTrackerMapping (torrent_id, tracker_id) "
+                            u"VALUES (?, (SELECT tracker_id FROM TrackerInfo WHERE tracker = ?))", mappings)
+
+    def reindex_torrents(self):
+        """
+        Reindex all torrents in the database. Required when upgrading to a newer FTS engine.
+        The torrents are read together with their files by one query per range of torrent ids. The end of the last
+        indexed range is checkpointed, so an interrupted reindex continues from there.
+        """
+        last_torrent_id = int(self._get_checkpoint(REINDEX_CHECKPOINT) or 0)
+        max_torrent_id = self.db.fetchone(u"SELECT MAX(torrent_id) FROM Torrent") or 0
+        sql = u"""SELECT T.torrent_id, T.name, F.path FROM Torrent T
+                  LEFT JOIN TorrentFiles F ON F.torrent_id = T.torrent_id
+                  WHERE T.torrent_id > ? AND T.torrent_id <= ? AND T.name IS NOT NULL ORDER BY T.torrent_id"""
+
+        while last_torrent_id < max_torrent_id:
+            end_torrent_id = last_torrent_id + REINDEX_BATCH_SIZE
+            index_values = []
+            for (torrent_id, name), rows in groupby(self.db.fetchall(sql, (last_torrent_id, end_torrent_id)),
+                                                    key=itemgetter(0, 1)):
+                filenames = []
+                fileexts = []
+                for _, _, path in rows:
+                    if path is None:
+                        continue
+                    filename, ext = os.path.splitext(path)
+                    filenames.append(u" ".join(split_into_keywords(filename)))
+                    fileexts.append(ext[1:])
+                index_values.append((torrent_id, u" ".join(split_into_keywords(name)), u" ".join(filenames),
+                                     u" ".join(fileexts)))
+
+            self.db.executemany(u"INSERT INTO FullTextIndex (rowid, swarmname, filenames, fileextensions)"
+                                u" VALUES(?,?,?,?)", index_values)
+            last_torrent_id = end_torrent_id
+            self._set_checkpoint(REINDEX_CHECKPOINT, last_torrent_id)
+            self.db.commit_now()
+            self.status_update_func(u"Reindexing torrents... %d%%" % (100 * min(last_torrent_id, max_torrent_id)
+                                                                       / max_torrent_id))
 
+        self._set_checkpoint(REINDEX_CHECKPOINT, None)
         self.db.commit_now()
@@ -5,7 +5,7 @@ from twisted.internet.defer import inlineCallbacks
 
 from Tribler.Core.CacheDB.db_versions import LATEST_DB_VERSION, LOWEST_SUPPORTED_DB_VERSION
 from Tribler.Core.Upgrade.config_converter import convert_config_to_tribler71
-from Tribler.Core.Upgrade.db_upgrader import DBUpgrader
+from Tribler.Core.Upgrade.db_upgrader import DBUpgrader, REIMPORT_CHECKPOINT
 from Tribler.Core.Upgrade.pickle_converter import PickleConverter
 from Tribler.Core.Upgrade.torrent_upgrade65 import TorrentMigrator65
 from Tribler.Core.simpledefs import NTFY_UPGRADER, NTFY_FINISHED, NTFY_STARTED, NTFY_UPGRADER_TICK
@@ -33,19 +33,21 @@ class TriblerUpgrader(object):
 
         self.current_status = u"Initializing"
 
+    @inlineCallbacks
     def run(self):
         """
         Run the upgrader if it is enabled in the config.
 
         Note that by default, upgrading is enabled in the config. It is then disabled
         after upgrading to Tribler 7.
+        :return: A Deferred that fires when the upgrade is done.
         """
         self.current_status = u"Checking Tribler version..."
         if self.session.config.get_upgrader_enabled():
             failed, has_to_upgrade = self.check_should_upgrade_database()
             if has_to_upgrade and not failed:
                 self.notify_starting()
-                self.upgrade_database_to_current_version()
+                yield self.upgrade_database_to_current_version()
 
                 # Convert old (pre 6.3 Tribler) pickle files to the newer .state format
                 pickle_converter = PickleConverter(self.session)
@@ -97,6 +99,10 @@ class TriblerUpgrader(object):
         elif self.db.version < LOWEST_SUPPORTED_DB_VERSION:
             msg = u"Database is too old %s < %s" % (self.db.version, LOWEST_SUPPORTED_DB_VERSION)
             self.current_status = msg
+        elif self.db.version == LATEST_DB_VERSION and self._is_reimport_pending():
+            self._logger.info(u"resuming the interrupted re-import of the torrents")
+            should_upgrade = True
+            self.failed = False
         elif self.db.version == LATEST_DB_VERSION:
             self._logger.info(u"tribler is in the latest version, no need to upgrade")
             self.failed = False
@@ -108,6 +114,12 @@ class TriblerUpgrader(object):
 
         return (self.failed, should_upgrade)
 
+    def _is_reimport_pending(self):
+        """
+        Checks whether the re-import of the torrents after an earlier upgrade has not finished yet.
+        """
+        return self.db.fetchone(u"SELECT value FROM MyInfo WHERE entry == ?", (REIMPORT_CHECKPOINT,)) is not None
+
     @blocking_call_on_reactor_thread
     @inlineCallbacks
     def upgrade_database_to_current_version(self):
@@ -123,6 +135,9 @@ class TriblerUpgrader(object):
 
             db_migrator = DBUpgrader(
                 self.session, self.db, torrent_store=torrent_store, status_update_func=self.update_status)
+            # The re-import is marked as pending before the database reaches the latest version, so an interrupted
+            # re-import is resumed on the next start.
+            db_migrator.mark_reimport_pending()
             yield db_migrator.start_migrate()
 
             # Import all the torrent files not in the database, we do this in
@@ -3,11 +3,16 @@ Search utilities.
 
 Author(s): Jelle Roozenburg, Arno Bakker
 """
+import math
 import re
+from struct import unpack_from
 
 RE_KEYWORD_SPLIT = re.compile(r"[\W_]", re.UNICODE)
 DIALOG_STOPWORDS = {'an', 'and', 'by', 'for', 'from', 'of', 'the', 'to', 'with'}
 
+# The weight of a match in the name, the file names and the file extensions of a torrent in the relevance score
+RELEVANCE_COLUMN_WEIGHTS = (0.8, 0.1, 0.1)
+
 
 def split_into_keywords(string, to_filter_stopwords=False):
     """
@@ -27,3 +32,32 @@ def split_into_keywords(string, to_filter_stopwords=False):
 
 def filter_keywords(keywords):
     return [kw for kw in keywords if len(kw) > 0 and kw not in DIALOG_STOPWORDS]
+
+
+def bm25_rank(matchinfo):
+    """
+    Calculates the relevance score of a row in the FullTextIndex, given its matchinfo blob in the 'pcnalx' format.
+    This function is registered as a SQLite function so ranking, ordering and limiting of the search results
+    happens inside SQLite. The algorithm is based on BM25. The document length factor is regarded since our
+    "documents" are very small (often a few keywords).
+    See https://en.wikipedia.org/wiki/Okapi_BM25 and https://www.sqlite.org/fts3.html#matchinfo for more information.
+    """
+    num_phrases, num_cols, num_rows = unpack_from('III', matchinfo)
+
+    # Skip the p, c, n values and the average and actual lengths of the columns (a and l)
+    hits = unpack_from('I' * (3 * num_cols * num_phrases), matchinfo, 4 * (3 + 2 * num_cols))
+
+    score = 0.0
+    for col_ind in xrange(min(num_cols, len(RELEVANCE_COLUMN_WEIGHTS))):
+        col_score = 0.0
+        for phrase_ind in xrange(num_phrases):
+            base_term_offset = 3 * (col_ind + phrase_ind * num_cols)
+            term_freq = hits[base_term_offset]
+            rows_with_term = hits[base_term_offset + 2]
+
+            inv_doc_freq = math.log((num_rows - rows_with_term + 0.5) / (rows_with_term + 0.5), 2)
+            col_score += inv_doc_freq * ((term_freq * (1.2 + 1)) / (term_freq + 1.2))
+
+        score += RELEVANCE_COLUMN_WEIGHTS[col_ind] * col_score
+
+    return score
@@ -0,0 +1,145 @@
+"""
+An in-memory index of the terms in the names of torrents, used for autocompletion and search suggestions.
+"""
+from bisect import bisect_left, insort
+from heapq import nlargest
+
+from Tribler.Core.Utilities.search_utils import split_into_keywords
+
+
+def levenshtein(a, b):
+    """
+    Calculates the Levenshtein distance between a and b.
+    """
+    n, m = len(a), len(b)
+    if n > m:
+        # Make sure n <= m, to use O(min(n,m)) space
+        a, b = b, a
+        n, m = m, n
+
+    current = range(n + 1)
+    for i in range(1, m + 1):
+        previous, current = current, [i] + [0] * n
+        for j in range(1, n + 1):
+            add, delete = previous[j] + 1, current[j - 1] + 1
+            change = previous[j - 1]
+            if a[j - 1] != b[i - 1]:
+                change = change + 1
+            current[j] = min(add, delete, change)
+
+    return current[n]
+
+
+def _prefix_successor(prefix):
+    """
+    Returns the smallest string that is larger than all strings starting with prefix.
+    """
+    return prefix[:-1] + unichr(ord(prefix[-1]) + 1)
+
+
+class TermIndex(object):
+    """
+    This class keeps the terms of torrent names in a sorted array, together with the number of names each term
+    appears in. Terms starting with a prefix form a contiguous range of this array, which is found by bisection.
+    Walking the array in order visits the terms like a depth-first walk over a prefix trie, which is used to find
+    the terms within a bounded edit distance of a word.
+    """
+
+    def __init__(self):
+        self._terms = []
+        self._counts = {}
+
+    def __len__(self):
+        return len(self._terms)
+
+    def __contains__(self, term):
+        return term in self._counts
+
+    def get_count(self, term):
+        return self._counts.get(term, 0)
+
+    def add_name(self, name):
+        """
+        Adds the terms of a single torrent name to the index.
+        """
+        for term in set(split_into_keywords(name)):
+            if term in self._counts:
+                self._counts[term] += 1
+            else:
+                self._counts[term] = 1
+                insort(self._terms, term)
+
+    def remove_name(self, name):
+        """
+        Removes the terms of a single torrent name that was added before from the index.
+        """
+        for term in set(split_into_keywords(name)):
+            count = self._counts.get(term, 0)
+            if count > 1:
+                self._counts[term] = count - 1
+            elif count == 1:
+                del self._counts[term]
+                del self._terms[bisect_left(self._terms, term)]
+
+    def add_names(self, names):
+        """
+        Adds the terms of many torrent names to the index at once, sorting the array only once.
+        """
+        for name in names:
+            for term in set(split_into_keywords(name)):
+                self._counts[term] = self._counts.get(term, 0) + 1
+        self._terms = sorted(self._counts)
+
+    def get_terms_with_prefix(self, prefix, max_terms):
+        """
+        Returns the max_terms most popular terms that start with prefix, most popular first.
+        """
+        if not prefix:
+            return []
+
+        low = bisect_left(self._terms, prefix)
+        high = bisect_left(self._terms, _prefix_successor(prefix), low)
+        return nlargest(max_terms, (self._terms[index] for index in xrange(low, high)), key=self._counts.get)
+
+    def get_close_terms(self, word, max_distance):
+        """
+        Returns (term, distance) tuples for all terms within an edit distance of max_distance of word.
+        Rows of the edit distance matrix are shared between terms with a common prefix, and when no term with the
+        current prefix can be close enough, all of them are skipped at once.
+        """
+        close_terms = []
+        terms = self._terms
+        rows = [range(len(word) + 1)]
+        previous_term = u""
+        index = 0
+
+        while index < len(terms):
+            term = terms[index]
+
+            common = 0
+            common_max = min(len(previous_term), len(term), len(rows) - 1)
+            while common < common_max and previous_term[common] == term[common]:
+                common += 1
+            del rows[common + 1:]
+
+            pruned_length = 0
+            for position in xrange(common, len(term)):
+                above = rows[-1]
+                row = [above[0] + 1]
+                for j in xrange(1, len(word) + 1):
+                    row.append(min(row[j - 1] + 1, above[j] + 1, above[j - 1] + (word[j - 1] != term[position])))
+                rows.append(row)
+
+                if min(row) > max_distance:
+                    pruned_length = position + 1
+                    break
+
+            previous_term = term
+            if pruned_length:
+                index = bisect_left(terms, _prefix_successor(term[:pruned_length]), index + 1)
+            else:
+                if rows[-1][-1] <= max_distance:
+                    close_terms.append((term, rows[-1][-1]))
+                index += 1
+
+        return close_terms
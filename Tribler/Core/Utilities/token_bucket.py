@@ -0,0 +1,44 @@
+"""
+A token bucket, used to limit the rate at which work is done on behalf of other peers.
+"""
+from time import time
+
+
+class TokenBucket(object):
+    """
+    This class holds up to capacity tokens, which are refilled at a fixed rate. Every unit of work consumes a token,
+    work for which no tokens are left should be dropped. This allows short bursts while capping the average rate.
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        :param rate: The number of tokens added per second.
+        :param capacity: The maximum number of tokens in the bucket, i.e. the largest burst that is allowed.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_update = time()
+
+    def _refill(self):
+        now = time()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_update) * self.rate)
+        self.last_update = now
+
+    def consume(self, tokens=1):
+        """
+        Takes tokens from the bucket.
+        :return: True if there were enough tokens, False otherwise (in which case no tokens are taken).
+        """
+        self._refill()
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+    def is_full(self):
+        """
+        Returns whether the bucket has been refilled completely, i.e. it has not been used for a while.
+        """
+        self._refill()
+        return self.tokens >= self.capacity
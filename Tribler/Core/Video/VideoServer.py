@@ -16,6 +16,9 @@ from collections import defaultdict
 from threading import Event, Thread, RLock
 from traceback import print_exc
 
+from twisted.internet import reactor
+from twisted.internet.threads import blockingCallFromThread
+
 from Tribler.Core.Libtorrent.LibtorrentDownloadImpl import VODFile
 from Tribler.Core.simpledefs import DLMODE_VOD, DLMODE_NORMAL
 
@@ -186,34 +189,36 @@ class VideoRequestHandler(BaseHTTPRequestHandler):
         with lock:
             if stream.closed:
                 return
-
             stream.seek(firstbyte)
-            nbyteswritten = 0
-            while True:
-                data = stream.read(blocksize)
 
-                if len(data) == 0:
+        # The stream is only locked while reading a block, so other requests for the same stream are not blocked
+        # while a block is written to a (slow) client.
+        nbyteswritten = 0
+        while nbyteswritten < nbytes2send:
+            position = firstbyte + nbyteswritten
+            nbytes = min(blocksize, nbytes2send - nbyteswritten)
+            if not stream.wait_for_bytes(position, nbytes):
+                break
+
+            with lock:
+                if stream.closed:
                     break
-                elif length is not None and nbyteswritten + len(data) > nbytes2send:
-                    endlen = nbytes2send - nbyteswritten
-                    if endlen != 0:
-                        self.wfile.write(data[:endlen])
-                        nbyteswritten += endlen
-                    break
-                else:
-                    self.wfile.write(data)
-                    nbyteswritten += len(data)
+                data = stream.read_buffer(position, nbytes)
+
+            if len(data) == 0:
+                break
+            self.connection.sendall(data)
+            nbyteswritten += len(data)
 
-            if nbyteswritten != nbytes2send:
-                self._logger.error("sent wrong amount, wanted %s got %s", nbytes2send, nbyteswritten)
+        if nbyteswritten != nbytes2send:
+            self._logger.error("sent wrong amount, wanted %s got %s", nbytes2send, nbyteswritten)
 
-            if not requested_range:
+        if not requested_range:
+            with lock:
                 stream.close()
 
     def wait_for_handle(self, download):
-        # TODO(Martijn): Ugly time.sleep required, should be refactored when we Twistify the video server
-        while not (download.handle and download.handle.is_valid()):
-            time.sleep(1)
+        blockingCallFromThread(reactor, download.get_handle)
 
     def wait_for_buffer(self, download):
         self.event = Event()
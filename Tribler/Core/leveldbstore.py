@@ -4,7 +4,7 @@ LevelDBStore.
 Author(s): Elric Milon
 """
 import os
-from collections import MutableMapping
+from collections import MutableMapping, OrderedDict
 from itertools import chain
 
 from shutil import rmtree
@@ -42,6 +42,8 @@ from Tribler.dispersy.taskmanager import TaskManager
 
 
 WRITEBACK_PERIOD = 120
+WRITEBACK_MAX_PENDING_SIZE = 8 * 1024 * 1024  # The pending writes are flushed when their values exceed 8 MiB
+READ_CACHE_SIZE = 256  # The number of values that are kept in memory after being read
 
 # TODO(emilon): Make sure the caching makes an actual difference in IO and kill
 # it if it doesn't as it complicates the code.
@@ -57,6 +59,8 @@ class LevelDbStore(MutableMapping, TaskManager):
 
         self._store_dir = store_dir
         self._pending_torrents = {}
+        self._pending_size = 0
+        self._read_cache = OrderedDict()
         self._logger = logging.getLogger(self.__class__.__name__)
         # This is done to work around LevelDB's inability to deal with non-ascii paths on windows.
         try:
@@ -75,6 +79,9 @@ class LevelDbStore(MutableMapping, TaskManager):
                 os.makedirs(self._store_dir)
                 self._db = self._leveldb(os.path.relpath(store_dir, os.getcwdu()))
 
+        # The number of keys in the store (including pending writes), so len() does not have to iterate the keys
+        self._key_count = sum(1 for _ in self._db.RangeIter(include_value=False))
+
         self._writeback_lc = self.register_task("flush cache ", LoopingCall(self.flush))
         self._writeback_lc.clock = self._reactor
         self._writeback_lc.start(WRITEBACK_PERIOD)
@@ -83,16 +90,61 @@ class LevelDbStore(MutableMapping, TaskManager):
         try:
             return self._pending_torrents[key]
         except KeyError:
-            return self._db.Get(key)
+            pass
+
+        try:
+            value = self._read_cache.pop(key)
+        except KeyError:
+            value = self._db.Get(key)
+
+        # (Re)insert the value at the end, so the least recently read value is evicted first
+        self._read_cache[key] = value
+        if len(self._read_cache) > READ_CACHE_SIZE:
+            self._read_cache.popitem(last=False)
+        return value
 
     def __setitem__(self, key, value):
+        if key in self._pending_torrents:
+            self._pending_size -= len(self._pending_torrents[key])
+        elif not self._db_contains(key):
+            self._key_count += 1
+
+        self._read_cache.pop(key, None)
         self._pending_torrents[key] = value
-        # self._db.Put(key, value)
+        self._pending_size += len(value)
+
+        if self._pending_size > WRITEBACK_MAX_PENDING_SIZE:
+            self.flush()
 
     def __delitem__(self, key):
+        self._read_cache.pop(key, None)
         if key in self._pending_torrents:
-            self._pending_torrents.pop(key)
-        self._db.Delete(key)
+            self._pending_size -= len(self._pending_torrents.pop(key))
+            self._key_count -= 1
+            if self._db_contains(key):
+                self._db.Delete(key)
+        elif self._db_contains(key):
+            self._db.Delete(key)
+            self._key_count -= 1
+
+    def delete_many(self, keys):
+        """
+        Deletes the given keys. The keys that have been written to the database are deleted with a single write batch
+        instead of one write per key.
+        """
+        write_batch = self._writebatch(self._db)
+        for key in set(keys):
+            self._read_cache.pop(key, None)
+            in_db = self._db_contains(key)
+            if key in self._pending_torrents:
+                self._pending_size -= len(self._pending_torrents.pop(key))
+                self._key_count -= 1
+            elif in_db:
+                self._key_count -= 1
+
+            if in_db:
+                write_batch.Delete(key)
+        self._db.Write(write_batch)
 
     def __iter__(self):
         for k in self._pending_torrents.iterkeys():
@@ -101,18 +153,19 @@ class LevelDbStore(MutableMapping, TaskManager):
             yield k
 
     def __contains__(self, key):
-        if key in self._pending_torrents:
-            return True
-        try:
-            self.__getitem__(key)
-            return True
-        except KeyError:
-            pass
-
-        return False
+        return key in self._pending_torrents or key in self._read_cache or self._db_contains(key)
 
     def __len__(self):
-        return len(self._pending_torrents) + len(list(self.keys()))
+        return self._key_count
+
+    def _db_contains(self, key):
+        """
+        Checks whether a key is in the database, by seeking an iterator to it. Contrary to Get, this does not copy
+        the value.
+        """
+        for db_key in self._db.RangeIter(key_from=key, include_value=False):
+            return db_key == key
+        return False
 
     def keys(self):
         return [k for k, _ in self._db.RangeIter()]
@@ -137,9 +190,11 @@ class LevelDbStore(MutableMapping, TaskManager):
             for k, v in self._pending_torrents.iteritems():
                 write_batch.Put(k, v)
             self._pending_torrents.clear()
+            self._pending_size = 0
             return self._db.Write(write_batch)
 
     def close(self):
         self.cancel_all_pending_tasks()
         self.flush()
+        self._read_cache.clear()
         self._db = None
@@ -0,0 +1,88 @@
+"""
+Benchmark of the order book and the price-time matching strategy.
+
+Loads a large number of ticks into an OrderBook and measures how many orders per second can be matched against it.
+Run with: python -m Tribler.Test.Community.Market.benchmark_orderbook [number of ticks]
+"""
+import random
+import sys
+from time import time
+
+from Tribler.community.market.core.matching_engine import PriceTimeStrategy
+from Tribler.community.market.core.message import TraderId, MessageNumber, MessageId
+from Tribler.community.market.core.message_repository import MemoryMessageRepository
+from Tribler.community.market.core.order import Order, OrderId, OrderNumber
+from Tribler.community.market.core.orderbook import OrderBook
+from Tribler.community.market.core.price import Price
+from Tribler.community.market.core.quantity import Quantity
+from Tribler.community.market.core.tick import Ask, Bid
+from Tribler.community.market.core.timeout import Timeout
+from Tribler.community.market.core.timestamp import Timestamp
+
+NUM_TICKS = 100000
+NUM_ORDERS = 10000
+MID_PRICE = 50000  # Bids are placed below this price, asks above it
+PRICE_RANGE = 40000  # The number of distinct prices on each side of the book
+LEVELS_PER_ORDER = 10  # The number of price levels each matched order sweeps
+
+
+def load_order_book(order_book, num_ticks, rand):
+    """
+    Inserts num_ticks ticks in the order book, half of them asks and half of them bids.
+    """
+    timestamp = Timestamp.now()
+    for tick_number in xrange(num_ticks):
+        message_id = MessageId(TraderId("%x" % (tick_number + 1)), MessageNumber(str(tick_number)))
+        order_id = OrderId(TraderId("%x" % (tick_number + 1)), OrderNumber(tick_number))
+        quantity = Quantity(rand.randint(1, 100), 'MC')
+        if tick_number % 2:
+            price = Price(MID_PRICE + rand.randint(1, PRICE_RANGE), 'BTC')
+            order_book.insert_ask(Ask(message_id, order_id, price, quantity, Timeout(3600), timestamp))
+        else:
+            price = Price(MID_PRICE - rand.randint(0, PRICE_RANGE - 1), 'BTC')
+            order_book.insert_bid(Bid(message_id, order_id, price, quantity, Timeout(3600), timestamp))
+
+
+def match_orders(order_book, num_orders, rand):
+    """
+    Matches num_orders orders that each cross a few price levels of the order book.
+    :return: the number of proposed trades
+    """
+    strategy = PriceTimeStrategy(order_book)
+    ask_prices = [price for price, _ in order_book.asks.get_price_level_list('BTC', 'MC').iteritems()]
+    bid_prices = [price for price, _ in order_book.bids.get_price_level_list('BTC', 'MC').iteritems(reverse=True)]
+
+    num_trades = 0
+    for order_number in xrange(num_orders):
+        is_ask = bool(order_number % 2)
+        prices = bid_prices if is_ask else ask_prices
+        limit = prices[min(rand.randint(0, LEVELS_PER_ORDER), len(prices) - 1)]
+        order = Order(OrderId(TraderId("0"), OrderNumber(order_number)), Price(float(limit), 'BTC'),
+                      Quantity(LEVELS_PER_ORDER * 100, 'MC'), Timeout(3600), Timestamp.now(), is_ask)
+        num_trades += len(strategy.match_order(order))
+    return num_trades
+
+
+def run_benchmark(num_ticks=NUM_TICKS, num_orders=NUM_ORDERS):
+    rand = random.Random(42)
+    order_book = OrderBook(MemoryMessageRepository("0"))
+
+    start_time = time()
+    load_order_book(order_book, num_ticks, rand)
+    load_time = time() - start_time
+    num_levels = len(order_book.asks.get_price_level_list('BTC', 'MC').items()) + \
+                 len(order_book.bids.get_price_level_list('BTC', 'MC').items())
+    print "Loaded %d ticks in %d price levels in %.2f seconds (%.0f ticks/s)" % \
+          (num_ticks, num_levels, load_time, num_ticks / load_time)
+
+    start_time = time()
+    num_trades = match_orders(order_book, num_orders, rand)
+    match_time = time() - start_time
+    print "Matched %d orders (%d proposed trades) in %.2f seconds (%.0f orders/s)" % \
+          (num_orders, num_trades, match_time, num_orders / match_time)
+
+    order_book.cancel_all_pending_tasks()
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_TICKS)
@@ -1,7 +1,8 @@
 import os
 from nose.tools import raises
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import inlineCallbacks, succeed, Deferred
 
+from Tribler.Core.simpledefs import NTFY_MYPREFERENCES, NTFY_INSERT
 from Tribler.Test.Community.AbstractTestCommunity import AbstractTestCommunity
 from Tribler.Test.Core.base_test import MockObject
 from Tribler.Test.common import TESTS_DATA_DIR
@@ -43,16 +44,16 @@ class TestSearchCommunity(AbstractTestCommunity):
         create_search_response.called = False
 
         def search_names(keywords, local=False, keys=None):
-            return []
+            return succeed([])
 
         self.search_community._torrent_db = MockObject()
-        self.search_community._torrent_db.searchNames = search_names
+        self.search_community._torrent_db.searchNames_async = search_names
 
         fake_message = MockObject()
         fake_message.candidate = MockObject()
         fake_message.candidate.sock_addr = "1234"
         fake_message.payload = MockObject()
-        fake_message.payload.keywords = "test"
+        fake_message.payload.keywords = [u"test"]
         fake_message.payload.identifier = "abc"
 
         self.search_community._create_search_response = create_search_response
@@ -62,6 +63,112 @@ class TestSearchCommunity(AbstractTestCommunity):
         self.assertTrue(log_incoming_searches.called)
         self.assertTrue(create_search_response.called)
 
+    def _create_search_messages(self, keywords, sock_addrs):
+        messages = []
+        for index, sock_addr in enumerate(sock_addrs):
+            message = MockObject()
+            message.candidate = MockObject()
+            message.candidate.sock_addr = sock_addr
+            message.payload = MockObject()
+            message.payload.keywords = keywords
+            message.payload.identifier = index
+            messages.append(message)
+        return messages
+
+    def test_on_search_cached(self):
+        """
+        Test whether identical search requests are answered from the cache
+        """
+        def search_names(keywords, local=False, keys=None):
+            search_names.called += 1
+            return succeed([])
+
+        search_names.called = 0
+        responses = []
+
+        self.search_community._torrent_db = MockObject()
+        self.search_community._torrent_db.searchNames_async = search_names
+        self.search_community._create_search_response = lambda *args: responses.append(args)
+
+        self.search_community.on_search(self._create_search_messages([u"test", u"ubuntu"], ["1", "2"]))
+        self.search_community.on_search(self._create_search_messages([u"ubuntu", u"test"], ["3"]))
+
+        self.assertEqual(search_names.called, 1)
+        self.assertEqual(len(responses), 3)
+        self.assertEqual(self.search_community.num_searches_cached, 2)
+
+    def test_on_search_coalesced(self):
+        """
+        Test whether identical search requests that arrive while searching are answered with the same results
+        """
+        search_deferred = Deferred()
+        responses = []
+
+        self.search_community._torrent_db = MockObject()
+        self.search_community._torrent_db.searchNames_async = lambda *_, **__: search_deferred
+        self.search_community._create_search_response = lambda *args: responses.append(args)
+
+        self.search_community.on_search(self._create_search_messages([u"test"], ["1", "2", "3"]))
+        self.assertEqual(len(responses), 0)
+
+        search_deferred.callback([])
+        self.assertEqual([response[0] for response in responses], [0, 1, 2])
+
+    def test_on_search_rate_limited(self):
+        """
+        Test whether search requests are dropped when a candidate sends too many of them
+        """
+        self.search_community._torrent_db = MockObject()
+        self.search_community._torrent_db.searchNames_async = lambda *_, **__: succeed([])
+        self.search_community._create_search_response = lambda *_: None
+
+        self.search_community.on_search(self._create_search_messages([u"test"], ["1"] * 10))
+
+        self.assertEqual(self.search_community.num_searches_dropped, 5)
+        self.assertEqual(self.search_community.get_search_statistics()["dropped"], 5)
+
+    def test_my_preferences(self):
+        """
+        Test whether our preferences are loaded once and kept up to date with notifications
+        """
+        def get_my_pref_list(limit=None):
+            get_my_pref_list.called += 1
+            return ['b' * 20, 'a' * 20]
+
+        get_my_pref_list.called = 0
+        self.search_community._mypref_db = MockObject()
+        self.search_community._mypref_db.getMyPrefListInfohash = get_my_pref_list
+
+        self.assertEqual(self.search_community.get_my_preferences(), ['b' * 20, 'a' * 20])
+        self.search_community.on_my_preferences_inserted([[NTFY_MYPREFERENCES, NTFY_INSERT, 'c' * 20],
+                                                          [NTFY_MYPREFERENCES, NTFY_INSERT, 'a' * 20]])
+        self.assertEqual(self.search_community.get_my_preferences(), ['c' * 20, 'b' * 20, 'a' * 20])
+        self.assertEqual(get_my_pref_list.called, 1)
+
+    def test_taste_bloom_filter(self):
+        """
+        Test whether the taste bloom filter is only rebuilt when our preferences change
+        """
+        self.search_community._mypref_db = MockObject()
+        self.search_community._mypref_db.getMyPrefListInfohash = lambda limit=None: ['a' * 20]
+
+        taste_bloom_filter = self.search_community.get_taste_bloom_filter()
+        self.assertIn('a' * 20, taste_bloom_filter)
+        self.assertIs(self.search_community.get_taste_bloom_filter(), taste_bloom_filter)
+
+        self.search_community.on_my_preferences_inserted([[NTFY_MYPREFERENCES, NTFY_INSERT, 'b' * 20]])
+        taste_bloom_filter = self.search_community.get_taste_bloom_filter()
+        self.assertIn('a' * 20, taste_bloom_filter)
+        self.assertIn('b' * 20, taste_bloom_filter)
+
+    def test_taste_bloom_filter_no_preferences(self):
+        """
+        Test whether no taste bloom filter is created when we have no preferences
+        """
+        self.search_community._mypref_db = MockObject()
+        self.search_community._mypref_db.getMyPrefListInfohash = lambda limit=None: []
+        self.assertIsNone(self.search_community.get_taste_bloom_filter())
+
     @raises(DropPacket)
     def test_decode_response_invalid(self):
         """
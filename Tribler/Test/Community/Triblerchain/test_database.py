@@ -3,6 +3,7 @@ import os
 from twisted.internet.defer import inlineCallbacks
 
 from Tribler.Test.Community.Trustchain.test_trustchain_utilities import TrustChainTestCase, TestBlock
+from Tribler.community.triblerchain import database
 from Tribler.community.triblerchain.database import TriblerChainDB
 from Tribler.community.trustchain.database import DATABASE_DIRECTORY
 from Tribler.dispersy.util import blocking_call_on_reactor_thread
@@ -33,3 +34,61 @@ class TestDatabase(TrustChainTestCase):
         self.db.add_block(self.block1)
         self.db.add_block(self.block2)
         self.assertEqual((2, 2), self.db.get_num_unique_interactors(self.block1.public_key))
+
+    @blocking_call_on_reactor_thread
+    def test_get_interactor_statistics(self):
+        """
+        Test whether the interactor statistics are updated when blocks are added
+        """
+        self.assertEqual((0, 0, 0, 0), self.db.get_interactor_statistics(self.block1.public_key))
+        self.block2 = TestBlock(previous=self.block1, transaction={'up': 10, 'down': 0})
+        block3 = TestBlock(previous=self.block2, transaction={'up': 0, 'down': 5})
+        block3.link_public_key = self.block2.link_public_key
+        block3.sign(block3.key)
+        self.db.add_block(self.block1)
+        self.db.add_block(self.block2)
+        self.db.add_block(block3)
+        self.assertEqual((2, 2, 52, 47), self.db.get_interactor_statistics(self.block1.public_key))
+
+    @blocking_call_on_reactor_thread
+    def test_database_upgrade_backfill(self):
+        """
+        Test whether the interactor statistics are computed from the existing blocks when upgrading from version 5
+        """
+        self.block2 = TestBlock(previous=self.block1, transaction={'up': 42, 'down': 0})
+        self.db.add_block(self.block1)
+        self.db.add_block(self.block2)
+        self.db.execute(u"DROP TABLE triblerchain_interactions")
+        self.db.execute(u"DROP TABLE triblerchain_statistics")
+        self.db.execute(u"UPDATE option SET value = '5' WHERE key = 'database_version'")
+        self.db.commit()
+        self.db.close()
+
+        self.db = TriblerChainDB(self.getStateDir(), u'triblerchain')
+        self.assertEqual((2, 1, 84, 42), self.db.get_interactor_statistics(self.block1.public_key))
+
+    @blocking_call_on_reactor_thread
+    def test_database_upgrade_backfill_pages(self):
+        """
+        Test whether the interactions of blocks in different pages are added up when upgrading from version 5
+        """
+        self.block2 = TestBlock(previous=self.block1, transaction={'up': 10, 'down': 0})
+        block3 = TestBlock(previous=self.block2, transaction={'up': 0, 'down': 5})
+        block3.link_public_key = self.block2.link_public_key
+        block3.sign(block3.key)
+        self.db.add_block(self.block1)
+        self.db.add_block(self.block2)
+        self.db.add_block(block3)
+        self.db.execute(u"DROP TABLE triblerchain_interactions")
+        self.db.execute(u"DROP TABLE triblerchain_statistics")
+        self.db.execute(u"UPDATE option SET value = '5' WHERE key = 'database_version'")
+        self.db.commit()
+        self.db.close()
+
+        batch_size = database.BACKFILL_BATCH_SIZE
+        database.BACKFILL_BATCH_SIZE = 1
+        try:
+            self.db = TriblerChainDB(self.getStateDir(), u'triblerchain')
+        finally:
+            database.BACKFILL_BATCH_SIZE = batch_size
+        self.assertEqual((2, 2, 52, 47), self.db.get_interactor_statistics(self.block1.public_key))
@@ -51,6 +51,10 @@ class MockDatabase(object):
         item = [i for i in self.data[blk.public_key] if i.sequence_number < blk.sequence_number]
         return item[-1] if item else None
 
+    def get_block_neighbourhood(self, blk):
+        return (self.get(blk.public_key, blk.sequence_number), self.get_linked(blk), self.get_block_before(blk),
+                self.get_block_after(blk))
+
 
 class TestBlocks(TrustChainTestCase):
     """
@@ -152,6 +156,29 @@ class TestBlocks(TrustChainTestCase):
         # Assert
         self.assertEqual(result[0], ValidationResult.valid)
 
+    def test_validate_stateless(self):
+        # Arrange
+        block = TestBlock()
+        # Act
+        valid_errors = block.validate_stateless()
+        block.signature = EMPTY_SIG
+        invalid_errors = block.validate_stateless()
+        # Assert
+        self.assertEqual(valid_errors, [])
+        self.assertEqual(invalid_errors, ['Invalid signature'])
+
+    def test_validate_precomputed_stateless_errors(self):
+        # Arrange
+        db = MockDatabase()
+        (block1, block2, block3, _) = TestBlocks.setup_validate()
+        db.add_block(block1)
+        db.add_block(block3)
+        # Act
+        result = block2.validate(db, ['Invalid signature'])
+        # Assert
+        self.assertEqual(result[0], ValidationResult.invalid)
+        self.assertEqual(result[1], ['Invalid signature'])
+
     def test_validate_non_existing(self):
         # Arrange
         db = MockDatabase()
@@ -117,6 +117,38 @@ class TestDatabase(TrustChainTestCase):
         # Assert
         self.assertEqual_block(self.block1, result)
 
+    @blocking_call_on_reactor_thread
+    def test_get_block_neighbourhood(self):
+        # Arrange
+        self.block2.public_key = self.block1.public_key
+        self.block2.sequence_number = self.block1.sequence_number + 1
+        block3 = TestBlock()
+        block3.public_key = self.block2.public_key
+        block3.sequence_number = self.block2.sequence_number + 10
+        block4 = TestBlock.create({"id": 42}, self.db, TestBlock().public_key, link=self.block2)
+        self.db.add_block(self.block1)
+        self.db.add_block(self.block2)
+        self.db.add_block(block3)
+        self.db.add_block(block4)
+        # Act
+        blk, link, prev_blk, next_blk = self.db.get_block_neighbourhood(self.block2)
+        # Assert
+        self.assertEqual_block(self.block2, blk)
+        self.assertEqual_block(block4, link)
+        self.assertEqual_block(self.block1, prev_blk)
+        self.assertEqual_block(block3, next_blk)
+        self.assertEqual((None, None, None, None), self.db.get_block_neighbourhood(TestBlock()))
+
+    @blocking_call_on_reactor_thread
+    def test_get_block_cached(self):
+        # Arrange
+        self.db.add_block(self.block1)
+        # Act
+        result = self.db.get(self.block1.public_key, self.block1.sequence_number)
+        # Assert
+        self.assertIs(result, self.db.get(self.block1.public_key, self.block1.sequence_number))
+        self.assertIs(result, self.db.get_latest(self.block1.public_key))
+
     @blocking_call_on_reactor_thread
     def test_save_large_upload_download_block(self):
         """
@@ -160,9 +192,13 @@ class TestDatabase(TrustChainTestCase):
 
     @blocking_call_on_reactor_thread
     def test_database_upgrade(self):
+        self.db.executescript(u"DROP INDEX trustchain_link_idx;")
         self.set_db_version(1)
         version, = next(self.db.execute(u"SELECT value FROM option WHERE key = 'database_version' LIMIT 1"))
-        self.assertEqual(version, u"1")
+        self.assertEqual(version, u"2")
+        indices = [name for name, in self.db.execute(u"SELECT name FROM sqlite_master WHERE type = 'index'")]
+        self.assertIn(u"trustchain_link_idx", indices)
+        self.assertIn(u"trustchain_insert_time_idx", indices)
 
     @blocking_call_on_reactor_thread
     def test_database_no_downgrade(self):
@@ -0,0 +1,84 @@
+"""
+Micro-benchmark of the tunnel cell encryption.
+
+Measures how many cells per second the originator of a 1, 2 and 3 hop circuit can encrypt, and how many cells per
+second the relays of such a circuit can decrypt again. Both are measured one cell at a time with
+encrypt_str/decrypt_str and in batches with encrypt_cells/decrypt_cells.
+Run with: python -m Tribler.Test.Community.Tunnel.benchmark_tunnelcrypto [number of cells]
+"""
+import os
+import sys
+from time import time
+
+from Tribler.community.tunnel import EXIT_NODE
+from Tribler.community.tunnel.crypto.tunnelcrypto import TunnelCrypto
+
+NUM_CELLS = 20000
+CELL_SIZE = 1400
+BATCH_SIZE = 64
+
+
+def encrypt_single(crypto, hops, cells):
+    encrypted = []
+    for cell in cells:
+        for session_keys in reversed(hops):
+            cell = crypto.encrypt_str(cell, session_keys[EXIT_NODE], session_keys[EXIT_NODE + 2],
+                                      session_keys.next_salt_explicit(EXIT_NODE))
+        encrypted.append(cell)
+    return encrypted
+
+
+def decrypt_single(crypto, hops, cells):
+    decrypted = []
+    for cell in cells:
+        for session_keys in hops:
+            cell = crypto.decrypt_str(cell, session_keys[EXIT_NODE], session_keys[EXIT_NODE + 2])
+        decrypted.append(cell)
+    return decrypted
+
+
+def encrypt_batched(crypto, hops, cells):
+    encrypted = []
+    for index in xrange(0, len(cells), BATCH_SIZE):
+        batch = cells[index:index + BATCH_SIZE]
+        for session_keys in reversed(hops):
+            batch = crypto.encrypt_cells(batch, session_keys, EXIT_NODE)
+        encrypted += batch
+    return encrypted
+
+
+def decrypt_batched(crypto, hops, cells):
+    decrypted = []
+    for index in xrange(0, len(cells), BATCH_SIZE):
+        batch = cells[index:index + BATCH_SIZE]
+        for session_keys in hops:
+            batch = crypto.decrypt_cells(batch, session_keys, EXIT_NODE)
+        decrypted += batch
+    return decrypted
+
+
+def measure(function, crypto, hops, cells):
+    start_time = time()
+    result = function(crypto, hops, cells)
+    return result, len(cells) / (time() - start_time)
+
+
+def run_benchmark(num_cells=NUM_CELLS):
+    crypto = TunnelCrypto()
+    cells = [os.urandom(CELL_SIZE) for _ in xrange(num_cells)]
+
+    for num_hops in (1, 2, 3):
+        hops = [crypto.generate_session_keys(os.urandom(64)) for _ in xrange(num_hops)]
+
+        encrypted, single_encrypt = measure(encrypt_single, crypto, hops, cells)
+        _, single_decrypt = measure(decrypt_single, crypto, hops, encrypted)
+        encrypted, batched_encrypt = measure(encrypt_batched, crypto, hops, cells)
+        decrypted, batched_decrypt = measure(decrypt_batched, crypto, hops, encrypted)
+        assert decrypted == cells
+
+        print "%d hop(s): encrypt %.0f cells/s (batched %.0f cells/s), decrypt %.0f cells/s (batched %.0f cells/s)" % \
+              (num_hops, single_encrypt, batched_encrypt, single_decrypt, batched_decrypt)
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_CELLS)
@@ -0,0 +1,38 @@
+from cryptography.exceptions import InvalidTag
+
+from Tribler.Test.Core.base_test import TriblerCoreTest
+from Tribler.community.tunnel import EXIT_NODE, EXIT_NODE_SALT, EXIT_NODE_SALT_EXPLICIT
+from Tribler.community.tunnel.crypto.tunnelcrypto import TunnelCrypto
+
+
+class TestTunnelCrypto(TriblerCoreTest):
+
+    def setUp(self, annotate=True):
+        super(TestTunnelCrypto, self).setUp(annotate=annotate)
+        self.crypto = object.__new__(TunnelCrypto)
+        self.session_keys = self.crypto.generate_session_keys("1234")
+
+    def test_encrypt_decrypt_cells(self):
+        """
+        Test whether a batch of encrypted cells can be decrypted again, each with its own salt_explicit
+        """
+        cells = ["cell %d" % index for index in xrange(5)]
+        encrypted = self.crypto.encrypt_cells(cells, self.session_keys, EXIT_NODE)
+        self.assertEqual(self.session_keys[EXIT_NODE_SALT_EXPLICIT], 6)
+        self.assertEqual(len(set(encrypted)), 5)
+        self.assertEqual(self.crypto.decrypt_cells(encrypted, self.session_keys, EXIT_NODE), cells)
+
+    def test_decrypt_cells_compatible(self):
+        """
+        Test whether cells encrypted one at a time can be decrypted in a batch
+        """
+        encrypted = self.crypto.encrypt_str("cell", self.session_keys[EXIT_NODE], self.session_keys[EXIT_NODE_SALT], 2)
+        self.assertEqual(self.crypto.decrypt_cells([encrypted], self.session_keys, EXIT_NODE), ["cell"])
+
+    def test_decrypt_cells_invalid(self):
+        """
+        Test whether decrypting a batch with a tampered cell fails
+        """
+        encrypted = self.crypto.encrypt_cells(["cell", "cell"], self.session_keys, EXIT_NODE)
+        encrypted[1] = encrypted[1][:-1] + chr(ord(encrypted[1][-1]) ^ 1)
+        self.assertRaises(InvalidTag, self.crypto.decrypt_cells, encrypted, self.session_keys, EXIT_NODE)
@@ -1,5 +1,7 @@
 import binascii
 import os
+import time
+from threading import Timer
 from twisted.internet.defer import Deferred
 
 import libtorrent as lt
@@ -557,6 +559,36 @@ class TestLibtorrentDownloadImplNoSession(TriblerCoreTest):
                 has_priorities_task = True
         self.assertTrue(has_priorities_task)
 
+    def test_set_vod_readahead(self):
+        """
+        Testing whether deadlines are set on the missing pieces ahead of the playback position, nearest piece first
+        """
+        def map_file(_dummy1, start_byte, _dummy2):
+            res = MockObject()
+            res.piece = int(start_byte / 250)
+            return res
+
+        deadlines = {}
+        self.libtorrent_download_impl.handle.get_torrent_info().map_file = map_file
+        self.libtorrent_download_impl.handle.have_piece = lambda piece: piece == 2
+        self.libtorrent_download_impl.handle.set_piece_deadline = lambda piece, deadline: \
+            deadlines.__setitem__(piece, deadline)
+        self.libtorrent_download_impl.vod_index = 0
+
+        self.libtorrent_download_impl.set_vod_readahead(300)
+        self.assertEqual(sorted(deadlines.keys()), [1, 3, 4])
+        self.assertLess(deadlines[1], deadlines[3])
+        self.assertLess(deadlines[3], deadlines[4])
+
+    def test_wait_for_piece(self):
+        """
+        Testing whether waiting for a piece returns when a piece finishes
+        """
+        Timer(0.1, self.libtorrent_download_impl.on_piece_finished_alert, [None]).start()
+        start_time = time.time()
+        self.libtorrent_download_impl.wait_for_piece(5)
+        self.assertLess(time.time() - start_time, 5)
+
     def test_get_pieces_bitmask(self):
         """
         Testing whether a correct pieces bitmask is returned when requested
@@ -584,3 +616,63 @@ class TestLibtorrentDownloadImplNoSession(TriblerCoreTest):
             self.libtorrent_download_impl._on_resume_err).addCallback(on_error))
         self.libtorrent_download_impl.on_save_resume_data_failed_alert(mock_alert)
         return test_deferred
+
+    def test_on_state_update(self):
+        """
+        Testing whether the statistics of a download are taken from a batched state update, without asking the handle
+        """
+        status = MockObject()
+        status.paused = False
+        status.state = DLSTATUS_DOWNLOADING
+        status.progress = 0.5
+        status.error = None
+        status.total_wanted = 1000
+        status.download_payload_rate = 100
+        status.upload_payload_rate = 50
+        status.all_time_upload = 42
+        status.all_time_download = 84
+        status.finished_time = 0
+        status.num_complete = 3
+        status.num_incomplete = 4
+        status.num_peers = 5
+        status.num_seeds = 2
+        status.pieces = [True, False]
+
+        self.libtorrent_download_impl.handle.status = lambda: self.fail("The handle should not be asked for a status")
+        self.libtorrent_download_impl.on_state_update(status)
+
+        self.assertEqual(self.libtorrent_download_impl.get_progress(), 0.5)
+        self.assertEqual(self.libtorrent_download_impl.get_length(), 1000)
+        self.assertEqual(self.libtorrent_download_impl.all_time_ratio, 0.5)
+        statistics = self.libtorrent_download_impl.network_create_statistics_reponse()
+        self.assertEqual(statistics.numSeeds, 2)
+        self.assertEqual(statistics.numPeers, 3)
+
+    def test_network_get_stats_peers(self):
+        """
+        Testing whether the peer list and the tracker status of a download share a single get_peer_info call
+        """
+        peer_info = MockObject()
+        peer_info.source = peer_info.dht = 1
+        peer_info.pex = 2
+
+        def get_peer_info():
+            get_peer_info.calls += 1
+            return [peer_info]
+        get_peer_info.calls = 0
+
+        ltsession = MockObject()
+        ltsession.is_dht_running = lambda: True
+        self.libtorrent_download_impl.ltmgr = MockObject()
+        self.libtorrent_download_impl.ltmgr.get_session = lambda _: ltsession
+        self.libtorrent_download_impl.handle.get_peer_info = get_peer_info
+        self.libtorrent_download_impl.handle.trackers = lambda: []
+        self.libtorrent_download_impl.tdef.is_private = lambda: False
+        self.libtorrent_download_impl.get_anon_mode = lambda: False
+        self.libtorrent_download_impl.network_create_statistics_reponse = lambda: None
+        self.libtorrent_download_impl.network_create_spew_from_peerlist = lambda peer_infos: peer_infos
+
+        _, stats, _, _ = self.libtorrent_download_impl.network_get_stats(True)
+        self.assertEqual(get_peer_info.calls, 1)
+        self.assertEqual(stats['spew'], [peer_info])
+        self.assertEqual(stats['tracker_status']['[DHT]'][0], 1)
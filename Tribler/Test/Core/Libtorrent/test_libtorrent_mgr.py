@@ -1,11 +1,12 @@
 import os
 import shutil
 import tempfile
+import libtorrent as lt
 from libtorrent import bencode
-from twisted.internet.defer import inlineCallbacks, Deferred
+from twisted.internet.defer import inlineCallbacks, CancelledError, Deferred
 
 from Tribler.Core.CacheDB.Notifier import Notifier
-from Tribler.Core.Libtorrent.LibtorrentMgr import LibtorrentMgr
+from Tribler.Core.Libtorrent.LibtorrentMgr import LibtorrentMgr, ALERT_INTERVAL, VOD_ALERT_INTERVAL
 from Tribler.Core.exceptions import DuplicateDownloadException, TorrentFileException
 from Tribler.Test.Core.base_test import MockObject
 from Tribler.Test.test_as_server import AbstractServer
@@ -173,6 +174,82 @@ class TestLibtorrentMgr(AbstractServer):
         self.assertEqual(self.ltmgr.add_torrent(None, {'ti': infohash}), mock_handle)
         self.assertRaises(DuplicateDownloadException, self.ltmgr.add_torrent, None, {'ti': infohash})
 
+    def test_async_add_torrent(self):
+        """
+        Testing whether a torrent that is added asynchronously is registered once libtorrent has added it
+        """
+        class add_torrent_alert(object):
+            pass
+
+        mock_handle = MockObject()
+        mock_handle.info_hash = lambda: 'a' * 20
+        mock_handle.is_valid = lambda: True
+
+        added_atps = []
+        mock_ltsession = MockObject()
+        mock_ltsession.async_add_torrent = added_atps.append
+
+        self.ltmgr.get_session = lambda *_: mock_ltsession
+        self.ltmgr.metadata_tmpdir = tempfile.mkdtemp(suffix=u'tribler_metainfo_tmpdir')
+
+        torrent_info = MockObject()
+        torrent_info.info_hash = lambda: 'a' * 20
+        added_handles = []
+        self.ltmgr.async_add_torrent(None, {'ti': torrent_info}).addCallback(added_handles.append)
+        self.assertEqual(len(added_atps), 1)
+        self.assertEqual(self.ltmgr.get_num_pending_adds(), 1)
+        self.assertRaises(DuplicateDownloadException, self.ltmgr.async_add_torrent, None, {'ti': torrent_info})
+
+        alert = add_torrent_alert()
+        alert.handle = mock_handle
+        alert.error = MockObject()
+        alert.error.value = lambda: 0
+        self.ltmgr.process_alert(alert)
+        self.assertEqual(added_handles, [mock_handle])
+        self.assertEqual(self.ltmgr.get_num_pending_adds(), 0)
+        self.assertIn('a' * 20, self.ltmgr.torrents)
+
+    def test_remove_torrent_being_added(self):
+        """
+        Testing whether a torrent that is removed while being added asynchronously is removed from libtorrent once it
+        has been added
+        """
+        class add_torrent_alert(object):
+            pass
+
+        mock_handle = MockObject()
+        mock_handle.info_hash = lambda: 'a' * 40
+        mock_handle.is_valid = lambda: True
+
+        removed_handles = []
+        mock_ltsession = MockObject()
+        mock_ltsession.async_add_torrent = lambda _: None
+        mock_ltsession.remove_torrent = lambda handle, _: removed_handles.append(handle)
+
+        self.ltmgr.get_session = lambda *_: mock_ltsession
+        self.ltmgr.metadata_tmpdir = tempfile.mkdtemp(suffix=u'tribler_metainfo_tmpdir')
+
+        mock_download = MockObject()
+        mock_download.handle = None
+        mock_download.get_def = lambda: mock_download
+        mock_download.get_infohash = lambda: ('a' * 40).decode('hex')
+
+        torrent_info = MockObject()
+        torrent_info.info_hash = lambda: 'a' * 40
+        failures = []
+        self.ltmgr.async_add_torrent(mock_download, {'ti': torrent_info}).addErrback(failures.append)
+        self.ltmgr.remove_torrent(mock_download)
+        failures[0].trap(CancelledError)
+        self.assertEqual(self.ltmgr.get_num_pending_adds(), 0)
+
+        alert = add_torrent_alert()
+        alert.handle = mock_handle
+        alert.error = MockObject()
+        alert.error.value = lambda: 0
+        self.ltmgr.process_alert(alert)
+        self.assertEqual(removed_handles, [mock_handle])
+        self.assertNotIn('a' * 40, self.ltmgr.torrents)
+
     def test_start_download_corrupt(self):
         """
         Testing whether starting the download of a corrupt torrent file raises an exception
@@ -212,3 +289,63 @@ class TestLibtorrentMgr(AbstractServer):
         mock_lt_session.set_proxy = on_proxy_set
         self.ltmgr.metadata_tmpdir = tempfile.mkdtemp(suffix=u'tribler_metainfo_tmpdir')
         self.ltmgr.set_proxy_settings(mock_lt_session, 0, ('a', "1234"), ('abc', 'def'))
+
+    def test_process_state_update_alert(self):
+        """
+        Testing whether the statuses in a state update alert are passed to the right downloads
+        """
+        class state_update_alert(object):
+            pass
+
+        def create_status(infohash):
+            status = MockObject()
+            status.handle = MockObject()
+            status.handle.info_hash = lambda: infohash
+            return status
+
+        updates = []
+        mock_download = MockObject()
+        mock_download.on_state_update = updates.append
+        self.ltmgr.torrents['a' * 40] = (mock_download, None)
+
+        alert = state_update_alert()
+        alert.status = [create_status('a' * 40), create_status('b' * 40)]
+        self.ltmgr.metadata_tmpdir = tempfile.mkdtemp(suffix=u'tribler_metainfo_tmpdir')
+        self.ltmgr.process_alert(alert)
+        self.assertEqual(updates, [alert.status[0]])
+
+    def test_set_piece_alerts(self):
+        """
+        Testing whether piece alerts stay enabled while another download in the same session is in VOD mode
+        """
+        alert_masks = []
+        mock_ltsession = MockObject()
+        mock_ltsession.set_alert_mask = alert_masks.append
+        self.ltmgr.get_session = lambda *_: mock_ltsession
+
+        self.ltmgr.set_piece_alerts(0, 'a' * 20, True)
+        self.ltmgr.set_piece_alerts(0, 'b' * 20, True)
+        self.ltmgr.set_piece_alerts(0, 'a' * 20, False)
+        self.assertTrue(alert_masks[-1] & lt.alert.category_t.progress_notification)
+        self.assertEqual(self.ltmgr.process_alerts_lc.interval, VOD_ALERT_INTERVAL)
+
+        self.ltmgr.set_piece_alerts(0, 'b' * 20, False)
+        self.assertFalse(alert_masks[-1] & lt.alert.category_t.progress_notification)
+        self.assertEqual(self.ltmgr.process_alerts_lc.interval, ALERT_INTERVAL)
+
+    def test_alert_statistics(self):
+        """
+        Testing whether alerts nobody handles are dropped without a torrent lookup, and whether all alerts are counted
+        """
+        class dht_reply_alert(object):
+            @property
+            def handle(self):
+                raise RuntimeError("The torrent of an unhandled alert may not be looked up")
+
+        self.ltmgr.metadata_tmpdir = tempfile.mkdtemp(suffix=u'tribler_metainfo_tmpdir')
+        self.ltmgr.process_alert(dht_reply_alert())
+        self.ltmgr.process_alert(dht_reply_alert())
+
+        statistics = self.ltmgr.get_alert_statistics()
+        self.assertEqual(statistics['dht_reply_alert']['alerts'], 2)
+        self.assertFalse(statistics['dht_reply_alert']['handled'])
@@ -1,6 +1,7 @@
 import json
 from twisted.internet.defer import inlineCallbacks
 
+from Tribler.Core.simpledefs import NTFY_TORRENTS, NTFY_INSERT
 from Tribler.Test.Core.Modules.RestApi.base_api_test import AbstractApiTest
 from Tribler.Test.Core.base_test import MockObject
 from Tribler.Test.twisted_thread import deferred
@@ -69,3 +70,85 @@ class TestCircuitDebugEndpoint(AbstractApiTest):
 
         self.should_check_equality = False
         return self.do_request('debug/circuits', expected_code=200).addCallback(verify_response)
+
+
+class TestSearchDebugEndpoint(AbstractApiTest):
+
+    @deferred(timeout=10)
+    def test_get_search_cache_statistics(self):
+        """
+        Testing whether the API returns the statistics of the search cache
+        """
+        self.session.lm.search_cache.get(self.session.lm.search_cache.get_query_key(u"tribler"))
+
+        def verify_response(response):
+            response_json = json.loads(response)
+            self.assertEqual(response_json['search_cache']['misses'], 1)
+            self.assertEqual(response_json['search_cache']['hits'], 0)
+
+        self.should_check_equality = False
+        return self.do_request('debug/search', expected_code=200).addCallback(verify_response)
+
+
+class TestNotifierDebugEndpoint(AbstractApiTest):
+
+    @deferred(timeout=10)
+    def test_get_notifier_statistics(self):
+        """
+        Testing whether the API returns the statistics of the notifier
+        """
+        self.session.notifier.notify(NTFY_TORRENTS, NTFY_INSERT, None)
+
+        def verify_response(response):
+            response_json = json.loads(response)
+            self.assertGreaterEqual(response_json['subjects'][NTFY_TORRENTS]['events'], 1)
+
+        self.should_check_equality = False
+        return self.do_request('debug/notifier', expected_code=200).addCallback(verify_response)
+
+
+class TestAlertsDebugEndpoint(AbstractApiTest):
+
+    def setUpPreSession(self):
+        super(TestAlertsDebugEndpoint, self).setUpPreSession()
+        self.config.set_libtorrent_enabled(True)
+
+    @deferred(timeout=10)
+    def test_get_alert_statistics(self):
+        """
+        Testing whether the API returns the statistics of the libtorrent alerts
+        """
+        class state_update_alert(object):
+            status = []
+
+        self.session.lm.ltmgr.process_alert(state_update_alert())
+
+        def verify_response(response):
+            response_json = json.loads(response)
+            self.assertGreaterEqual(response_json['alerts']['state_update_alert']['alerts'], 1)
+            self.assertTrue(response_json['alerts']['state_update_alert']['handled'])
+
+        self.should_check_equality = False
+        return self.do_request('debug/alerts', expected_code=200).addCallback(verify_response)
+
+
+class TestAlertsDebugEndpointNoLibtorrent(AbstractApiTest):
+
+    @deferred(timeout=10)
+    def test_get_alert_statistics_no_libtorrent(self):
+        """
+        Testing whether the API returns error 404 if libtorrent is not enabled
+        """
+        self.should_check_equality = False
+        return self.do_request('debug/alerts', expected_code=404)
+
+
+class TestTorrentCheckerDebugEndpointNoChecker(AbstractApiTest):
+
+    @deferred(timeout=10)
+    def test_get_torrent_checker_statistics_no_checker(self):
+        """
+        Testing whether the API returns error 404 if torrent checking is not enabled
+        """
+        self.should_check_equality = False
+        return self.do_request('debug/torrentchecker', expected_code=404)
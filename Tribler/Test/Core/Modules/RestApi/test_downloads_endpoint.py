@@ -3,11 +3,15 @@ import os
 from binascii import hexlify
 from urllib import pathname2url
 
+from twisted.web.client import Agent, readBody
+from twisted.web.http_headers import Headers
+
 from Tribler.Core.DownloadConfig import DownloadStartupConfig
+from Tribler.Core.Modules.restapi.downloads_endpoint import DownloadsEndpoint, MAX_DELTA_REVISIONS
 from Tribler.Core.Utilities.network_utils import get_random_port
 from Tribler.Test.Core.Modules.RestApi.base_api_test import AbstractApiTest
 from Tribler.Test.common import UBUNTU_1504_INFOHASH, TESTS_DATA_DIR
-from Tribler.Test.twisted_thread import deferred
+from Tribler.Test.twisted_thread import deferred, reactor
 
 
 class TestDownloadsEndpoint(AbstractApiTest):
@@ -41,6 +45,82 @@ class TestDownloadsEndpoint(AbstractApiTest):
         self.should_check_equality = False
         return self.do_request('downloads?get_peers=1&get_pieces=1', expected_code=200).addCallback(verify_download)
 
+    @deferred(timeout=20)
+    def test_get_downloads_revision(self):
+        """
+        Testing whether the API only returns the changed fields of downloads when a revision is passed
+        """
+        def verify_delta(downloads):
+            downloads_json = json.loads(downloads)
+            self.assertFalse(downloads_json['full'])
+            for download_json in downloads_json['downloads']:
+                self.assertNotIn('name', download_json)
+                self.assertNotIn('size', download_json)
+
+        def verify_full(downloads):
+            downloads_json = json.loads(downloads)
+            self.assertEqual(len(downloads_json['downloads']), 1)
+            self.assertIn('name', downloads_json['downloads'][0])
+            self.assertEqual(downloads_json['removed'], [])
+            self.assertTrue(downloads_json['full'])
+            return self.do_request('downloads?revision=%s' % downloads_json['revision'], expected_code=200)
+
+        video_tdef, _ = self.create_local_torrent(os.path.join(TESTS_DATA_DIR, 'video.avi'))
+        self.session.start_download_from_tdef(video_tdef, DownloadStartupConfig())
+
+        self.should_check_equality = False
+        test_deferred = self.do_request('downloads?revision=0', expected_code=200)
+        return test_deferred.addCallback(verify_full).addCallback(verify_delta)
+
+    @deferred(timeout=20)
+    def test_get_downloads_unknown_revision(self):
+        """
+        Testing whether the API returns all downloads and fields when a revision from another epoch is passed
+        """
+        def verify_full(downloads):
+            downloads_json = json.loads(downloads)
+            self.assertTrue(downloads_json['full'])
+            self.assertIn('name', downloads_json['downloads'][0])
+
+        video_tdef, _ = self.create_local_torrent(os.path.join(TESTS_DATA_DIR, 'video.avi'))
+        self.session.start_download_from_tdef(video_tdef, DownloadStartupConfig())
+
+        self.should_check_equality = False
+        return self.do_request('downloads?revision=00000000-1', expected_code=200).addCallback(verify_full)
+
+    def test_prune_removed_downloads(self):
+        """
+        Testing whether removed downloads are forgotten once deltas are no longer computed from their revision
+        """
+        endpoint = DownloadsEndpoint(self.session)
+        endpoint.update_revision([{"infohash": "aa" * 20}])
+        endpoint.update_revision([])
+        self.assertIn("aa" * 20, endpoint.removed_downloads)
+        self.assertEqual(endpoint.parse_revision("%s-1" % endpoint.epoch), 1)
+
+        for progress in xrange(MAX_DELTA_REVISIONS):
+            endpoint.update_revision([{"infohash": "bb" * 20, "progress": progress}])
+        self.assertNotIn("aa" * 20, endpoint.removed_downloads)
+        self.assertEqual(endpoint.parse_revision("%s-1" % endpoint.epoch), 0)
+
+    @deferred(timeout=10)
+    def test_get_downloads_not_modified(self):
+        """
+        Testing whether the API answers with 304 Not Modified when the downloads did not change
+        """
+        url = 'http://localhost:%s/downloads' % self.session.config.get_http_api_port()
+        agent = Agent(reactor, pool=self.connection_pool)
+
+        def request_again(response):
+            etag = response.headers.getRawHeaders('etag')[0]
+            return readBody(response).addCallback(
+                lambda _: agent.request('GET', url, Headers({'If-None-Match': [etag]})))
+
+        def verify_response(response):
+            self.assertEqual(response.code, 304)
+
+        return agent.request('GET', url).addCallback(request_again).addCallback(verify_response)
+
     @deferred(timeout=10)
     def test_start_download_no_uri(self):
         """
@@ -114,6 +114,27 @@ class TestSearchEndpoint(AbstractApiTest):
         return self.do_request('search?q=test', expected_code=200, expected_json=expected_json)\
             .addCallback(self.verify_search_results)
 
+    @deferred(timeout=10)
+    def test_search_paging(self):
+        """
+        Testing whether the API only returns the requested page of the local torrent results
+        """
+        self.insert_channels_in_db(5)
+        self.insert_torrents_in_db(6)
+        self.expected_num_results_list = [5, 2]
+
+        expected_json = {"queried": True}
+        return self.do_request('search?q=test&limit=2&offset=3', expected_code=200, expected_json=expected_json)\
+            .addCallback(self.verify_search_results)
+
+    @deferred(timeout=10)
+    def test_search_invalid_paging(self):
+        """
+        Testing whether the API returns an error 400 if an invalid limit or offset is passed with the request
+        """
+        expected_json = {"error": "the limit must be positive and the offset must not be negative"}
+        return self.do_request('search?q=test&limit=0', expected_code=400, expected_json=expected_json)
+
     @deferred(timeout=10)
     def test_completions_no_query(self):
         """
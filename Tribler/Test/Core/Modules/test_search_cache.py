@@ -0,0 +1,101 @@
+from Tribler.Core.CacheDB.Notifier import Notifier
+from Tribler.Core.Modules.search_cache import SearchResultCache
+from Tribler.Core.simpledefs import NTFY_TORRENTS, NTFY_INSERT, NTFY_UPDATE
+from Tribler.Test.Core.base_test import TriblerCoreTest, MockObject
+
+
+class TestSearchResultCache(TriblerCoreTest):
+
+    def setUp(self, annotate=True):
+        super(TestSearchResultCache, self).setUp(annotate=annotate)
+
+        self.notifier = Notifier()
+        self.session = MockObject()
+        self.session.add_observer = self.notifier.add_observer
+        self.session.remove_observer = self.notifier.remove_observer
+
+        self.search_cache = SearchResultCache(self.session, max_entries=2)
+        self.search_cache.initialize()
+
+    def tearDown(self, annotate=True):
+        self.search_cache.shutdown()
+        super(TestSearchResultCache, self).tearDown(annotate=annotate)
+
+    def test_query_key(self):
+        """
+        Test whether queries that only differ in case, order and stopwords share the same key
+        """
+        self.assertEqual(SearchResultCache.get_query_key(u"The Pioneer one"),
+                         SearchResultCache.get_query_key(u"one pioneer"))
+        self.assertNotEqual(SearchResultCache.get_query_key(u"pioneer"),
+                            SearchResultCache.get_query_key(u"pioneer one"))
+
+    def test_get_put(self):
+        """
+        Test whether results are cached and whether the hits and misses are counted
+        """
+        key = SearchResultCache.get_query_key(u"pioneer")
+        self.assertIsNone(self.search_cache.get(key))
+        self.search_cache.put(key, ['result'], ['a' * 20])
+        self.assertEqual(self.search_cache.get(key), ['result'])
+
+        statistics = self.search_cache.get_statistics()
+        self.assertEqual(statistics['hits'], 1)
+        self.assertEqual(statistics['misses'], 1)
+        self.assertEqual(statistics['entries'], 1)
+
+    def test_lru_eviction(self):
+        """
+        Test whether the least recently used entry is dropped when the cache is full
+        """
+        self.search_cache.put('a', ['a'], [])
+        self.search_cache.put('b', ['b'], [])
+        self.search_cache.get('a')
+        self.search_cache.put('c', ['c'], [])
+
+        self.assertEqual(self.search_cache.get('a'), ['a'])
+        self.assertIsNone(self.search_cache.get('b'))
+        self.assertEqual(self.search_cache.get('c'), ['c'])
+
+    def test_ttl(self):
+        """
+        Test whether entries expire after the TTL
+        """
+        self.search_cache.ttl = -1
+        self.search_cache.put('a', ['a'], [])
+        self.assertIsNone(self.search_cache.get('a'))
+
+    def test_invalidate_update(self):
+        """
+        Test whether an updated torrent only invalidates the entries that contain it
+        """
+        self.search_cache.put('a', ['a'], ['a' * 20])
+        self.search_cache.put('b', ['b'], ['b' * 20])
+        self.notifier.notify(NTFY_TORRENTS, NTFY_UPDATE, 'a' * 20)
+
+        self.assertIsNone(self.search_cache.get('a'))
+        self.assertEqual(self.search_cache.get('b'), ['b'])
+        self.assertEqual(self.search_cache.get_statistics()['invalidations'], 1)
+
+    def test_invalidate_insert(self):
+        """
+        Test whether an inserted torrent invalidates all entries and results of racing searches
+        """
+        generation = self.search_cache.generation
+        self.search_cache.put('a', ['a'], ['a' * 20])
+        self.notifier.notify(NTFY_TORRENTS, NTFY_INSERT, 'c' * 20)
+        self.search_cache.put('b', ['b'], ['b' * 20], generation)
+
+        self.assertIsNone(self.search_cache.get('a'))
+        self.assertIsNone(self.search_cache.get('b'))
+
+    def test_invalidate_update_many(self):
+        """
+        Test whether an update of many torrents at once only invalidates the entries that contain one of them
+        """
+        self.search_cache.put('a', ['a'], ['a' * 20])
+        self.search_cache.put('b', ['b'], ['b' * 20])
+        self.notifier.notify(NTFY_TORRENTS, NTFY_UPDATE, None, ['a' * 20, 'c' * 20])
+
+        self.assertIsNone(self.search_cache.get('a'))
+        self.assertEqual(self.search_cache.get('b'), ['b'])
@@ -94,3 +94,23 @@ class TestTrackerManager(TriblerCoreTest):
         self.tracker_manager._tracker_dict["http://test1.com/announce"]['last_check'] = 0
         self.tracker_manager._tracker_dict["DHT"]['last_check'] = 1000
         self.assertEqual('http://test1.com/announce', self.tracker_manager.get_next_tracker_for_auto_check()[0])
+
+    @blocking_call_on_reactor_thread
+    def test_get_trackers_for_check(self):
+        """
+        Test whether the trackers that were checked longest ago are returned for the auto check, without the DHT
+        """
+        self.tracker_manager.initialize()
+        self.assertEqual(self.tracker_manager.get_next_trackers_for_auto_check(2), [])
+
+        self.tracker_manager.add_tracker("http://test1.com:80/announce")
+        self.tracker_manager.add_tracker("http://test2.com:80/announce")
+        self.tracker_manager.add_tracker("http://test3.com:80/announce")
+        self.tracker_manager._tracker_dict["http://test1.com/announce"]['last_check'] = 20
+        self.tracker_manager._tracker_dict["http://test2.com/announce"]['last_check'] = 10
+        self.tracker_manager._tracker_dict["http://test3.com/announce"]['last_check'] = 0
+
+        self.assertEqual(self.tracker_manager.get_next_trackers_for_auto_check(2),
+                         ['http://test3.com/announce', 'http://test2.com/announce'])
+        self.assertEqual(self.tracker_manager.get_next_trackers_for_auto_check(
+            2, exclude={'http://test3.com/announce'}), ['http://test2.com/announce', 'http://test1.com/announce'])
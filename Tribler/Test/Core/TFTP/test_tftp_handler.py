@@ -1,9 +1,14 @@
+from base64 import b64encode
+from hashlib import sha1
+
 from nose.tools import raises
 from twisted.internet.defer import inlineCallbacks
 
 from Tribler.Core.TFTP.exception import FileNotFound
-from Tribler.Core.TFTP.handler import TftpHandler, METADATA_PREFIX
-from Tribler.Core.TFTP.packet import OPCODE_OACK, OPCODE_ERROR, OPCODE_RRQ
+from Tribler.Core.TFTP.handler import TftpHandler, METADATA_PREFIX, MAX_LOCKSTEP_ADDRESSES
+from Tribler.Core.TFTP.packet import OPCODE_OACK, OPCODE_ERROR, OPCODE_RRQ, OPCODE_DATA, OPCODE_ACK, encode_packet, \
+    decode_packet
+from Tribler.Core.TFTP.session import Session
 from Tribler.Test.Core.base_test import TriblerCoreTest, MockObject
 from Tribler.dispersy.util import blocking_call_on_reactor_thread
 
@@ -47,6 +52,29 @@ class TestTFTPHandler(TriblerCoreTest):
         self.handler._max_retries = 1
         self.assertTrue(self.handler._check_session_timeout(mock_session))
 
+    def test_check_session_timeout_lockstep_fallback(self):
+        """
+        Testing whether an unanswered windowed request is sent again without a window instead of failing
+        """
+        sent_packets = []
+        self.handler._send_packet = lambda _, packet: sent_packets.append(packet)
+        client = Session(True, 1, ("127.0.0.1", 1), OPCODE_RRQ, u"test", '', None, None, window_size=4)
+        client.last_contact_time = 0
+        client.last_sent_packet = {'opcode': OPCODE_RRQ}
+        self.assertFalse(self.handler._check_session_timeout(client))
+        self.assertEqual(client.window_size, 1)
+        self.assertNotIn('windowsize', sent_packets[0]['options'])
+        self.assertIn(("127.0.0.1", 1), self.handler._lockstep_addresses)
+
+    def test_lockstep_addresses_limit(self):
+        """
+        Testing whether the least recently used peers without window support are forgotten first
+        """
+        for port in xrange(MAX_LOCKSTEP_ADDRESSES + 1):
+            self.handler._add_lockstep_address(("127.0.0.1", port))
+        self.assertEqual(len(self.handler._lockstep_addresses), MAX_LOCKSTEP_ADDRESSES)
+        self.assertNotIn(("127.0.0.1", 0), self.handler._lockstep_addresses)
+
     def test_schedule_callback_processing(self):
         """
         Testing whether scheduling a TFTP callback works correctly
@@ -221,3 +249,95 @@ class TestTFTPHandler(TriblerCoreTest):
         mock_session = MockObject()
         mock_session.session_id = 42
         self.handler._send_error_packet(mock_session, 43, "test")
+
+    def transfer(self, file_data, window_size, drop_blocks=()):
+        """
+        Transfers file_data between two handlers, dropping the first DATA packet of each block in drop_blocks.
+        :return: a (receiver session, sender session, list of sent DATA block numbers) tuple
+        """
+        receiver = TftpHandler(None, None, None, block_size=16, window_size=window_size)
+        self.handler._window_size = window_size
+        checksum = b64encode(sha1(file_data).digest())
+        client = Session(True, 1, ("127.0.0.1", 1), OPCODE_RRQ, u"test", '', None, None, block_size=16,
+                         window_size=window_size)
+        server = Session(False, 1, ("127.0.0.1", 2), OPCODE_RRQ, u"test", file_data, len(file_data), checksum,
+                         block_size=16, window_size=window_size)
+
+        queue = []
+        sent_blocks = []
+        dropped = set()
+
+        def send_to(handler, session):
+            def send_packet(_, packet):
+                packet = decode_packet(encode_packet(packet))
+                if packet['opcode'] == OPCODE_DATA:
+                    sent_blocks.append(packet['block_number'])
+                    if packet['block_number'] in drop_blocks and packet['block_number'] not in dropped:
+                        dropped.add(packet['block_number'])
+                        return
+                queue.append((handler, session, packet))
+            return send_packet
+
+        receiver._send_packet = send_to(self.handler, server)
+        self.handler._send_packet = send_to(receiver, client)
+        self.handler._send_oack_packet(server)
+
+        while queue and not client.is_done and not client.is_failed:
+            handler, session, packet = queue.pop(0)
+            handler._process_packet(session, packet)
+
+        receiver.cancel_all_pending_tasks()
+        return client, server, sent_blocks
+
+    def test_transfer_lockstep(self):
+        """
+        Testing whether a file is transferred one block at a time without a window
+        """
+        client, server, sent_blocks = self.transfer("a" * 100, 1)
+        self.assertTrue(client.is_done)
+        self.assertEqual(client.file_data, "a" * 100)
+        self.assertEqual(sent_blocks, range(1, 8))
+        self.assertEqual(client.bytes_transferred, 100)
+
+    def test_transfer_window(self):
+        """
+        Testing whether a file is transferred in windows of blocks, including a file that fills the last block
+        """
+        file_data = "".join(chr(i) for i in xrange(160))
+        client, server, sent_blocks = self.transfer(file_data, 4)
+        self.assertTrue(client.is_done)
+        self.assertEqual(client.file_data, file_data)
+        self.assertEqual(sent_blocks, range(1, 12))
+        self.assertLess(client.packets_sent, 5)
+
+    def test_transfer_window_lost_block(self):
+        """
+        Testing whether the sender continues from a block that was lost in the middle of a window
+        """
+        file_data = "".join(chr(i) for i in xrange(100))
+        client, server, sent_blocks = self.transfer(file_data, 4, drop_blocks=(2,))
+        self.assertTrue(client.is_done)
+        self.assertEqual(client.file_data, file_data)
+        self.assertEqual(sent_blocks[:8], [1, 2, 3, 4, 2, 3, 4, 5])
+        self.assertEqual(server.packets_retransmitted, 3)
+
+    def test_oack_windowsize_mismatch(self):
+        """
+        Testing whether an OACK with a larger window than we asked for fails the session
+        """
+        self.handler._send_error_packet = lambda *_: None
+        client = Session(True, 1, ("127.0.0.1", 1), OPCODE_RRQ, u"test", '', None, None, window_size=4)
+        packet = {'opcode': OPCODE_OACK, 'options': {'blksize': client.block_size, 'timeout': client.timeout,
+                                                     'tsize': 1, 'checksum': 'a', 'windowsize': 8}}
+        self.handler._handle_packet_as_receiver(client, packet)
+        self.assertTrue(client.is_failed)
+
+    def test_old_ack_ignored(self):
+        """
+        Testing whether ACKs older than the last acknowledged block are ignored by the sender
+        """
+        server = Session(False, 1, ("127.0.0.1", 1), OPCODE_RRQ, u"test", "a" * 100, 100, None, window_size=4)
+        server.block_number = server.acked_block_number = 4
+        self.handler._send_packet = lambda *_: self.fail("No packet should be sent")
+        self.handler._handle_packet_as_sender(server, {'opcode': OPCODE_ACK, 'block_number': 3})
+        self.assertFalse(server.is_failed)
@@ -2,7 +2,7 @@ from nose.tools import raises
 
 from Tribler.Core.TFTP.exception import InvalidStringException, InvalidPacketException, InvalidOptionException
 from Tribler.Core.TFTP.packet import _get_string, _decode_options, _decode_data, _decode_ack, _decode_error, \
-    decode_packet, OPCODE_ERROR, encode_packet
+    decode_packet, OPCODE_ERROR, OPCODE_DATA, OPCODE_OACK, encode_packet
 from Tribler.Test.Core.base_test import TriblerCoreTest
 
 
@@ -102,3 +102,17 @@ class TestTFTPPacket(TriblerCoreTest):
         encoded = encode_packet({'opcode': OPCODE_ERROR, 'session_id': 123, 'error_code': 1, 'error_msg': 'hi'})
         self.assertEqual(encoded[-3], 'h')
         self.assertEqual(encoded[-2], 'i')
+
+    def test_encode_packet_data_view(self):
+        """
+        Testing whether a DATA packet with a memoryview over the file data is encoded like one with a string
+        """
+        packet = {'opcode': OPCODE_DATA, 'session_id': 123, 'block_number': 2, 'data': memoryview("abcdef")[2:4]}
+        self.assertEqual(decode_packet(encode_packet(packet))['data'], "cd")
+
+    def test_decode_windowsize(self):
+        """
+        Testing whether the windowsize option is decoded as an integer
+        """
+        encoded = encode_packet({'opcode': OPCODE_OACK, 'session_id': 123, 'options': {'windowsize': 16}})
+        self.assertEqual(decode_packet(encoded)['options']['windowsize'], 16)
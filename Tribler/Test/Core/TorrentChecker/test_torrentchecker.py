@@ -1,5 +1,5 @@
 import time
-from twisted.internet.defer import Deferred
+from twisted.internet.defer import Deferred, succeed
 
 from Tribler.Core.CacheDB.SqliteCacheDBHandler import TorrentDBHandler
 from Tribler.Core.Category.Category import Category
@@ -109,6 +109,98 @@ class TestTorrentChecker(TriblerCoreTest):
 
         self.assertEqual(len(controlled_session.infohash_list), 1)
 
+    @blocking_call_on_reactor_thread
+    def test_task_select_tracker_max_sessions(self):
+        """
+        Test whether no more trackers are checked at the same time than allowed, one session per tracker
+        """
+        self.torrent_checker._torrent_db.addExternalTorrentNoDef(
+            'a' * 20, 'ubuntu.iso', [['a.test', 1234]], ['http://google.com/announce', 'http://tribler.org/announce'], 5)
+
+        created_sessions = []
+
+        def create_session(tracker_url, **_):
+            session = HttpTrackerSession(tracker_url, None, None, None)
+            session.connect_to_tracker = lambda: Deferred()
+            created_sessions.append(session)
+            return session
+
+        self.torrent_checker._create_session_for_request = create_session
+        self.torrent_checker._max_tracker_sessions = 1
+        self.torrent_checker._task_select_tracker()
+        self.torrent_checker._task_select_tracker()
+        self.assertEqual(len(created_sessions), 1)
+
+        self.torrent_checker._max_tracker_sessions = 2
+        self.torrent_checker._task_select_tracker()
+        self.assertEqual(len(created_sessions), 2)
+        self.assertNotEqual(created_sessions[0].tracker_url, created_sessions[1].tracker_url)
+
+    @blocking_call_on_reactor_thread
+    def test_tracker_check_result(self):
+        """
+        Test whether the results of an automatic tracker check are stored in the database
+        """
+        self.torrent_checker._torrent_db.addExternalTorrentNoDef(
+            'a' * 20, 'ubuntu.iso', [['a.test', 1234]], ['http://google.com/announce'], 5)
+
+        create_session_for_request = self.torrent_checker._create_session_for_request
+
+        def create_session(tracker_url, **kwargs):
+            session = create_session_for_request(tracker_url, **kwargs)
+            session.connect_to_tracker = lambda: succeed({tracker_url: [
+                {'infohash': ('a' * 20).encode('hex'), 'seeders': 5, 'leechers': 10}]})
+            return session
+
+        self.torrent_checker._create_session_for_request = create_session
+        self.torrent_checker._task_select_tracker()
+
+        result = self.torrent_checker._torrent_db.getTorrent('a' * 20, (u'num_seeders', u'num_leechers', u'status'),
+                                                             False)
+        self.assertEqual((result[u'num_seeders'], result[u'num_leechers'], result[u'status']), (5, 10, u'good'))
+
+        statistics = self.torrent_checker.get_statistics()
+        self.assertEqual(statistics['tracker_checks'], 1)
+        self.assertEqual(statistics['checked_torrents'], 1)
+        self.assertEqual(statistics['tracker_sessions'], 0)
+        self.assertEqual(statistics['freshness']['fresh'], 1)
+
+    @blocking_call_on_reactor_thread
+    def test_tracker_check_min_interval(self):
+        """
+        Test whether a tracker is not checked again right after a successful check
+        """
+        tracker_url = 'http://bt.etree.org/announce'
+        self.torrent_checker._torrent_db.addExternalTorrentNoDef(
+            'a' * 20, 'ubuntu.iso', [['a.test', 1234]], [tracker_url], 5)
+        self.torrent_checker._torrent_db.addExternalTorrentNoDef(
+            'b' * 20, 'debian.iso', [['b.test', 1234]], [tracker_url], 5)
+        self.session.lm.tracker_manager.should_check_tracker = lambda _: True
+
+        scraped_infohashes = []
+        create_session_for_request = self.torrent_checker._create_session_for_request
+
+        def scrape(session):
+            scraped_infohashes.append(session.infohash_list[0])
+            return succeed({session.tracker_url: [{'infohash': session.infohash_list[0].encode('hex'),
+                                           'seeders': 5, 'leechers': 10}]})
+
+        def create_session(tracker_url, **kwargs):
+            session = create_session_for_request(tracker_url, **kwargs)
+            session.connect_to_tracker = lambda: scrape(session)
+            return session
+
+        self.torrent_checker._create_session_for_request = create_session
+        self.torrent_checker._task_select_tracker()
+        self.torrent_checker._task_select_tracker()
+        self.assertEqual(len(scraped_infohashes), 1)
+
+        for checked_tracker_url in self.torrent_checker._tracker_check_times:
+            self.torrent_checker._tracker_check_times[checked_tracker_url] -= \
+                self.torrent_checker._min_tracker_check_interval
+        self.torrent_checker._task_select_tracker()
+        self.assertEqual(sorted(scraped_infohashes), ['a' * 20, 'b' * 20])
+
     @deferred(timeout=30)
     def test_tracker_test_error_resolve(self):
         """
@@ -1,12 +1,19 @@
 import os
+from binascii import hexlify
+from hashlib import sha1
+
+from libtorrent import bencode
 
 from Tribler.Core.CacheDB.SqliteCacheDBHandler import TorrentDBHandler
 from Tribler.Core.CacheDB.db_versions import LATEST_DB_VERSION
-from Tribler.Core.Upgrade.db_upgrader import DBUpgrader, VersionNoLongerSupportedError, DatabaseUpgradeError
+from Tribler.Core.CacheDB.sqlitecachedb import str2bin
+from Tribler.Core.Upgrade.db_upgrader import DBUpgrader, VersionNoLongerSupportedError, DatabaseUpgradeError, \
+    REIMPORT_CHECKPOINT, REIMPORT_BATCH_SIZE
 from Tribler.Core.Utilities.utilities import fix_torrent
 from Tribler.Core.leveldbstore import LevelDbStore
 from Tribler.Test.Core.Upgrade.upgrade_base import AbstractUpgrader, MockTorrentStore
 from Tribler.Test.common import TORRENT_UBUNTU_FILE, TORRENT_UBUNTU_FILE_INFOHASH
+from Tribler.Test.twisted_thread import deferred
 
 
 class TestDBUpgrader(AbstractUpgrader):
@@ -42,6 +49,16 @@ class TestDBUpgrader(AbstractUpgrader):
         self.assertTrue('txt' in results[0][2])
         self.assertTrue('txt' in results[0][2])
 
+    def test_upgrade_17_to_latest_binary_infohashes(self):
+        self.copy_and_initialize_upgrade_database('tribler_v17.sdb')
+        db_migrator = DBUpgrader(self.session, self.sqlitedb, torrent_store=MockTorrentStore())
+        db_migrator.start_migrate()
+
+        # The base64 encoded infohashes are stored as blobs
+        self.assertEqual(self.sqlitedb.fetchone(u"SELECT COUNT(*) FROM Torrent WHERE typeof(infohash) != 'blob'"), 0)
+        torrent_db_handler = TorrentDBHandler(self.session)
+        self.assertEqual(torrent_db_handler.getInfohash(1), str2bin('aaaaaaaaaaaaaaaaaaaa'))
+
     def test_upgrade_wrong_version(self):
         self.copy_and_initialize_upgrade_database('tribler_v17.sdb')
         db_migrator = DBUpgrader(self.session, self.sqlitedb, torrent_store=MockTorrentStore())
@@ -62,3 +79,68 @@ class TestDBUpgrader(AbstractUpgrader):
 
         torrent_db_handler = TorrentDBHandler(self.session)
         self.assertEqual(torrent_db_handler.getTorrentID(TORRENT_UBUNTU_FILE_INFOHASH), 3)
+
+    def test_reimport_torrents_checkpoint(self):
+        self.copy_and_initialize_upgrade_database('tribler_v17.sdb')
+        self.torrent_store = LevelDbStore(self.session.config.get_torrent_store_dir())
+        db_migrator = DBUpgrader(self.session, self.sqlitedb, torrent_store=self.torrent_store)
+        db_migrator.start_migrate()
+
+        self.torrent_store[TORRENT_UBUNTU_FILE_INFOHASH] = fix_torrent(TORRENT_UBUNTU_FILE)
+        self.torrent_store.flush()
+
+        # An interrupted import continues after the last torrent it has written
+        self.sqlitedb.execute_write(u"INSERT INTO MyInfo (entry, value) VALUES (?, ?)",
+                                    (REIMPORT_CHECKPOINT, hexlify(TORRENT_UBUNTU_FILE_INFOHASH)))
+        db_migrator.reimport_torrents()
+
+        torrent_db_handler = TorrentDBHandler(self.session)
+        self.assertIsNone(torrent_db_handler.getTorrentID(TORRENT_UBUNTU_FILE_INFOHASH))
+        self.assertIsNone(self.sqlitedb.fetchone(u"SELECT value FROM MyInfo WHERE entry == ?", (REIMPORT_CHECKPOINT,)))
+
+    def test_mark_reimport_pending(self):
+        """
+        Test whether the re-import is marked as pending without losing the checkpoint of an interrupted re-import
+        """
+        self.copy_and_initialize_upgrade_database('tribler_v17.sdb')
+        db_migrator = DBUpgrader(self.session, self.sqlitedb, torrent_store=MockTorrentStore())
+        db_migrator.mark_reimport_pending()
+        self.assertEqual(self.sqlitedb.fetchone(u"SELECT value FROM MyInfo WHERE entry == ?", (REIMPORT_CHECKPOINT,)),
+                         u"")
+
+        checkpoint = hexlify(TORRENT_UBUNTU_FILE_INFOHASH)
+        self.sqlitedb.execute_write(u"UPDATE MyInfo SET value = ? WHERE entry == ?", (checkpoint, REIMPORT_CHECKPOINT))
+        db_migrator.mark_reimport_pending()
+        self.assertEqual(self.sqlitedb.fetchone(u"SELECT value FROM MyInfo WHERE entry == ?", (REIMPORT_CHECKPOINT,)),
+                         checkpoint)
+
+    @deferred(timeout=60)
+    def test_reimport_torrents_in_thread(self):
+        """
+        Test whether a torrent store of more than one batch, which is decoded in a thread, is imported completely
+        """
+        self.copy_and_initialize_upgrade_database('tribler_v17.sdb')
+        self.torrent_store = LevelDbStore(self.session.config.get_torrent_store_dir())
+        db_migrator = DBUpgrader(self.session, self.sqlitedb, torrent_store=self.torrent_store)
+        db_migrator.start_migrate()
+
+        infohashes = []
+        for index in xrange(REIMPORT_BATCH_SIZE * 2 + 1):
+            info = {'name': 'torrent %d' % index, 'length': 1, 'piece length': 16384,
+                    'pieces': sha1(str(index)).digest()}
+            infohash = sha1(bencode(info)).digest()
+            self.torrent_store[infohash] = bencode({'info': info})
+            infohashes.append(infohash)
+        self.torrent_store.flush()
+
+        def verify_imported(_):
+            torrent_db_handler = TorrentDBHandler(self.session)
+            self.assertEqual(len(torrent_db_handler.getTorrentIDS(infohashes)), len(infohashes))
+            self.assertEqual(torrent_db_handler.getTorrent(infohashes[-1], keys=('name',))['name'],
+                             u'torrent %d' % (len(infohashes) - 1))
+            self.assertIsNone(self.sqlitedb.fetchone(u"SELECT value FROM MyInfo WHERE entry == ?",
+                                                     (REIMPORT_CHECKPOINT,)))
+
+        reimport_deferred = db_migrator.reimport_torrents()
+        self.assertFalse(reimport_deferred.called)
+        return reimport_deferred.addCallback(verify_imported)
@@ -2,6 +2,7 @@ import os
 from twisted.internet.defer import Deferred, inlineCallbacks
 
 from Tribler.Core.CacheDB.db_versions import LATEST_DB_VERSION, LOWEST_SUPPORTED_DB_VERSION
+from Tribler.Core.Upgrade.db_upgrader import REIMPORT_CHECKPOINT
 from Tribler.Core.Upgrade.upgrade import TriblerUpgrader
 from Tribler.Core.simpledefs import NTFY_UPGRADER_TICK, NTFY_STARTED
 from Tribler.Test.Core.Upgrade.upgrade_base import AbstractUpgrader
@@ -44,6 +45,15 @@ class TestUpgrader(AbstractUpgrader):
         self.assertFalse(self.upgrader.check_should_upgrade_database()[0])
         self.assertTrue(self.upgrader.check_should_upgrade_database()[1])
 
+    @blocking_call_on_reactor_thread
+    def test_should_upgrade_pending_reimport(self):
+        """
+        Test whether an interrupted re-import of the torrents is resumed when the database is at the latest version
+        """
+        self.sqlitedb._version = LATEST_DB_VERSION
+        self.sqlitedb.execute_write(u"INSERT INTO MyInfo (entry, value) VALUES (?, ?)", (REIMPORT_CHECKPOINT, u""))
+        self.assertEqual(self.upgrader.check_should_upgrade_database(), (False, True))
+
     @blocking_call_on_reactor_thread
     def test_upgrade_with_upgrader_enabled(self):
         self.upgrader.run()
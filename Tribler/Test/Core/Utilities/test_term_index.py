@@ -0,0 +1,50 @@
+from Tribler.Core.Utilities.term_index import TermIndex, levenshtein
+from Tribler.Test.Core.base_test import TriblerCoreTest
+
+
+class TestTermIndex(TriblerCoreTest):
+    """
+    Tests for the TermIndex class.
+    """
+
+    def setUp(self, annotate=True):
+        super(TestTermIndex, self).setUp(annotate=annotate)
+        self.term_index = TermIndex()
+        self.term_index.add_names([u"pioneer one", u"pioneer movie", u"ubuntu linux", u"pioneers"])
+
+    def test_add_name(self):
+        self.assertEqual(len(self.term_index), 6)
+        self.term_index.add_name(u"Pioneer two")
+        self.assertEqual(len(self.term_index), 7)
+        self.assertEqual(self.term_index.get_count(u"pioneer"), 3)
+        self.assertIn(u"two", self.term_index)
+
+    def test_remove_name(self):
+        self.term_index.remove_name(u"pioneer one")
+        self.assertEqual(self.term_index.get_count(u"pioneer"), 1)
+        self.assertNotIn(u"one", self.term_index)
+        self.assertEqual(len(self.term_index), 5)
+        self.term_index.remove_name(u"unknown name")
+        self.assertEqual(len(self.term_index), 5)
+
+    def test_get_terms_with_prefix(self):
+        self.assertEqual(self.term_index.get_terms_with_prefix(u"pio", 2), [u"pioneer", u"pioneers"])
+        self.assertEqual(self.term_index.get_terms_with_prefix(u"pio", 1), [u"pioneer"])
+        self.assertEqual(self.term_index.get_terms_with_prefix(u"xyz", 5), [])
+        self.assertEqual(self.term_index.get_terms_with_prefix(u"", 5), [])
+
+    def test_get_close_terms(self):
+        self.assertEqual(sorted(self.term_index.get_close_terms(u"pionere", 2)), [(u"pioneer", 2), (u"pioneers", 2)])
+        self.assertEqual(self.term_index.get_close_terms(u"linux", 0), [(u"linux", 0)])
+        self.assertEqual(self.term_index.get_close_terms(u"windows", 1), [])
+
+    def test_get_close_terms_brute_force(self):
+        self.term_index.add_names([u"one on onion", u"oneself ones"])
+        for word in [u"one", u"onoe", u"pioner", u"x"]:
+            expected = sorted((term, levenshtein(word, term)) for term in self.term_index._terms
+                              if levenshtein(word, term) <= 2)
+            self.assertEqual(sorted(self.term_index.get_close_terms(word, 2)), expected)
+
+    def test_levenshtein(self):
+        self.assertEqual(levenshtein(u"kitten", u"sitting"), 3)
+        self.assertEqual(levenshtein(u"", u"abc"), 3)
@@ -0,0 +1,27 @@
+from Tribler.Core.Utilities.token_bucket import TokenBucket
+from Tribler.Test.Core.base_test import TriblerCoreTest
+
+
+class TestTokenBucket(TriblerCoreTest):
+    """
+    Tests for the TokenBucket class.
+    """
+
+    def test_consume(self):
+        bucket = TokenBucket(0, 2)
+        self.assertTrue(bucket.consume())
+        self.assertTrue(bucket.consume())
+        self.assertFalse(bucket.consume())
+
+    def test_consume_too_many(self):
+        bucket = TokenBucket(0, 2)
+        self.assertFalse(bucket.consume(3))
+        self.assertTrue(bucket.consume(2))
+
+    def test_refill(self):
+        bucket = TokenBucket(10, 2)
+        self.assertTrue(bucket.consume(2))
+        self.assertFalse(bucket.is_full())
+        bucket.last_update -= 1
+        self.assertTrue(bucket.is_full())
+        self.assertEqual(bucket.tokens, 2)
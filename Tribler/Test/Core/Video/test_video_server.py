@@ -12,6 +12,7 @@ from twisted.internet.protocol import Protocol, connectionDone
 
 from Tribler.Core.DownloadConfig import DownloadStartupConfig
 from Tribler.Core.TorrentDef import TorrentDef
+from Tribler.Core.Libtorrent.LibtorrentDownloadImpl import VODFile
 from Tribler.Core.Utilities.network_utils import get_random_port
 from Tribler.Core.Video.VideoServer import VideoServer
 from Tribler.Test.Core.base_test import MockObject, TriblerCoreTest
@@ -103,6 +104,39 @@ class TestVideoServer(TriblerCoreTest):
         self.mock_session.get_download = lambda _: None
         self.assertEqual(self.video_server.get_vod_stream("abcd"), (None, None))
 
+    def test_vod_file_read_buffer(self):
+        """
+        Testing whether the VOD file returns the right bytes, both from the mapped file and past its end
+        """
+        map_file_result = MockObject()
+        map_file_result.piece = 0
+        map_file_result.start = 0
+        torrent_info = MockObject()
+        torrent_info.map_file = lambda *_: map_file_result
+        mock_download = MockObject()
+        mock_download.handle = MockObject()
+        mock_download.handle.get_torrent_info = lambda: torrent_info
+        mock_download.tdef = MockObject()
+        mock_download.tdef.get_pieces = lambda: '\x00' * 20
+        mock_download.tdef.get_piece_length = lambda: 16384
+        mock_download.get_vod_fileindex = lambda: 0
+        mock_download.get_vod_filesize = lambda: 0
+        mock_download.vod_seekpos = 100
+        readahead = []
+        mock_download.set_vod_readahead = readahead.append
+
+        file_name = os.path.join(self.session_base_dir, "video.bin")
+        content = os.urandom(100000)
+        with open(file_name, 'wb') as video_file:
+            video_file.write(content)
+
+        with open(file_name, 'rb') as video_file:
+            stream = VODFile(video_file, mock_download)
+            self.assertEqual(str(stream.read_buffer(100, 70000)), content[100:70100])
+            self.assertEqual(mock_download.vod_seekpos, 70100)
+            self.assertEqual(readahead, [70100])
+            self.assertEqual(str(stream.read_buffer(99990, 20)), content[99990:])
+
 
 class TestVideoServerSession(TestAsServer):
 
@@ -0,0 +1,133 @@
+"""
+Benchmark of the ingestion of channel torrents received from Dispersy.
+
+Creates a fresh megacache database and inserts a large number of synthetic channel torrents in it, in batches as they
+are received during a channel synchronization. For comparison, a fraction of them is stored with the metadata of every
+torrent added separately.
+Run with: python -m Tribler.Test.Core.benchmark_channel_torrents [number of torrents]
+"""
+import os
+import random
+import sys
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import time
+
+from Tribler.Core.CacheDB.Notifier import Notifier
+from Tribler.Core.CacheDB.SqliteCacheDBHandler import TorrentDBHandler, ChannelCastDBHandler
+from Tribler.Core.CacheDB.sqlitecachedb import SQLiteCacheDB
+from Tribler.Core.Category.Category import Category
+from Tribler.Core.Modules.tracker_manager import TrackerManager
+
+NUM_TORRENTS = 50000
+BATCH_SIZE = 1000  # The number of torrents that is stored at once, like a batch of Dispersy messages
+SINGLE_FRACTION = 10  # The comparison with separately added torrents uses one in this many torrents
+NUM_TRACKERS = 50
+WORDS = [u"ubuntu", u"debian", u"linux", u"pioneer", u"one", u"big", u"buck", u"bunny", u"sintel", u"tears", u"of",
+         u"steel", u"elephants", u"dream", u"creative", u"commons", u"music", u"album", u"live", u"2017", u"hd",
+         u"1080p", u"x264", u"documentary", u"lecture", u"course", u"season", u"episode"]
+EXTENSIONS = [u"mkv", u"mp4", u"avi", u"mp3", u"flac", u"iso", u"pdf", u"txt"]
+
+
+class BenchmarkSession(object):
+    """
+    The part of a session that the database handlers use.
+    """
+
+    def __init__(self, db_path):
+        self.sqlite_db = SQLiteCacheDB(db_path)
+        self.sqlite_db.initialize()
+        self.sqlite_db.initial_begin()
+        self.notifier = Notifier()
+        self.lm = self
+        self.config = self
+        self.category = Category()
+        self.rtorrent_handler = None
+        self.torrent_store = None
+        self.tracker_manager = TrackerManager(self)
+        self.tracker_manager.initialize()
+
+        self.torrent_db = TorrentDBHandler(self)
+        self.torrent_db.category = self.category
+        self.channelcast_db = ChannelCastDBHandler(self)
+        self.channelcast_db.torrent_db = self.torrent_db
+
+    def get_torrent_store_enabled(self):
+        return False
+
+    def close(self):
+        self.sqlite_db.commit_now()
+        self.sqlite_db.close()
+
+
+def create_torrents(channel_id, num_torrents, rand):
+    """
+    Creates num_torrents synthetic channel torrents, in the format of ChannelCastDBHandler.on_torrents_from_dispersy.
+    """
+    trackers = [u"http://tracker%d.example.com/announce" % tracker_number for tracker_number in xrange(NUM_TRACKERS)]
+    torrents = []
+    for torrent_number in xrange(num_torrents):
+        infohash = ("%020d" % torrent_number)[-20:]
+        name = u" ".join(rand.sample(WORDS, rand.randint(2, 6)))
+        files = [(u"%s %d.%s" % (name, file_number, rand.choice(EXTENSIONS)), rand.randint(1, 1 << 30))
+                 for file_number in xrange(rand.randint(1, 5))]
+        torrents.append((channel_id, torrent_number + 1, None, infohash, 1500000000 + torrent_number, name, files,
+                         rand.sample(trackers, rand.randint(0, 3))))
+    return torrents
+
+
+def ingest_batched(session, torrents):
+    """
+    Stores the channel torrents in batches of BATCH_SIZE.
+    """
+    for offset in xrange(0, len(torrents), BATCH_SIZE):
+        session.channelcast_db.on_torrents_from_dispersy(torrents[offset:offset + BATCH_SIZE])
+    session.sqlite_db.commit_now()
+
+
+def ingest_per_torrent(session, torrents):
+    """
+    Stores the channel torrents in batches of BATCH_SIZE, but adds the metadata of every new torrent and looks up its
+    channel torrent id separately, as was done before the bulk ingestion.
+    """
+    torrent_db = session.torrent_db
+    channelcast_db = session.channelcast_db
+    for offset in xrange(0, len(torrents), BATCH_SIZE):
+        batch = torrents[offset:offset + BATCH_SIZE]
+        torrent_ids, inserted = torrent_db.addOrGetTorrentIDSReturn([torrent[3] for torrent in batch])
+        for channel_id, dispersy_id, peer_id, infohash, timestamp, name, files, trackers in batch:
+            if infohash in inserted:
+                torrent_db.addExternalTorrentNoDef(infohash, name, files, trackers, timestamp)
+        session.sqlite_db.executemany(u"INSERT INTO _ChannelTorrents (dispersy_id, torrent_id, channel_id, peer_id, "
+                                      u"name, time_stamp) VALUES (?,?,?,?,?,?)",
+                                      [(torrent[1], torrent_id, torrent[0], torrent[2], torrent[5], torrent[4])
+                                       for torrent_id, torrent in zip(torrent_ids, batch)])
+        for torrent in batch:
+            channelcast_db.get_channel_torrent_id(torrent[0], torrent[3])
+    session.sqlite_db.commit_now()
+
+
+def run_benchmark(num_torrents=NUM_TORRENTS):
+    rand = random.Random(42)
+    state_dir = mkdtemp(prefix="benchmark_channel_torrents_")
+    try:
+        for name, ingest, count in [("in batches of %d" % BATCH_SIZE, ingest_batched, num_torrents),
+                                    ("one torrent at a time", ingest_per_torrent, num_torrents // SINGLE_FRACTION)]:
+            session = BenchmarkSession(os.path.join(state_dir, "%s.db" % ingest.__name__))
+            channel_id = session.sqlite_db.fetchone(u"INSERT INTO _Channels (dispersy_cid, name) VALUES (?, ?); "
+                                                    u"SELECT last_insert_rowid();", (buffer('c' * 20), u"benchmark"))
+            torrents = create_torrents(channel_id, count, rand)
+
+            start_time = time()
+            ingest(session, torrents)
+            ingest_time = time() - start_time
+            num_stored = session.sqlite_db.fetchone(u"SELECT COUNT(*) FROM ChannelTorrents")
+            print "Stored %d channel torrents %s in %.2f seconds (%.0f torrents/s)" % \
+                  (num_stored, name, ingest_time, count / ingest_time)
+            session.close()
+    finally:
+        rmtree(state_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_TORRENTS)
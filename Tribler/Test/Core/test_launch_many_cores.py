@@ -3,7 +3,7 @@ from nose.tools import raises
 from twisted.internet.defer import Deferred
 
 from Tribler.Core import NoDispersyRLock
-from Tribler.Core.APIImplementation.LaunchManyCore import TriblerLaunchMany
+from Tribler.Core.APIImplementation.LaunchManyCore import TriblerLaunchMany, RESUME_QUEUE_SIZE
 from Tribler.Core.DownloadConfig import DefaultDownloadStartupConfig
 from Tribler.Core.TorrentDef import TorrentDef
 from Tribler.Core.Utilities.configparser import CallbackConfigParser
@@ -141,9 +141,10 @@ class TestLaunchManyCore(TriblerCoreTest):
         """
         Test whether we are resuming downloads after loading checkpoint
         """
-        def mocked_resume_download(filename, setupDelay=3):
+        def mocked_resume_download(filename, pstate=None, async_add=False):
             self.assertTrue(filename.endswith('abcd.state'))
-            self.assertEqual(setupDelay, 0)
+            self.assertIsNone(pstate)
+            self.assertTrue(async_add)
             mocked_resume_download.called = True
 
         mocked_resume_download.called = False
@@ -157,6 +158,38 @@ class TestLaunchManyCore(TriblerCoreTest):
         self.lm.load_checkpoint()
         self.assertTrue(mocked_resume_download.called)
 
+    @deferred(timeout=10)
+    def test_load_checkpoint_paced(self):
+        """
+        Test whether downloads are only resumed while the libtorrent queue of torrents being added has room
+        """
+        resumed = []
+
+        def mocked_resume_download(filename, pstate=None, **_):
+            self.assertEqual(pstate.get('state', 'metainfo'), {'info': {'name': 'test'}})
+            self.assertEqual(pstate.get('download_defaults', 'saveas'), u'/downloads')
+            resumed.append(filename)
+
+        self.lm.session.get_downloads_pstate_dir = lambda: self.session_base_dir
+        for index in xrange(RESUME_QUEUE_SIZE + 1):
+            pstate = CallbackConfigParser()
+            pstate.add_section('state')
+            pstate.set('state', 'metainfo', {'info': {'name': 'test'}})
+            pstate.add_section('download_defaults')
+            pstate.set('download_defaults', 'saveas', u'/downloads')
+            pstate.write_file(os.path.join(self.session_base_dir, '%d.state' % index))
+
+        self.lm.ltmgr = MockObject()
+        self.lm.ltmgr.get_num_pending_adds = lambda: len(resumed)
+        self.lm.initComplete = True
+        self.lm.resume_download = mocked_resume_download
+        resume_deferred = self.lm.load_checkpoint()
+        self.assertEqual(len(resumed), RESUME_QUEUE_SIZE)
+
+        # Once libtorrent has added the queued torrents, the remaining download is resumed
+        self.lm.ltmgr.get_num_pending_adds = lambda: 0
+        return resume_deferred.addCallback(lambda _: self.assertEqual(len(resumed), RESUME_QUEUE_SIZE + 1))
+
     def test_resume_download(self):
         with open(os.path.join(TESTS_DATA_DIR, "bak_single.torrent"), mode='rb') as torrent_file:
             torrent_data = torrent_file.read()
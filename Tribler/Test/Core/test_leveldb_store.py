@@ -10,7 +10,8 @@ from shutil import rmtree
 from tempfile import mkdtemp
 from twisted.internet.task import Clock
 
-from Tribler.Core.leveldbstore import LevelDbStore, WRITEBACK_PERIOD, get_write_batch_leveldb
+from Tribler.Core.leveldbstore import LevelDbStore, WRITEBACK_PERIOD, get_write_batch_leveldb, \
+    WRITEBACK_MAX_PENDING_SIZE, READ_CACHE_SIZE
 from Tribler.Test.test_as_server import BaseTestCase
 
 
@@ -88,11 +89,74 @@ class AbstractTestLevelDBStore(BaseTestCase):
         self.store.flush()
         self.assertEqual(1, len(self.store), 2)
 
+    def test_len_overwrite_delete(self):
+        self.store[K] = V
+        self.store.flush()
+        self.store[K] = V
+        self.assertEqual(1, len(self.store))
+        del self.store[K]
+        self.assertEqual(0, len(self.store))
+        del self.store[K]
+        self.assertEqual(0, len(self.store))
+
+    def test_len_reopen(self):
+        self.store[K] = V
+        self.store["baz"] = V
+        store_dir = self.store._store_dir
+        self.store.close()
+        self.openStore(store_dir)
+        self.assertEqual(2, len(self.store))
+
     def test_contains(self):
         self.assertFalse(K in self.store)
         self.store[K] = V
         self.assertTrue(K in self.store)
 
+    def test_contains_flushed(self):
+        self.store[K] = V
+        self.store.flush()
+        self.assertTrue(K in self.store)
+        self.assertFalse(K[:-1] in self.store)
+        self.assertFalse(K + "a" in self.store)
+
+    def test_read_cache(self):
+        self.store[K] = V
+        self.store.flush()
+        self.assertEqual(V, self.store[K])
+        self.assertIn(K, self.store._read_cache)
+        self.store[K] = "baz"
+        self.assertNotIn(K, self.store._read_cache)
+        self.assertEqual("baz", self.store[K])
+
+    def test_read_cache_bounded(self):
+        for i in xrange(READ_CACHE_SIZE + 1):
+            self.store[str(i)] = V
+        self.store.flush()
+        for i in xrange(READ_CACHE_SIZE + 1):
+            self.store.get(str(i))
+        self.assertEqual(READ_CACHE_SIZE, len(self.store._read_cache))
+        self.assertNotIn("0", self.store._read_cache)
+
+    def test_size_flush(self):
+        self.store[K] = "a" * WRITEBACK_MAX_PENDING_SIZE
+        self.assertEqual(1, len(self.store._pending_torrents))
+        self.store["baz"] = V
+        self.assertEqual(0, len(self.store._pending_torrents))
+        self.assertEqual(V, self.store._db.Get("baz"))
+
+    def test_delete_many(self):
+        self.store[K] = V
+        self.store["baz"] = V
+        self.store.flush()
+        self.store["qux"] = V
+        self.store.get(K)
+        self.store.delete_many([K, "qux", "qux", "missing"])
+        self.assertEqual(1, len(self.store))
+        self.assertNotIn(K, self.store)
+        self.assertNotIn("qux", self.store)
+        self.assertEqual(V, self.store["baz"])
+        self.assertEqual(0, self.store._pending_size)
+
     @raises(StopIteration)
     def test_iter_empty(self):
         iteritems = self.store.iteritems()
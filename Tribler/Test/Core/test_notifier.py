@@ -22,7 +22,7 @@ class TriblerCoreTestNotifier(TriblerCoreTest):
 
     def cache_callback_func(self, events):
         self.called_callback = True
-        self.test_deferred.callback(None)
+        self.test_deferred.callback(events)
 
     @deferred(timeout=10)
     def test_notifier(self):
@@ -70,3 +70,27 @@ class TriblerCoreTestNotifier(TriblerCoreTest):
         notifier.notify(NTFY_TORRENTS, NTFY_STARTED, None)
         notifier.remove_observers()
         self.assertEqual(len(notifier.observertimers), 0)
+
+    @deferred(timeout=10)
+    def test_notifier_cache_coalesce(self):
+        notifier = Notifier()
+        notifier.add_observer(self.cache_callback_func, NTFY_TORRENTS, [NTFY_STARTED], cache=0.1, coalesce=True)
+        notifier.notify(NTFY_TORRENTS, NTFY_STARTED, 'a', 1)
+        notifier.notify(NTFY_TORRENTS, NTFY_STARTED, 'b', 2)
+        notifier.notify(NTFY_TORRENTS, NTFY_STARTED, 'a', 3)
+
+        def verify_events(events):
+            self.assertEqual(events, [[NTFY_TORRENTS, NTFY_STARTED, 'b', 2], [NTFY_TORRENTS, NTFY_STARTED, 'a', 3]])
+
+        return self.test_deferred.addCallback(verify_events)
+
+    def test_notifier_statistics(self):
+        notifier = Notifier()
+        notifier.add_observer(lambda *_: None, NTFY_TORRENTS, [NTFY_STARTED])
+        notifier.notify(NTFY_TORRENTS, NTFY_STARTED, None)
+        notifier.notify(NTFY_TORRENTS, NTFY_FINISHED, None)
+
+        statistics = notifier.get_statistics()[NTFY_TORRENTS]
+        self.assertEqual(statistics['events'], 2)
+        self.assertEqual(statistics['callbacks'], 1)
+        self.assertGreater(statistics['events_per_second'], 0)
@@ -1,4 +1,6 @@
-from Tribler.Core.Utilities.search_utils import split_into_keywords, filter_keywords
+import struct
+
+from Tribler.Core.Utilities.search_utils import split_into_keywords, filter_keywords, bm25_rank
 from Tribler.Test.Core.base_test import TriblerCoreTest
 
 
@@ -17,3 +19,12 @@ class TriblerCoreTestSearchUtils(TriblerCoreTest):
         result = filter_keywords(["to", "be", "or", "not", "to", "be"])
         self.assertIsInstance(result, list)
         self.assertEqual(len(result), 4)
+
+    def test_bm25_rank(self):
+        # One phrase, three columns and 100 rows. The term appears once in the name of the torrent only.
+        matchinfo = struct.pack('I' * 18, 1, 3, 100, 4, 10, 1, 4, 10, 1, 1, 1, 5, 0, 0, 0, 0, 0, 0)
+        self.assertGreater(bm25_rank(matchinfo), 0)
+
+        # The term matches in the file extensions only, which should give a lower score
+        matchinfo_ext = struct.pack('I' * 18, 1, 3, 100, 4, 10, 1, 4, 10, 1, 0, 0, 5, 0, 0, 0, 1, 1, 5)
+        self.assertLess(bm25_rank(matchinfo_ext), bm25_rank(matchinfo))
@@ -330,6 +330,14 @@ class TestSessionAsServer(TestAsServer):
         self.session.config.get_torrent_store_enabled = lambda: False
         self.session.delete_collected_torrent(None)
 
+    @raises(OperationNotEnabledByConfigurationException)
+    def test_delete_collected_torrents(self):
+        """
+        Test whether the delete_collected_torrents throws an exception if dispersy is not enabled.
+        """
+        self.session.config.get_torrent_store_enabled = lambda: False
+        self.session.delete_collected_torrents([])
+
     @raises(OperationNotEnabledByConfigurationException)
     def test_search_remote_channels(self):
         """
@@ -9,6 +9,7 @@ from twisted.internet.defer import inlineCallbacks
 
 from Tribler.Core.CacheDB.sqlitecachedb import SQLiteCacheDB, DB_SCRIPT_ABSOLUTE_PATH, CorruptedDatabaseError
 from Tribler.Test.Core.base_test import TriblerCoreTest
+from Tribler.Test.twisted_thread import deferred
 from Tribler.dispersy.util import blocking_call_on_reactor_thread
 
 
@@ -219,3 +220,35 @@ class TestSqliteCacheDB(TriblerCoreTest):
         self.sqlite_test.delete("person", lastname=("LIKE", "a"))
         one = self.sqlite_test.fetchone(u"SELECT * FROM person")
         self.assertEqual(one, ('x', 'z'))
+
+    @deferred(timeout=10)
+    def test_fetchall_async_memory(self):
+        """
+        This test tests whether reading asynchronously from an in-memory database falls back to the main connection.
+        """
+        self.test_insertmany()
+
+        def verify_rows(rows):
+            self.assertEqual(len(rows), 100)
+            self.assertIsNone(self.sqlite_test._read_pool)
+
+        return self.sqlite_test.fetchall_async(u"SELECT * FROM person").addCallback(verify_rows)
+
+    @deferred(timeout=10)
+    def test_fetchall_async_read_pool(self):
+        """
+        This test tests whether reading asynchronously from the read pool observes the pending writes.
+        """
+        sqlite_test_2 = SQLiteCacheDB(os.path.join(self.session_base_dir, "test_db.db"), DB_SCRIPT_ABSOLUTE_PATH)
+        sqlite_test_2.initialize()
+        sqlite_test_2.initial_begin()
+        sqlite_test_2.insert('MyInfo', entry='test', value='abc')
+
+        def verify_one(value):
+            self.assertEqual(value, 'abc')
+            self.assertIsNotNone(sqlite_test_2._read_pool)
+            sqlite_test_2.close()
+            self.assertIsNone(sqlite_test_2._read_pool)
+
+        return sqlite_test_2.fetchone_async(u"SELECT value FROM MyInfo WHERE entry = ?", ('test',))\
+            .addCallback(verify_one)
@@ -1,7 +1,7 @@
 import os
 from binascii import unhexlify
 from shutil import copy as copyfile
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import inlineCallbacks, fail
 
 from Tribler.Core.CacheDB.SqliteCacheDBHandler import TorrentDBHandler, MyPreferenceDBHandler, ChannelCastDBHandler
 from Tribler.Core.CacheDB.sqlitecachedb import str2bin
@@ -10,6 +10,7 @@ from Tribler.Core.TorrentDef import TorrentDef
 from Tribler.Core.leveldbstore import LevelDbStore
 from Tribler.Test.Core.test_sqlitecachedbhandler import AbstractDB
 from Tribler.Test.common import TESTS_DATA_DIR
+from Tribler.Test.twisted_thread import deferred
 from Tribler.dispersy.util import blocking_call_on_reactor_thread
 
 S_TORRENT_PATH_BACKUP = os.path.join(TESTS_DATA_DIR, 'bak_single.torrent')
@@ -209,6 +210,38 @@ class TestTorrentDBHandler(AbstractDB):
                                          [], 1234)
         self.assertFalse(self.tdb.getTorrentID(infohash))
 
+    @blocking_call_on_reactor_thread
+    def test_add_external_torrents_no_def(self):
+        existing_infohash = str2bin('AA8cTG7ZuPsyblbRE7CyxsrKUCg=')
+        single_infohash = unhexlify('51865489ac16e2f34ea0cd3043cfd970cc24ec09')
+        multi_infohash = unhexlify('52865489ac16e2f34ea0cd3043cfd970cc24ec09')
+        invalid_infohash = unhexlify('53865489ac16e2f34ea0cd3043cfd970cc24ec09')
+        existing_name = self.tdb.getOne('name', torrent_id=1)
+
+        torrent_ids, inserted = self.tdb.addExternalTorrentsNoDef([
+            (existing_infohash, u"existing", [(u"file1", 42)], [], 1234),
+            (single_infohash, u"single torrent.iso", [(u"single torrent.iso", 42)], ['http://localhost/announce'],
+             1234),
+            (multi_infohash, u"multi torrent", [(u"file1.mkv", 42), (u"file2.srt", 43)], [], 1234),
+            (invalid_infohash, u"invalid torrent", [(u"file1", {}), (u"file2", 43)], [], 1234)])
+
+        self.assertEqual(torrent_ids[0], 1)
+        self.assertEqual(inserted, set([single_infohash, multi_infohash, invalid_infohash]))
+        self.assertEqual(self.tdb.getOne('name', torrent_id=1), existing_name)
+
+        single_torrent = self.tdb.getTorrent(single_infohash, (u'name', u'length', u'num_files'), False)
+        self.assertEqual((single_torrent['name'], single_torrent['length'], single_torrent['num_files']),
+                         (u"single torrent.iso", 42, 1))
+        self.assertIn(u'http://localhost/announce', self.tdb.getTrackerListByInfohash(single_infohash))
+        self.assertEqual(self.tdb.getOne('length', torrent_id=torrent_ids[2]), 85)
+        self.assertIsNone(self.tdb.getOne('name', torrent_id=torrent_ids[3]))
+
+        self.assertEqual(self.tdb._db.fetchone(u"SELECT COUNT(*) FROM TorrentFiles WHERE torrent_id = ?",
+                                               (torrent_ids[2],)), 2)
+        file_extensions = self.tdb._db.fetchone(u"SELECT fileextensions FROM FullTextIndex WHERE rowid = ?",
+                                                (torrent_ids[2],))
+        self.assertEqual(set(file_extensions.split()), set([u"mkv", u"srt"]))
+
     @blocking_call_on_reactor_thread
     def test_add_get_torrent_id(self):
         infohash = str2bin('AA8cTG7ZuPsyblbRE7CyxsrKUCg=')
@@ -244,6 +277,54 @@ class TestTorrentDBHandler(AbstractDB):
         self.session.lm.torrent_store.close()
         self.assertEqual(res, old_res-20)
 
+    @blocking_call_on_reactor_thread
+    def test_free_space_eviction_score(self):
+        """
+        Test whether the collected torrent with the lowest eviction score is removed first
+        """
+        self.session.lm.torrent_store = LevelDbStore(self.session.config.get_torrent_store_dir())
+        infohash = self.tdb.getInfohash(1)
+        self.tdb.updateTorrent(infohash, notify=False, relevance=-100000)
+        self.assertEqual(self.tdb.freeSpace(1), 1)
+        self.session.lm.torrent_store.close()
+
+        self.assertFalse(self.tdb.hasTorrent(infohash))
+        self.assertFalse(self.tdb.getOne('is_collected', torrent_id=1))
+
+    @blocking_call_on_reactor_thread
+    def test_number_collected_torrents(self):
+        """
+        Test whether the number of collected torrents follows inserts, updates and deletes of collected torrents
+        """
+        num_collected = self.tdb.getNumberCollectedTorrents()
+        self.assertEqual(num_collected, self.tdb._db.getOne('CollectedTorrent', 'count(torrent_id)'))
+
+        self.tdb._db.insert('Torrent', infohash=u'a' * 28, is_collected=1)
+        self.assertEqual(self.tdb.getNumberCollectedTorrents(), num_collected + 1)
+        self.tdb._db.update('Torrent', where=u"torrent_id = 1", is_collected=0)
+        self.tdb._db.update('Torrent', where=u"torrent_id = 1", is_collected=0)
+        self.assertEqual(self.tdb.getNumberCollectedTorrents(), num_collected)
+        self.tdb._db.delete('Torrent', infohash=u'a' * 28)
+        self.assertEqual(self.tdb.getNumberCollectedTorrents(), num_collected - 1)
+
+    @blocking_call_on_reactor_thread
+    def test_eviction_score_creation_date(self):
+        """
+        Test whether the age penalty of the eviction score is capped and ignores missing or future creation dates
+        """
+        insert_time = 1500000000
+        self.tdb._db.insert('Torrent', infohash=buffer('a' * 20), relevance=0, num_seeders=100, num_leechers=0,
+                            creation_date=0, insert_time=insert_time)
+        self.assertEqual(self.tdb._db.getOne('Torrent', 'eviction_score', infohash=buffer('a' * 20)), 400)
+
+        self.tdb._db.update('Torrent', where=u"infohash = x'%s'" % ('a' * 20).encode('hex'),
+                            creation_date=insert_time + 86400)
+        self.assertEqual(self.tdb._db.getOne('Torrent', 'eviction_score', infohash=buffer('a' * 20)), 400)
+
+        self.tdb._db.update('Torrent', where=u"infohash = x'%s'" % ('a' * 20).encode('hex'),
+                            creation_date=insert_time - 1000 * 86400)
+        self.assertEqual(self.tdb._db.getOne('Torrent', 'eviction_score', infohash=buffer('a' * 20)), -100)
+
     @blocking_call_on_reactor_thread
     def test_get_search_suggestions(self):
         self.assertEqual(self.tdb.getSearchSuggestion(["content", "cont"]), ["content 1"])
@@ -252,6 +333,43 @@ class TestTorrentDBHandler(AbstractDB):
     def test_get_autocomplete_terms(self):
         self.assertEqual(len(self.tdb.getAutoCompleteTerms("content", 100)), 0)
 
+    @deferred(timeout=10)
+    def test_get_autocomplete_terms_term_index(self):
+        def verify_terms(_):
+            self.assertEqual(len(self.tdb.getAutoCompleteTerms("content", 100)), 0)
+            self.tdb._indexTorrent(4849, u"contentious torrent", [])
+            self.assertEqual(self.tdb.getAutoCompleteTerms("cont", 5), [u"content", u"contentious"])
+
+        return self.tdb.build_term_index().addCallback(verify_terms)
+
+    @deferred(timeout=10)
+    def test_term_index_reindex_and_free_space(self):
+        def verify_counts(_):
+            self.tdb._indexTorrent(4849, u"contentious torrent", [])
+            self.tdb._indexTorrent(4849, u"contentious torrent", [])
+            self.assertEqual(self.tdb.term_index.get_count(u"contentious"), 1)
+            self.tdb._remove_index_values([4849])
+            self.assertNotIn(u"contentious", self.tdb.term_index)
+
+        return self.tdb.build_term_index().addCallback(verify_counts)
+
+    @deferred(timeout=10)
+    def test_build_term_index_failed(self):
+        self.tdb._db.fetchall_async = lambda *_: fail(RuntimeError("failed"))
+
+        def verify_pending_changes(_):
+            self.assertIsNone(self.tdb.term_index)
+            self.assertIsNone(self.tdb._term_index_pending_changes)
+
+        return self.tdb.build_term_index().addCallback(verify_pending_changes)
+
+    @deferred(timeout=10)
+    def test_get_search_suggestions_term_index(self):
+        def verify_suggestions(_):
+            self.assertEqual(self.tdb.getSearchSuggestion(["contnet"]), ["content 1"])
+
+        return self.tdb.build_term_index().addCallback(verify_suggestions)
+
     @blocking_call_on_reactor_thread
     def test_get_recently_randomly_collected_torrents(self):
         self.assertEqual(len(self.tdb.getRecentlyCollectedTorrents(limit=10)), 10)
@@ -262,6 +380,34 @@ class TestTorrentDBHandler(AbstractDB):
         infohash = str2bin('AA8cTG7ZuPsyblbRE7CyxsrKUCg=')
         self.assertEqual(len(self.tdb.select_torrents_to_collect(infohash)), 0)
 
+    @blocking_call_on_reactor_thread
+    def test_update_torrent_check_results(self):
+        infohash = str2bin('AA8cTG7ZuPsyblbRE7CyxsrKUCg=')
+        torrent_id, _ = self.tdb.getTorrentCheckRetriesByInfohash([infohash, 'fake_infohash_100000'])[infohash]
+
+        notifications = []
+        self.tdb.notifier.notify = lambda *args: notifications.append(args)
+        self.tdb.updateTorrentCheckResults([(torrent_id, infohash, 5, 10, 1000, 2000, u'good', 0)])
+
+        torrent = self.tdb.getTorrent(infohash, (u'num_seeders', u'num_leechers', u'next_tracker_check'),
+                                      include_mypref=False)
+        self.assertEqual((torrent[u'num_seeders'], torrent[u'num_leechers'], torrent[u'next_tracker_check']),
+                         (5, 10, 2000))
+        self.assertEqual(len(notifications), 1)
+        self.assertEqual(notifications[0][2:], (None, [infohash]))
+
+    @blocking_call_on_reactor_thread
+    def test_get_torrent_check_statistics(self):
+        infohash = str2bin('AA8cTG7ZuPsyblbRE7CyxsrKUCg=')
+        torrent_id, _ = self.tdb.getTorrentCheckRetriesByInfohash([infohash])[infohash]
+        self.tdb.updateTorrentCheckResults([(torrent_id, infohash, 5, 10, 1000, 2000, u'good', 0)])
+
+        statistics = self.tdb.getTorrentCheckStatistics(1500, 1000)
+        self.assertGreaterEqual(statistics['checked'], 1)
+        self.assertGreaterEqual(statistics['fresh'], 1)
+        self.assertLessEqual(statistics['fresh'], statistics['checked'])
+        self.assertGreater(statistics['fresh_fraction'], 0)
+
     @blocking_call_on_reactor_thread
     def test_get_torrents_stats(self):
         self.assertEqual(self.tdb.getTorrentsStats(), (4847, 6519179841442, 187195))
@@ -291,6 +437,17 @@ class TestTorrentDBHandler(AbstractDB):
         self.assertEqual(len(results), 4848)
         self.assertEqual(results[0][3], 493785)
 
+    @blocking_call_on_reactor_thread
+    @inlineCallbacks
+    def test_search_names_async(self):
+        """
+        Test whether searching for torrents off the reactor thread returns the same results as a blocking search
+        """
+        columns = ['T.torrent_id', 'infohash', 'status', 'num_seeders']
+        self.tdb.channelcast_db = ChannelCastDBHandler(self.session)
+        results = yield self.tdb.searchNames_async(['content'], keys=columns)
+        self.assertEqual(results, self.tdb.searchNames(['content'], keys=columns))
+
     @blocking_call_on_reactor_thread
     def test_search_local_torrents(self):
         """
@@ -301,3 +458,17 @@ class TestTorrentDBHandler(AbstractDB):
         self.assertNotEqual(results[0][-1], 0.0)  # Relevance score of result should not be zero
         results = self.tdb.search_in_local_torrents_db('fdsafasfds', ['infohash'])
         self.assertEqual(len(results), 0)
+
+    @blocking_call_on_reactor_thread
+    def test_search_local_torrents_limit(self):
+        """
+        Test whether the results of a local search are ordered by relevance and paginated inside the database
+        """
+        results = self.tdb.search_in_local_torrents_db('content', ['infohash'], limit=10)
+        self.assertEqual(len(results), 10)
+        scores = [result[-1] for result in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+        next_results = self.tdb.search_in_local_torrents_db('content', ['infohash'], limit=10, offset=10)
+        self.assertEqual(len(next_results), 10)
+        self.assertLessEqual(next_results[0][-1], scores[-1])
@@ -430,3 +430,33 @@ class TestTorrentDef(BaseTestCase):
 
         t.metainfo = {'info': {'files': [{'path': ['a.txt'], 'path.utf-8': ['b.txt'], 'length': 123}]}}
         self.assertEqual(t.get_index_of_file_in_files('b.txt'), 0)
+
+    def test_get_files_table(self):
+        t = TorrentDef()
+        t.metainfo_valid = True
+        t.metainfo = {'info': {'files': [{'path': ['a.txt'], 'length': 123},
+                                         {'path': ['dir', 'b.AVI'], 'length': 0},
+                                         {'path': ['c.mkv'], 'length': 456}]}}
+        self.assertEqual(t.get_files(), [u'a.txt', os.path.join(u'dir', u'b.AVI'), u'c.mkv'])
+        self.assertEqual(t.get_files_with_length(['avi', 'mkv']), [(os.path.join(u'dir', u'b.AVI'), 0),
+                                                                    (u'c.mkv', 456)])
+        self.assertEqual(t.get_length(), 579)
+        self.assertEqual(t.get_length([u'c.mkv', u'd.txt']), 456)
+        self.assertEqual(t.get_index_of_file_in_files(u'c.mkv'), 2)
+
+        t.metainfo = {'info': {'files': [{'path': ['d.txt'], 'length': 1}]}}
+        self.assertEqual(t.get_files(), [u'd.txt'])
+        self.assertEqual(t.get_length(), 1)
+
+    def test_get_index_of_file_at_offset(self):
+        t = TorrentDef()
+        t.metainfo_valid = True
+        t.metainfo = {'info': {'files': [{'path': ['a.txt'], 'length': 100},
+                                         {'path': ['b.txt'], 'length': 0},
+                                         {'path': ['c.txt'], 'length': 50}]}}
+        self.assertEqual(t.get_index_of_file_at_offset(0), 0)
+        self.assertEqual(t.get_index_of_file_at_offset(99), 0)
+        self.assertEqual(t.get_index_of_file_at_offset(100), 2)
+        self.assertEqual(t.get_index_of_file_at_offset(149), 2)
+        self.assertIsNone(t.get_index_of_file_at_offset(150))
+        self.assertIsNone(t.get_index_of_file_at_offset(-1))
@@ -6,7 +6,6 @@ from time import time
 from traceback import print_stack
 from twisted.python.threadable import isInIOThread
 
-from Tribler.Core.CacheDB.sqlitecachedb import str2bin
 from Tribler.Core.simpledefs import NTFY_CHANNEL, NTFY_TORRENT
 from Tribler.Core.simpledefs import NTFY_DISCOVERED
 from Tribler.community.channel.payload import ModerationPayload
@@ -734,7 +733,7 @@ class ChannelCommunity(Community):
                     infohash = self._channelcast_db._db.fetchone(
                         u"SELECT infohash FROM Torrent WHERE torrent_id = ?", (torrent_id,))
                     if infohash:
-                        infohash = str2bin(infohash)
+                        infohash = str(infohash)
                         logger.debug(
                             "Incoming metadata-json with infohash %s from %s",
                             infohash.encode("HEX"),
@@ -272,7 +272,7 @@ class OrderBook(TaskManager):
         :rtype: list
         """
         profile = []
-        for key, value in self._bids.get_price_level_list(price_wallet_id, quantity_wallet_id).items():
+        for key, value in self._bids.get_price_level_list(price_wallet_id, quantity_wallet_id).iteritems():
             profile.append((key, value.depth))
         return profile
 
@@ -284,7 +284,7 @@ class OrderBook(TaskManager):
         :rtype: list
         """
         profile = []
-        for key, value in self._asks.get_price_level_list(price_wallet_id, quantity_wallet_id).items():
+        for key, value in self._asks.get_price_level_list(price_wallet_id, quantity_wallet_id).iteritems():
             profile.append((key, value.depth))
         return profile
 
@@ -345,12 +345,12 @@ class OrderBook(TaskManager):
         ids = []
 
         for price_wallet_id, quantity_wallet_id in self.asks.get_price_level_list_wallets():
-            for _, price_level in self.asks.get_price_level_list(price_wallet_id, quantity_wallet_id).items():
+            for _, price_level in self.asks.get_price_level_list(price_wallet_id, quantity_wallet_id).iteritems():
                 for ask in price_level:
                     ids.append(ask.tick.order_id)
 
         for price_wallet_id, quantity_wallet_id in self.bids.get_price_level_list_wallets():
-            for _, price_level in self.bids.get_price_level_list(price_wallet_id, quantity_wallet_id).items():
+            for _, price_level in self.bids.get_price_level_list(price_wallet_id, quantity_wallet_id).iteritems():
                 for bid in price_level:
                     ids.append(bid.tick.order_id)
 
@@ -360,11 +360,11 @@ class OrderBook(TaskManager):
         res_str = ''
         res_str += "------ Bids -------\n"
         for price_wallet_id, quantity_wallet_id in self.bids.get_price_level_list_wallets():
-            for _, value in self._bids.get_price_level_list(price_wallet_id, quantity_wallet_id).items(reverse=True):
+            for _, value in self._bids.get_price_level_list(price_wallet_id, quantity_wallet_id).iteritems(reverse=True):
                 res_str += '%s' % value
         res_str += "\n------ Asks -------\n"
         for price_wallet_id, quantity_wallet_id in self.asks.get_price_level_list_wallets():
-            for _, value in self._asks.get_price_level_list(price_wallet_id, quantity_wallet_id).items():
+            for _, value in self._asks.get_price_level_list(price_wallet_id, quantity_wallet_id).iteritems():
                 res_str += '%s' % value
         res_str += "\n"
         return res_str
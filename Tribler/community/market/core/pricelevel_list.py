@@ -1,15 +1,20 @@
+from bisect import bisect_left
+
 from Tribler.community.market.core.price import Price
 from Tribler.community.market.core.pricelevel import PriceLevel
 
 
 class PriceLevelList(object):
     """
-    Sorted doubly linked dictionary implementation.
+    Sorted dictionary implementation. The prices are kept in a sorted list, so a price and its neighbours are
+    found by bisection instead of a linear scan. A parallel list with the float values of the prices is bisected,
+    so the comparisons do not go through Price.
     """
 
     def __init__(self):
         super(PriceLevelList, self).__init__()
         self._price_list = []
+        self._price_keys = []  # The float values of the prices in _price_list
         self._price_level_dictionary = {}
 
     def insert(self, price, price_level):
@@ -20,8 +25,9 @@ class PriceLevelList(object):
         assert isinstance(price, Price), type(price)
         assert isinstance(price_level, PriceLevel), type(price_level)
 
-        self._price_list.append(price)
-        self._price_list.sort()
+        index = bisect_left(self._price_keys, float(price))
+        self._price_keys.insert(index, float(price))
+        self._price_list.insert(index, price)
         self._price_level_dictionary[price] = price_level
 
     def remove(self, price):
@@ -30,9 +36,25 @@ class PriceLevelList(object):
         """
         assert isinstance(price, Price), type(price)
 
-        self._price_list.remove(price)
+        index = self._index(price)
+        del self._price_keys[index]
+        del self._price_list[index]
         del self._price_level_dictionary[price]
 
+    def _index(self, price):
+        """
+        Returns the index of the given price in the sorted price list
+
+        :type price: Price
+        :rtype: int
+        :raises ValueError: if the price is not in the list
+        """
+        key = float(price)
+        index = bisect_left(self._price_keys, key)
+        if index == len(self._price_keys) or self._price_keys[index] != key:
+            raise ValueError("%s is not in the price level list" % price)
+        return index
+
     def succ_item(self, price):
         """
         Returns (price, price_level) pair where price is successor to given price
@@ -42,7 +64,7 @@ class PriceLevelList(object):
         """
         assert isinstance(price, Price), type(price)
 
-        index = self._price_list.index(price) + 1
+        index = self._index(price) + 1
         if index >= len(self._price_list):
             raise IndexError
         succ_price = self._price_list[index]
@@ -57,7 +79,7 @@ class PriceLevelList(object):
         """
         assert isinstance(price, Price), type(price)
 
-        index = self._price_list.index(price) - 1
+        index = self._index(price) - 1
         if index < 0:
             raise IndexError
         prev_price = self._price_list[index]
@@ -87,13 +109,19 @@ class PriceLevelList(object):
         :type reverse: bool
         :rtype: List[(Price, PriceLevel)]
         """
-        items = []
-        for price in self._price_list:
-            if reverse:
-                items.insert(0, (price, self._price_level_dictionary[price]))
-            else:
-                items.append((price, self._price_level_dictionary[price]))
-        return items
+        return list(self.iteritems(reverse))
+
+    def iteritems(self, reverse=False):
+        """
+        Iterates over the price, price_level tuples in sorted order
+
+        :param reverse: When true iterates in reversed sorted order
+        :type reverse: bool
+        :rtype: Iterator[(Price, PriceLevel)]
+        """
+        prices = reversed(self._price_list) if reverse else iter(self._price_list)
+        for price in prices:
+            yield price, self._price_level_dictionary[price]
 
     def get_ticks_list(self):
         """
@@ -101,7 +129,7 @@ class PriceLevelList(object):
         :return: list
         """
         ticks_list = []
-        for _, price_level in self.items():
+        for _, price_level in self.iteritems():
             for tick in price_level:
                 ticks_list.append(tick.tick.to_dictionary())
 
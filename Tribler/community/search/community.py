@@ -4,13 +4,17 @@ Peer to peer search functionality and discovering new torrents.
 Author(s): Niels Zeilemaker
 """
 from binascii import hexlify
+from collections import OrderedDict
 from random import shuffle
 from time import time
 from traceback import print_exc
+from twisted.internet.defer import inlineCallbacks, CancelledError
 from twisted.internet.task import LoopingCall
 
-from Tribler.Core.CacheDB.sqlitecachedb import bin2str
+from Tribler.Core.Modules.search_cache import SearchResultCache
 from Tribler.Core.TorrentDef import TorrentDef
+from Tribler.Core.Utilities.search_utils import filter_keywords
+from Tribler.Core.Utilities.token_bucket import TokenBucket
 from Tribler.community.channel.payload import TorrentPayload
 from Tribler.community.channel.preview import PreviewChannelCommunity
 from Tribler.community.search.conversion import SearchConversion
@@ -34,6 +38,23 @@ DEBUG = False
 SWIFT_INFOHASHES = 0
 CREATE_TORRENT_COLLECT_INTERVAL = 5
 
+# Responses to remote searches are cached briefly, so popular keywords are only searched for once
+SEARCH_RESPONSE_CACHE_TTL = 30
+SEARCH_RESPONSE_CACHE_MAX_ENTRIES = 256
+# The number of remote searches per second we do in the database, and the burst we allow
+SEARCH_REQUESTS_PER_SECOND = 5
+SEARCH_REQUESTS_BURST = 20
+# The number of search requests per second we answer for a single candidate, and the burst we allow
+CANDIDATE_SEARCH_REQUESTS_PER_SECOND = 0.5
+CANDIDATE_SEARCH_REQUESTS_BURST = 5
+MAX_CANDIDATE_SEARCH_BUCKETS = 1000
+
+# The number of most recent preferences that is used to determine the similarity with other peers
+MAX_TASTE_PREFERENCES = 500
+
+SEARCH_RESPONSE_KEYS = ['infohash', 'T.name', 'T.length', 'T.num_files', 'T.category', 'T.creation_date',
+                        'T.num_seeders', 'T.num_leechers']
+
 
 class SearchCommunity(Community):
 
@@ -71,11 +92,28 @@ class SearchCommunity(Community):
 
         self._rtorrent_handler = None
 
+        # Our most recent preferences, newest first. They are loaded once and then kept up to date through
+        # notifications, the bloom filter of these preferences is only rebuilt when they change.
+        self._my_preferences = None
+        self._my_preference_set = frozenset()
         self.taste_bloom_filter = None
-        self.taste_bloom_filter_key = None
+        self._taste_bloom_filter_valid = False
 
         self.torrent_cache = None
 
+        # Remote search requests are answered from a short lived cache, identical searches that are in progress are
+        # coalesced and the number of searches in the database is limited, both per candidate and overall
+        self.search_response_cache = SearchResultCache(None, max_entries=SEARCH_RESPONSE_CACHE_MAX_ENTRIES,
+                                                       ttl=SEARCH_RESPONSE_CACHE_TTL)
+        self._pending_searches = {}
+        self._search_id = 0
+        self._search_bucket = TokenBucket(SEARCH_REQUESTS_PER_SECOND, SEARCH_REQUESTS_BURST)
+        self._candidate_search_buckets = OrderedDict()
+
+        self.num_searches_served = 0
+        self.num_searches_cached = 0
+        self.num_searches_dropped = 0
+
     def initialize(self, tribler_session=None, log_incoming_searches=False):
         self.tribler_session = tribler_session
         self.integrate_with_tribler = tribler_session is not None
@@ -86,7 +124,7 @@ class SearchCommunity(Community):
         # self.taste_buddies.append([1, time(), Candidate(("127.0.0.1", 1234), False))
 
         if self.integrate_with_tribler:
-            from Tribler.Core.simpledefs import NTFY_CHANNELCAST, NTFY_TORRENTS, NTFY_MYPREFERENCES
+            from Tribler.Core.simpledefs import NTFY_CHANNELCAST, NTFY_TORRENTS, NTFY_MYPREFERENCES, NTFY_INSERT
 
             # tribler channelcast database
             self._channelcast_db = tribler_session.open_dbhandler(NTFY_CHANNELCAST)
@@ -96,6 +134,14 @@ class SearchCommunity(Community):
 
             # torrent collecting
             self._rtorrent_handler = tribler_session.lm.rtorrent_handler
+
+            self._notifier.add_observer(self.on_my_preferences_inserted, NTFY_MYPREFERENCES, [NTFY_INSERT], cache=1)
+
+            # drop cached search responses when the torrents in them change
+            self.search_response_cache = SearchResultCache(tribler_session,
+                                                           max_entries=SEARCH_RESPONSE_CACHE_MAX_ENTRIES,
+                                                           ttl=SEARCH_RESPONSE_CACHE_TTL)
+            self.search_response_cache.initialize()
         else:
             self._channelcast_db = ChannelCastDBStub(self._dispersy)
             self._torrent_db = None
@@ -106,6 +152,13 @@ class SearchCommunity(Community):
                            LoopingCall(self.create_torrent_collect_requests)).start(CREATE_TORRENT_COLLECT_INTERVAL,
                                                                                     now=True)
 
+    @inlineCallbacks
+    def unload_community(self):
+        if self.integrate_with_tribler:
+            self._notifier.remove_observer(self.on_my_preferences_inserted)
+            self.search_response_cache.shutdown()
+        yield super(SearchCommunity, self).unload_community()
+
     def initiate_meta_messages(self):
         return super(SearchCommunity, self).initiate_meta_messages() + [
             Message(self, u"search-request",
@@ -219,6 +272,51 @@ class SearchCommunity(Community):
                 break
         return candidates
 
+    def get_my_preferences(self):
+        """
+        Returns the infohashes of our most recent preferences, newest first.
+        """
+        if self._my_preferences is None:
+            self._my_preferences = self._mypref_db.getMyPrefListInfohash(limit=MAX_TASTE_PREFERENCES)
+            self._my_preference_set = frozenset(self._my_preferences)
+            self._taste_bloom_filter_valid = False
+        return self._my_preferences
+
+    def on_my_preferences_inserted(self, events):
+        """
+        Adds new preferences to the in-memory preferences, dropping the oldest ones if there are too many.
+        Called with a batch of NTFY_MYPREFERENCES insert events.
+        """
+        if self._my_preferences is None:
+            # The preferences have not been loaded yet, the new ones will be included when they are
+            return
+
+        new_preferences = []
+        for _, _, infohash in events:
+            if infohash not in self._my_preference_set and infohash not in new_preferences:
+                new_preferences.insert(0, infohash)
+
+        if new_preferences:
+            self._my_preferences = (new_preferences + self._my_preferences)[:MAX_TASTE_PREFERENCES]
+            self._my_preference_set = frozenset(self._my_preferences)
+            self._taste_bloom_filter_valid = False
+
+    def get_taste_bloom_filter(self):
+        """
+        Returns the bloom filter of our preferences that we send in introduction requests, or None if we have no
+        preferences.
+        """
+        my_preferences = self.get_my_preferences()
+        if not self._taste_bloom_filter_valid:
+            if my_preferences:
+                # no prefix changing, we want false positives (make sure it is a single char)
+                self.taste_bloom_filter = BloomFilter(0.005, len(my_preferences), prefix=' ')
+                self.taste_bloom_filter.add_keys(my_preferences)
+            else:
+                self.taste_bloom_filter = None
+            self._taste_bloom_filter_valid = True
+        return self.taste_bloom_filter
+
     def __calc_similarity(self, candidate, myPrefs, hisPrefs, overlap):
         if myPrefs > 0 and hisPrefs > 0:
             my_root = 1.0 / (myPrefs ** .5)
@@ -235,21 +333,8 @@ class SearchCommunity(Community):
 
         advice = True
         if not is_fast_walker:
-            my_preferences = sorted(self._mypref_db.getMyPrefListInfohash(limit=500))
-            num_preferences = len(my_preferences)
-
-            my_pref_key = u",".join(map(bin2str, my_preferences))
-            if my_pref_key != self.taste_bloom_filter_key:
-                if num_preferences > 0:
-                    # no prefix changing, we want false positives (make sure it is a single char)
-                    self.taste_bloom_filter = BloomFilter(0.005, len(my_preferences), prefix=' ')
-                    self.taste_bloom_filter.add_keys(my_preferences)
-                else:
-                    self.taste_bloom_filter = None
-
-                self.taste_bloom_filter_key = my_pref_key
-
-            taste_bloom_filter = self.taste_bloom_filter
+            taste_bloom_filter = self.get_taste_bloom_filter()
+            num_preferences = len(self.get_my_preferences())
 
             cache = self._request_cache.add(IntroductionRequestCache(self, destination))
             payload = (destination.sock_addr, self._dispersy._lan_address, self._dispersy._wan_address, advice, self._dispersy._connection_type, None, cache.number, num_preferences, taste_bloom_filter)
@@ -275,16 +360,23 @@ class SearchCommunity(Community):
         super(SearchCommunity, self).on_introduction_request(messages)
 
         if any(message.payload.taste_bloom_filter for message in messages):
-            my_preferences = self._mypref_db.getMyPrefListInfohash(limit=500)
+            my_preferences = self.get_my_preferences()
         else:
             my_preferences = []
 
+        # Peers that have the same preferences send identical bloom filters, the overlap with those is only
+        # computed once per batch
+        overlaps = {}
         new_taste_buddies = []
         for message in messages:
             taste_bloom_filter = message.payload.taste_bloom_filter
             num_preferences = message.payload.num_preferences
             if taste_bloom_filter:
-                overlap = sum(infohash in taste_bloom_filter for infohash in my_preferences)
+                filter_key = (taste_bloom_filter.prefix, taste_bloom_filter.functions, taste_bloom_filter.bytes)
+                overlap = overlaps.get(filter_key)
+                if overlap is None:
+                    overlap = overlaps[filter_key] = sum(infohash in taste_bloom_filter
+                                                         for infohash in my_preferences)
             else:
                 overlap = 0
 
@@ -340,30 +432,86 @@ class SearchCommunity(Community):
             if self.log_incoming_searches:
                 self.log_incoming_searches(message.candidate.sock_addr, keywords)
 
-            results = []
-            dbresults = self._torrent_db.searchNames(keywords, local=False, keys=['infohash', 'T.name', 'T.length', 'T.num_files', 'T.category', 'T.creation_date', 'T.num_seeders', 'T.num_leechers'])
-            if len(dbresults) > 0:
-                for dbresult in dbresults:
-                    channel_details = dbresult[-10:]
-
-                    dbresult = list(dbresult[:8])
-                    dbresult[2] = long(dbresult[2])  # length
-                    dbresult[3] = int(dbresult[3])  # num_files
-                    dbresult[4] = [dbresult[4]]  # category
-                    dbresult[5] = long(dbresult[5])  # creation_date
-                    dbresult[6] = int(dbresult[6] or 0)  # num_seeders
-                    dbresult[7] = int(dbresult[7] or 0)  # num_leechers
-
-                    # cid
-                    if channel_details[1]:
-                        channel_details[1] = str(channel_details[1])
-                    dbresult.append(channel_details[1])
-
-                    results.append(tuple(dbresult))
-            elif DEBUG:
-                self._logger.debug(u"no results")
+            if not self._get_candidate_search_bucket(message.candidate).consume():
+                self._logger.debug(u"dropping search request from %s, too many requests", message.candidate)
+                self.num_searches_dropped += 1
+                continue
 
-            self._create_search_response(message.payload.identifier, results, message.candidate)
+            # The keywords are matched in any order, so searches with the same set of keywords have the same results
+            key = frozenset(filter_keywords(keywords))
+            request = (message.payload.identifier, message.candidate)
+
+            results = self.search_response_cache.get(key)
+            if results is not None:
+                self.num_searches_cached += 1
+                self._create_search_response(request[0], results, request[1])
+            elif key in self._pending_searches:
+                self.num_searches_cached += 1
+                self._pending_searches[key].append(request)
+            elif not self._search_bucket.consume():
+                self._logger.debug(u"dropping search request from %s, too many searches", message.candidate)
+                self.num_searches_dropped += 1
+            else:
+                self._pending_searches[key] = [request]
+                self._search_id += 1
+                search_deferred = self._torrent_db.searchNames_async(keywords, local=False, keys=SEARCH_RESPONSE_KEYS)
+                search_deferred.addCallback(self._on_search_results, key, self.search_response_cache.generation)
+                search_deferred.addErrback(self._on_search_failed, key)
+                self.register_task(u"search %d" % self._search_id, search_deferred)
+
+    def _get_candidate_search_bucket(self, candidate):
+        """
+        Returns the token bucket that limits the number of search requests of a candidate.
+        """
+        # The buckets are kept in the order in which they were last used, so the oldest bucket is forgotten first
+        bucket = self._candidate_search_buckets.pop(candidate.sock_addr, None)
+        if bucket is None:
+            if len(self._candidate_search_buckets) >= MAX_CANDIDATE_SEARCH_BUCKETS:
+                self._candidate_search_buckets.popitem(last=False)
+            bucket = TokenBucket(CANDIDATE_SEARCH_REQUESTS_PER_SECOND, CANDIDATE_SEARCH_REQUESTS_BURST)
+        self._candidate_search_buckets[candidate.sock_addr] = bucket
+        return bucket
+
+    def _on_search_results(self, dbresults, key, generation):
+        results = []
+        for dbresult in dbresults:
+            channel_details = dbresult[-10:]
+
+            dbresult = list(dbresult[:8])
+            dbresult[2] = long(dbresult[2])  # length
+            dbresult[3] = int(dbresult[3])  # num_files
+            dbresult[4] = [dbresult[4]]  # category
+            dbresult[5] = long(dbresult[5])  # creation_date
+            dbresult[6] = int(dbresult[6] or 0)  # num_seeders
+            dbresult[7] = int(dbresult[7] or 0)  # num_leechers
+
+            # cid
+            if channel_details[1]:
+                channel_details[1] = str(channel_details[1])
+            dbresult.append(channel_details[1])
+
+            results.append(tuple(dbresult))
+
+        if DEBUG and not results:
+            self._logger.debug(u"no results")
+
+        self.search_response_cache.put(key, results, [result[0] for result in results], generation)
+        for identifier, candidate in self._pending_searches.pop(key, []):
+            self._create_search_response(identifier, results, candidate)
+
+    def _on_search_failed(self, failure, key):
+        requests = self._pending_searches.pop(key, [])
+        self.num_searches_dropped += len(requests)
+        if not failure.check(CancelledError):
+            self._logger.error(u"searching for %s failed: %s", list(key), failure.getErrorMessage())
+
+    def get_search_statistics(self):
+        """
+        Returns a dictionary with statistics about the search requests of other peers.
+        """
+        return {"served": self.num_searches_served, "cached": self.num_searches_cached,
+                "dropped": self.num_searches_dropped, "pending": len(self._pending_searches),
+                "cache": self.search_response_cache.get_statistics()}
 
     def _create_search_response(self, identifier, results, candidate):
         # create search-response message
@@ -371,6 +519,7 @@ class SearchCommunity(Community):
         message = meta.impl(authentication=(self._my_member,),
                             distribution=(self.global_time,), destination=(candidate,), payload=(identifier, results))
         self._dispersy._forward([message])
+        self.num_searches_served += 1
 
         if DEBUG:
             self._logger.debug(u"returning %s results to %s", len(results), candidate)
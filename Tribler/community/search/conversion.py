@@ -18,6 +18,8 @@ class SearchConversion(BinaryConversion):
 
     def __init__(self, community):
         super(SearchConversion, self).__init__(community, "\x02")
+        # The community reuses its taste bloom filter until its preferences change, so it is encoded only once
+        self._encoded_taste_bloom_filter = (None, None)
         self.define_meta_message(chr(1), community.get_meta_message(u"search-request"), self._encode_search_request, self._decode_search_request)
         self.define_meta_message(chr(2), community.get_meta_message(u"search-response"), self._encode_search_response, self._decode_search_response)
         self.define_meta_message(chr(3), community.get_meta_message(u"torrent-request"), self._encode_torrent_request, self._decode_torrent_request)
@@ -28,8 +30,11 @@ class SearchConversion(BinaryConversion):
     def _encode_introduction_request(self, message):
         data = BinaryConversion._encode_introduction_request(self, message)
 
-        if message.payload.taste_bloom_filter:
-            data.extend((pack('!IBH', message.payload.num_preferences, message.payload.taste_bloom_filter.functions, message.payload.taste_bloom_filter.size), message.payload.taste_bloom_filter.prefix, message.payload.taste_bloom_filter.bytes))
+        taste_bloom_filter = message.payload.taste_bloom_filter
+        if taste_bloom_filter:
+            if self._encoded_taste_bloom_filter[0] is not taste_bloom_filter:
+                self._encoded_taste_bloom_filter = (taste_bloom_filter, taste_bloom_filter.bytes)
+            data.extend((pack('!IBH', message.payload.num_preferences, taste_bloom_filter.functions, taste_bloom_filter.size), taste_bloom_filter.prefix, self._encoded_taste_bloom_filter[1]))
         return data
 
     def _decode_introduction_request(self, placeholder, offset, data):
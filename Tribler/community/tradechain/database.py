@@ -5,7 +5,7 @@ class TradeChainDB(TrustChainDB):
     """
     Persistence layer for the TradeChain Community.
     """
-    LATEST_DB_VERSION = 1
+    LATEST_DB_VERSION = 2
 
     def get_all_blocks(self):
         """
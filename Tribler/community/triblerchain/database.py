@@ -1,11 +1,56 @@
+from Tribler.Core.Utilities.encoding import decode
 from Tribler.community.trustchain.database import TrustChainDB
 
+BACKFILL_BATCH_SIZE = 10000  # The number of blocks that is read at once when backfilling the interactions
+
 
 class TriblerChainDB(TrustChainDB):
     """
     Persistence layer for the TriblerChain Community.
+    Next to the blocks, it maintains the amounts exchanged with every interactor and an aggregate per public key, so
+    the statistics of a member do not require decoding all of its blocks.
     """
-    LATEST_DB_VERSION = 4
+    LATEST_DB_VERSION = 6
+
+    def add_block(self, block, commit=True):
+        """
+        Persist a block and update the interactor statistics of its creator.
+        :param block: The data that will be saved.
+        :param commit: False to leave committing to the caller, for instance when adding a batch of blocks.
+        """
+        super(TriblerChainDB, self).add_block(block, commit=False)
+        self._add_interaction(buffer(block.public_key), buffer(block.link_public_key),
+                              max(0, int(block.transaction["up"])), max(0, int(block.transaction["down"])))
+        if commit:
+            self.commit()
+
+    def _add_interaction(self, public_key, link_public_key, up, down):
+        """
+        Adds the amounts of a single block to the interaction between public_key and link_public_key, and to the
+        aggregate of public_key. An interactor is counted as a unique peer the first time an amount is exchanged.
+        """
+        row = self.execute(u"SELECT up, down FROM %s_interactions WHERE public_key = ? AND link_public_key = ?"
+                           % self.db_name, (public_key, link_public_key)).fetchone()
+        old_up, old_down = row if row else (0, 0)
+        self.execute(u"INSERT OR REPLACE INTO %s_interactions (public_key, link_public_key, up, down) "
+                     u"VALUES(?,?,?,?)" % self.db_name, (public_key, link_public_key, old_up + up, old_down + down))
+
+        self.execute(u"INSERT OR IGNORE INTO %s_statistics (public_key, peers_helped, peers_helped_by, total_up, "
+                     u"total_down) VALUES(?,0,0,0,0)" % self.db_name, (public_key,))
+        self.execute(u"UPDATE %s_statistics SET peers_helped = peers_helped + ?, peers_helped_by = peers_helped_by + ?,"
+                     u" total_up = total_up + ?, total_down = total_down + ? WHERE public_key = ?" % self.db_name,
+                     (int(old_up == 0 and up > 0), int(old_down == 0 and down > 0), up, down, public_key))
+
+    def get_interactor_statistics(self, public_key):
+        """
+        Returns the aggregated interactions of a public key.
+        :param public_key: The public key of the member of which we want the information
+        :return: A tuple of the number of unique interactors you helped, the number of unique interactors that helped
+                 you, and the total amounts up and down in the stored blocks
+        """
+        row = self.execute(u"SELECT peers_helped, peers_helped_by, total_up, total_down FROM %s_statistics "
+                           u"WHERE public_key = ?" % self.db_name, (buffer(public_key),)).fetchone()
+        return tuple(row) if row else (0, 0, 0, 0)
 
     def get_num_unique_interactors(self, public_key):
         """
@@ -13,14 +58,30 @@ class TriblerChainDB(TrustChainDB):
         :param public_key: The public key of the member of which we want the information
         :return: A tuple of unique number of interactors that helped you and that you have helped respectively
         """
-        peers_you_helped = set()
-        peers_helped_you = set()
-        for block in self.get_latest_blocks(public_key, limit=-1):
-            if int(block.transaction["up"]) > 0:
-                peers_you_helped.add(block.link_public_key)
-            if int(block.transaction["down"]) > 0:
-                peers_helped_you.add(block.link_public_key)
-        return len(peers_you_helped), len(peers_helped_you)
+        return self.get_interactor_statistics(public_key)[:2]
+
+    def get_schema(self):
+        """
+        Return the schema for the database.
+        """
+        return super(TriblerChainDB, self).get_schema() + u"""
+        CREATE TABLE IF NOT EXISTS %s_interactions(
+         public_key      TEXT NOT NULL,
+         link_public_key TEXT NOT NULL,
+         up              INTEGER NOT NULL,
+         down            INTEGER NOT NULL,
+
+         PRIMARY KEY (public_key, link_public_key)
+         );
+
+        CREATE TABLE IF NOT EXISTS %s_statistics(
+         public_key      TEXT PRIMARY KEY,
+         peers_helped    INTEGER NOT NULL,
+         peers_helped_by INTEGER NOT NULL,
+         total_up        INTEGER NOT NULL,
+         total_down      INTEGER NOT NULL
+         );
+        """ % (self.db_name, self.db_name)
 
     def get_upgrade_script(self, current_version):
         """
@@ -32,3 +93,51 @@ class TriblerChainDB(TrustChainDB):
             DROP TABLE IF EXISTS %s;
             DROP TABLE IF EXISTS option;
             """ % self.db_name
+
+    def check_database(self, database_version):
+        """
+        Ensure the proper schema is used by the database. Databases from before version 6 have the interactor
+        statistics filled from their existing blocks.
+        :param database_version: Current version of the database.
+        """
+        latest_version = super(TriblerChainDB, self).check_database(database_version)
+        if int(database_version) < 6:
+            self._backfill_interactions()
+            self.commit()
+        return latest_version
+
+    def _backfill_interactions(self):
+        """
+        Computes the interactions and statistics tables from all blocks in the database. The transactions are
+        encoded, so they are decoded here instead of in SQL. The blocks are read in pages of rowids, so only one page
+        of blocks is in memory at a time.
+        """
+        self.executescript(u"DELETE FROM %s_interactions; DELETE FROM %s_statistics;" % (self.db_name, self.db_name))
+
+        last_rowid = -1
+        while True:
+            rows = self.execute(u"SELECT rowid, tx, public_key, link_public_key FROM %s WHERE rowid > ? "
+                                u"ORDER BY rowid LIMIT ?" % self.db_name, (last_rowid, BACKFILL_BATCH_SIZE)).fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+
+            interactions = {}
+            for _, tx, public_key, link_public_key in rows:
+                _, transaction = decode(str(tx))
+                key = (str(public_key), str(link_public_key))
+                up, down = interactions.get(key, (0, 0))
+                interactions[key] = (up + max(0, int(transaction["up"])), down + max(0, int(transaction["down"])))
+
+            self.executemany(u"INSERT OR IGNORE INTO %s_interactions (public_key, link_public_key, up, down) "
+                             u"VALUES(?,?,0,0)" % self.db_name,
+                             [(buffer(public_key), buffer(link_public_key))
+                              for public_key, link_public_key in interactions.iterkeys()])
+            self.executemany(u"UPDATE %s_interactions SET up = up + ?, down = down + ? "
+                             u"WHERE public_key = ? AND link_public_key = ?" % self.db_name,
+                             [(up, down, buffer(public_key), buffer(link_public_key))
+                              for (public_key, link_public_key), (up, down) in interactions.iteritems()])
+
+        self.execute(u"INSERT INTO %s_statistics (public_key, peers_helped, peers_helped_by, total_up, total_down) "
+                     u"SELECT public_key, SUM(up > 0), SUM(down > 0), SUM(up), SUM(down) FROM %s_interactions "
+                     u"GROUP BY public_key" % (self.db_name, self.db_name))
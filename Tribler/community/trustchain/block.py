@@ -18,6 +18,9 @@ EMPTY_PK = '0'*PK_LENGTH
 block_pack_format = "! {0}s I {0}s I {1}s {2}s".format(PK_LENGTH, HASH_LENGTH, SIG_LENGTH)
 block_pack_size = calcsize(block_pack_format)
 
+# ECCrypto keeps no state, so all blocks share a single instance instead of creating one for every validation
+crypto = ECCrypto()
+
 
 class TrustChainBlock(object):
     """
@@ -75,17 +78,52 @@ class TrustChainBlock(object):
         """
         return ValidationResult.valid, []
 
-    def validate(self, database):
+    def validate_stateless(self):
+        """
+        Validates the parts of this block that do not depend on the database: the signature, the public keys and the
+        sanity of the sequence numbers. These checks are the expensive part of validation and only read the block
+        itself, so they can be done for many blocks at once on a thread other than the reactor thread.
+        :return: A list of user string errors, empty if the block passed all checks
+        """
+        errors = []
+        if self.sequence_number < GENESIS_SEQ:
+            errors.append("Sequence number is prior to genesis")
+        if self.link_sequence_number < GENESIS_SEQ and self.link_sequence_number != UNKNOWN_SEQ:
+            errors.append("Link sequence number not empty and is prior to genesis")
+        if not crypto.is_valid_public_bin(self.public_key):
+            errors.append("Public key is not valid")
+        else:
+            # If the public key is valid, we can use it to check the signature. We want just a yes/no answer here, and
+            # we want to keep checking for more errors, so just catch all packing exceptions and report if any happen.
+            try:
+                pck = self.pack(signature=False)
+            except:
+                pck = None
+            if pck is None or not crypto.is_valid_signature(
+                    crypto.key_from_public_bin(self.public_key), pck, self.signature):
+                errors.append("Invalid signature")
+        if not crypto.is_valid_public_bin(self.link_public_key):
+            errors.append("Linked public key is not valid")
+        if self.public_key == self.link_public_key:
+            # Blocks to self serve no purpose and are thus invalid.
+            errors.append("Self signed block")
+        if self.sequence_number == GENESIS_SEQ and self.previous_hash != GENESIS_HASH:
+            errors.append("Sequence number implies previous hash should be Genesis ID")
+        if self.sequence_number != GENESIS_SEQ and self.previous_hash == GENESIS_HASH:
+            errors.append("Sequence number implies previous hash should not be Genesis ID")
+        return errors
+
+    def validate(self, database, stateless_errors=None):
         """
         Validates this block against what is known in the database
         :param database: the database to check against
+        :param stateless_errors: optionally, the result of validate_stateless if that has already been computed
         :return: A tuple consisting of a ValidationResult and a list of user string errors
         """
 
         # we start off thinking everything is hunky dory
         result = [ValidationResult.valid]
         errors = []
-        crypto = ECCrypto()
 
         # short cut for invalidating so we don't have repeating similar code for every error.
         # this is also the reason result is a list, we need a mutable container. Assignments in err are limited to its
@@ -99,10 +137,7 @@ class TrustChainBlock(object):
         # cases subsequent blocks can get validation errors and will not get inserted into the database. Thus we can
         # assume that all retrieved blocks are not invalid themselves. Blocks can get inserted into the database in any
         # order, so we need to find successors, predecessors as well as the block itself and its linked block.
-        blk = database.get(self.public_key, self.sequence_number)
-        link = database.get_linked(self)
-        prev_blk = database.get_block_before(self)
-        next_blk = database.get_block_after(self)
+        blk, link, prev_blk, next_blk = database.get_block_neighbourhood(self)
 
         # Step 2: determine the maximum validation level
         # Depending on the blocks we get from the database, we can decide to reduce the validation level. We must do
@@ -155,32 +190,10 @@ class TrustChainBlock(object):
             result[0] = tx_validate_res
             errors += tx_errors
 
-        if self.sequence_number < GENESIS_SEQ:
-            err("Sequence number is prior to genesis")
-        if self.link_sequence_number < GENESIS_SEQ and self.link_sequence_number != UNKNOWN_SEQ:
-            err("Link sequence number not empty and is prior to genesis")
-        if not crypto.is_valid_public_bin(self.public_key):
-            err("Public key is not valid")
-        else:
-            # If the public key is valid, we can use it to check the signature. We want just a yes/no answer here, and
-            # we want to keep checking for more errors, so just catch all packing exceptions and err() if any happen.
-            try:
-                pck = self.pack(signature=False)
-            except:
-                pck = None
-            if pck is None or not crypto.is_valid_signature(
-                    crypto.key_from_public_bin(self.public_key), pck, self.signature):
-                err("Invalid signature")
-        if not crypto.is_valid_public_bin(self.link_public_key):
-            err("Linked public key is not valid")
-        if self.public_key == self.link_public_key:
-            # Blocks to self serve no purpose and are thus invalid.
-            err("Self signed block")
-        if is_genesis:
-            if self.sequence_number == GENESIS_SEQ and self.previous_hash != GENESIS_HASH:
-                err("Sequence number implies previous hash should be Genesis ID")
-            if self.sequence_number != GENESIS_SEQ and self.previous_hash == GENESIS_HASH:
-                err("Sequence number implies previous hash should not be Genesis ID")
+        if stateless_errors is None:
+            stateless_errors = self.validate_stateless()
+        for reason in stateless_errors:
+            err(reason)
 
         # Step 4: does the database already know about this block? If so it should be equal or else we caught a
         # branch in someones trustchain.
@@ -245,7 +258,6 @@ class TrustChainBlock(object):
         Signs this block with the given key
         :param key: the key to sign this block with
         """
-        crypto = ECCrypto()
         self.signature = crypto.create_signature(key, self.pack(signature=False))
 
     @classmethod
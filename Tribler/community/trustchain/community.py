@@ -8,7 +8,8 @@ from random import randint
 from time import time
 
 from twisted.internet import reactor
-from twisted.internet.defer import succeed, Deferred, inlineCallbacks
+from twisted.internet.defer import succeed, Deferred, inlineCallbacks, CancelledError
+from twisted.internet.threads import deferToThread
 
 from Tribler.community.trustchain.block import TrustChainBlock, ValidationResult, GENESIS_SEQ, UNKNOWN_SEQ
 from Tribler.community.trustchain.conversion import TrustChainConversion
@@ -26,6 +27,18 @@ from Tribler.dispersy.resolution import PublicResolution
 HALF_BLOCK = u"half_block"
 CRAWL = u"crawl"
 
+# Batches of half blocks with at least this many blocks have their signatures checked on the thread pool. Smaller
+# batches, like a single signature request, are validated right away as the thread handoff would only add latency.
+THREADED_VALIDATION_MIN_BATCH = 16
+
+
+def validate_blocks_stateless(blocks):
+    """
+    Runs the checks that do not need the database for a batch of blocks. Safe to call from any thread.
+    :return: a list with the errors of every block
+    """
+    return [blk.validate_stateless() for blk in blocks]
+
 
 class TrustChainCommunity(Community):
     """
@@ -53,6 +66,10 @@ class TrustChainCommunity(Community):
         self.expected_sig_requests = {}
         self.received_block_ids = set()
 
+        self.num_validated_blocks = 0
+        self.num_invalid_blocks = 0
+        self._validation_batch_id = 0
+
     @classmethod
     def get_master_members(cls, dispersy):
         # generated: Tue Jun 13 14:42:46 2017
@@ -185,18 +202,43 @@ class TrustChainCommunity(Community):
 
     def received_half_block(self, messages):
         """
-        We've received a half block, either because we sent a SIGNED message to some one or we are crawling
+        We've received a half block, either because we sent a SIGNED message to some one or we are crawling.
+        Large batches have their signatures checked on the thread pool, only the checks against the database and the
+        insertion of the blocks are done on the reactor thread.
         :param messages The half block messages
+        :return: A Deferred that fires when the blocks have been processed
         """
         self.logger.debug("Received %d half block messages.", len(messages))
-        for message in messages:
+        blocks = [message.payload.block for message in messages]
+        if len(blocks) < THREADED_VALIDATION_MIN_BATCH:
+            self.process_half_blocks(messages, validate_blocks_stateless(blocks))
+            return succeed(None)
+
+        self._validation_batch_id += 1
+        validate_deferred = deferToThread(validate_blocks_stateless, blocks)
+        validate_deferred.addCallback(lambda errors: self.process_half_blocks(messages, errors))
+        validate_deferred.addErrback(lambda failure: failure.trap(CancelledError))
+        return self.register_task("validate_half_blocks_%d" % self._validation_batch_id, validate_deferred)
+
+    def process_half_blocks(self, messages, stateless_errors):
+        """
+        Validates the received half blocks against the database, stores the new ones in a single transaction and
+        signs the requests that are addressed to us.
+        :param messages: The half block messages
+        :param stateless_errors: The result of validate_blocks_stateless for the blocks in the messages
+        """
+        added_blocks = False
+        for message, errors in zip(messages, stateless_errors):
             blk = message.payload.block
-            validation = blk.validate(self.persistence)
+            validation = blk.validate(self.persistence, errors)
+            self.num_validated_blocks += 1
             self.logger.debug("Block validation result %s, %s, (%s)", validation[0], validation[1], blk)
             if validation[0] == ValidationResult.invalid:
+                self.num_invalid_blocks += 1
                 continue
             elif not self.persistence.contains(blk):
-                self.persistence.add_block(blk)
+                self.persistence.add_block(blk, commit=False)
+                added_blocks = True
             else:
                 self.logger.debug("Received already known block (%s)", blk)
 
@@ -246,6 +288,9 @@ class TrustChainCommunity(Community):
                     self.cancel_pending_task(crawl_task)
                     continue
 
+        if added_blocks:
+            self.persistence.commit()
+
     def send_crawl_request(self, candidate, public_key, sequence_number=None):
         sq = sequence_number
         if sequence_number is None:
@@ -2,12 +2,14 @@
 This file contains everything related to persistence for TrustChain.
 """
 import os
+from collections import OrderedDict
 
 from Tribler.dispersy.database import Database
 from Tribler.community.trustchain.block import TrustChainBlock
 
 
 DATABASE_DIRECTORY = os.path.join(u"sqlite")
+BLOCK_CACHE_SIZE = 4096  # The number of decoded blocks that are kept in memory
 
 
 class TrustChainDB(Database):
@@ -16,7 +18,7 @@ class TrustChainDB(Database):
     Connection layer to SQLiteDB.
     Ensures a proper DB schema on startup.
     """
-    LATEST_DB_VERSION = 1
+    LATEST_DB_VERSION = 2
 
     def __init__(self, working_directory, db_name):
         """
@@ -29,26 +31,47 @@ class TrustChainDB(Database):
         super(TrustChainDB, self).__init__(db_path)
         self._logger.debug("TrustChain database path: %s", db_path)
         self.db_name = db_name
+        # Blocks are immutable once stored, so decoded blocks can be shared. Maps (public_key, sequence_number) to a
+        # block, least recently used first.
+        self._block_cache = OrderedDict()
         self.open()
 
-    def add_block(self, block):
+    def add_block(self, block, commit=True):
         """
         Persist a block
         :param block: The data that will be saved.
+        :param commit: False to leave committing to the caller, for instance when adding a batch of blocks.
         """
         self.execute(
             u"INSERT INTO %s (tx, public_key, sequence_number, link_public_key,"
             u"link_sequence_number, previous_hash, signature, block_hash) VALUES(?,?,?,?,?,?,?,?)" % self.db_name,
             block.pack_db_insert())
-        self.commit()
+        if commit:
+            self.commit()
+
+    def _get_block_from_row(self, db_result):
+        """
+        Returns the block stored in a database row, decoding it only if it is not in the block cache.
+        """
+        key = (str(db_result[1]), db_result[2])
+        block = self._block_cache.pop(key, None)
+        if block is None:
+            block = TrustChainBlock(db_result)
+        self._cache_block(key, block)
+        return block
+
+    def _cache_block(self, key, block):
+        self._block_cache[key] = block
+        if len(self._block_cache) > BLOCK_CACHE_SIZE:
+            self._block_cache.popitem(last=False)
 
     def _get(self, query, params):
         db_result = self.execute(self.get_sql_header() + query, params).fetchone()
-        return TrustChainBlock(db_result) if db_result else None
+        return self._get_block_from_row(db_result) if db_result else None
 
     def _getall(self, query, params):
         db_result = self.execute(self.get_sql_header() + query, params).fetchall()
-        return [TrustChainBlock(db_item) for db_item in db_result]
+        return [self._get_block_from_row(db_item) for db_item in db_result]
 
     def get(self, public_key, sequence_number):
         """
@@ -57,6 +80,10 @@ class TrustChainDB(Database):
         :param sequence_number: The specific block to get
         :return: the block or None if it is not known
         """
+        block = self._block_cache.pop((public_key, sequence_number), None)
+        if block is not None:
+            self._cache_block((public_key, sequence_number), block)
+            return block
         return self._get(u"WHERE public_key = ? AND sequence_number = ?", (buffer(public_key), sequence_number))
 
     def contains(self, block):
@@ -85,7 +112,7 @@ class TrustChainDB(Database):
         :param block: The block who's successor we want to find
         :return A block
         """
-        return self._get(u"WHERE sequence_number > ? AND public_key = ? ORDER BY sequence_number ASC",
+        return self._get(u"WHERE sequence_number > ? AND public_key = ? ORDER BY sequence_number ASC LIMIT 1",
                          (block.sequence_number, buffer(block.public_key)))
 
     def get_block_before(self, block):
@@ -94,7 +121,7 @@ class TrustChainDB(Database):
         :param block: The block who's predecessor we want to find
         :return A block
         """
-        return self._get(u"WHERE sequence_number < ? AND public_key = ? ORDER BY sequence_number DESC",
+        return self._get(u"WHERE sequence_number < ? AND public_key = ? ORDER BY sequence_number DESC LIMIT 1",
                          (block.sequence_number, buffer(block.public_key)))
 
     def get_linked(self, block):
@@ -107,6 +134,33 @@ class TrustChainDB(Database):
                          u"link_sequence_number = ?", (buffer(block.link_public_key), block.link_sequence_number,
                                                        buffer(block.public_key), block.sequence_number))
 
+    def get_block_neighbourhood(self, block):
+        """
+        Get the blocks that are needed to validate the given block, with a single query.
+        :param block: The block for which to get the neighbourhood
+        :return: A tuple of the stored block with the same public key and sequence number, the linked block, the block
+        before and the block after the given block. Each of them is None if it is not known.
+        """
+        columns = self.get_sql_header()[len(u"SELECT "):]
+        subquery = u"SELECT * FROM (SELECT %d, " + columns + u"WHERE %s)"
+        query = u" UNION ALL ".join([
+            subquery % (0, u"public_key = ? AND sequence_number = ?"),
+            subquery % (1, u"public_key = ? AND sequence_number = ?"),
+            subquery % (2, u"link_public_key = ? AND link_sequence_number = ? LIMIT 1"),
+            subquery % (3, u"public_key = ? AND sequence_number < ? ORDER BY sequence_number DESC LIMIT 1"),
+            subquery % (4, u"public_key = ? AND sequence_number > ? ORDER BY sequence_number ASC LIMIT 1")])
+        public_key = buffer(block.public_key)
+        params = (public_key, block.sequence_number, buffer(block.link_public_key), block.link_sequence_number,
+                  public_key, block.sequence_number, public_key, block.sequence_number,
+                  public_key, block.sequence_number)
+
+        neighbourhood = [None] * 5
+        for db_result in self.execute(query, params).fetchall():
+            neighbourhood[db_result[0]] = self._get_block_from_row(db_result[1:])
+
+        blk, linked, linked_back, prev_blk, next_blk = neighbourhood
+        return blk, linked or linked_back, prev_blk, next_blk
+
     def crawl(self, public_key, sequence_number, limit=100):
         assert limit <= 100, "Don't fetch too much"
         return self._getall(u"WHERE insert_time >= (SELECT MAX(insert_time) FROM %s WHERE public_key = ? AND "
@@ -142,9 +196,12 @@ class TrustChainDB(Database):
          PRIMARY KEY (public_key, sequence_number)
          );
 
-        CREATE TABLE option(key TEXT PRIMARY KEY, value BLOB);
-        INSERT INTO option(key, value) VALUES('database_version', '%s');
-        """ % (self.db_name, str(self.LATEST_DB_VERSION))
+        CREATE INDEX IF NOT EXISTS %s_link_idx ON %s(link_public_key, link_sequence_number);
+        CREATE INDEX IF NOT EXISTS %s_insert_time_idx ON %s(insert_time);
+
+        CREATE TABLE IF NOT EXISTS option(key TEXT PRIMARY KEY, value BLOB);
+        INSERT OR REPLACE INTO option(key, value) VALUES('database_version', '%s');
+        """ % ((self.db_name,) * 5 + (str(self.LATEST_DB_VERSION),))
 
     def get_upgrade_script(self, current_version):
         """
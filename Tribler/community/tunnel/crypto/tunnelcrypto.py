@@ -5,10 +5,38 @@ from Tribler.community.tunnel.crypto.cryptowrapper import crypto_box_beforenm, c
     algorithms, modes, HKDFExpand, hashes, default_backend
 
 
+GCM_HEADER = struct.Struct('!q16s')  # salt_explicit and gcm tag, prepended to the ciphertext
+
+
 class CryptoException(Exception):
     pass
 
 
+class SessionKeys(list):
+    """
+    The session keys of a hop: [key originator, key exit node, salt originator, salt exit node,
+    salt_explicit originator, salt_explicit exit node]. The AES ciphers of both directions are built when the keys
+    are set, so they are not rebuilt for every cell.
+    """
+
+    def __init__(self, keys):
+        super(SessionKeys, self).__init__(keys)
+        self._ciphers = (algorithms.AES(self[0]), algorithms.AES(self[1]))
+
+    def get_cipher(self, direction):
+        """
+        Returns the AES cipher for the given direction.
+        """
+        return self._ciphers[direction]
+
+    def next_salt_explicit(self, direction):
+        """
+        Increments and returns the salt_explicit of the given direction.
+        """
+        self[direction + 4] += 1
+        return self[direction + 4]
+
+
 class TunnelCrypto(ECCrypto):
 
     def initialize(self, community):
@@ -51,7 +79,7 @@ class TunnelCrypto(ECCrypto):
         kb = key[16:32]
         sf = key[32:36]
         sb = key[36:40]
-        return [kf, kb, sf, sb, 1, 1]
+        return SessionKeys([kf, kb, sf, sb, 1, 1])
 
     def _bulid_iv(self, salt, salt_explicit):
         assert isinstance(salt, (basestring)), type(salt)
@@ -62,27 +90,56 @@ class TunnelCrypto(ECCrypto):
 
         return salt + str(salt_explicit)
 
-    def encrypt_str(self, content, key, salt, salt_explicit):
+    def _encrypt(self, cipher, salt, salt_explicit, content):
         # return the encrypted content prepended with the
         # gcm tag and salt_explicit
-        cipher = Cipher(algorithms.AES(key),
-                        modes.GCM(initialization_vector=self._bulid_iv(salt, salt_explicit)),
-                        backend=default_backend()
-                        ).encryptor()
-        ciphertext = cipher.update(content) + cipher.finalize()
-        return struct.pack('!q16s', salt_explicit, cipher.tag) + ciphertext
-
-    def decrypt_str(self, content, key, salt):
+        encryptor = Cipher(cipher,
+                           modes.GCM(initialization_vector=self._bulid_iv(salt, salt_explicit)),
+                           backend=default_backend()
+                           ).encryptor()
+        ciphertext = encryptor.update(content) + encryptor.finalize()
+        return GCM_HEADER.pack(salt_explicit, encryptor.tag) + ciphertext
+
+    def _decrypt(self, cipher, salt, content):
         # content contains the gcm tag and salt_explicit in plaintext
-        if len(content) < 24:
+        if len(content) < GCM_HEADER.size:
             raise CryptoException("truncated content")
 
-        salt_explicit, gcm_tag = struct.unpack_from('!q16s', content)
-        cipher = Cipher(algorithms.AES(key),
-                        modes.GCM(initialization_vector=self._bulid_iv(salt, salt_explicit), tag=gcm_tag),
-                        backend=default_backend()
-                        ).decryptor()
-        return cipher.update(content[24:]) + cipher.finalize()
+        salt_explicit, gcm_tag = GCM_HEADER.unpack_from(content)
+        decryptor = Cipher(cipher,
+                           modes.GCM(initialization_vector=self._bulid_iv(salt, salt_explicit), tag=gcm_tag),
+                           backend=default_backend()
+                           ).decryptor()
+        return decryptor.update(content[GCM_HEADER.size:]) + decryptor.finalize()
+
+    def encrypt_str(self, content, key, salt, salt_explicit):
+        return self._encrypt(algorithms.AES(key), salt, salt_explicit, content)
+
+    def decrypt_str(self, content, key, salt):
+        return self._decrypt(algorithms.AES(key), salt, content)
+
+    def encrypt_cells(self, cells, session_keys, direction):
+        """
+        Encrypts a list of cells with the session keys of one hop, using the cached cipher of the given direction.
+        :param cells: the plaintext cells
+        :param session_keys: SessionKeys, as returned by generate_session_keys
+        :param direction: ORIGINATOR or EXIT_NODE
+        :return: a list with the encrypted cells, in the same order
+        """
+        cipher = session_keys.get_cipher(direction)
+        salt = session_keys[direction + 2]
+        return [self._encrypt(cipher, salt, session_keys.next_salt_explicit(direction), cell) for cell in cells]
+
+    def decrypt_cells(self, cells, session_keys, direction):
+        """
+        Decrypts a list of cells with the session keys of one hop, using the cached cipher of the given direction.
+        Raises InvalidTag if any of the cells fails to authenticate.
+        :return: a list with the decrypted cells, in the same order
+        """
+        cipher = session_keys.get_cipher(direction)
+        salt = session_keys[direction + 2]
+        return [self._decrypt(cipher, salt, cell) for cell in cells]
+
 
 class NoTunnelCrypto(TunnelCrypto):
 
@@ -103,7 +160,7 @@ class NoTunnelCrypto(TunnelCrypto):
         return ''
 
     def generate_session_keys(self, shared_secret):
-        return '\0' * 16, '\0' * 16, '\0' * 4, '\0' * 4, 1, 1
+        return SessionKeys(['\0' * 16, '\0' * 16, '\0' * 4, '\0' * 4, 1, 1])
 
     def encrypt_str(self, content, key, salt, salt_explicit):
         return content
@@ -111,5 +168,11 @@ class NoTunnelCrypto(TunnelCrypto):
     def decrypt_str(self, content, key, salt):
         return content
 
+    def encrypt_cells(self, cells, session_keys, direction):
+        return list(cells)
+
+    def decrypt_cells(self, cells, session_keys, direction):
+        return list(cells)
+
 if __name__ == "__main__":
     tc = TunnelCrypto()
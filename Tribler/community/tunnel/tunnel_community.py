@@ -21,7 +21,7 @@ from twisted.python.threadable import isInIOThread
 from Tribler.Core.Utilities.encoding import decode, encode
 from Tribler.community.tunnel import (CIRCUIT_ID_PORT, CIRCUIT_STATE_EXTENDING, CIRCUIT_STATE_READY, CIRCUIT_TYPE_DATA,
                                       CIRCUIT_TYPE_RENDEZVOUS, CIRCUIT_TYPE_RP, EXIT_NODE, EXIT_NODE_SALT, ORIGINATOR,
-                                      ORIGINATOR_SALT, PING_INTERVAL)
+                                      PING_INTERVAL)
 from Tribler.community.tunnel.Socks5.server import Socks5Server
 from Tribler.community.tunnel.conversion import TunnelConversion
 from Tribler.community.tunnel.crypto.tunnelcrypto import CryptoException, TunnelCrypto
@@ -788,31 +788,56 @@ class TunnelCommunity(Community):
         return self.relay_packet(circuit_id, message_type, message.packet)
 
     def relay_packet(self, circuit_id, message_type, packet):
+        return self.relay_packets(circuit_id, message_type, [packet])
+
+    def relay_packets(self, circuit_id, message_type, packets):
+        """
+        Relays a list of packets of the same type that were received for the same circuit. The encryption layer of
+        the relay is added or removed for all packets in one batch.
+        """
         next_relay = self.relay_from_to[circuit_id]
         this_relay = self.relay_from_to.get(next_relay.circuit_id, None)
 
-        self.tunnel_logger.debug("Relay %s from %d to %d", message_type, circuit_id, next_relay.circuit_id)
+        self.tunnel_logger.debug("Relay %d %s from %d to %d", len(packets), message_type, circuit_id,
+                                 next_relay.circuit_id)
 
         if this_relay:
             this_relay.last_incoming = time.time()
-            self.increase_bytes_received(this_relay, len(packet))
+            self.increase_bytes_received(this_relay, sum(len(packet) for packet in packets))
 
-        plaintext, encrypted = TunnelConversion.split_encrypted_packet(packet, message_type)
+        split_packets = [TunnelConversion.split_encrypted_packet(packet, message_type) for packet in packets]
         try:
-            if next_relay.rendezvous_relay:
-                decrypted = self.crypto_in(circuit_id, encrypted)
-                encrypted = self.crypto_out(next_relay.circuit_id, decrypted)
-            else:
-                encrypted = self.crypto_relay(circuit_id, encrypted)
-            packet = plaintext + encrypted
+            encrypted = self._crypto_relay_cells(circuit_id, next_relay, [cell for _, cell in split_packets])
 
         except CryptoException, e:
             self.tunnel_logger.error(str(e))
-            return False
+            if len(packets) == 1:
+                return False
+
+            # Don't let a single corrupt cell cause the other cells in the batch to be dropped
+            encrypted = []
+            for _, encrypted_cell in split_packets:
+                try:
+                    encrypted += self._crypto_relay_cells(circuit_id, next_relay, [encrypted_cell])
+                except CryptoException, e:
+                    self.tunnel_logger.error(str(e))
+                    encrypted.append(None)
+
+        candidate = Candidate(next_relay.sock_addr, False)
+        relayed = False
+        for (plaintext, _), encrypted_cell in zip(split_packets, encrypted):
+            if encrypted_cell is None:
+                continue
+            packet = TunnelConversion.swap_circuit_id(plaintext + encrypted_cell, message_type, circuit_id,
+                                                      next_relay.circuit_id)
+            self.increase_bytes_sent(next_relay, self.send_packet([candidate], message_type, packet))
+            relayed = True
+        return relayed
 
-        packet = TunnelConversion.swap_circuit_id(packet, message_type, circuit_id, next_relay.circuit_id)
-        self.increase_bytes_sent(next_relay, self.send_packet([Candidate(next_relay.sock_addr, False)], message_type, packet))
-        return True
+    def _crypto_relay_cells(self, circuit_id, next_relay, contents):
+        if next_relay.rendezvous_relay:
+            return self.crypto_out_cells(next_relay.circuit_id, self.crypto_in_cells(circuit_id, contents))
+        return self.crypto_relay_cells(circuit_id, contents)
 
     def check_create(self, messages):
         for message in messages:
@@ -1010,6 +1035,10 @@ class TunnelCommunity(Community):
             self.update_exit_candidates(message.candidate, message.payload.exitnode)
 
     def on_cell(self, messages):
+        # Consecutive cells that are relayed for the same circuit and of the same type are grouped, so they are
+        # encrypted in batches while the cells are still relayed in the order in which they arrived
+        relay_batches = []
+
         for message in messages:
             circuit_id = message.payload.circuit_id
             self.tunnel_logger.debug("Got %s (%d) from %s, I am %s", message.payload.message_type,
@@ -1017,9 +1046,10 @@ class TunnelCommunity(Community):
                                      self.my_member)
 
             if self.is_relay(circuit_id):
-                if not self.relay_cell(circuit_id, message.payload.message_type, message):
-                    # TODO: if crypto fails for relay messages, call remove_relay
-                    pass
+                if relay_batches and relay_batches[-1][:2] == (circuit_id, message.payload.message_type):
+                    relay_batches[-1][2].append(message.packet)
+                else:
+                    relay_batches.append((circuit_id, message.payload.message_type, [message.packet]))
 
             else:
                 circuit = self.circuits.get(circuit_id, None)
@@ -1044,6 +1074,12 @@ class TunnelCommunity(Community):
                     circuit.beat_heart()
                     self.increase_bytes_received(circuit, len(message.packet))
 
+        for circuit_id, message_type, packets in relay_batches:
+            # The relay might have been removed while processing the other cells
+            if self.is_relay(circuit_id) and not self.relay_packets(circuit_id, message_type, packets):
+                # TODO: if crypto fails for relay messages, call remove_relay
+                pass
+
     def on_create(self, messages):
         for message in messages:
             candidate = message.candidate
@@ -1289,72 +1325,80 @@ class TunnelCommunity(Community):
             self.tunnel_logger.error("Dropping data packets with unknown circuit_id")
 
     def crypto_out(self, circuit_id, content, is_data=False):
+        return self.crypto_out_cells(circuit_id, [content], is_data)[0]
+
+    def crypto_out_cells(self, circuit_id, contents, is_data=False):
+        """
+        Adds the encryption layers of a circuit to a list of cells, one layer at a time for all cells.
+        """
         circuit = self.circuits.get(circuit_id, None)
         if circuit:
-            if circuit and is_data and circuit.ctype in [CIRCUIT_TYPE_RENDEZVOUS, CIRCUIT_TYPE_RP]:
+            if is_data and circuit.ctype in [CIRCUIT_TYPE_RENDEZVOUS, CIRCUIT_TYPE_RP]:
                 direction = int(circuit.ctype == CIRCUIT_TYPE_RP)
-                content = self.crypto.encrypt_str(content, *self.get_session_keys(circuit.hs_session_keys, direction))
+                contents = self.crypto.encrypt_cells(contents, circuit.hs_session_keys, direction)
 
             for hop in reversed(circuit.hops):
-                content = self.crypto.encrypt_str(content, *self.get_session_keys(hop.session_keys, EXIT_NODE))
-            return content
+                contents = self.crypto.encrypt_cells(contents, hop.session_keys, EXIT_NODE)
+            return contents
 
         elif circuit_id in self.relay_session_keys:
-            return self.crypto.encrypt_str(content,
-                                           *self.get_session_keys(self.relay_session_keys[circuit_id], ORIGINATOR))
+            return self.crypto.encrypt_cells(contents, self.relay_session_keys[circuit_id], ORIGINATOR)
 
         raise CryptoException("Don't know how to encrypt outgoing message for circuit_id %d" % circuit_id)
 
     def crypto_in(self, circuit_id, content, is_data=False):
+        return self.crypto_in_cells(circuit_id, [content], is_data)[0]
+
+    def crypto_in_cells(self, circuit_id, contents, is_data=False):
+        """
+        Removes the encryption layers of a circuit from a list of cells, one layer at a time for all cells.
+        """
         circuit = self.circuits.get(circuit_id, None)
         if circuit:
             if len(circuit.hops) > 0:
                 # Remove all the encryption layers
                 layer = 0
-                for hop in self.circuits[circuit_id].hops:
+                for hop in circuit.hops:
                     layer += 1
                     try:
-                        content = self.crypto.decrypt_str(content,
-                                                          hop.session_keys[ORIGINATOR],
-                                                          hop.session_keys[ORIGINATOR_SALT])
+                        contents = self.crypto.decrypt_cells(contents, hop.session_keys, ORIGINATOR)
                     except InvalidTag as e:
                         raise CryptoException("Got exception %r when trying to remove encryption layer %s "
                                               "for message: %r received for circuit_id: %s, is_data: %i, circuit_hops:"
-                                              " %r" % (e, layer, content, circuit_id, is_data, circuit.hops))
+                                              " %r" % (e, layer, contents, circuit_id, is_data, circuit.hops))
 
                 if is_data and circuit.ctype in [CIRCUIT_TYPE_RENDEZVOUS, CIRCUIT_TYPE_RP]:
                     direction = int(circuit.ctype != CIRCUIT_TYPE_RP)
-                    direction_salt = direction + 2
-                    content = self.crypto.decrypt_str(content,
-                                                      circuit.hs_session_keys[direction],
-                                                      circuit.hs_session_keys[direction_salt])
-                return content
+                    contents = self.crypto.decrypt_cells(contents, circuit.hs_session_keys, direction)
+                return contents
 
             else:
                 raise CryptoException("Error decrypting message for circuit %d, circuit is set to 0 hops.")
 
         elif circuit_id in self.relay_session_keys:
             try:
-                return self.crypto.decrypt_str(content,
-                                               self.relay_session_keys[circuit_id][EXIT_NODE],
-                                               self.relay_session_keys[circuit_id][EXIT_NODE_SALT])
+                return self.crypto.decrypt_cells(contents, self.relay_session_keys[circuit_id], EXIT_NODE)
             except InvalidTag as e:
                 raise CryptoException("Got exception %r when trying to decrypt relay message: "
                                       "%r received for circuit_id: %s, is_data: %i, " %
-                                      (e, content, circuit_id, is_data))
+                                      (e, contents, circuit_id, is_data))
 
         raise CryptoException("Received message for unknown circuit ID: %d" % circuit_id)
 
     def crypto_relay(self, circuit_id, content):
+        return self.crypto_relay_cells(circuit_id, [content])[0]
+
+    def crypto_relay_cells(self, circuit_id, contents):
+        """
+        Adds (towards the originator) or removes (towards the exit node) the encryption layer of this relay for a
+        list of cells.
+        """
         direction = self.directions[circuit_id]
         if direction == ORIGINATOR:
-            return self.crypto.encrypt_str(content,
-                                           *self.get_session_keys(self.relay_session_keys[circuit_id], ORIGINATOR))
+            return self.crypto.encrypt_cells(contents, self.relay_session_keys[circuit_id], ORIGINATOR)
         elif direction == EXIT_NODE:
             try:
-                return self.crypto.decrypt_str(content,
-                                               self.relay_session_keys[circuit_id][EXIT_NODE],
-                                               self.relay_session_keys[circuit_id][EXIT_NODE_SALT])
+                return self.crypto.decrypt_cells(contents, self.relay_session_keys[circuit_id], EXIT_NODE)
             except InvalidTag:
                 # Reasons that can cause this:
                 # - The introductionpoint circuit is extended with a candidate
@@ -1376,7 +1420,7 @@ class TunnelCommunity(Community):
                                      "  circuit_id: %r\n"
                                      "  content: : %r\n"
                                      "  Possibly corrupt data?",
-                                     direction, circuit_id, content)
+                                     direction, circuit_id, contents)
 
         raise CryptoException("Direction must be either ORIGINATOR or EXIT_NODE")
 
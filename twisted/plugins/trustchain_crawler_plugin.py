@@ -1,9 +1,11 @@
 import os
 import signal
 import logging.config
+from time import time
 
 from twisted.application.service import IServiceMaker, MultiService
 from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
 from twisted.plugin import IPlugin
 from twisted.python import usage
 from twisted.python.log import msg
@@ -22,9 +24,33 @@ class Options(usage.Options):
           if os.environ.get('HOME') else u'.trustchain', "Use an alternate statedir"    , unicode],
         ["ip"      , "i", "0.0.0.0" ,  "Dispersy uses this ip"                          , str],
         ["port"    , "p", 6421      ,  "Dispersy uses this UDP port"                    , int],
+        ["statsinterval", "t", 60   ,  "Interval in seconds between validation reports" , int],
     ]
 
 
+class ValidationRateReporter(object):
+    """
+    Periodically logs how many blocks per second the crawler validates.
+    """
+
+    def __init__(self, community):
+        self.community = community
+        self.last_report_time = time()
+        self.last_validated_blocks = community.num_validated_blocks
+        self.last_invalid_blocks = community.num_invalid_blocks
+
+    def report(self):
+        now = time()
+        validated = self.community.num_validated_blocks - self.last_validated_blocks
+        invalid = self.community.num_invalid_blocks - self.last_invalid_blocks
+        msg("Validated %d blocks (%d invalid) in %.1f seconds, %.1f blocks/s" %
+            (validated, invalid, now - self.last_report_time, validated / max(now - self.last_report_time, 1e-6)))
+
+        self.last_report_time = now
+        self.last_validated_blocks = self.community.num_validated_blocks
+        self.last_invalid_blocks = self.community.num_invalid_blocks
+
+
 class TrustchainCrawlerServiceMaker(object):
     implements(IServiceMaker, IPlugin)
     tapname = "trustchain_crawler"
@@ -52,7 +78,11 @@ class TrustchainCrawlerServiceMaker(object):
                 raise RuntimeError("Unable to start Dispersy")
             master_member = TriblerChainCommunityCrawler.get_master_members(dispersy)[0]
             my_member = dispersy.get_member(private_key=crypto.key_to_bin(crypto.generate_key(u"curve25519")))
-            TriblerChainCommunityCrawler.init_community(dispersy, master_member, my_member)
+            community = TriblerChainCommunityCrawler.init_community(dispersy, master_member, my_member)
+
+            reporter = ValidationRateReporter(community)
+            self._report_lc = LoopingCall(reporter.report)
+            self._report_lc.start(options["statsinterval"], now=False)
 
             self._stopping = False
 
@@ -60,6 +90,7 @@ class TrustchainCrawlerServiceMaker(object):
                 msg("Received signal '%s' in %s (shutting down)" % (sig, frame))
                 if not self._stopping:
                     self._stopping = True
+                    self._report_lc.stop()
                     dispersy.stop().addCallback(lambda _: reactor.stop())
             signal.signal(signal.SIGINT, signal_handler)
             signal.signal(signal.SIGTERM, signal_handler)